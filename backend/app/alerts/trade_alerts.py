@@ -10,6 +10,8 @@ from app.models.trade import Trade
 from app.models.user import User
 from app.telegram.bot import telegram_bot
 from app.services.notification_service import notification_service, NotificationPriority, NotificationChannel
+from app.services.pnl_rollups import pnl_rollups
+from app.services.trading_stats import trading_stats
 
 logger = logging.getLogger(__name__)
 
@@ -72,6 +74,12 @@ class TradeAlertManager:
         close_reason: str = 'manual'
     ):
         """Send trade close alert"""
+        try:
+            trading_stats.record(trade)
+            await pnl_rollups.record(trade)
+        except Exception as e:
+            logger.error(f"Failed to record trade stats: {e}")
+        
         try:
             trade_data = {
                 'id': trade.id,
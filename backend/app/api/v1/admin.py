@@ -0,0 +1,40 @@
+"""
+API Endpoints for operators - diagnostics of the running worker
+"""
+
+from fastapi import APIRouter, Depends, Query
+
+from app.auth.dependencies import require_admin
+from app.core.cache import cache
+from app.core.performance import db_optimizer
+
+router = APIRouter()
+
+
+@router.get("/cache")
+async def cache_overview(
+    limit: int = Query(20, ge=1, le=200),
+    sort: str = Query("accesses", pattern="^(accesses|bytes)$"),
+    current_user = Depends(require_admin)
+):
+    """
+    Local tier usage per namespace and the busiest (sort=accesses) or
+    largest (sort=bytes) keys seen by this worker. Hit/miss rates across
+    workers are in Prometheus (cache_hits_total, cache_misses_total).
+    """
+    return cache.debug_stats(limit, sort)
+
+
+@router.get("/db/queries")
+async def query_stats(
+    limit: int = Query(20, ge=1, le=200),
+    sort: str = Query("total_time", pattern="^(total_time|avg_time|max_time|count|rows)$"),
+    current_user = Depends(require_admin)
+):
+    """
+    Statements seen by this worker grouped by fingerprint (literals and
+    parameters stripped), with EXPLAIN plans of the slow SELECTs, and the
+    time spent waiting for pooled connections. Latency across workers is in
+    Prometheus (db_query_duration_seconds, db_pool_checkout_seconds).
+    """
+    return db_optimizer.query_report(limit, sort)
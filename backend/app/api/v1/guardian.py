@@ -6,25 +6,28 @@ from typing import List, Optional
 from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
-from app.database.connection import get_db
+from app.core.pagination import keyset, page
+from app.database.connection import get_db, get_read_db
 from app.auth.dependencies import get_current_user, require_admin
-from app.guardian.monitor import PerformanceMonitor
+from app.guardian.monitor import performance_monitor
 from app.guardian.analyzer import CodeAnalyzer
 from app.guardian.fixer import AutoFixer
 from app.guardian.models import (
     PerformanceMetric, Alert, CodeChange, GuardianState,
-    GuardianStatus, ChangeStatus
+    GuardianStatus, ChangeStatus, KnowledgePatternDB
 )
 from app.guardian.knowledge_base import KnowledgeBase
 
 router = APIRouter(prefix="/guardian", tags=["guardian"])
 
 # Dependency to get monitor instance
-def get_monitor(db: Session = Depends(get_db)):
-    return PerformanceMonitor(db)
+def get_monitor():
+    return performance_monitor
 
 def get_analyzer(db: Session = Depends(get_db)):
     return CodeAnalyzer(db)
@@ -65,11 +68,10 @@ async def get_guardian_status(
     current_user = Depends(get_current_user)
 ):
     """الحصول على حالة Guardian"""
-    monitor = PerformanceMonitor(db)
     fixer = AutoFixer(db)
     
     pending = len(fixer.get_pending_changes())
-    alerts = len(monitor.get_active_alerts())
+    alerts = len(await performance_monitor.get_active_alerts())
     
     return StatusResponse(
         status=GuardianStatus.OPERATIONAL.value,
@@ -83,15 +85,15 @@ async def get_guardian_status(
 @router.get("/metrics", response_model=MetricsResponse)
 async def get_metrics(
     limit: int = Query(100, ge=1, le=1000),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user = Depends(get_current_user)
 ):
     """الحصول على المقاييس"""
     from app.guardian.models import PerformanceMetricDB
     
-    metrics = db.query(PerformanceMetricDB).order_by(
-        PerformanceMetricDB.timestamp.desc()
-    ).limit(limit).all()
+    metrics = (await db.execute(
+        select(PerformanceMetricDB).order_by(PerformanceMetricDB.timestamp.desc()).limit(limit)
+    )).scalars().all()
     
     current = metrics[0] if metrics else None
     
@@ -104,20 +106,20 @@ async def get_metrics(
 async def get_alerts(
     severity: Optional[str] = None,
     resolved: Optional[bool] = False,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user = Depends(get_current_user)
 ):
     """الحصول على التنبيهات"""
     from app.guardian.models import AlertDB
     
-    query = db.query(AlertDB)
+    query = select(AlertDB)
     
     if severity:
-        query = query.filter(AlertDB.severity == severity)
+        query = query.where(AlertDB.severity == severity)
     if resolved is not None:
-        query = query.filter(AlertDB.is_resolved == resolved)
+        query = query.where(AlertDB.is_resolved == resolved)
         
-    alerts = query.order_by(AlertDB.timestamp.desc()).all()
+    alerts = (await db.execute(query.order_by(AlertDB.timestamp.desc()))).scalars().all()
     
     critical = sum(1 for a in alerts if a.severity == "critical")
     
@@ -130,12 +132,11 @@ async def get_alerts(
 @router.post("/alerts/{alert_id}/resolve")
 async def resolve_alert(
     alert_id: int,
-    db: Session = Depends(get_db),
     current_user = Depends(require_admin)
 ):
     """حل تنبيه"""
-    monitor = PerformanceMonitor(db)
-    monitor.resolve_alert(alert_id)
+    if not await performance_monitor.resolve_alert(alert_id):
+        raise HTTPException(status_code=404, detail="التنبيه غير موجود أو محلول")
     return {"message": "تم حل التنبيه"}
 
 @router.get("/changes/pending", response_model=List[CodeChange])
@@ -168,19 +169,24 @@ async def approve_change(
 @router.get("/history")
 async def get_change_history(
     limit: int = Query(50, ge=1, le=200),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
     current_user = Depends(get_current_user)
 ):
-    """سجل التغييرات"""
+    """سجل التغييرات (الأحدث أولاً، الصفحة التالية عبر next_cursor)"""
     from app.guardian.models import CodeChangeDB
     
-    changes = db.query(CodeChangeDB).order_by(
-        CodeChangeDB.created_at.desc()
-    ).limit(limit).all()
+    key = (CodeChangeDB.created_at, CodeChangeDB.id)
+    try:
+        query = keyset(select(CodeChangeDB), key, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    changes, next_cursor = page((await db.execute(query)).scalars().all(), key, limit)
     
     return {
         "changes": [CodeChange.from_orm(c) for c in changes],
-        "total": len(changes)
+        "total": len(changes),
+        "next_cursor": next_cursor
     }
 
 @router.post("/trigger-analysis")
@@ -204,20 +210,22 @@ async def trigger_analysis(
 @router.get("/knowledge/patterns")
 async def get_knowledge_patterns(
     pattern_type: Optional[str] = None,
-    limit: int = 20,
-    db: Session = Depends(get_db),
+    limit: int = Query(20, ge=1, le=200),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
     current_user = Depends(get_current_user)
 ):
-    """الحصول على أنماط قاعدة المعرفة"""
-    kb = KnowledgeBase(db)
-    
-    query = db.query(KnowledgePatternDB)
+    """الحصول على أنماط قاعدة المعرفة (الأعلى نجاحاً أولاً)"""
+    query = select(KnowledgePatternDB)
     if pattern_type:
-        query = query.filter(KnowledgePatternDB.pattern_type == pattern_type)
-        
-    patterns = query.order_by(
-        KnowledgePatternDB.success_rate.desc()
-    ).limit(limit).all()
+        query = query.where(KnowledgePatternDB.pattern_type == pattern_type)
+    
+    key = (KnowledgePatternDB.success_rate, KnowledgePatternDB.id)
+    try:
+        query = keyset(query, key, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    patterns, next_cursor = page((await db.execute(query)).scalars().all(), key, limit)
     
     return {
         "patterns": [
@@ -229,34 +237,31 @@ async def get_knowledge_patterns(
                 "usage_count": p.usage_count
             }
             for p in patterns
-        ]
+        ],
+        "next_cursor": next_cursor
     }
 
 @router.get("/trends")
 async def get_performance_trends(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user = Depends(get_current_user)
 ):
     """اتجاهات الأداء"""
-    kb = KnowledgeBase(db)
-    return kb.get_performance_trends()
+    # KnowledgeBase is written against a sync Session; run_sync keeps it off the event loop
+    return await db.run_sync(lambda session: KnowledgeBase(session).get_performance_trends())
 
 @router.post("/start-monitoring")
 async def start_monitoring(
-    db: Session = Depends(get_db),
     current_user = Depends(require_admin)
 ):
     """بدء المراقبة"""
-    monitor = PerformanceMonitor(db)
-    await monitor.start()
+    await performance_monitor.start()
     return {"message": "تم بدء المراقبة"}
 
 @router.post("/stop-monitoring")
 async def stop_monitoring(
-    db: Session = Depends(get_db),
     current_user = Depends(require_admin)
 ):
     """إيقاف المراقبة"""
-    monitor = PerformanceMonitor(db)
-    await monitor.stop()
+    await performance_monitor.stop()
     return {"message": "تم إيقاف المراقبة"}
@@ -5,6 +5,7 @@ from .trading import router as trading_router
 from .ai import router as ai_router
 from .guardian import router as guardian_router
 from .webhooks import router as webhooks_router
+from .admin import router as admin_router
 
 api_router = APIRouter()
 
@@ -15,4 +16,7 @@ api_router.include_router(auth_router, prefix="/auth", tags=["auth"])
 api_router.include_router(trading_router, prefix="/trading", tags=["trading"])
 api_router.include_router(ai_router, prefix="/ai", tags=["ai"])
 api_router.include_router(guardian_router, prefix="/guardian", tags=["guardian"])
-api_router.include_router(webhooks_router, prefix="/webhooks", tags=["webhooks"])
\ No newline at end of file
+api_router.include_router(webhooks_router, prefix="/webhooks", tags=["webhooks"])
+
+# Operations
+api_router.include_router(admin_router, prefix="/admin", tags=["admin"])
\ No newline at end of file
@@ -1,11 +1,15 @@
 # backend/app/api/v1/trading.py (مُحدَّث)
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from app.database.connection import get_db
 from app.core.trading_engine import TradingEngine
 from app.auth.dependencies import get_current_user, require_trader
+from app.middleware.rate_limit import limiter
+from app.services.pnl_rollups import pnl_rollups, week_of
+from app.services.signal_hub import CHANNELS, signal_hub
 
 router = APIRouter()
 
@@ -22,7 +26,7 @@ async def trading_status(
         "mode": "auto_scaling",
         "is_running": trading_engine.is_running,
         "open_positions": 0,  # TODO: Get from DB
-        "daily_pnl": 0.0,
+        "daily_pnl": (await pnl_rollups.day(current_user.id, date.today()))["net_pnl"],
         "risk_status": trading_engine.risk_manager.get_risk_report()
     }
 
@@ -40,8 +44,26 @@ async def get_balance(
         "margin_level": 98.0
     }
 
+@router.get("/pnl/daily")
+async def get_daily_pnl(
+    days: int = Query(30, ge=1, le=366),
+    current_user = Depends(require_trader)
+):
+    """Closed-trade PnL per day (read from the pnl_daily rollup)"""
+    return {"days": await pnl_rollups.trend(days=days, user_id=current_user.id)}
+
+@router.get("/pnl/weekly")
+async def get_weekly_pnl(
+    week: Optional[date] = None,
+    current_user = Depends(require_trader)
+):
+    """Closed-trade PnL of one week (read from the pnl_weekly rollup)"""
+    return await pnl_rollups.week(current_user.id, week_of(week or date.today()))
+
 @router.post("/analyze")
+@limiter.limit("market_data")
 async def analyze_market(
+    request: Request,
     symbol: str = "XAUUSD",
     timeframe: str = "M15",
     current_user = Depends(require_trader)
@@ -49,6 +71,11 @@ async def analyze_market(
     """
     Run full market analysis
     """
+    # subscribed pairs are analysed once per closed bar for everyone
+    latest = signal_hub.latest(symbol, timeframe, current_bar=True)
+    if latest is not None:
+        return latest
+    
     # TODO: Get real data from MT5
     # For now, return mock data structure
     import random
@@ -78,6 +105,29 @@ async def analyze_market(
     
     return result
 
+@router.post("/signals/subscribe")
+async def subscribe_signals(
+    symbol: str = "XAUUSD",
+    timeframe: str = "M15",
+    channels: List[str] = Query(sorted(CHANNELS)),
+    current_user = Depends(require_trader)
+):
+    """Receive the (symbol, timeframe) signal on every closed bar"""
+    try:
+        await signal_hub.subscribe(current_user.id, symbol, timeframe, channels)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"symbol": symbol, "timeframe": timeframe, "channels": sorted(channels)}
+
+@router.delete("/signals/subscribe")
+async def unsubscribe_signals(
+    symbol: Optional[str] = None,
+    timeframe: Optional[str] = None,
+    current_user = Depends(require_trader)
+):
+    """Stop receiving signals (all of them without symbol/timeframe)"""
+    return {"unsubscribed": await signal_hub.unsubscribe(current_user.id, symbol, timeframe)}
+
 @router.post("/signal")
 async def get_signal(
     symbol: str = "XAUUSD",
@@ -0,0 +1,35 @@
+"""
+Backtesting - محرك الاختبار التاريخي
+Replays historical candles through TradingEngine and PositionSizer
+"""
+
+from .data import CandleSeries, TIMEFRAME_SECONDS
+from .execution import FixedSpread, SessionSpread, FixedSlippage, RandomSlippage, resolve_exits
+from .engine import BacktestConfig, BacktestEngine, BacktestResult
+from .metrics import summarize
+from .optimizer import ParameterOptimizer, ParameterSpace, Leaderboard
+from .monte_carlo import MonteCarloConfig, MonteCarloEngine, MonteCarloResult
+from .walk_forward import WalkForwardAnalyzer, WalkForwardConfig, walk_forward_splits
+
+__all__ = [
+    "CandleSeries",
+    "TIMEFRAME_SECONDS",
+    "FixedSpread",
+    "SessionSpread",
+    "FixedSlippage",
+    "RandomSlippage",
+    "resolve_exits",
+    "BacktestConfig",
+    "BacktestEngine",
+    "BacktestResult",
+    "summarize",
+    "ParameterOptimizer",
+    "ParameterSpace",
+    "Leaderboard",
+    "MonteCarloConfig",
+    "MonteCarloEngine",
+    "MonteCarloResult",
+    "WalkForwardAnalyzer",
+    "WalkForwardConfig",
+    "walk_forward_splits",
+]
@@ -0,0 +1,107 @@
+"""
+Candle series container for backtests
+Columnar NumPy arrays with a lazily built list-of-dicts view for the analyzers
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from app.marketdata.bars import TIMEFRAME_SECONDS, parse_timestamp
+
+
+@dataclass
+class CandleSeries:
+    """
+    OHLCV bars in columnar form.
+
+    time is int64 epoch seconds (bar open time, UTC); prices are bid prices
+    as delivered by MT5.
+    """
+
+    time: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    _records: Optional[List[dict]] = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.time = np.asarray(self.time, dtype=np.int64)
+        for name in ("open", "high", "low", "close", "volume"):
+            setattr(self, name, np.asarray(getattr(self, name), dtype=np.float64))
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    @classmethod
+    def from_records(cls, records: Sequence[dict]) -> "CandleSeries":
+        """Build from the analyzers' list-of-dicts format"""
+        series = cls(
+            time=np.fromiter((parse_timestamp(r["timestamp"]) for r in records), dtype=np.int64, count=len(records)),
+            open=np.fromiter((r["open"] for r in records), dtype=np.float64, count=len(records)),
+            high=np.fromiter((r["high"] for r in records), dtype=np.float64, count=len(records)),
+            low=np.fromiter((r["low"] for r in records), dtype=np.float64, count=len(records)),
+            close=np.fromiter((r["close"] for r in records), dtype=np.float64, count=len(records)),
+            volume=np.fromiter((r.get("volume", 0) for r in records), dtype=np.float64, count=len(records)),
+        )
+        series._records = list(records)
+        return series
+
+    @classmethod
+    def from_structured(cls, array: np.ndarray) -> "CandleSeries":
+        """Build from a structured array with time/open/high/low/close/volume fields"""
+        return cls(
+            time=array["time"],
+            open=array["open"],
+            high=array["high"],
+            low=array["low"],
+            close=array["close"],
+            volume=array["volume"],
+        )
+
+    def records(self) -> List[dict]:
+        """List-of-dicts view (built once, then shared by every window slice)"""
+        if self._records is None:
+            times = self.time.astype("datetime64[s]").astype(str)
+            self._records = [
+                {
+                    "timestamp": ts,
+                    "open": o,
+                    "high": h,
+                    "low": l,
+                    "close": c,
+                    "volume": v
+                }
+                for ts, o, h, l, c, v in zip(
+                    times,
+                    self.open.tolist(),
+                    self.high.tolist(),
+                    self.low.tolist(),
+                    self.close.tolist(),
+                    self.volume.tolist()
+                )
+            ]
+        return self._records
+
+    def slice(self, start: int, end: int) -> "CandleSeries":
+        return CandleSeries(
+            time=self.time[start:end],
+            open=self.open[start:end],
+            high=self.high[start:end],
+            low=self.low[start:end],
+            close=self.close[start:end],
+            volume=self.volume[start:end],
+        )
+
+    def between(self, start: datetime, end: datetime) -> "CandleSeries":
+        """Bars with start <= time < end"""
+        lo = np.searchsorted(self.time, parse_timestamp(start), side="left")
+        hi = np.searchsorted(self.time, parse_timestamp(end), side="left")
+        return self.slice(lo, hi)
+
+    def datetime_at(self, index: int) -> datetime:
+        return datetime.fromtimestamp(int(self.time[index]), tz=timezone.utc)
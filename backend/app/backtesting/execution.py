@@ -0,0 +1,152 @@
+"""
+Execution simulation for backtests
+- Spread models (bid OHLC -> ask side)
+- Slippage models
+- Vectorized SL / TP / timeout exit resolution
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+EXIT_STOP_LOSS = 1
+EXIT_TAKE_PROFIT = 2
+EXIT_TIMEOUT = 3
+
+
+class FixedSpread:
+    """Constant spread in price units (gold: 0.30 = 30 cents)"""
+
+    def __init__(self, spread: float = 0.30):
+        self.spread = spread
+
+    def at(self, index: np.ndarray, series) -> np.ndarray:
+        return np.full(len(index), self.spread, dtype=np.float64)
+
+
+class SessionSpread(FixedSpread):
+    """Spread widened outside the London/New York sessions (07:00-21:00 GMT)"""
+
+    def __init__(self, spread: float = 0.30, off_hours_multiplier: float = 2.5):
+        super().__init__(spread)
+        self.off_hours_multiplier = off_hours_multiplier
+
+    def at(self, index: np.ndarray, series) -> np.ndarray:
+        hours = (series.time[index] // 3600) % 24
+        off_hours = (hours < 7) | (hours >= 21)
+        return np.where(off_hours, self.spread * self.off_hours_multiplier, self.spread)
+
+
+class FixedSlippage:
+    """Every market fill is worse by a constant amount"""
+
+    def __init__(self, amount: float = 0.05):
+        self.amount = amount
+
+    def sample(self, n: int) -> np.ndarray:
+        return np.full(n, self.amount, dtype=np.float64)
+
+
+class RandomSlippage:
+    """Half-normal adverse slippage (seeded, so runs are reproducible)"""
+
+    def __init__(self, scale: float = 0.05, seed: Optional[int] = 42):
+        self.scale = scale
+        self.rng = np.random.default_rng(seed)
+
+    def sample(self, n: int) -> np.ndarray:
+        return np.abs(self.rng.normal(0.0, self.scale, n))
+
+
+@dataclass
+class ExitResult:
+    exit_index: np.ndarray   # bar on which the position was closed
+    exit_price: np.ndarray   # raw trigger price (before exit slippage)
+    reason: np.ndarray       # EXIT_* code
+
+
+def resolve_exits(
+    series,
+    entry_index: np.ndarray,
+    direction: np.ndarray,
+    stop_loss: np.ndarray,
+    take_profit: np.ndarray,
+    spread: np.ndarray,
+    max_hold: int
+) -> ExitResult:
+    """
+    Find the first bar at or after entry where SL or TP is touched,
+    for all candidate entries at once.
+
+    OHLC are bid prices: longs exit on the bid, shorts exit on the ask
+    (bid + spread). When both levels fall inside the same bar the stop is
+    assumed to have been hit first. A level gapped through at the open
+    fills at the open. Positions still open after max_hold bars are
+    closed at that bar's close.
+    """
+    n_bars = len(series)
+    if len(entry_index) == 0:
+        empty = np.array([], dtype=np.int64)
+        return ExitResult(empty, np.array([], dtype=np.float64), empty)
+
+    # only the bars the entries can reach, padded so every entry has a full look-ahead window
+    lo = int(entry_index.min())
+    hi = min(n_bars, int(entry_index.max()) + max_hold)
+    pad = np.full(max_hold, np.nan)
+    high = np.concatenate([series.high[lo:hi], pad])
+    low = np.concatenate([series.low[lo:hi], pad])
+    opens = np.concatenate([series.open[lo:hi], pad])
+
+    local = entry_index - lo
+    windows_high = sliding_window_view(high, max_hold)[local]
+    windows_low = sliding_window_view(low, max_hold)[local]
+    windows_open = sliding_window_view(opens, max_hold)[local]
+
+    is_long = (direction > 0)[:, None]
+    ask_offset = spread[:, None]
+
+    # prices the position is actually exposed to
+    adverse = np.where(is_long, windows_low, windows_high + ask_offset)
+    favorable = np.where(is_long, windows_high, windows_low + ask_offset)
+    open_side = np.where(is_long, windows_open, windows_open + ask_offset)
+
+    sl = stop_loss[:, None]
+    tp = take_profit[:, None]
+
+    with np.errstate(invalid="ignore"):
+        sl_hit = np.where(is_long, adverse <= sl, adverse >= sl)
+        tp_hit = np.where(is_long, favorable >= tp, favorable <= tp)
+
+    first_sl = np.where(sl_hit.any(axis=1), sl_hit.argmax(axis=1), max_hold)
+    first_tp = np.where(tp_hit.any(axis=1), tp_hit.argmax(axis=1), max_hold)
+
+    last_step = np.minimum(max_hold - 1, n_bars - 1 - entry_index)
+    step = np.minimum(np.minimum(first_sl, first_tp), last_step)
+
+    reason = np.full(len(entry_index), EXIT_TIMEOUT, dtype=np.int64)
+    reason[(first_sl <= first_tp) & (first_sl <= last_step)] = EXIT_STOP_LOSS
+    reason[(first_tp < first_sl) & (first_tp <= last_step)] = EXIT_TAKE_PROFIT
+
+    rows = np.arange(len(entry_index))
+    bar_open = open_side[rows, step]
+
+    # gapped through the level at the open: filled at the open
+    sl_gap = np.where(direction > 0, bar_open < stop_loss, bar_open > stop_loss)
+    tp_gap = np.where(direction > 0, bar_open > take_profit, bar_open < take_profit)
+
+    exit_index = entry_index + step
+    exit_price = np.empty(len(entry_index), dtype=np.float64)
+
+    stop = reason == EXIT_STOP_LOSS
+    exit_price[stop] = np.where(sl_gap[stop], bar_open[stop], stop_loss[stop])
+
+    target = reason == EXIT_TAKE_PROFIT
+    exit_price[target] = np.where(tp_gap[target], bar_open[target], take_profit[target])
+
+    timeout = reason == EXIT_TIMEOUT
+    exit_close = series.close[exit_index[timeout]]
+    exit_price[timeout] = np.where(direction[timeout] > 0, exit_close, exit_close + spread[timeout])
+
+    return ExitResult(exit_index=exit_index, exit_price=exit_price, reason=reason)
@@ -0,0 +1,78 @@
+"""
+Backtest performance metrics
+The same figures SafeTester.validate_performance gates on:
+win rate, profit factor, max drawdown, Sharpe ratio
+"""
+
+from typing import Dict
+
+import numpy as np
+
+SECONDS_PER_DAY = 86_400
+TRADING_DAYS_PER_YEAR = 252
+
+# reported instead of +inf when there are winners but no losers,
+# so results stay JSON serializable for CodeChangeDB.test_results
+PROFIT_FACTOR_CAP = 99.99
+
+
+def max_drawdown(equity: np.ndarray) -> float:
+    """Largest peak-to-trough decline as a negative fraction (-0.12 = 12%)"""
+    if len(equity) == 0:
+        return 0.0
+    peaks = np.maximum.accumulate(equity)
+    drawdowns = equity / peaks - 1.0
+    return float(drawdowns.min())
+
+
+def profit_factor(pnl: np.ndarray) -> float:
+    gross_profit = pnl[pnl > 0].sum()
+    gross_loss = -pnl[pnl < 0].sum()
+    if gross_loss > 0:
+        return float(min(gross_profit / gross_loss, PROFIT_FACTOR_CAP))
+    return PROFIT_FACTOR_CAP if gross_profit > 0 else 0.0
+
+
+def daily_returns(bar_time: np.ndarray, bar_equity: np.ndarray) -> np.ndarray:
+    """Close-to-close daily returns of a per-bar equity curve"""
+    if len(bar_time) == 0:
+        return np.array([], dtype=np.float64)
+    day = bar_time // SECONDS_PER_DAY
+    # last bar of each day
+    last_of_day = np.flatnonzero(np.diff(day, append=day[-1] + 1))
+    closes = bar_equity[last_of_day]
+    if len(closes) < 2:
+        return np.array([], dtype=np.float64)
+    return np.diff(closes) / closes[:-1]
+
+
+def sharpe_ratio(returns: np.ndarray, periods_per_year: int = TRADING_DAYS_PER_YEAR) -> float:
+    if len(returns) < 2:
+        return 0.0
+    std = returns.std(ddof=1)
+    if std == 0:
+        return 0.0
+    return float(returns.mean() / std * np.sqrt(periods_per_year))
+
+
+def summarize(
+    pnl: np.ndarray,
+    bar_time: np.ndarray,
+    bar_equity: np.ndarray,
+    initial_balance: float
+) -> Dict[str, float]:
+    """Headline metrics for a finished run"""
+    total_trades = int(len(pnl))
+    wins = int((pnl > 0).sum())
+    final_balance = float(bar_equity[-1]) if len(bar_equity) else initial_balance
+
+    return {
+        "total_return": final_balance / initial_balance - 1.0,
+        "sharpe_ratio": sharpe_ratio(daily_returns(bar_time, bar_equity)),
+        "max_drawdown": max_drawdown(bar_equity),
+        "win_rate": wins / total_trades if total_trades else 0.0,
+        "total_trades": total_trades,
+        "profit_factor": profit_factor(pnl),
+        "expectancy": float(pnl.mean()) if total_trades else 0.0,
+        "final_balance": final_balance,
+    }
@@ -0,0 +1,139 @@
+"""
+Monte Carlo risk engine
+Resamples a backtest's per-trade returns into many alternative equity paths:
+
+- shuffle: every path is a random permutation of the real trades
+  (same final return, different ordering -> drawdown / streak risk)
+- block: moving-block bootstrap with replacement (circular), which keeps
+  short-range dependence between consecutive trades; block_size=1 is a
+  plain i.i.d. bootstrap
+
+Paths are simulated as a 2-D (paths x trades) array in chunks, so memory is
+bounded by chunk_size x horizon regardless of n_paths. Only per-path summary
+statistics are kept.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+METHODS = ("shuffle", "block")
+
+
+@dataclass
+class MonteCarloConfig:
+    n_paths: int = 100_000
+    method: str = "block"
+    block_size: int = 5
+    horizon: Optional[int] = None     # trades per path, default: number of real trades
+    chunk_size: int = 10_000
+    seed: Optional[int] = 42
+    confidence: float = 0.95
+    # reliability gate used by SafeTester.validate_performance
+    min_prob_profit: float = 0.60
+    drawdown_limit: float = -0.25     # tail (confidence) drawdown must stay above this
+
+
+@dataclass
+class MonteCarloResult:
+    config: MonteCarloConfig
+    final_return: np.ndarray      # per path, compounded
+    max_drawdown: np.ndarray      # per path, negative fraction
+    losing_streak: np.ndarray     # per path, longest run of losing trades
+
+    def summary(self) -> Dict[str, Any]:
+        config = self.config
+        tail = 1 - config.confidence
+        level = int(round(config.confidence * 100))
+
+        var = float(np.quantile(self.final_return, tail))
+        cvar = float(self.final_return[self.final_return <= var].mean())
+        dd_tail = float(np.quantile(self.max_drawdown, tail))
+        prob_profit = float((self.final_return > 0).mean())
+
+        return {
+            "reliable": bool(prob_profit >= config.min_prob_profit and dd_tail > config.drawdown_limit),
+            "paths": int(len(self.final_return)),
+            "method": config.method,
+            "prob_profit": prob_profit,
+            "mean_return": float(self.final_return.mean()),
+            "median_return": float(np.median(self.final_return)),
+            f"var_{level}": var,
+            f"cvar_{level}": cvar,
+            "max_drawdown_median": float(np.median(self.max_drawdown)),
+            f"max_drawdown_{level}": dd_tail,
+            "max_drawdown_worst": float(self.max_drawdown.min()),
+            "losing_streak_median": float(np.median(self.losing_streak)),
+            f"losing_streak_{level}": int(np.quantile(self.losing_streak, config.confidence, method="higher")),
+            "max_consecutive_losses": int(self.losing_streak.max()),
+        }
+
+
+def longest_run(mask: np.ndarray) -> np.ndarray:
+    """Longest run of True per row of a 2-D boolean array"""
+    counts = np.cumsum(mask, axis=1, dtype=np.int32)
+    # count at the last False seen so far; the run length is the count since then
+    resets = np.maximum.accumulate(np.where(mask, 0, counts), axis=1)
+    return (counts - resets).max(axis=1)
+
+
+class MonteCarloEngine:
+    """
+    Usage:
+        engine = MonteCarloEngine(MonteCarloConfig(n_paths=100_000, method="block"))
+        result = engine.run(backtest_result.trade_returns)
+        result.summary()["cvar_95"]
+    """
+
+    def __init__(self, config: Optional[MonteCarloConfig] = None):
+        self.config = config or MonteCarloConfig()
+        if self.config.method not in METHODS:
+            raise ValueError(f"Unknown method {self.config.method!r}, expected one of {METHODS}")
+
+    def _indices(self, rng: np.random.Generator, paths: int, n_trades: int, horizon: int) -> np.ndarray:
+        if self.config.method == "shuffle":
+            # permutation of all trades, truncated/tiled to the horizon
+            order = rng.permuted(np.tile(np.arange(n_trades), (paths, 1)), axis=1)
+            if horizon <= n_trades:
+                return order[:, :horizon]
+            reps = -(-horizon // n_trades)
+            return np.tile(order, (1, reps))[:, :horizon]
+
+        block = max(1, min(self.config.block_size, n_trades))
+        n_blocks = -(-horizon // block)
+        starts = rng.integers(0, n_trades, size=(paths, n_blocks))
+        idx = (starts[:, :, None] + np.arange(block)) % n_trades
+        return idx.reshape(paths, -1)[:, :horizon]
+
+    def run(self, trade_returns: np.ndarray) -> MonteCarloResult:
+        returns = np.asarray(trade_returns, dtype=np.float64)
+        if len(returns) < 2:
+            raise ValueError("Need at least 2 trades for a Monte Carlo simulation")
+
+        config = self.config
+        horizon = config.horizon or len(returns)
+        rng = np.random.default_rng(config.seed)
+
+        final_return = np.empty(config.n_paths)
+        max_drawdown = np.empty(config.n_paths)
+        losing_streak = np.empty(config.n_paths, dtype=np.int32)
+
+        for lo in range(0, config.n_paths, config.chunk_size):
+            hi = min(lo + config.chunk_size, config.n_paths)
+            sampled = returns[self._indices(rng, hi - lo, len(returns), horizon)]
+
+            equity = np.cumprod(1.0 + sampled, axis=1)
+            # the starting balance (1.0) is the first peak
+            peaks = np.maximum(np.maximum.accumulate(equity, axis=1), 1.0)
+
+            final_return[lo:hi] = equity[:, -1] - 1.0
+            max_drawdown[lo:hi] = np.minimum((equity / peaks - 1.0).min(axis=1), 0.0)
+            losing_streak[lo:hi] = longest_run(sampled < 0)
+
+        return MonteCarloResult(
+            config=config,
+            final_return=final_return,
+            max_drawdown=max_drawdown,
+            losing_streak=losing_streak,
+        )
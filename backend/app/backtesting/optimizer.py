@@ -0,0 +1,562 @@
+"""
+Parameter sweep optimizer
+Grid / random search over SignalParams, each candidate backtested in a
+process pool.
+
+The analyzers (order blocks, volume profile, patterns, trend) do not depend
+on the parameters, so they run once per bar up front. Each candidate then only
+re-scores those features with its own weights / thresholds / lookback, which
+is a handful of NumPy operations instead of a full analyzer pass.
+
+Candles and features are published once in shared memory; workers attach by
+name instead of receiving a pickled copy per task. Finished runs stream to a
+CSV leaderboard keyed by parameter hash, so an interrupted sweep resumes where
+it stopped.
+"""
+
+import copy
+import csv
+import hashlib
+import itertools
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, fields
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.backtesting.data import CandleSeries
+from app.backtesting.engine import BacktestConfig, BacktestEngine, SignalTable
+from app.core.trading_engine import BEARISH_PATTERNS, BULLISH_PATTERNS, SignalParams
+from app.strategies.price_action import PriceActionAnalyzer
+from app.strategies.smc import OrderBlockType, SMCAnalyzer
+from app.strategies.volume_profile import VolumeProfileAnalyzer
+
+logger = logging.getLogger(__name__)
+
+PATTERN_SIGN = {**{p: 1 for p in BULLISH_PATTERNS}, **{p: -1 for p in BEARISH_PATTERNS}}
+TREND_SIGN = {"bullish": 1, "bearish": -1}
+VALUE_AREA_SIGN = {"below_value_area": 1, "above_value_area": -1}
+STRONG_OB = ("strong", "very_strong")
+
+SERIES_FIELDS = ("time", "open", "high", "low", "close", "volume")
+PARAM_COLUMNS = [f.name for f in fields(SignalParams)]
+METRIC_COLUMNS = [
+    "total_return", "sharpe_ratio", "max_drawdown", "win_rate",
+    "total_trades", "profit_factor", "expectancy", "final_balance",
+]
+
+DEFAULT_SPACE = {
+    "ob_weight": [20, 30, 40],
+    "value_area_weight": [10, 20, 30],
+    "trend_weight": [10, 20, 30],
+    "pattern_weight": [10, 15, 20],
+    "entry_threshold": [30, 40, 50],
+    "ob_lookback": [30, 50, 80],
+}
+
+
+def param_hash(params: SignalParams) -> str:
+    payload = json.dumps(params.to_dict(), sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+# -----------------------------
+# Parameter-independent features
+# -----------------------------
+@dataclass
+class SignalFeatures:
+    """
+    Analyzer output for every analyzed bar.
+
+    Order blocks are stored flat, one row per (bar, order block) pair, with
+    the maximum lookback (the whole window); a shorter ob_lookback is a
+    filter on ob_index.
+    """
+
+    window: int
+    close: np.ndarray
+    analyzed: np.ndarray        # bool, bar was in a tradable kill zone
+    value_area: np.ndarray      # +1 below VA, -1 above, 0 inside
+    trend: np.ndarray           # +1 bullish, -1 bearish, 0 neutral
+    patterns: np.ndarray        # net bullish patterns among the last 3
+    ob_bar: np.ndarray          # bar at which the order block was seen
+    ob_index: np.ndarray        # bar of the order block candle
+    ob_bullish: np.ndarray
+    ob_strong: np.ndarray
+    ob_low: np.ndarray
+    ob_high: np.ndarray
+
+    ARRAYS = (
+        "close", "analyzed", "value_area", "trend", "patterns",
+        "ob_bar", "ob_index", "ob_bullish", "ob_strong", "ob_low", "ob_high",
+    )
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    @classmethod
+    def from_arrays(cls, window: int, arrays: Dict[str, np.ndarray]) -> "SignalFeatures":
+        return cls(window=window, **{name: arrays[name] for name in cls.ARRAYS})
+
+    def slice(self, start: int, end: int) -> "SignalFeatures":
+        """Bars start..end-1, renumbered from 0 (matches CandleSeries.slice)"""
+        rows = (self.ob_bar >= start) & (self.ob_bar < end)
+        return SignalFeatures(
+            window=self.window,
+            close=self.close[start:end],
+            analyzed=self.analyzed[start:end],
+            value_area=self.value_area[start:end],
+            trend=self.trend[start:end],
+            patterns=self.patterns[start:end],
+            ob_bar=self.ob_bar[rows] - start,
+            ob_index=self.ob_index[rows] - start,
+            ob_bullish=self.ob_bullish[rows],
+            ob_strong=self.ob_strong[rows],
+            ob_low=self.ob_low[rows],
+            ob_high=self.ob_high[rows],
+        )
+
+    def signals(self, params: SignalParams) -> SignalTable:
+        """TradingEngine._generate_signal / _calculate_sl / _calculate_tp, for every bar at once"""
+        n = len(self.close)
+        close = self.close
+
+        # detect_order_blocks: candles i = 1 .. lookback-2 of the last `lookback` bars
+        lookback = min(params.ob_lookback, self.window)
+        in_range = self.ob_index >= self.ob_bar - lookback + 2
+        bull = in_range & self.ob_bullish
+        bear = in_range & ~self.ob_bullish
+
+        strong_bull = np.bincount(self.ob_bar[bull & self.ob_strong], minlength=n) > 0
+        strong_bear = np.bincount(self.ob_bar[bear & self.ob_strong], minlength=n) > 0
+
+        score = (
+            params.ob_weight * (strong_bull.astype(np.float64) - strong_bear)
+            + params.value_area_weight * self.value_area
+            + params.trend_weight * self.trend
+            + params.pattern_weight * self.patterns
+        )
+
+        direction = np.select(
+            [
+                score >= params.strong_threshold,
+                score >= params.entry_threshold,
+                score <= -params.strong_threshold,
+                score <= -params.entry_threshold,
+            ],
+            [1, 1, -1, -1],
+            0,
+        ).astype(np.int8)
+        direction[~self.analyzed] = 0
+
+        bull_low = np.full(n, np.inf)
+        np.minimum.at(bull_low, self.ob_bar[bull], self.ob_low[bull])
+        bear_high = np.full(n, -np.inf)
+        np.maximum.at(bear_high, self.ob_bar[bear], self.ob_high[bear])
+
+        long_sl = np.where(np.isfinite(bull_low), bull_low - params.sl_buffer, close * (1 - params.fallback_sl_pct))
+        short_sl = np.where(np.isfinite(bear_high), bear_high + params.sl_buffer, close * (1 + params.fallback_sl_pct))
+        stop_loss = np.where(direction > 0, long_sl, short_sl)
+
+        risk = np.abs(close - stop_loss)
+        take_profit = np.where(direction > 0, close + risk * params.reward_risk, close - risk * params.reward_risk)
+
+        trade = direction != 0
+        return SignalTable(
+            direction=direction,
+            stop_loss=np.where(trade, stop_loss, np.nan),
+            take_profit=np.where(trade, take_profit, np.nan),
+            confidence=np.minimum(100, np.abs(score)),
+        )
+
+
+def extract_features(series: CandleSeries, indices: np.ndarray, window: int) -> Dict[str, np.ndarray]:
+    """Run the analyzers on the close of each bar in indices"""
+    records = series.records()
+    position = {r["timestamp"]: k for k, r in enumerate(records)}
+    n = len(series)
+
+    value_area = np.zeros(n, dtype=np.int8)
+    trend = np.zeros(n, dtype=np.int8)
+    patterns = np.zeros(n, dtype=np.int8)
+    ob_rows: List[Tuple[int, int, bool, bool, float, float]] = []
+
+    for i in indices:
+        i = int(i)
+        data = records[i - window + 1:i + 1]
+
+        for ob in SMCAnalyzer(data).detect_order_blocks(lookback=len(data)):
+            ob_rows.append((
+                i, position[ob.timestamp], ob.type == OrderBlockType.BULLISH,
+                ob.strength in STRONG_OB, ob.low, ob.high
+            ))
+
+        volume_profile = VolumeProfileAnalyzer(data)
+        if volume_profile.calculate():
+            value_area[i] = VALUE_AREA_SIGN.get(volume_profile.get_price_position(data[-1]["close"]), 0)
+
+        price_action = PriceActionAnalyzer(data)
+        recent = price_action.detect_patterns()[-3:]
+        patterns[i] = sum(PATTERN_SIGN.get(p.type.value, 0) for p in recent)
+        trend[i] = TREND_SIGN.get(price_action.analyze_trend().get("direction"), 0)
+
+    ob = np.array(ob_rows, dtype=[
+        ("bar", np.int64), ("index", np.int64), ("bullish", bool),
+        ("strong", bool), ("low", np.float64), ("high", np.float64),
+    ])
+    analyzed = np.zeros(n, dtype=bool)
+    analyzed[np.asarray(indices, dtype=np.int64)] = True
+
+    return {
+        "close": series.close,
+        "analyzed": analyzed,
+        "value_area": value_area,
+        "trend": trend,
+        "patterns": patterns,
+        "ob_bar": ob["bar"],
+        "ob_index": ob["index"],
+        "ob_bullish": ob["bullish"],
+        "ob_strong": ob["strong"],
+        "ob_low": ob["low"],
+        "ob_high": ob["high"],
+    }
+
+
+def _feature_chunk(arrays: Dict[str, np.ndarray], offset: int, indices: np.ndarray, window: int):
+    """ProcessPool worker: features for one chunk of bars"""
+    chunk = CandleSeries(**arrays)
+    return offset, indices, extract_features(chunk, indices - offset, window)
+
+
+def compute_features(series: CandleSeries, config: BacktestConfig, workers: int = 1) -> SignalFeatures:
+    """Analyzer features for every tradable bar of series, in chunks across workers"""
+    started = time.perf_counter()
+    window = config.window
+    tradable = BacktestEngine(config).tradable_bars(series)
+
+    if workers <= 1 or len(tradable) == 0:
+        features = SignalFeatures.from_arrays(window, extract_features(series, tradable, window))
+        logger.info(f"🧮 Features for {len(tradable)} bars ready in {time.perf_counter() - started:.1f}s")
+        return features
+
+    chunk_size = max(1, -(-len(tradable) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for start in range(0, len(tradable), chunk_size):
+            indices = tradable[start:start + chunk_size]
+            lo = int(indices[0]) - window + 1
+            hi = int(indices[-1]) + 1
+            arrays = {name: getattr(series, name)[lo:hi] for name in SERIES_FIELDS}
+            futures.append(pool.submit(_feature_chunk, arrays, lo, indices, window))
+        parts = [future.result() for future in futures]
+
+    n = len(series)
+    merged = {
+        "close": series.close,
+        "analyzed": np.zeros(n, dtype=bool),
+        "value_area": np.zeros(n, dtype=np.int8),
+        "trend": np.zeros(n, dtype=np.int8),
+        "patterns": np.zeros(n, dtype=np.int8),
+    }
+    for offset, indices, chunk in parts:
+        merged["analyzed"][indices] = True
+        for name in ("value_area", "trend", "patterns"):
+            merged[name][indices] = chunk[name][indices - offset]
+
+    for name in ("ob_bar", "ob_index"):
+        merged[name] = np.concatenate([chunk[name] + offset for offset, _, chunk in parts])
+    for name in ("ob_bullish", "ob_strong", "ob_low", "ob_high"):
+        merged[name] = np.concatenate([chunk[name] for _, _, chunk in parts])
+
+    logger.info(
+        f"🧮 Features for {len(tradable)} bars ready in {time.perf_counter() - started:.1f}s "
+        f"({workers} workers)"
+    )
+    return SignalFeatures.from_arrays(window, merged)
+
+
+# -----------------------------
+# Search space
+# -----------------------------
+class ParameterSpace:
+    """
+    SignalParams field -> list of values, or a (low, high) range for random
+    search (integers if both bounds are ints). Fields not listed keep the
+    base value.
+    """
+
+    def __init__(self, space: Optional[Dict[str, Any]] = None, base: Optional[SignalParams] = None):
+        self.space = space if space is not None else DEFAULT_SPACE
+        self.base = base or SignalParams()
+
+        unknown = set(self.space) - set(PARAM_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown parameters: {sorted(unknown)}")
+
+    def _make(self, values: Dict[str, Any]) -> SignalParams:
+        return SignalParams(**{**self.base.to_dict(), **values})
+
+    def grid(self) -> Iterator[SignalParams]:
+        names = list(self.space)
+        choices = []
+        for name in names:
+            values = self.space[name]
+            if isinstance(values, tuple):
+                raise ValueError(f"Range for {name} cannot be used in a grid search; give a list")
+            choices.append(values)
+        for combo in itertools.product(*choices):
+            yield self._make(dict(zip(names, combo)))
+
+    def sample(self, n_iter: int, seed: Optional[int] = 42) -> Iterator[SignalParams]:
+        rng = np.random.default_rng(seed)
+        for _ in range(n_iter):
+            values = {}
+            for name, spec in self.space.items():
+                if isinstance(spec, tuple):
+                    low, high = spec
+                    if isinstance(low, int) and isinstance(high, int):
+                        values[name] = int(rng.integers(low, high + 1))
+                    else:
+                        values[name] = float(rng.uniform(low, high))
+                else:
+                    values[name] = spec[int(rng.integers(len(spec)))]
+            yield self._make(values)
+
+    def size(self) -> int:
+        return int(np.prod([len(v) for v in self.space.values() if not isinstance(v, tuple)]))
+
+
+# -----------------------------
+# Leaderboard
+# -----------------------------
+class Leaderboard:
+    """
+    Append-only CSV of finished runs, flushed per row.
+    A .parquet path keeps the CSV next to it as the journal and writes the
+    Parquet file on finalize().
+    """
+
+    COLUMNS = ["hash", *PARAM_COLUMNS, *METRIC_COLUMNS, "elapsed"]
+
+    def __init__(self, path: str, objective: str = "sharpe_ratio"):
+        self.path = path
+        self.parquet_path = path if path.endswith(".parquet") else None
+        self.csv_path = os.path.splitext(path)[0] + ".csv" if self.parquet_path else path
+        self.objective = objective
+
+    def completed(self) -> set:
+        return {row["hash"] for row in self.rows()}
+
+    def rows(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.csv_path):
+            return []
+        with open(self.csv_path, newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+
+    def append(self, row: Dict[str, Any]):
+        new_file = not os.path.exists(self.csv_path)
+        with open(self.csv_path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=self.COLUMNS, extrasaction="ignore")
+            if new_file:
+                writer.writeheader()
+            writer.writerow(row)
+
+    def top(self, n: int = 10) -> List[Dict[str, Any]]:
+        rows = self.rows()
+        rows.sort(key=lambda r: float(r[self.objective]), reverse=True)
+        return rows[:n]
+
+    def finalize(self):
+        if not self.parquet_path:
+            return
+        try:
+            import pandas as pd
+            pd.read_csv(self.csv_path).to_parquet(self.parquet_path, index=False)
+        except ImportError as e:
+            logger.warning(f"⚠️ Parquet export unavailable ({e}); leaderboard kept at {self.csv_path}")
+
+
+# -----------------------------
+# Shared memory
+# -----------------------------
+class SharedArrays:
+    """NumPy arrays published once in shared memory; workers attach by name"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.blocks: Dict[str, SharedMemory] = {}
+        self.spec: Dict[str, Tuple[str, str, Tuple[int, ...]]] = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            self.blocks[name] = block
+            self.spec[name] = (block.name, array.dtype.str, array.shape)
+
+    @staticmethod
+    def attach(spec: Dict[str, Tuple[str, str, Tuple[int, ...]]]):
+        blocks = {}
+        arrays = {}
+        for name, (block_name, dtype, shape) in spec.items():
+            block = SharedMemory(name=block_name)
+            blocks[name] = block
+            arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+        return arrays, blocks
+
+    def close(self):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks.clear()
+
+
+def share_features(series: CandleSeries, features: SignalFeatures) -> SharedArrays:
+    """Candles and features in shared memory, for a pool started with init_worker"""
+    return SharedArrays({
+        **{f"series_{name}": getattr(series, name) for name in SERIES_FIELDS},
+        **{f"features_{name}": array for name, array in features.arrays().items()},
+    })
+
+
+# per-process state of pool workers, set by init_worker: series, features, config
+WORKER: Dict[str, Any] = {}
+
+
+def init_worker(spec, config: BacktestConfig, window: int):
+    """ProcessPoolExecutor initializer: attach to share_features() arrays"""
+    arrays, blocks = SharedArrays.attach(spec)
+    WORKER["blocks"] = blocks
+    WORKER["series"] = CandleSeries(**{name: arrays[f"series_{name}"] for name in SERIES_FIELDS})
+    WORKER["features"] = SignalFeatures.from_arrays(
+        window, {name: arrays[f"features_{name}"] for name in SignalFeatures.ARRAYS}
+    )
+    WORKER["config"] = config
+
+
+def _evaluate_in_worker(params: SignalParams) -> Dict[str, Any]:
+    return evaluate_params(WORKER["series"], WORKER["features"], WORKER["config"], params)
+
+
+def evaluate_params(
+    series: CandleSeries,
+    features: SignalFeatures,
+    config: BacktestConfig,
+    params: SignalParams
+) -> Dict[str, Any]:
+    """Backtest one candidate from precomputed features"""
+    started = time.perf_counter()
+    # fresh copy so stateful slippage models start from the same seed every run
+    engine = BacktestEngine(copy.deepcopy(config), params)
+    result = engine.run_signals(series, features.signals(params))
+    return {
+        "hash": param_hash(params),
+        **params.to_dict(),
+        **result.metrics,
+        "elapsed": round(time.perf_counter() - started, 4),
+    }
+
+
+# -----------------------------
+# Optimizer
+# -----------------------------
+class ParameterOptimizer:
+    """
+    Usage:
+        optimizer = ParameterOptimizer(candles, leaderboard_path="sweep.csv", workers=4)
+        optimizer.grid_search(ParameterSpace({"ob_weight": [20, 30], "entry_threshold": [30, 40]}))
+        optimizer.random_search(ParameterSpace({"ob_weight": (10, 50)}), n_iter=200)
+        optimizer.leaderboard.top(10)
+    """
+
+    def __init__(
+        self,
+        candles: Union[CandleSeries, List[dict]],
+        config: Optional[BacktestConfig] = None,
+        leaderboard_path: str = "optimizer_leaderboard.csv",
+        workers: int = 1,
+        objective: str = "sharpe_ratio"
+    ):
+        self.series = candles if isinstance(candles, CandleSeries) else CandleSeries.from_records(candles)
+        self.config = config or BacktestConfig()
+        self.workers = max(1, workers)
+        self.leaderboard = Leaderboard(leaderboard_path, objective)
+        self.features: Optional[SignalFeatures] = None
+
+        if len(self.series) < self.config.window + 2:
+            raise ValueError(f"Need at least {self.config.window + 2} bars, got {len(self.series)}")
+
+    def prepare(self) -> SignalFeatures:
+        """Run the analyzers once over every tradable bar"""
+        if self.features is None:
+            self.features = compute_features(self.series, self.config, self.workers)
+        return self.features
+
+    # -----------------------------
+    # Searches
+    # -----------------------------
+    def grid_search(self, space: Optional[ParameterSpace] = None) -> List[Dict[str, Any]]:
+        space = space or ParameterSpace()
+        logger.info(f"🔍 Grid search over {space.size()} parameter sets")
+        return self.run(space.grid())
+
+    def random_search(
+        self,
+        space: Optional[ParameterSpace] = None,
+        n_iter: int = 100,
+        seed: Optional[int] = 42
+    ) -> List[Dict[str, Any]]:
+        space = space or ParameterSpace()
+        logger.info(f"🎲 Random search: {n_iter} samples (seed={seed})")
+        return self.run(space.sample(n_iter, seed))
+
+    def run(self, candidates: Iterable[SignalParams], top: int = 10) -> List[Dict[str, Any]]:
+        """Evaluate candidates not already on the leaderboard"""
+        done = self.leaderboard.completed()
+        pending = []
+        for params in candidates:
+            key = param_hash(params)
+            if key not in done:
+                done.add(key)
+                pending.append(params)
+
+        if pending:
+            features = self.prepare()
+            logger.info(f"🚀 Evaluating {len(pending)} parameter sets on {self.workers} worker(s)")
+            if self.workers == 1:
+                for params in pending:
+                    self.leaderboard.append(evaluate_params(self.series, features, self.config, params))
+            else:
+                self._run_parallel(pending, features)
+        else:
+            logger.info("✅ Every candidate is already on the leaderboard")
+
+        self.leaderboard.finalize()
+        return self.leaderboard.top(top)
+
+    def _run_parallel(self, pending: List[SignalParams], features: SignalFeatures):
+        shared = share_features(self.series, features)
+        # bounded in-flight queue: results stream to the leaderboard as they finish
+        max_in_flight = self.workers * 4
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=init_worker,
+                initargs=(shared.spec, self.config, features.window)
+            ) as pool:
+                queue = iter(pending)
+                in_flight = set()
+                for params in itertools.islice(queue, max_in_flight):
+                    in_flight.add(pool.submit(_evaluate_in_worker, params))
+
+                while in_flight:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        self.leaderboard.append(future.result())
+                    for params in itertools.islice(queue, len(finished)):
+                        in_flight.add(pool.submit(_evaluate_in_worker, params))
+        finally:
+            shared.close()
@@ -0,0 +1,273 @@
+"""
+Walk-forward analysis
+Re-optimizes SignalParams on each in-sample window and trades the winner on
+the following out-of-sample window.
+
+- rolling: fixed-length in-sample window that slides forward
+- anchored: in-sample always starts at the first bar and grows
+
+Analyzer features are computed once for the whole history; every fold slices
+the same cache, so overlapping windows never re-run the analyzers. Folds are
+independent and run in a process pool over shared memory.
+"""
+
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from app.backtesting.data import CandleSeries
+from app.backtesting.engine import BacktestConfig
+from app.backtesting.optimizer import (
+    PARAM_COLUMNS,
+    WORKER,
+    ParameterSpace,
+    SignalFeatures,
+    compute_features,
+    evaluate_params,
+    init_worker,
+    share_features,
+)
+from app.core.trading_engine import SignalParams
+
+logger = logging.getLogger(__name__)
+
+# small default search so SafeTester stays interactive
+DEFAULT_WALK_FORWARD_SPACE = {
+    "ob_weight": [20, 30, 40],
+    "trend_weight": [10, 20, 30],
+    "entry_threshold": [30, 40, 50],
+    "ob_lookback": [30, 50],
+}
+
+
+@dataclass
+class WalkForwardConfig:
+    folds: int = 5
+    in_sample_bars: Optional[int] = None      # default: is_oos_ratio x out_of_sample_bars
+    out_of_sample_bars: Optional[int] = None  # default: sized so `folds` folds fit the data
+    is_oos_ratio: int = 3
+    anchored: bool = False
+    search: str = "grid"                      # grid | random
+    n_iter: int = 50                          # random search samples per fold
+    seed: Optional[int] = 42
+    objective: str = "sharpe_ratio"
+    space: Dict[str, Any] = field(default_factory=lambda: dict(DEFAULT_WALK_FORWARD_SPACE))
+    workers: int = 1
+    # robustness_score at or above this counts as consistent
+    min_robustness: float = 0.6
+
+
+@dataclass
+class Fold:
+    index: int
+    is_start: int
+    is_end: int
+    oos_start: int
+    oos_end: int
+
+
+@dataclass
+class FoldResult:
+    fold: Fold
+    params: Dict[str, Any]
+    in_sample: Dict[str, Any]
+    out_of_sample: Dict[str, Any]
+    candidates: int
+
+
+def walk_forward_splits(
+    n_bars: int,
+    in_sample: int,
+    out_of_sample: int,
+    anchored: bool = False,
+    start: int = 0
+) -> List[Fold]:
+    """Consecutive, non-overlapping out-of-sample windows after an in-sample window"""
+    folds = []
+    oos_start = start + in_sample
+    while oos_start + out_of_sample <= n_bars:
+        is_start = start if anchored else oos_start - in_sample
+        folds.append(Fold(len(folds), is_start, oos_start, oos_start, oos_start + out_of_sample))
+        oos_start += out_of_sample
+    return folds
+
+
+def run_fold(
+    series: CandleSeries,
+    features: SignalFeatures,
+    config: BacktestConfig,
+    fold: Fold,
+    candidates: List[SignalParams],
+    objective: str
+) -> FoldResult:
+    """Optimize on the in-sample slice, then trade the winner out of sample"""
+    is_series = series.slice(fold.is_start, fold.is_end)
+    is_features = features.slice(fold.is_start, fold.is_end)
+
+    best_params = candidates[0]
+    best_row = None
+    for params in candidates:
+        row = evaluate_params(is_series, is_features, config, params)
+        if best_row is None or row[objective] > best_row[objective]:
+            best_params, best_row = params, row
+
+    oos_row = evaluate_params(
+        series.slice(fold.oos_start, fold.oos_end),
+        features.slice(fold.oos_start, fold.oos_end),
+        config,
+        best_params
+    )
+    return FoldResult(
+        fold=fold,
+        params=best_params.to_dict(),
+        in_sample=best_row,
+        out_of_sample=oos_row,
+        candidates=len(candidates),
+    )
+
+
+def _fold_in_worker(fold: Fold, candidates: List[SignalParams], objective: str) -> FoldResult:
+    return run_fold(WORKER["series"], WORKER["features"], WORKER["config"], fold, candidates, objective)
+
+
+def robustness_report(results: List[FoldResult], bars: List[int], min_robustness: float) -> Dict[str, Any]:
+    """
+    robustness_score = mean of
+    - share of out-of-sample folds that made money
+    - walk-forward efficiency: out-of-sample return per bar relative to
+      in-sample return per bar, clipped to [0, 1]
+    """
+    if not results:
+        return {"consistent": False, "robustness_score": 0.0, "folds": 0, "error": "Not enough data for a single fold"}
+
+    oos_returns = np.array([r.out_of_sample["total_return"] for r in results])
+    is_returns = np.array([r.in_sample["total_return"] for r in results])
+    is_bars = np.array([r.fold.is_end - r.fold.is_start for r in results])
+    oos_bars = np.array(bars)
+
+    profitable = float((oos_returns > 0).mean())
+
+    is_rate = is_returns / is_bars
+    oos_rate = oos_returns / oos_bars
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(is_rate > 0, oos_rate / is_rate, 0.0)
+    efficiency = float(np.clip(np.median(ratio), 0.0, 1.0))
+
+    score = round((profitable + efficiency) / 2, 4)
+    compounded = float(np.prod(1 + oos_returns) - 1)
+
+    # how often each parameter value won a fold (stable winners are a good sign)
+    stability = {}
+    for name in PARAM_COLUMNS:
+        values = [r.params[name] for r in results]
+        most_common = max(set(values), key=values.count)
+        stability[name] = round(values.count(most_common) / len(values), 4)
+
+    return {
+        "consistent": bool(score >= min_robustness and compounded > 0),
+        "robustness_score": score,
+        "profitable_folds": profitable,
+        "efficiency": efficiency,
+        "oos_total_return": compounded,
+        "oos_mean_sharpe": float(np.mean([r.out_of_sample["sharpe_ratio"] for r in results])),
+        "oos_worst_drawdown": float(min(r.out_of_sample["max_drawdown"] for r in results)),
+        "oos_trades": int(sum(r.out_of_sample["total_trades"] for r in results)),
+        "folds": len(results),
+        "parameter_stability": stability,
+    }
+
+
+class WalkForwardAnalyzer:
+    """
+    Usage:
+        analyzer = WalkForwardAnalyzer(candles, wf_config=WalkForwardConfig(folds=8, workers=4))
+        report = analyzer.run()
+        report["robustness_score"], analyzer.results
+    """
+
+    def __init__(
+        self,
+        candles: Union[CandleSeries, List[dict]],
+        config: Optional[BacktestConfig] = None,
+        wf_config: Optional[WalkForwardConfig] = None,
+        features: Optional[SignalFeatures] = None
+    ):
+        self.series = candles if isinstance(candles, CandleSeries) else CandleSeries.from_records(candles)
+        self.config = config or BacktestConfig()
+        self.wf_config = wf_config or WalkForwardConfig()
+        self.features = features
+        self.results: List[FoldResult] = []
+
+    def splits(self) -> List[Fold]:
+        wf = self.wf_config
+        # the first window-1 bars only feed the analyzers
+        start = self.config.window - 1
+        usable = len(self.series) - start
+
+        oos = wf.out_of_sample_bars or usable // (wf.folds + wf.is_oos_ratio)
+        in_sample = wf.in_sample_bars or oos * wf.is_oos_ratio
+        if oos <= 0 or in_sample <= 0:
+            return []
+        return walk_forward_splits(len(self.series), in_sample, oos, wf.anchored, start)
+
+    def _candidates(self) -> List[SignalParams]:
+        wf = self.wf_config
+        space = ParameterSpace(wf.space)
+        if wf.search == "random":
+            return list(space.sample(wf.n_iter, wf.seed))
+        return list(space.grid())
+
+    def run(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        wf = self.wf_config
+        folds = self.splits()
+        if not folds:
+            return robustness_report([], [], wf.min_robustness)
+
+        if self.features is None:
+            self.features = compute_features(self.series, self.config, wf.workers)
+
+        candidates = self._candidates()
+        logger.info(
+            f"🚶 Walk-forward: {len(folds)} {'anchored' if wf.anchored else 'rolling'} folds "
+            f"x {len(candidates)} candidates on {wf.workers} worker(s)"
+        )
+
+        if wf.workers <= 1:
+            self.results = [
+                run_fold(self.series, self.features, self.config, fold, candidates, wf.objective)
+                for fold in folds
+            ]
+        else:
+            self.results = self._run_parallel(folds, candidates)
+
+        report = robustness_report(
+            self.results,
+            [f.oos_end - f.oos_start for f in folds],
+            wf.min_robustness
+        )
+        report["elapsed"] = round(time.perf_counter() - started, 2)
+        logger.info(
+            f"✅ Walk-forward done in {report['elapsed']}s: robustness {report['robustness_score']:.2f}"
+        )
+        return report
+
+    def _run_parallel(self, folds: List[Fold], candidates: List[SignalParams]) -> List[FoldResult]:
+        shared = share_features(self.series, self.features)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.wf_config.workers,
+                initializer=init_worker,
+                initargs=(shared.spec, self.config, self.features.window)
+            ) as pool:
+                futures = [
+                    pool.submit(_fold_in_worker, fold, candidates, self.wf_config.objective)
+                    for fold in folds
+                ]
+                return [future.result() for future in futures]
+        finally:
+            shared.close()
@@ -3,32 +3,150 @@ Revolution X - Caching System
 Redis-based caching with fallback to in-memory
 """
 import json
-import pickle
 import hashlib
-from typing import Any, Optional, Union, Callable
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union, Callable
 from functools import wraps
 from datetime import timedelta
 import asyncio
+import inspect
+import time
+import uuid
 
+import numpy as np
 import redis.asyncio as redis
 from redis.asyncio import Redis
+from redis.exceptions import WatchError
 
+from app.core import codecs
 from app.core.config import settings
+from app.core.local_cache import LocalCache
 from app.core.logging import logger
+from app.core.metrics import (
+    cache_hits_total,
+    cache_local_bytes,
+    cache_local_entries,
+    cache_local_removals_total,
+    cache_misses_total,
+    cache_redis_latency_seconds,
+    cache_sets_total,
+    cache_stale_hits_total,
+)
+from app.marketdata.bars import CANDLE_DTYPE, to_candle_array
+
+_MISSING = object()
+
+# stale-while-revalidate values are stored as [_SWR_MARKER, fresh_until, value]
+_SWR_MARKER = "__swr__"
+
+# delete the lock only if we still own it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _record_local_removal(namespace: str, reason: str):
+    cache_local_removals_total.labels(namespace=namespace, reason=reason).inc()
+
+
+def _export_local_size(local: LocalCache):
+    """Report the local tier's size per namespace at scrape time"""
+    for name, segment in local.segments.items():
+        cache_local_bytes.labels(namespace=name).set_function(lambda s=segment: s.bytes)
+        cache_local_entries.labels(namespace=name).set_function(lambda s=segment: len(s.entries))
+
+
+@contextmanager
+def _redis_timer(operation: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        cache_redis_latency_seconds.labels(operation=operation).observe(time.perf_counter() - started)
+
+
+class KeyUsage:
+    """
+    Approximate access counts and payload sizes of the busiest keys.
+    
+    Holds at most 2 * capacity keys; when full, only the top `capacity` are
+    kept and their counts halved, so the ranking follows recent traffic.
+    """
+    
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.accesses: Counter = Counter()
+        self.sizes: Dict[str, int] = {}
+    
+    def record(self, key: str, size: Optional[int] = None, access: bool = True):
+        self.accesses[key] += access
+        if size is not None:
+            self.sizes[key] = size
+        if len(self.accesses) > 2 * self.capacity:
+            self._prune()
+    
+    def _prune(self):
+        keep = self.accesses.most_common(self.capacity)
+        self.accesses = Counter({key: count // 2 for key, count in keep})
+        self.sizes = {key: self.sizes[key] for key in self.accesses if key in self.sizes}
+    
+    def top(self, limit: int = 20, by: str = "accesses") -> List[dict]:
+        """Busiest (by="accesses") or largest (by="bytes") keys"""
+        rows = [
+            {"key": key, "accesses": count, "bytes": self.sizes.get(key)}
+            for key, count in self.accesses.items()
+        ]
+        rows.sort(key=lambda row: row[by] or 0, reverse=True)
+        return rows[:limit]
 
 
 class CacheManager:
-    """Advanced caching manager with Redis and local fallback."""
+    """
+    Advanced caching manager with Redis and local fallback.
+    
+    get_or_set()/cached() coalesce concurrent misses: one computation per key
+    per process (single-flight), optionally one per cluster (Redis lock), and
+    with stale_ttl an expired value keeps being served while a single
+    background refresh runs.
+    
+    While Redis is up, `local` acts as a short-lived L1 in front of it: reads
+    are served from memory and every write publishes an invalidation on
+    CACHE_INVALIDATION_CHANNEL so other workers/pods drop their copy. The L1
+    is bypassed whenever that subscription is down. Without Redis, `local`
+    holds the only copy.
+    """
     
     def __init__(self):
         self.redis_client: Optional[Redis] = None
-        self.local_cache: dict = {}
-        self.local_ttl: dict = {}
-        self._lock = asyncio.Lock()
+        self.local = LocalCache(
+            max_entries=settings.LOCAL_CACHE_MAX_ENTRIES,
+            max_bytes=settings.LOCAL_CACHE_MAX_BYTES,
+            listener=_record_local_removal
+        )
         self._connected = False
+        self.node_id = uuid.uuid4().hex
+        self.l1_enabled = settings.CACHE_L1_ENABLED
+        self.l1_ttl = settings.CACHE_L1_TTL
+        self._l1_live = False
+        # bumped on every invalidation; a read only fills the L1 if no
+        # write/invalidation happened while it was waiting on Redis
+        self._generation = 0
+        self._subscriber: Optional[asyncio.Task] = None
+        self._inflight: dict = {}
+        self.key_usage = KeyUsage()
+    
+    @property
+    def connected(self) -> bool:
+        """True while Redis backs the cache (False: this process runs on the local tier alone)."""
+        return self._connected
     
     async def connect(self):
         """Initialize Redis connection."""
+        self.local.start()
         try:
             self.redis_client = redis.Redis(
                 host=settings.REDIS_HOST,
@@ -43,39 +161,126 @@ class CacheManager:
             await self.redis_client.ping()
             self._connected = True
             logger.info("✅ Redis cache connected")
+            if self.l1_enabled:
+                self._subscriber = asyncio.create_task(self._listen_invalidations())
         except Exception as e:
             logger.warning(f"⚠️ Redis unavailable, using in-memory cache: {e}")
             self._connected = False
     
     async def disconnect(self):
         """Close Redis connection."""
+        if self._subscriber:
+            self._subscriber.cancel()
+            try:
+                await self._subscriber
+            except asyncio.CancelledError:
+                pass
+            self._subscriber = None
         if self.redis_client:
             await self.redis_client.close()
             self._connected = False
+        await self.local.stop()
+    
+    async def _listen_invalidations(self):
+        """Apply invalidations published by other nodes, resubscribing on errors."""
+        channel = settings.CACHE_INVALIDATION_CHANNEL
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(channel)
+                # messages may have been missed while unsubscribed
+                self.local.clear()
+                self._l1_live = True
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._apply_invalidation(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache invalidation channel lost, L1 bypassed: {e}")
+            finally:
+                self._l1_live = False
+                await pubsub.aclose()
+            await asyncio.sleep(1)
+    
+    def _apply_invalidation(self, data: bytes):
+        message = json.loads(data)
+        if message.get("node") != self.node_id:
+            self._invalidate_local(message.get("keys"), message.get("pattern"))
+    
+    def _invalidate_local(self, keys: Optional[list] = None, pattern: Optional[str] = None) -> int:
+        self._generation += 1
+        removed = self.local.clear_pattern(pattern) if pattern else 0
+        for key in keys or ():
+            removed += self.local.delete(key)
+        return removed
+    
+    async def _publish_invalidation(self, keys: Optional[list] = None, pattern: Optional[str] = None):
+        if not self.l1_enabled:
+            return
+        message = {"node": self.node_id}
+        if keys:
+            message["keys"] = keys
+        if pattern:
+            message["pattern"] = pattern
+        await self.redis_client.publish(settings.CACHE_INVALIDATION_CHANNEL, json.dumps(message))
+    
+    def _use_l1(self) -> bool:
+        return self.l1_enabled and self._l1_live
+    
+    def _fill_l1(self, key: str, value: Any, ttl: Optional[float], size: int):
+        # never keep a copy longer than Redis does
+        ttl = self.l1_ttl if ttl is None or ttl <= 0 else min(ttl, self.l1_ttl)
+        self.local.set(key, value, ttl, size=size)
+    
+    def _record_hit(self, key: str, tier: str, size: Optional[int] = None):
+        cache_hits_total.labels(namespace=self.local.namespace(key), tier=tier).inc()
+        self.key_usage.record(key, size)
+    
+    def _record_miss(self, key: str):
+        cache_misses_total.labels(namespace=self.local.namespace(key)).inc()
+        self.key_usage.record(key)
+    
+    def _record_set(self, key: str, size: int):
+        cache_sets_total.labels(namespace=self.local.namespace(key)).inc()
+        self.key_usage.record(key, size, access=False)
     
     def _generate_key(self, prefix: str, *args, **kwargs) -> str:
         """Generate cache key from arguments."""
         key_data = f"{prefix}:{str(args)}:{str(sorted(kwargs.items()))}"
         return hashlib.md5(key_data.encode()).hexdigest()
     
-    async def get(self, key: str, default: Any = None) -> Any:
-        """Get value from cache."""
+    async def get(self, key: str, default: Any = None, allow_pickle: bool = False) -> Any:
+        """Get value from cache (pickled payloads only with allow_pickle=True)."""
         try:
-            if self._connected:
-                data = await self.redis_client.get(key)
-                if data:
-                    return pickle.loads(data)
+            if not self._connected:
+                # Fallback to local cache
+                value = self.local.get(key, _MISSING)
+                if value is _MISSING:
+                    self._record_miss(key)
+                    return default
+                self._record_hit(key, "local")
+                return value
             
-            # Fallback to local cache
-            async with self._lock:
-                if key in self.local_cache:
-                    if asyncio.get_event_loop().time() < self.local_ttl.get(key, 0):
-                        return self.local_cache[key]
-                    else:
-                        del self.local_cache[key]
-                        del self.local_ttl[key]
+            if self._use_l1():
+                value = self.local.get(key, _MISSING)
+                if value is not _MISSING:
+                    self._record_hit(key, "l1")
+                    return value
             
-            return default
+            generation = self._generation
+            with _redis_timer("get"):
+                async with self.redis_client.pipeline(transaction=False) as pipe:
+                    data, pttl = await pipe.get(key).pttl(key).execute()
+            if not data:
+                self._record_miss(key)
+                return default
+            
+            self._record_hit(key, "redis", len(data))
+            value = codecs.decode(data, allow_pickle)
+            if self._use_l1() and generation == self._generation:
+                self._fill_l1(key, value, pttl / 1000 if pttl > 0 else None, len(data))
+            return value
             
         except Exception as e:
             logger.error(f"Cache get error: {e}")
@@ -86,23 +291,42 @@ class CacheManager:
         key: str,
         value: Any,
         ttl: Optional[int] = None,
-        nx: bool = False
+        nx: bool = False,
+        codec: Optional[str] = None,
+        tags: Sequence[str] = ()
     ) -> bool:
-        """Set value in cache."""
+        """
+        Set value in cache, serialized with `codec` (see app.core.codecs, default msgpack).
+        
+        Tagged keys are also added to one Redis set per tag so
+        invalidate_tags() can drop them without scanning the keyspace.
+        """
         try:
-            serialized = pickle.dumps(value)
+            serialized = codecs.encode(value, codec)
+            self._record_set(key, len(serialized))
             
             if self._connected:
-                if nx:
-                    return await self.redis_client.setnx(key, serialized)
-                await self.redis_client.setex(key, ttl or 300, serialized)
+                ttl = ttl or 300
+                with _redis_timer("set"):
+                    if tags:
+                        async with self.redis_client.pipeline(transaction=True) as pipe:
+                            pipe.set(key, serialized, ex=ttl, nx=nx)
+                            self._queue_tags(pipe, key, ttl, tags)
+                            stored = (await pipe.execute())[0]
+                    elif nx:
+                        stored = await self.redis_client.set(key, serialized, ex=ttl, nx=True)
+                    else:
+                        stored = await self.redis_client.setex(key, ttl, serialized)
+                if nx and not stored:
+                    return False
+                self._invalidate_local([key])
+                if self._use_l1():
+                    self._fill_l1(key, value, ttl, len(serialized))
+                await self._publish_invalidation(keys=[key])
                 return True
             
             # Fallback to local cache
-            async with self._lock:
-                self.local_cache[key] = value
-                self.local_ttl[key] = asyncio.get_event_loop().time() + (ttl or 300)
-            return True
+            return self.local.set(key, value, ttl or 300, size=len(serialized), nx=nx, tags=tags)
             
         except Exception as e:
             logger.error(f"Cache set error: {e}")
@@ -112,53 +336,413 @@ class CacheManager:
         """Delete key from cache."""
         try:
             if self._connected:
-                await self.redis_client.delete(key)
-            
-            async with self._lock:
-                self.local_cache.pop(key, None)
-                self.local_ttl.pop(key, None)
+                with _redis_timer("delete"):
+                    await self.redis_client.delete(key)
+                await self._publish_invalidation(keys=[key])
+            # after the Redis write, so in-flight reads cannot refill it
+            self._invalidate_local([key])
             return True
         except Exception as e:
             logger.error(f"Cache delete error: {e}")
             return False
     
-    async def clear_pattern(self, pattern: str) -> int:
-        """Clear all keys matching pattern."""
+    async def get_many(
+        self,
+        keys: Iterable[str],
+        default: Any = None,
+        allow_pickle: bool = False
+    ) -> Dict[str, Any]:
+        """Get several keys: L1 first, then one MGET round trip for the rest."""
+        keys = list(dict.fromkeys(keys))
+        try:
+            found, missing = {}, keys
+            if not self._connected or self._use_l1():
+                tier = "l1" if self._connected else "local"
+                missing = []
+                for key in keys:
+                    value = self.local.get(key, _MISSING)
+                    if value is _MISSING:
+                        missing.append(key)
+                    else:
+                        found[key] = value
+                        self._record_hit(key, tier)
+            
+            if missing and self._connected:
+                generation = self._generation
+                with _redis_timer("get_many"):
+                    async with self.redis_client.pipeline(transaction=False) as pipe:
+                        pipe.mget(missing)
+                        for key in missing:
+                            pipe.pttl(key)
+                        payloads, *pttls = await pipe.execute()
+                
+                fill = self._use_l1() and generation == self._generation
+                for key, data, pttl in zip(missing, payloads, pttls):
+                    if not data:
+                        self._record_miss(key)
+                        continue
+                    self._record_hit(key, "redis", len(data))
+                    found[key] = codecs.decode(data, allow_pickle)
+                    if fill:
+                        self._fill_l1(key, found[key], pttl / 1000 if pttl > 0 else None, len(data))
+            elif missing:
+                for key in missing:
+                    self._record_miss(key)
+            
+            return {key: found.get(key, default) for key in keys}
+        
+        except Exception as e:
+            logger.error(f"Cache get_many error: {e}")
+            return {key: default for key in keys}
+    
+    async def set_many(
+        self,
+        mapping: Dict[str, Any],
+        ttl: Optional[int] = None,
+        codec: Optional[str] = None,
+        tags: Sequence[str] = ()
+    ) -> bool:
+        """Set several keys with one pipelined SETEX round trip."""
+        try:
+            ttl = ttl or 300
+            serialized = {key: codecs.encode(value, codec) for key, value in mapping.items()}
+            for key, data in serialized.items():
+                self._record_set(key, len(data))
+            
+            if not self._connected:
+                return all([
+                    self.local.set(key, mapping[key], ttl, size=len(data), tags=tags)
+                    for key, data in serialized.items()
+                ])
+            
+            with _redis_timer("set_many"):
+                async with self.redis_client.pipeline(transaction=bool(tags)) as pipe:
+                    for key, data in serialized.items():
+                        pipe.setex(key, ttl, data)
+                        self._queue_tags(pipe, key, ttl, tags)
+                    await pipe.execute()
+            
+            keys = list(serialized)
+            self._invalidate_local(keys)
+            if self._use_l1():
+                for key, data in serialized.items():
+                    self._fill_l1(key, mapping[key], ttl, len(data))
+            await self._publish_invalidation(keys=keys)
+            return True
+        
+        except Exception as e:
+            logger.error(f"Cache set_many error: {e}")
+            return False
+    
+    async def delete_many(self, keys: Iterable[str]) -> int:
+        """Delete several keys with one UNLINK and one invalidation message."""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return 0
+        try:
+            if self._connected:
+                with _redis_timer("delete_many"):
+                    removed = await self._unlink(keys)
+                await self._publish_invalidation(keys=keys)
+                self._invalidate_local(keys)
+                return removed
+            return self._invalidate_local(keys)
+        except Exception as e:
+            logger.error(f"Cache delete_many error: {e}")
+            return 0
+    
+    async def append_series(
+        self,
+        key: str,
+        rows: np.ndarray,
+        max_len: int,
+        ttl: Optional[int] = None,
+        replace: bool = False,
+        tags: Sequence[str] = ()
+    ) -> int:
+        """
+        Append time-ordered rows of a structured array to a bounded series.
+        
+        The series is a Redis list holding one fixed-size record per row.
+        Rows older than the last stored one are dropped, a row with the same
+        time overwrites it (the still-forming bar), and the list is trimmed to
+        max_len. replace=True starts the series over. Returns rows written.
+        """
+        ttl = ttl or 300
+        rows = np.ascontiguousarray(rows)
+        self._record_set(key, min(len(rows), max_len) * rows.dtype.itemsize)
+        try:
+            if not self._connected:
+                return self._append_local_series(key, rows, max_len, ttl, replace, tags)
+            
+            with _redis_timer("append_series"):
+                async with self.redis_client.pipeline(transaction=True) as pipe:
+                    while True:
+                        try:
+                            await pipe.watch(key)
+                            last = None if replace else await pipe.lindex(key, -1)
+                            new, overwrite = self._new_rows(rows, last)
+                            records = [row.tobytes() for row in new]
+                            
+                            pipe.multi()
+                            if replace:
+                                pipe.delete(key)
+                            if overwrite:
+                                pipe.lset(key, -1, records.pop(0))
+                            if records:
+                                pipe.rpush(key, *records)
+                            pipe.ltrim(key, -max_len, -1).expire(key, ttl)
+                            self._queue_tags(pipe, key, ttl, tags)
+                            await pipe.execute()
+                            return len(new)
+                        except WatchError:
+                            # another writer appended in between, re-read the tail
+                            continue
+        
+        except Exception as e:
+            logger.error(f"Cache append_series error: {e}")
+            return 0
+    
+    @staticmethod
+    def _new_rows(rows: np.ndarray, last: Optional[bytes]) -> tuple:
+        """Rows at or after the stored tail, and whether the first overwrites it"""
+        if not last or not len(rows):
+            return rows, False
+        last_time = np.frombuffer(last, dtype=rows.dtype)[0]["time"]
+        new = rows[rows["time"] >= last_time]
+        return new, bool(len(new)) and new[0]["time"] == last_time
+    
+    def _append_local_series(self, key: str, rows: np.ndarray, max_len: int, ttl: int, replace: bool, tags: Sequence[str]) -> int:
+        current = None if replace else self.local.get(key)
+        if current is None:
+            new, series = rows, rows
+        else:
+            new, overwrite = self._new_rows(rows, current[-1:].tobytes() if len(current) else None)
+            series = np.concatenate([current[:-1] if overwrite else current, new])
+        series = series[-max_len:].copy()
+        self.local.set(key, series, ttl, size=series.nbytes, tags=tags)
+        return len(new)
+    
+    async def get_series_tail(self, key: str, dtype: np.dtype, limit: int) -> Optional[np.ndarray]:
+        """Last `limit` rows of a series written by append_series (read-only view)."""
+        if limit <= 0:
+            # series[-0:] / LRANGE key -0 -1 would return the whole series
+            return np.empty(0, dtype=dtype)
+        try:
+            if not self._connected:
+                series = self.local.get(key)
+                if series is None:
+                    self._record_miss(key)
+                    return None
+                self._record_hit(key, "local", series.nbytes)
+                return series[-limit:]
+            
+            with _redis_timer("get_series_tail"):
+                records = await self.redis_client.lrange(key, -limit, -1)
+            if not records:
+                self._record_miss(key)
+                return None
+            data = b"".join(records)
+            self._record_hit(key, "redis", len(data))
+            return np.frombuffer(data, dtype=dtype)
+        
+        except Exception as e:
+            logger.error(f"Cache get_series_tail error: {e}")
+            return None
+    
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        return f"tag:{tag}"
+    
+    def _queue_tags(self, pipe, key: str, ttl: int, tags: Sequence[str]):
+        for tag in tags:
+            # tag sets live as long as their longest-lived key
+            tag_key = self._tag_key(tag)
+            pipe.sadd(tag_key, key).expire(tag_key, ttl, nx=True).expire(tag_key, ttl, gt=True)
+    
+    UNLINK_BATCH = 500
+    
+    async def _unlink(self, keys: list) -> int:
+        removed = 0
+        for i in range(0, len(keys), self.UNLINK_BATCH):
+            removed += await self.redis_client.unlink(*keys[i:i + self.UNLINK_BATCH])
+        return removed
+    
+    async def invalidate_tags(self, *tags: str) -> int:
+        """Delete every key stored with any of the tags; O(tagged keys)."""
         try:
             if self._connected:
-                keys = await self.redis_client.keys(pattern)
+                tag_keys = [self._tag_key(tag) for tag in tags]
+                # read and drop the sets atomically, later writes start a new set
+                with _redis_timer("invalidate_tags"):
+                    async with self.redis_client.pipeline(transaction=True) as pipe:
+                        for tag_key in tag_keys:
+                            pipe.smembers(tag_key)
+                        pipe.delete(*tag_keys)
+                        *members, _ = await pipe.execute()
+                    
+                    keys = sorted({
+                        key.decode() if isinstance(key, bytes) else key
+                        for group in members for key in group
+                    })
+                    removed = await self._unlink(keys) if keys else 0
                 if keys:
-                    return await self.redis_client.delete(*keys)
+                    await self._publish_invalidation(keys=keys)
+                    self._invalidate_local(keys)
+                return removed
+            
+            self._generation += 1
+            return self.local.invalidate_tags(tags)
+        
+        except Exception as e:
+            logger.error(f"Cache tag invalidation error: {e}")
+            return 0
+    
+    async def clear_pattern(self, pattern: str) -> int:
+        """
+        Clear all keys matching pattern.
+        
+        Walks the keyspace with SCAN and UNLINKs in batches, so Redis is never
+        blocked; prefer tags for anything on a hot path.
+        """
+        try:
+            if self._connected:
+                removed, batch = 0, []
+                async for key in self.redis_client.scan_iter(match=pattern, count=1000):
+                    batch.append(key)
+                    if len(batch) >= self.UNLINK_BATCH:
+                        removed += await self._unlink(batch)
+                        batch = []
+                if batch:
+                    removed += await self._unlink(batch)
+                await self._publish_invalidation(pattern=pattern)
+                self._invalidate_local(pattern=pattern)
+                return removed
             
             # Local cache clear
-            async with self._lock:
-                keys_to_delete = [k for k in self.local_cache if pattern in k]
-                for k in keys_to_delete:
-                    del self.local_cache[k]
-                    del self.local_ttl[k]
-                return len(keys_to_delete)
+            return self._invalidate_local(pattern=pattern)
                 
         except Exception as e:
             logger.error(f"Cache clear error: {e}")
             return 0
     
+    LOCK_TIMEOUT = 10.0  # seconds a cross-worker computation may hold its lock
+    LOCK_POLL_INTERVAL = 0.05
+    
     async def get_or_set(
         self,
         key: str,
         factory: Callable,
-        ttl: Optional[int] = None
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None,
+        lock: bool = False,
+        codec: Optional[str] = None,
+        tags: Sequence[str] = ()
     ) -> Any:
-        """Get from cache or compute and store."""
-        value = await self.get(key)
-        if value is not None:
+        """
+        Get from cache or compute and store.
+        
+        Concurrent callers for the same key share one computation. With
+        lock=True other workers wait for it too instead of recomputing.
+        With stale_ttl the value is kept for ttl + stale_ttl seconds and,
+        once older than ttl, returned as-is while one background refresh
+        replaces it; keys written this way must be read through get_or_set.
+        codec=codecs.PICKLE also allows unpickling what is read back.
+        """
+        ttl = ttl or 300
+        cached_value = await self.get(key, allow_pickle=codec == codecs.PICKLE)
+        
+        if stale_ttl and self._is_swr(cached_value):
+            _, fresh_until, value = cached_value
+            if time.time() >= fresh_until:
+                cache_stale_hits_total.labels(namespace=self.local.namespace(key)).inc()
+                self._flight(key, factory, ttl, stale_ttl, lock, codec, tags)
             return value
+        if cached_value is not None:
+            return cached_value
         
-        value = await factory() if asyncio.iscoroutinefunction(factory) else factory()
-        await self.set(key, value, ttl)
-        return value
+        return await asyncio.shield(self._flight(key, factory, ttl, stale_ttl, lock, codec, tags))
+    
+    @staticmethod
+    def _is_swr(value: Any) -> bool:
+        return isinstance(value, (list, tuple)) and len(value) == 3 and value[0] == _SWR_MARKER
+    
+    def _flight(self, key: str, factory: Callable, *options) -> asyncio.Task:
+        """The running computation for key, started if there is none."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._refresh(key, factory, *options))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._flight_done(key, t))
+        return task
+    
+    def _flight_done(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Cache refresh of {key} failed: {task.exception()}")
     
-    def cached(self, ttl: int = 300, key_prefix: str = ""):
-        """Decorator for caching function results."""
+    async def _refresh(
+        self,
+        key: str,
+        factory: Callable,
+        ttl: int,
+        stale_ttl: Optional[int],
+        lock: bool,
+        codec: Optional[str],
+        tags: Sequence[str]
+    ) -> Any:
+        lock_key = token = None
+        if lock and self._connected:
+            lock_key, token = f"lock:{key}", uuid.uuid4().hex
+            try:
+                acquired = await self.redis_client.set(lock_key, token, px=int(self.LOCK_TIMEOUT * 1000), nx=True)
+            except Exception as e:
+                logger.warning(f"Cache lock error on {key}, computing without it: {e}")
+                acquired, lock_key = True, None
+            if not acquired:
+                value = await self._wait_for_other_worker(key, stale_ttl, codec == codecs.PICKLE)
+                if value is not _MISSING:
+                    return value
+                lock_key = None  # holder timed out, compute ourselves
+        
+        try:
+            value = factory()
+            if inspect.isawaitable(value):
+                value = await value
+            if value is not None:
+                if stale_ttl:
+                    await self.set(key, [_SWR_MARKER, time.time() + ttl, value], ttl + stale_ttl, codec=codec, tags=tags)
+                else:
+                    await self.set(key, value, ttl, codec=codec, tags=tags)
+            return value
+        finally:
+            if lock_key:
+                try:
+                    await self.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    logger.warning(f"Cache lock release error on {key}: {e}")
+    
+    async def _wait_for_other_worker(self, key: str, stale_ttl: Optional[int], allow_pickle: bool) -> Any:
+        """Poll for the value another worker is computing under its lock."""
+        deadline = time.monotonic() + self.LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.LOCK_POLL_INTERVAL)
+            value = await self.get(key, allow_pickle=allow_pickle)
+            if stale_ttl and self._is_swr(value):
+                if time.time() < value[1]:
+                    return value[2]
+            elif value is not None:
+                return value
+        return _MISSING
+    
+    def cached(
+        self,
+        ttl: int = 300,
+        key_prefix: str = "",
+        stale_ttl: Optional[int] = None,
+        lock: bool = False
+    ):
+        """Decorator for caching function results (async functions get get_or_set semantics)."""
         def decorator(func: Callable) -> Callable:
             @wraps(func)
             async def async_wrapper(*args, **kwargs):
@@ -168,13 +752,13 @@ class CacheManager:
                     **kwargs
                 )
                 
-                cached_value = await self.get(cache_key)
-                if cached_value is not None:
-                    return cached_value
-                
-                result = await func(*args, **kwargs)
-                await self.set(cache_key, result, ttl)
-                return result
+                return await self.get_or_set(
+                    cache_key,
+                    lambda: func(*args, **kwargs),
+                    ttl,
+                    stale_ttl=stale_ttl,
+                    lock=lock
+                )
             
             @wraps(func)
             def sync_wrapper(*args, **kwargs):
@@ -182,11 +766,12 @@ class CacheManager:
                 cache_key = f"{key_prefix or func.__name__}:{str(args)}"
                 
                 # Check local cache only for sync
-                if cache_key in self.local_cache:
-                    return self.local_cache[cache_key]
+                cached_value = self.local.get(cache_key, _MISSING)
+                if cached_value is not _MISSING:
+                    return cached_value
                 
                 result = func(*args, **kwargs)
-                asyncio.create_task(self.set(cache_key, result, ttl))
+                self.local.set(cache_key, result, ttl)
                 return result
             
             return async_wrapper if asyncio.iscoroutinefunction(func) else sync_wrapper
@@ -195,28 +780,37 @@ class CacheManager:
     async def increment(self, key: str, amount: int = 1) -> int:
         """Atomic increment operation."""
         if self._connected:
-            return await self.redis_client.incrby(key, amount)
+            value = await self.redis_client.incrby(key, amount)
+            await self._publish_invalidation(keys=[key])
+            self._invalidate_local([key])
+            return value
         
-        # Local implementation (not atomic)
-        async with self._lock:
-            current = self.local_cache.get(key, 0)
-            self.local_cache[key] = current + amount
-            return current + amount
+        return self.local.increment(key, amount)
     
     async def expire(self, key: str, seconds: int) -> bool:
         """Set expiration on key."""
         if self._connected:
             return await self.redis_client.expire(key, seconds)
         
-        async with self._lock:
-            if key in self.local_cache:
-                self.local_ttl[key] = asyncio.get_event_loop().time() + seconds
-                return True
-        return False
+        return self.local.expire(key, seconds)
+    
+    def local_stats(self) -> dict:
+        """Entry/byte usage, hit, eviction and expiry counts of the local tier."""
+        return self.local.stats()
+    
+    def debug_stats(self, limit: int = 20, by: str = "accesses") -> dict:
+        """Local tier usage plus the busiest or largest keys seen by this worker."""
+        return {
+            "connected": self._connected,
+            "l1_live": self._use_l1(),
+            "local": self.local_stats(),
+            "top_keys": self.key_usage.top(limit, by),
+        }
 
 
 # Global cache instance
 cache = CacheManager()
+_export_local_size(cache.local)
 
 
 # Specific cache helpers for trading data
@@ -224,8 +818,29 @@ class MarketDataCache:
     """Specialized cache for market data."""
     
     TICK_TTL = 1  # 1 second for ticks
-    CANDLE_TTL = 60  # 1 minute for candles
+    CANDLE_TTL = 86400  # candle series expire a day after their last append
+    CANDLE_MAX_BARS = 5000  # per (symbol, timeframe); callers slice the tail
     ANALYSIS_TTL = 300  # 5 minutes for analysis
+    ANALYSIS_STALE_TTL = 120  # served while a refresh runs
+    
+    # compact, pickle-free payloads per namespace; NumPy arrays always use
+    # the raw ndarray codec so reads are zero-copy
+    CODECS = {
+        "tick": codecs.MSGPACK,
+        "analysis": codecs.MSGPACK,
+    }
+    
+    @staticmethod
+    def _codec(namespace: str, data: Any) -> str:
+        if isinstance(data, np.ndarray):
+            return codecs.NDARRAY
+        return MarketDataCache.CODECS[namespace]
+    
+    @staticmethod
+    def _tags(symbol: str) -> list:
+        # candle/analysis keys vary by timeframe and limit; ticks have a
+        # single key per symbol and are deleted directly
+        return [f"symbol:{symbol}"]
     
     @staticmethod
     async def get_tick(symbol: str) -> Optional[dict]:
@@ -237,19 +852,54 @@ class MarketDataCache:
     async def set_tick(symbol: str, data: dict):
         """Cache tick data."""
         key = f"tick:{symbol}"
-        await cache.set(key, data, ttl=MarketDataCache.TICK_TTL)
+        await cache.set(key, data, ttl=MarketDataCache.TICK_TTL, codec=MarketDataCache._codec("tick", data))
     
     @staticmethod
-    async def get_candles(symbol: str, timeframe: str, limit: int = 100) -> Optional[list]:
-        """Get cached candles."""
-        key = f"candles:{symbol}:{timeframe}:{limit}"
-        return await cache.get(key)
+    async def get_ticks(symbols: Iterable[str]) -> Dict[str, Optional[dict]]:
+        """Cached ticks for several symbols in one round trip."""
+        symbols = list(symbols)
+        values = await cache.get_many(f"tick:{symbol}" for symbol in symbols)
+        return {symbol: values[f"tick:{symbol}"] for symbol in symbols}
+    
+    @staticmethod
+    async def set_ticks(ticks: Dict[str, dict]):
+        """Cache ticks for several symbols in one round trip."""
+        await cache.set_many(
+            {f"tick:{symbol}": data for symbol, data in ticks.items()},
+            ttl=MarketDataCache.TICK_TTL,
+            codec=MarketDataCache.CODECS["tick"]
+        )
     
     @staticmethod
-    async def set_candles(symbol: str, timeframe: str, data: list, limit: int = 100):
-        """Cache candle data."""
-        key = f"candles:{symbol}:{timeframe}:{limit}"
-        await cache.set(key, data, ttl=MarketDataCache.CANDLE_TTL)
+    async def get_candles(symbol: str, timeframe: str, limit: int = 100) -> Optional[np.ndarray]:
+        """Last `limit` cached candles as a CANDLE_DTYPE array (oldest first)."""
+        key = f"candles:{symbol}:{timeframe}"
+        return await cache.get_series_tail(key, CANDLE_DTYPE, limit)
+    
+    @staticmethod
+    async def append_candles(symbol: str, timeframe: str, bars: Union[list, np.ndarray]) -> int:
+        """Append new bars (or update the forming one) to the canonical series."""
+        key = f"candles:{symbol}:{timeframe}"
+        return await cache.append_series(
+            key,
+            to_candle_array(bars),
+            max_len=MarketDataCache.CANDLE_MAX_BARS,
+            ttl=MarketDataCache.CANDLE_TTL,
+            tags=MarketDataCache._tags(symbol)
+        )
+    
+    @staticmethod
+    async def set_candles(symbol: str, timeframe: str, bars: Union[list, np.ndarray]) -> int:
+        """Replace the canonical series (e.g. after a history reload)."""
+        key = f"candles:{symbol}:{timeframe}"
+        return await cache.append_series(
+            key,
+            to_candle_array(bars),
+            max_len=MarketDataCache.CANDLE_MAX_BARS,
+            ttl=MarketDataCache.CANDLE_TTL,
+            replace=True,
+            tags=MarketDataCache._tags(symbol)
+        )
     
     @staticmethod
     async def get_analysis(symbol: str, timeframe: str) -> Optional[dict]:
@@ -257,18 +907,44 @@ class MarketDataCache:
         key = f"analysis:{symbol}:{timeframe}"
         return await cache.get(key)
     
+    @staticmethod
+    async def get_analyses(symbols: Iterable[str], timeframe: str) -> Dict[str, Optional[dict]]:
+        """Cached analysis for several symbols in one round trip."""
+        symbols = list(symbols)
+        values = await cache.get_many(f"analysis:{symbol}:{timeframe}" for symbol in symbols)
+        return {symbol: values[f"analysis:{symbol}:{timeframe}"] for symbol in symbols}
+    
     @staticmethod
     async def set_analysis(symbol: str, timeframe: str, data: dict):
         """Cache analysis results."""
         key = f"analysis:{symbol}:{timeframe}"
-        await cache.set(key, data, ttl=MarketDataCache.ANALYSIS_TTL)
+        await cache.set(
+            key,
+            data,
+            ttl=MarketDataCache.ANALYSIS_TTL,
+            codec=MarketDataCache._codec("analysis", data),
+            tags=MarketDataCache._tags(symbol)
+        )
+    
+    @staticmethod
+    async def get_or_compute_analysis(symbol: str, timeframe: str, factory: Callable) -> Optional[dict]:
+        """Cached analysis, computed once across concurrent callers and workers."""
+        key = f"analysis:{symbol}:{timeframe}:swr"
+        return await cache.get_or_set(
+            key,
+            factory,
+            ttl=MarketDataCache.ANALYSIS_TTL,
+            stale_ttl=MarketDataCache.ANALYSIS_STALE_TTL,
+            lock=True,
+            codec=MarketDataCache.CODECS["analysis"],
+            tags=MarketDataCache._tags(symbol)
+        )
     
     @staticmethod
     async def invalidate_symbol(symbol: str):
         """Invalidate all cache for symbol."""
-        patterns = [f"tick:{symbol}*", f"candles:{symbol}*", f"analysis:{symbol}*"]
-        for pattern in patterns:
-            await cache.clear_pattern(pattern)
+        await cache.delete(f"tick:{symbol}")
+        await cache.invalidate_tags(*MarketDataCache._tags(symbol))
 
 
 class UserCache:
@@ -304,6 +980,5 @@ class UserCache:
     @staticmethod
     async def invalidate_user(user_id: int):
         """Invalidate all user cache."""
-        patterns = [f"session:{user_id}*", f"profile:{user_id}*"]
-        for pattern in patterns:
-            await cache.clear_pattern(pattern)
+        # one key per namespace, no pattern needed (session:1* also matched user 10)
+        await cache.delete_many([f"session:{user_id}", f"profile:{user_id}"])
@@ -0,0 +1,152 @@
+"""
+Revolution X - Cache Codecs
+Compact, self-describing serialization for cached values.
+
+Every payload starts with a one-byte tag naming its codec, so readers never
+need to know which codec a writer picked:
+
+- msgpack: dicts/lists of plain values; NumPy arrays nested inside travel
+  as ndarray ext payloads, naive datetimes as ISO strings in an ext type
+- orjson: JSON-compatible payloads (NumPy arrays become lists)
+- ndarray: raw little-endian buffer behind a small header; decoding is
+  zero-copy via np.frombuffer (the result is read-only)
+- pickle: arbitrary Python objects; payloads have no tag, pickle's own
+  0x80 protocol marker identifies them. Unpickling runs code chosen by
+  whoever wrote the key, so pickle is never a default: writers name it and
+  readers pass allow_pickle=True, otherwise decode() rejects the payload
+"""
+import json
+import pickle
+import struct
+import threading
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Optional
+
+import msgpack
+import numpy as np
+import orjson
+
+PICKLE = "pickle"
+MSGPACK = "msgpack"
+ORJSON = "orjson"
+NDARRAY = "ndarray"
+
+_TAG_MSGPACK = 0x01
+_TAG_ORJSON = 0x02
+_TAG_NDARRAY = 0x03
+_TAG_PICKLE = 0x80   # first byte of pickle protocol >= 2
+
+# msgpack ext type codes
+_EXT_NDARRAY = 1
+_EXT_DATETIME = 2
+
+# tag + header length, header is padded so array data starts 16-byte aligned
+_ARRAY_PREFIX = struct.Struct("<BI")
+_ARRAY_ALIGN = 16
+
+
+# ---------------------------------------------------------------- ndarray
+
+@lru_cache(maxsize=256)
+def _array_header(dtype: np.dtype, shape: tuple) -> bytes:
+    header = json.dumps({"descr": np.lib.format.dtype_to_descr(dtype), "shape": shape}).encode()
+    header += b" " * (-(_ARRAY_PREFIX.size + len(header)) % _ARRAY_ALIGN)
+    return _ARRAY_PREFIX.pack(_TAG_NDARRAY, len(header)) + header
+
+
+@lru_cache(maxsize=256)
+def _parse_array_header(header: bytes) -> tuple:
+    parsed = json.loads(header)
+    shape = tuple(parsed["shape"])
+    return np.lib.format.descr_to_dtype(parsed["descr"]), shape, int(np.prod(shape))
+
+
+def encode_array(array: np.ndarray) -> bytes:
+    """Header (dtype descr + shape) followed by the raw little-endian buffer"""
+    array = np.asarray(array)
+    if array.dtype.hasobject:
+        raise ValueError("Object arrays cannot be encoded as raw buffers")
+    shape = array.shape
+    array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+    return b"".join((_array_header(array.dtype, shape), array.reshape(-1).view(np.uint8)))
+
+
+def decode_array(data: bytes) -> np.ndarray:
+    """View over `data` without copying"""
+    _, header_size = _ARRAY_PREFIX.unpack_from(data)
+    offset = _ARRAY_PREFIX.size + header_size
+    dtype, shape, count = _parse_array_header(bytes(data[_ARRAY_PREFIX.size:offset]))
+    return np.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+
+# ---------------------------------------------------------------- msgpack
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return msgpack.ExtType(_EXT_NDARRAY, encode_array(value))
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, datetime):
+        return msgpack.ExtType(_EXT_DATETIME, value.isoformat().encode())
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Cannot msgpack {type(value).__name__}")
+
+
+def _msgpack_ext_hook(code: int, data: bytes) -> Any:
+    if code == _EXT_NDARRAY:
+        return decode_array(data)
+    if code == _EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+_local = threading.local()
+
+
+def _packer() -> msgpack.Packer:
+    # building a Packer costs more than packing a tick, so reuse one per thread
+    packer = getattr(_local, "packer", None)
+    if packer is None:
+        packer = _local.packer = msgpack.Packer(default=_msgpack_default, use_bin_type=True, datetime=False)
+    return packer
+
+
+# ---------------------------------------------------------------- API
+
+def encode(value: Any, codec: Optional[str] = None) -> bytes:
+    """Serialize with the named codec (default: msgpack)"""
+    codec = codec or MSGPACK
+    if codec == MSGPACK:
+        return bytes((_TAG_MSGPACK,)) + _packer().pack(value)
+    if codec == ORJSON:
+        return bytes((_TAG_ORJSON,)) + orjson.dumps(
+            value, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+    if codec == NDARRAY:
+        return encode_array(value)
+    if codec == PICKLE:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    raise ValueError(f"Unknown codec {codec!r}, expected one of {CODECS}")
+
+
+def decode(data: bytes, allow_pickle: bool = False) -> Any:
+    """Deserialize a payload produced by encode(); pickle only with allow_pickle"""
+    tag = data[0]
+    if tag == _TAG_MSGPACK:
+        return msgpack.unpackb(
+            memoryview(data)[1:], ext_hook=_msgpack_ext_hook, raw=False, strict_map_key=False
+        )
+    if tag == _TAG_ORJSON:
+        return orjson.loads(memoryview(data)[1:])
+    if tag == _TAG_NDARRAY:
+        return decode_array(data)
+    if tag == _TAG_PICKLE:
+        if not allow_pickle:
+            raise ValueError("Refusing to unpickle a cache payload without allow_pickle=True")
+        return pickle.loads(data)
+    raise ValueError(f"Unknown cache payload tag 0x{tag:02x}")
+
+
+CODECS = (PICKLE, MSGPACK, ORJSON, NDARRAY)
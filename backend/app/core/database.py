@@ -1,27 +1,10 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from app.core.config import settings
-
-# إنشاء محرك قاعدة البيانات
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    pool_size=10,
-    max_overflow=20,
-)
-
-# إنشاء SessionLocal
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# إنشاء Base
-Base = declarative_base()
-
-# دالة للحصول على DB session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+"""
+Compatibility layer for code that imports the database from app.core.
+There is no engine here any more: everything shares the async pool of
+app.database.connection.
+"""
+from app.database.connection import AsyncSessionLocal, Base, session_scope
+
+# async sessions; `async with get_db() as db:` keeps working for existing callers
+SessionLocal = AsyncSessionLocal
+get_db = session_scope
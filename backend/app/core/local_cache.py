@@ -0,0 +1,352 @@
+"""
+Revolution X - Bounded in-process cache tier
+LRU + TTL cache behind CacheManager: a short-lived L1 in front of Redis while
+its invalidation channel is up, the only cache tier when Redis is unavailable.
+
+- every namespace (key prefix before the first ":") gets its own slice of the
+  entry and byte budget, so a burst of ticks can only evict other ticks and
+  never user sessions
+- least recently used entries are evicted once a namespace is over budget
+- expiry is driven by a hashed timer wheel: a sweeper advances the wheel once
+  per tick, so expired keys are dropped even if nobody reads them again
+"""
+import asyncio
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from app.core.logging import logger
+
+DEFAULT_NAMESPACE = "default"
+
+# share of the global entry/byte budget per namespace; unknown prefixes
+# share the DEFAULT_NAMESPACE slice
+DEFAULT_QUOTAS = {
+    "tick": 0.10,
+    "candles": 0.25,
+    "analysis": 0.15,
+    "session": 0.20,
+    "profile": 0.10,
+    DEFAULT_NAMESPACE: 0.20,
+}
+
+EVICTED = "evicted"
+EXPIRED = "expired"
+
+RemovalListener = Callable[[str, str], None]
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory cost of a value (pickled length)"""
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "size", "slot", "tags")
+
+    def __init__(self, value: Any, expires_at: Optional[float], size: int, tags: tuple = ()):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+        self.slot: Optional[int] = None
+        self.tags = tags
+
+
+class _Segment:
+    """LRU map for one namespace with its own budget and counters"""
+
+    def __init__(self, name: str, max_entries: int, max_bytes: int):
+        self.name = name
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def over_budget(self) -> bool:
+        return len(self.entries) > self.max_entries or self.bytes > self.max_bytes
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class LocalCache:
+    """
+    Usage:
+        local = LocalCache(max_entries=10_000, max_bytes=64 * 1024 * 1024)
+        local.set("tick:XAUUSD", tick, ttl=1)
+        local.get("tick:XAUUSD")
+        local.start()         # background expiry sweeper (needs a running loop)
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        max_bytes: int = 64 * 1024 * 1024,
+        quotas: Optional[Dict[str, float]] = None,
+        resolution: float = 1.0,
+        wheel_slots: int = 512,
+        listener: Optional[RemovalListener] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        quotas = dict(quotas or DEFAULT_QUOTAS)
+        quotas.setdefault(DEFAULT_NAMESPACE, max(0.0, 1.0 - sum(quotas.values())) or 0.1)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.segments = {
+            name: _Segment(name, int(max_entries * share), int(max_bytes * share))
+            for name, share in quotas.items()
+        }
+
+        self.resolution = resolution
+        self._wheel = [set() for _ in range(wheel_slots)]
+        self._clock = clock
+        self._tick = self._tick_of(clock())
+        self._listener = listener
+        self._lock = threading.RLock()
+        self._sweeper: Optional[asyncio.Task] = None
+        self._tags: Dict[str, set] = {}
+
+    # ---------------------------------------------------------------- keys
+
+    def namespace(self, key: str) -> str:
+        """Segment a key belongs to: its prefix if that has a quota, else the default"""
+        namespace = key.split(":", 1)[0] if ":" in key else DEFAULT_NAMESPACE
+        return namespace if namespace in self.segments else DEFAULT_NAMESPACE
+
+    def _segment(self, key: str) -> _Segment:
+        return self.segments[self.namespace(key)]
+
+    def _tick_of(self, timestamp: float) -> int:
+        return int(timestamp / self.resolution)
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return entry.expires_at is not None and now >= entry.expires_at
+
+    def _schedule(self, key: str, entry: _Entry):
+        if entry.expires_at is None:
+            return
+        # the slot is processed only once the whole tick has elapsed
+        tick = max(self._tick_of(entry.expires_at) + 1, self._tick + 1)
+        entry.slot = tick % len(self._wheel)
+        self._wheel[entry.slot].add(key)
+
+    def _remove(self, segment: _Segment, key: str, reason: Optional[str] = None) -> _Entry:
+        entry = segment.entries.pop(key)
+        segment.bytes -= entry.size
+        if entry.slot is not None:
+            self._wheel[entry.slot].discard(key)
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+        if reason == EVICTED:
+            segment.evictions += 1
+        elif reason == EXPIRED:
+            segment.expirations += 1
+        if reason and self._listener:
+            self._listener(segment.name, reason)
+        return entry
+
+    # ---------------------------------------------------------------- API
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            segment = self._segment(key)
+            entry = segment.entries.get(key)
+            if entry is None:
+                segment.misses += 1
+                return default
+            if self._expired(entry, self._clock()):
+                self._remove(segment, key, EXPIRED)
+                segment.misses += 1
+                return default
+            segment.entries.move_to_end(key)
+            segment.hits += 1
+            return entry.value
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[float] = None,
+        size: Optional[int] = None,
+        nx: bool = False,
+        tags: Sequence[str] = ()
+    ) -> bool:
+        """Store a value; ttl=None never expires (the budget still applies)"""
+        size = estimate_size(value) if size is None else size
+        with self._lock:
+            now = self._clock()
+            self._advance(now)
+            segment = self._segment(key)
+
+            existing = segment.entries.get(key)
+            if existing is not None:
+                if nx and not self._expired(existing, now):
+                    return False
+                self._remove(segment, key)
+
+            if size > segment.max_bytes:
+                # would flush the whole namespace for a single value
+                logger.warning(f"Local cache: {key} ({size} bytes) exceeds the {segment.name} budget")
+                return False
+
+            entry = _Entry(value, now + ttl if ttl is not None else None, size, tuple(tags))
+            segment.entries[key] = entry
+            segment.bytes += size
+            self._schedule(key, entry)
+            for tag in entry.tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+            while segment.over_budget():
+                self._remove(segment, next(iter(segment.entries)), EVICTED)
+            return True
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            segment = self._segment(key)
+            if key not in segment.entries:
+                return False
+            self._remove(segment, key)
+            return True
+
+    def clear_pattern(self, pattern: str) -> int:
+        """Delete keys matching a Redis-style glob pattern"""
+        with self._lock:
+            removed = 0
+            for segment in self.segments.values():
+                for key in [k for k in segment.entries if fnmatchcase(k, pattern)]:
+                    self._remove(segment, key)
+                    removed += 1
+            return removed
+
+    def invalidate_tags(self, tags: Sequence[str]) -> int:
+        """Delete every key stored with any of the tags"""
+        with self._lock:
+            keys = set().union(*(self._tags.get(tag, ()) for tag in tags))
+            for key in keys:
+                self._remove(self._segment(key), key)
+            return len(keys)
+
+    def clear(self) -> int:
+        with self._lock:
+            removed = len(self)
+            for segment in self.segments.values():
+                segment.entries.clear()
+                segment.bytes = 0
+            for slot in self._wheel:
+                slot.clear()
+            self._tags.clear()
+            return removed
+
+    def increment(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            segment = self._segment(key)
+            entry = segment.entries.get(key)
+            now = self._clock()
+            if entry is None or self._expired(entry, now):
+                self.set(key, amount)
+                return amount
+            entry.value += amount
+            segment.entries.move_to_end(key)
+            return entry.value
+
+    def expire(self, key: str, seconds: float) -> bool:
+        with self._lock:
+            segment = self._segment(key)
+            entry = segment.entries.get(key)
+            now = self._clock()
+            if entry is None or self._expired(entry, now):
+                return False
+            if entry.slot is not None:
+                self._wheel[entry.slot].discard(key)
+            entry.expires_at = now + seconds
+            self._schedule(key, entry)
+            return True
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            entry = self._segment(key).entries.get(key)
+            return entry is not None and not self._expired(entry, self._clock())
+
+    def __len__(self) -> int:
+        return sum(len(segment.entries) for segment in self.segments.values())
+
+    # ---------------------------------------------------------------- expiry
+
+    def _advance(self, now: float) -> int:
+        now_tick = self._tick_of(now)
+        if now_tick <= self._tick:
+            return 0
+
+        expired = 0
+        steps = min(now_tick - self._tick, len(self._wheel))
+        for tick in range(self._tick + 1, self._tick + 1 + steps):
+            for key in list(self._wheel[tick % len(self._wheel)]):
+                segment = self._segment(key)
+                # entries further out than one wheel rotation stay for a later pass
+                if self._expired(segment.entries[key], now):
+                    self._remove(segment, key, EXPIRED)
+                    expired += 1
+        self._tick = now_tick
+        return expired
+
+    def sweep(self) -> int:
+        """Drop every entry whose TTL has elapsed, returns how many"""
+        with self._lock:
+            return self._advance(self._clock())
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.resolution)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Local cache sweep error: {e}")
+
+    def start(self):
+        """Start the background sweeper on the running loop"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        if self._sweeper:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    # ---------------------------------------------------------------- stats
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            namespaces = {name: segment.stats() for name, segment in self.segments.items()}
+        totals = {
+            field: sum(s[field] for s in namespaces.values())
+            for field in ("entries", "bytes", "hits", "misses", "evictions", "expirations")
+        }
+        return {**totals, "max_entries": self.max_entries, "max_bytes": self.max_bytes, "namespaces": namespaces}
@@ -268,6 +268,7 @@ class PerformanceLogger:
 
 
 # Global instances
+logger = logging.getLogger("revolution_x")
 audit_logger = AuditLogger()
 performance_logger = PerformanceLogger()
 
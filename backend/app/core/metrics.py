@@ -69,12 +69,14 @@ active_connections = Gauge(
 db_connections_active = Gauge(
     "db_connections_active",
     "Active database connections",
+    ["pool"],
     registry=registry
 )
 
 db_connections_idle = Gauge(
     "db_connections_idle",
     "Idle database connections",
+    ["pool"],
     registry=registry
 )
 
@@ -86,6 +88,20 @@ db_query_duration_seconds = Histogram(
     registry=registry
 )
 
+db_query_rows_total = Counter(
+    "db_query_rows_total",
+    "Rows returned or affected by database queries",
+    ["query_type"],
+    registry=registry
+)
+
+db_pool_checkout_seconds = Histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting for a pooled database connection",
+    buckets=[0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0],
+    registry=registry
+)
+
 # Trading metrics
 trades_executed_total = Counter(
     "trades_executed_total",
@@ -205,6 +221,64 @@ websocket_messages_total = Counter(
     registry=registry
 )
 
+# Cache metrics
+cache_local_removals_total = Counter(
+    "cache_local_removals_total",
+    "Entries dropped from the in-process cache tier",
+    ["namespace", "reason"],
+    registry=registry
+)
+
+cache_hits_total = Counter(
+    "cache_hits_total",
+    "Cache reads that found a value",
+    ["namespace", "tier"],
+    registry=registry
+)
+
+cache_misses_total = Counter(
+    "cache_misses_total",
+    "Cache reads that found nothing",
+    ["namespace"],
+    registry=registry
+)
+
+cache_stale_hits_total = Counter(
+    "cache_stale_hits_total",
+    "Stale values served while a refresh runs (subset of hits)",
+    ["namespace"],
+    registry=registry
+)
+
+cache_sets_total = Counter(
+    "cache_sets_total",
+    "Cache writes",
+    ["namespace"],
+    registry=registry
+)
+
+cache_redis_latency_seconds = Histogram(
+    "cache_redis_latency_seconds",
+    "Redis round-trip time of cache operations",
+    ["operation"],
+    buckets=[0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25],
+    registry=registry
+)
+
+cache_local_bytes = Gauge(
+    "cache_local_bytes",
+    "Approximate memory held by the in-process cache tier",
+    ["namespace"],
+    registry=registry
+)
+
+cache_local_entries = Gauge(
+    "cache_local_entries",
+    "Entries held by the in-process cache tier",
+    ["namespace"],
+    registry=registry
+)
+
 
 class MetricsMiddleware:
     """Middleware to collect HTTP metrics."""
@@ -0,0 +1,64 @@
+"""
+Keyset (cursor) pagination
+Pages walk an index in descending order of a unique column tuple, e.g.
+(created_at, id), and each page starts strictly after the last row of the
+previous one: WHERE (created_at, id) < (:created_at, :id). Unlike OFFSET,
+nothing before the page is scanned, so page 1000 costs what page 1 does.
+
+Cursors are opaque url-safe strings carrying the last row's key values.
+
+Usage:
+    query = keyset(select(Notification).where(...), [Notification.created_at, Notification.id], cursor, limit)
+    rows = (await db.execute(query)).scalars().all()
+    items, next_cursor = page(rows, [Notification.created_at, Notification.id], limit)
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> List[Any]:
+    """Cursor -> key values typed like `columns`; ValueError if it is not one of ours"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"invalid cursor: {e}") from None
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("invalid cursor: wrong number of values")
+
+    typed = []
+    for column, value in zip(columns, values):
+        python_type = column.type.python_type
+        if value is not None and python_type in (datetime, date):
+            value = python_type.fromisoformat(value)
+        elif value is not None and not isinstance(value, python_type):
+            value = python_type(value)
+        typed.append(value)
+    return typed
+
+
+def keyset(query, columns: Sequence, cursor: Optional[str], limit: int):
+    """Order `query` by `columns` descending and fetch the page after `cursor` (one extra row)"""
+    if cursor:
+        query = query.where(tuple_(*columns) < tuple_(*decode_cursor(cursor, columns)))
+    return query.order_by(*(column.desc() for column in columns)).limit(limit + 1)
+
+
+def page(rows: Sequence, columns: Sequence, limit: int) -> Tuple[List, Optional[str]]:
+    """Rows fetched by keyset() -> (the page, cursor of the next page or None on the last one)"""
+    items = list(rows[:limit])
+    if len(rows) <= limit:
+        return items, None
+    last = items[-1]
+    return items, encode_cursor([getattr(last, column.key) for column in columns])
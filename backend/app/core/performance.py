@@ -3,59 +3,94 @@ Revolution X - Performance Optimization
 Database query optimization, connection pooling, and async operations
 """
 import asyncio
+import re
 import time
 from contextlib import asynccontextmanager
-from typing import Optional, List, Any, Callable
+from typing import Optional, List, Any, Awaitable, Callable
 from functools import wraps
 import threading
+import weakref
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool, QueuePool
-import asyncpg
+import numpy as np
+from sqlalchemy import Table, event, insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 
 from app.core.config import settings
 from app.core.logging import logger
-from app.db.base import Base
+from app.core.metrics import (
+    db_connections_active,
+    db_connections_idle,
+    db_pool_checkout_seconds,
+    db_query_duration_seconds,
+    db_query_rows_total,
+)
+
+
+_SQL_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_SQL_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_SQL_PARAMS = re.compile(r"\$\d+|%\(\w+\)s|%s|(?<!:):\w+|\?")
+_SQL_CASTS = re.compile(r"\?::\w+(?:\[\])*")
+_SQL_NUMBERS = re.compile(r"(?<![\w$.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.I)
+_SQL_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SQL_ROWS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SQL_SPACES = re.compile(r"\s+")
+
+QUERY_TYPES = ("select", "insert", "update", "delete")
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Statement with literals, bind parameters and value lists replaced, so
+    every execution of the same query shape maps to one key:
+    
+        SELECT * FROM users WHERE id = $1 AND email IN ('a', 'b')
+        -> SELECT * FROM users WHERE id = ? AND email IN (...)
+    """
+    sql = _SQL_COMMENTS.sub(" ", statement)
+    sql = _SQL_STRINGS.sub("?", sql)
+    sql = _SQL_PARAMS.sub("?", sql)
+    sql = _SQL_CASTS.sub("?", sql)
+    sql = _SQL_NUMBERS.sub("?", sql)
+    sql = _SQL_SPACES.sub(" ", sql).strip()
+    sql = _SQL_LISTS.sub("(...)", sql)
+    return _SQL_ROWS.sub("(...)", sql)
+
+
+def query_type(statement: str) -> str:
+    """select / insert / update / delete / other, a bounded label for Prometheus"""
+    word = statement.lstrip(" (\n\t").split(None, 1)[0].lower() if statement.strip() else ""
+    if word == "with":
+        return "select"
+    return word if word in QUERY_TYPES else "other"
 
 
 class DatabaseOptimizer:
-    """Database performance optimization."""
+    """
+    Database performance optimization.
+    
+    instrument(engine) hooks cursor execution and pool checkouts: each
+    statement is recorded under its fingerprint (count, time, rows), timed
+    into db_query_duration_seconds by query type, and SELECTs slower than
+    settings.DB_SLOW_QUERY_SECONDS get their EXPLAIN plan captured on a
+    separate connection (at most once per DB_EXPLAIN_INTERVAL per
+    fingerprint).
+    """
     
-    def __init__(self):
+    def __init__(self, max_fingerprints: int = 2000):
         self.engine = None
         self.async_session_maker = None
         self._query_stats = {}
         self._stats_lock = threading.Lock()
+        self.max_fingerprints = max_fingerprints
+        self._instrumented = weakref.WeakSet()
+        self._explaining = set()
+        self._pool_wait = {"count": 0, "total_time": 0.0, "max_time": 0.0}
     
     def create_optimized_engine(self):
-        """Create optimized async database engine."""
-        self.engine = create_async_engine(
-            settings.ASYNC_DATABASE_URL,
-            echo=settings.DB_ECHO,
-            poolclass=QueuePool,
-            pool_size=20,
-            max_overflow=30,
-            pool_pre_ping=True,
-            pool_recycle=3600,
-            pool_timeout=30,
-            connect_args={
-                "command_timeout": 60,
-                "server_settings": {
-                    "jit": "off",  # Disable JIT for short queries
-                    "application_name": "revolution_x"
-                }
-            }
-        )
-        
-        self.async_session_maker = sessionmaker(
-            self.engine,
-            class_=AsyncSession,
-            expire_on_commit=False,
-            autoflush=False
-        )
-        
-        logger.info("✅ Optimized database engine created")
+        """The process-wide engine from app.database.connection (one pool per process)."""
+        from app.database.connection import AsyncSessionLocal, engine
+        self.engine = engine
+        self.async_session_maker = AsyncSessionLocal
         return self.engine
     
     @asynccontextmanager
@@ -71,22 +106,28 @@ class DatabaseOptimizer:
             finally:
                 await session.close()
     
-    def log_query_time(self, query_name: str, duration: float):
+    def log_query_time(self, query_name: str, duration: float, rows: int = 0):
         """Log query execution time for monitoring."""
         with self._stats_lock:
             if query_name not in self._query_stats:
-                self._query_stats[query_name] = {
+                if len(self._query_stats) >= self.max_fingerprints:
+                    # unbounded query shapes (e.g. generated SQL) share one bucket
+                    query_name = "<other>"
+                self._query_stats.setdefault(query_name, {
                     "count": 0,
                     "total_time": 0,
                     "avg_time": 0,
-                    "max_time": 0
-                }
+                    "max_time": 0,
+                    "rows": 0,
+                    "plan": None
+                })
             
             stats = self._query_stats[query_name]
             stats["count"] += 1
             stats["total_time"] += duration
             stats["avg_time"] = stats["total_time"] / stats["count"]
             stats["max_time"] = max(stats["max_time"], duration)
+            stats["rows"] += max(rows, 0)
             
             # Alert on slow queries
             if duration > 1.0:  # 1 second threshold
@@ -100,11 +141,131 @@ class DatabaseOptimizer:
                     "query": name,
                     "avg_time": stats["avg_time"],
                     "max_time": stats["max_time"],
-                    "count": stats["count"]
+                    "count": stats["count"],
+                    "rows": stats["rows"],
+                    "plan": stats["plan"]
                 }
                 for name, stats in self._query_stats.items()
                 if stats["avg_time"] > threshold
             ]
+    
+    def query_report(self, limit: int = 20, sort: str = "total_time") -> dict:
+        """Top fingerprints by total_time, avg_time, max_time, count or rows, plus pool wait."""
+        with self._stats_lock:
+            queries = sorted(
+                ({"query": name, **stats} for name, stats in self._query_stats.items()),
+                key=lambda q: q[sort],
+                reverse=True
+            )[:limit]
+            pool_wait = dict(self._pool_wait)
+        pool_wait["avg_time"] = pool_wait["total_time"] / pool_wait["count"] if pool_wait["count"] else 0.0
+        return {"fingerprints": len(self._query_stats), "queries": queries, "pool_checkout": pool_wait}
+    
+    def reset_query_stats(self):
+        with self._stats_lock:
+            self._query_stats.clear()
+            self._pool_wait = {"count": 0, "total_time": 0.0, "max_time": 0.0}
+    
+    # ---------------------------------------------------------------- instrumentation
+    
+    def instrument(self, engine):
+        """Record every statement and pool checkout of an (async or sync) engine."""
+        sync_engine = getattr(engine, "sync_engine", engine)
+        if sync_engine in self._instrumented:
+            return engine
+        self._instrumented.add(sync_engine)
+        
+        event.listen(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(sync_engine, "handle_error", self._handle_error)
+        self._time_checkouts(sync_engine.pool)
+        return engine
+    
+    def _time_checkouts(self, pool):
+        # there is no "checkout requested" event, so the pool's own getter is timed
+        do_get = pool._do_get
+        
+        def timed_do_get():
+            started = time.perf_counter()
+            try:
+                return do_get()
+            finally:
+                self.record_pool_wait(time.perf_counter() - started)
+        
+        pool._do_get = timed_do_get
+    
+    def record_pool_wait(self, duration: float):
+        db_pool_checkout_seconds.observe(duration)
+        with self._stats_lock:
+            self._pool_wait["count"] += 1
+            self._pool_wait["total_time"] += duration
+            self._pool_wait["max_time"] = max(self._pool_wait["max_time"], duration)
+    
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+    
+    @staticmethod
+    def _handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+    
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        duration = time.perf_counter() - started
+        if statement.lstrip()[:7].upper() == "EXPLAIN":
+            return
+        
+        kind = query_type(statement)
+        rows = getattr(cursor, "rowcount", -1)
+        key = fingerprint(statement)
+        self.log_query_time(key, duration, rows)
+        db_query_duration_seconds.labels(query_type=kind).observe(duration)
+        if rows > 0:
+            db_query_rows_total.labels(query_type=kind).inc(rows)
+        
+        if kind == "select" and not executemany and duration >= settings.DB_SLOW_QUERY_SECONDS:
+            self._schedule_explain(conn.engine, key, statement, parameters)
+    
+    def _schedule_explain(self, sync_engine, key: str, statement: str, parameters):
+        stats = self._query_stats.get(key)
+        if stats is None or key in self._explaining:
+            return
+        plan = stats["plan"]
+        if plan and time.time() - plan["captured_at"] < settings.DB_EXPLAIN_INTERVAL:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # sync engine outside the event loop
+        self._explaining.add(key)
+        loop.create_task(self._explain(sync_engine, key, statement, parameters))
+    
+    @staticmethod
+    def _explain_blocking(sync_engine, statement: str, parameters):
+        with sync_engine.connect() as conn:
+            return conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+    
+    async def _explain(self, sync_engine, key: str, statement: str, parameters):
+        """EXPLAIN on its own connection, so a failure can't abort the caller's transaction."""
+        try:
+            if sync_engine.dialect.is_async:
+                async with AsyncEngine(sync_engine).connect() as conn:
+                    result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+                    plan = result.scalar()
+            else:
+                # a blocking driver (the legacy psycopg2 pool): run it in a thread, off the loop
+                plan = await asyncio.get_running_loop().run_in_executor(
+                    None, self._explain_blocking, sync_engine, statement, parameters
+                )
+            with self._stats_lock:
+                if key in self._query_stats:
+                    self._query_stats[key]["plan"] = {"captured_at": time.time(), "plan": plan}
+        except Exception as e:
+            logger.warning(f"EXPLAIN failed for {key[:200]}: {e}")
+        finally:
+            self._explaining.discard(key)
 
 
 class QueryOptimizer:
@@ -130,9 +291,8 @@ class QueryOptimizer:
             "CREATE INDEX IF NOT EXISTS idx_positions_symbol ON positions(symbol)",
             "CREATE INDEX IF NOT EXISTS idx_positions_status ON positions(status)",
             
-            # Market data
-            "CREATE INDEX IF NOT EXISTS idx_candles_symbol_timeframe ON candles(symbol, timeframe, timestamp)",
-            "CREATE INDEX IF NOT EXISTS idx_candles_timestamp ON candles(timestamp)",
+            # Market data: candles_m1 partitions are covered by their
+            # (symbol, time) primary key, see app.marketdata.candle_store
             
             # AI predictions
             "CREATE INDEX IF NOT EXISTS idx_predictions_symbol ON predictions(symbol)",
@@ -155,18 +315,40 @@ class QueryOptimizer:
 
 
 class AsyncBatchProcessor:
-    """Batch processing for high-throughput operations."""
+    """
+    Batch processing for high-throughput operations.
+    
+    Items are handed to _process_batch() batch_size at a time, as soon as
+    that many are waiting or every flush_interval seconds. A failing batch
+    is retried with exponential backoff, then put back for the next flush;
+    items still failing after max_attempts flushes are dropped. At most
+    max_buffer items are held, the oldest are dropped beyond that.
+    """
     
-    def __init__(self, batch_size: int = 100, flush_interval: float = 1.0):
+    def __init__(
+        self,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_buffer: int = 10_000,
+        max_retries: int = 3,
+        retry_delay: float = 0.1,
+        max_attempts: int = 3
+    ):
         self.batch_size = batch_size
         self.flush_interval = flush_interval
-        self._buffer = []
+        self.max_buffer = max_buffer
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self._buffer: List[list] = []  # [item, future or None, failed flushes]
         self._lock = asyncio.Lock()
         self._flush_task = None
+        self.dropped = 0
     
     async def start(self):
         """Start background flush task."""
-        self._flush_task = asyncio.create_task(self._periodic_flush())
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._periodic_flush())
     
     async def stop(self):
         """Stop and flush remaining items."""
@@ -176,16 +358,44 @@ class AsyncBatchProcessor:
                 await self._flush_task
             except asyncio.CancelledError:
                 pass
+            self._flush_task = None
         
-        await self.flush()
+        # failing items are dropped after max_attempts, so this ends
+        while self._buffer:
+            await self.flush()
     
-    async def add(self, item: Any):
-        """Add item to batch."""
+    async def add(self, item: Any, wait: bool = False) -> Any:
+        """
+        Add item to batch.
+        
+        With wait=True, returns once the item's batch was processed (with
+        _process_batch's result for it) and raises if it was dropped.
+        """
+        future = asyncio.get_running_loop().create_future() if wait else None
         async with self._lock:
-            self._buffer.append(item)
-            
-            if len(self._buffer) >= self.batch_size:
-                await self.flush()
+            self._buffer.append([item, future, 0])
+            self._trim()
+            full = len(self._buffer) >= self.batch_size
+        
+        if self._flush_task is None:
+            await self.start()
+        if full:
+            await self.flush()
+        if future is not None:
+            return await future
+    
+    def _trim(self):
+        overflow = len(self._buffer) - self.max_buffer
+        if overflow > 0:
+            dropped, self._buffer = self._buffer[:overflow], self._buffer[overflow:]
+            self._drop(dropped, BufferError(f"batch buffer full ({self.max_buffer} items)"))
+    
+    def _drop(self, entries: List[list], error: Exception):
+        self.dropped += len(entries)
+        logger.error(f"{type(self).__name__}: dropped {len(entries)} items: {error}")
+        for _, future, _ in entries:
+            if future is not None and not future.done():
+                future.set_exception(error)
     
     async def flush(self):
         """Flush buffer to database."""
@@ -193,57 +403,225 @@ class AsyncBatchProcessor:
             if not self._buffer:
                 return
             
-            batch = self._buffer[:]
+            entries = self._buffer
             self._buffer = []
         
-        # Process batch
-        try:
-            await self._process_batch(batch)
-        except Exception as e:
-            logger.error(f"Batch processing error: {e}")
+        for i in range(0, len(entries), self.batch_size):
+            await self._process_entries(entries[i:i + self.batch_size])
+    
+    async def _process_entries(self, entries: List[list]):
+        items = [entry[0] for entry in entries]
+        for attempt in range(self.max_retries + 1):
+            try:
+                results = await self._process_batch(items)
+                break
+            except Exception as e:
+                error = e
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.retry_delay * 2 ** attempt)
+        else:
+            logger.error(f"Batch processing error: {error}")
+            for entry in entries:
+                entry[2] += 1
+            self._drop([entry for entry in entries if entry[2] >= self.max_attempts], error)
             # Re-add to buffer for retry
             async with self._lock:
-                self._buffer = batch + self._buffer
+                self._buffer = [entry for entry in entries if entry[2] < self.max_attempts] + self._buffer
+                self._trim()
+            return
+        
+        if not isinstance(results, list) or len(results) != len(entries):
+            results = [None] * len(entries)
+        for (_, future, _), result in zip(entries, results):
+            if future is not None and not future.done():
+                future.set_result(result)
     
     async def _periodic_flush(self):
         """Periodic flush based on time."""
         while True:
             await asyncio.sleep(self.flush_interval)
-            await self.flush()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Periodic flush error: {e}")
     
     async def _process_batch(self, batch: List[Any]):
         """Override this method to process batch."""
         raise NotImplementedError
 
 
+_batch_writers: List["BulkInsertWriter"] = []
+
+
+class BulkInsertWriter(AsyncBatchProcessor):
+    """
+    Buffered inserts into one table, one transaction per batch.
+    
+    Rows are dicts keyed by column key (all rows of a writer share the same
+    keys). Batches go out as multi-row INSERTs (SQLAlchemy's insertmanyvalues)
+    or, with copy=True, through asyncpg's binary COPY; COPY skips SQL
+    expressions, so Python-side column defaults are filled in here and
+    server-side ones are left to the database.
+    
+    after_insert(session, batch), if given, runs in the batch's transaction,
+    for bookkeeping that must commit (or roll back) with the rows.
+    
+    Usage:
+        writer = BulkInsertWriter(Notification.__table__)
+        await writer.add(row)               # stored within flush_interval
+        await writer.add(row, wait=True)    # returns once committed
+        await stop_batch_writers()          # on shutdown
+    """
+    
+    def __init__(
+        self,
+        table: Table,
+        session_factory: Optional[Callable] = None,
+        copy: bool = False,
+        after_insert: Optional[Callable[[AsyncSession, List[dict]], Awaitable[None]]] = None,
+        **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.table = table
+        self.copy = copy
+        self.after_insert = after_insert
+        self._session_factory = session_factory
+        self.rows_written = 0
+        _batch_writers.append(self)
+    
+    def _sessions(self) -> Callable:
+        # app.database.connection imports this module, so its default is looked up on first use
+        if self._session_factory is None:
+            from app.database.connection import AsyncSessionLocal
+            self._session_factory = AsyncSessionLocal
+        return self._session_factory
+    
+    async def _process_batch(self, batch: List[dict]):
+        async with self._sessions()() as session:
+            async with session.begin():
+                if self.copy:
+                    await self._copy(session, batch)
+                else:
+                    await session.execute(insert(self.table), batch)
+                if self.after_insert is not None:
+                    await self.after_insert(session, batch)
+        self.rows_written += len(batch)
+    
+    async def _copy(self, session: AsyncSession, batch: List[dict]):
+        connection = await session.connection()
+        dialect = connection.dialect
+        columns = [
+            column for column in self.table.columns
+            if column.key in batch[0]
+            or (column.default is not None and (column.default.is_scalar or column.default.is_callable))
+        ]
+        
+        fillers = []
+        for column in columns:
+            default = column.default
+            processor = column.type.bind_processor(dialect)
+            fillers.append((column.key, default, processor))
+        
+        records = []
+        for row in batch:
+            record = []
+            for key, default, processor in fillers:
+                if key in row:
+                    value = row[key]
+                elif default.is_callable:
+                    value = default.arg(None)
+                else:
+                    value = default.arg
+                record.append(processor(value) if processor else value)
+            records.append(tuple(record))
+        
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            self.table.name,
+            records=records,
+            columns=[column.name for column in columns],
+            schema_name=self.table.schema
+        )
+
+
+async def stop_batch_writers():
+    """Flush and stop every BulkInsertWriter (application shutdown)."""
+    for writer in _batch_writers:
+        try:
+            await writer.stop()
+        except Exception as e:
+            logger.error(f"Batch writer shutdown error ({writer.table.name}): {e}")
+
+
 class ConnectionPoolMonitor:
-    """Monitor database connection pool health."""
+    """
+    Monitor database connection pool health.
     
-    def __init__(self, engine):
-        self.engine = engine
-        self._check_interval = 30
+    Watches every engine registered by app.database.connection.create_engine
+    (the primary and, if configured, the read replica), exports checked-out
+    and idle connections per pool and warns when one is close to exhaustion.
+    """
+    
+    def __init__(self, engines: Optional[dict] = None, interval: float = 30):
+        if engines is not None and not isinstance(engines, dict):
+            engines = {"primary": engines}
+        self._engines = engines
+        self._check_interval = interval
+        self._task: Optional[asyncio.Task] = None
+    
+    @property
+    def engines(self) -> dict:
+        if self._engines is None:
+            from app.database.connection import engines
+            return engines
+        return self._engines
     
     async def start_monitoring(self):
         """Start pool monitoring."""
         while True:
-            await self._check_pool_health()
+            try:
+                await self._check_pool_health()
+            except Exception as e:
+                logger.error(f"Connection pool check failed: {e}")
             await asyncio.sleep(self._check_interval)
     
-    async def _check_pool_health(self):
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.start_monitoring())
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _check_pool_health(self) -> dict:
         """Check connection pool statistics."""
-        pool = self.engine.pool
-        stats = {
-            "size": pool.size(),
-            "checked_in": pool.checkedin(),
-            "checked_out": pool.checkedout(),
-            "overflow": pool.overflow()
-        }
-        
-        # Alert if pool is exhausted
-        if stats["checked_out"] / stats["size"] > 0.8:
-            logger.warning(f"⚠️ Connection pool near exhaustion: {stats}")
+        report = {}
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            if not hasattr(pool, "checkedout"):
+                continue  # NullPool / StaticPool keep nothing to watch
+            stats = {
+                "size": pool.size(),
+                "max_overflow": getattr(pool, "_max_overflow", 0),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow()
+            }
+            db_connections_active.labels(pool=name).set(stats["checked_out"])
+            db_connections_idle.labels(pool=name).set(stats["checked_in"])
+            
+            # Alert if pool is exhausted
+            capacity = stats["size"] + max(stats["max_overflow"], 0)
+            if capacity and stats["checked_out"] / capacity > 0.8:
+                logger.warning(f"⚠️ Connection pool {name} near exhaustion: {stats}")
+            report[name] = stats
         
-        return stats
+        return report
 
 
 def measure_time(func: Callable) -> Callable:
@@ -4,6 +4,7 @@ Trading Engine - Main execution logic
 Combines all strategies and risk management
 """
 
+from dataclasses import dataclass, asdict
 from typing import Optional, List, Dict
 from datetime import datetime
 import asyncio
@@ -16,8 +17,40 @@ from app.core.risk_manager import RiskManager
 from app.core.position_sizer import PositionSizer
 from app.mt5.connector import mt5_connector
 
+BULLISH_PATTERNS = ("engulfing_bullish", "morning_star", "hammer")
+BEARISH_PATTERNS = ("engulfing_bearish", "evening_star", "shooting_star")
+
+
+@dataclass
+class SignalParams:
+    """Tunable scoring weights, thresholds and lookbacks for _generate_signal"""
+    
+    # Score weights
+    ob_weight: float = 30
+    value_area_weight: float = 20
+    trend_weight: float = 20
+    pattern_weight: float = 15
+    
+    # |score| needed for BUY/SELL and STRONG_BUY/STRONG_SELL
+    entry_threshold: float = 40
+    strong_threshold: float = 60
+    
+    # SMC lookbacks
+    ob_lookback: int = 50
+    swing_lookback: int = 20
+    
+    # Stop / target placement
+    sl_buffer: float = 5.0          # beyond the order block
+    fallback_sl_pct: float = 0.005  # when there is no order block
+    reward_risk: float = 2.0
+    
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
 class TradingEngine:
-    def __init__(self):
+    def __init__(self, params: Optional[SignalParams] = None):
+        self.params = params or SignalParams()
         self.smc = None
         self.volume_profile = None
         self.price_action = None
@@ -28,9 +61,15 @@ class TradingEngine:
         self.is_running = False
         self.current_signal = None
         
-    async def analyze_market(self, data: List[dict], symbol: str = "XAUUSD") -> Dict:
+    async def analyze_market(
+        self,
+        data: List[dict],
+        symbol: str = "XAUUSD",
+        as_of: Optional[datetime] = None
+    ) -> Dict:
         """
         Run full market analysis
+        as_of: evaluate kill zones at this time instead of now (backtests)
         """
         # Initialize analyzers
         self.smc = SMCAnalyzer(data)
@@ -38,10 +77,13 @@ class TradingEngine:
         self.price_action = PriceActionAnalyzer(data)
         
         # Run all analyses
-        smc_result = self.smc.analyze()
+        smc_result = self.smc.analyze(
+            ob_lookback=self.params.ob_lookback,
+            swing_lookback=self.params.swing_lookback
+        )
         vp_result = self.volume_profile.calculate()
         pa_result = self.price_action.analyze()
-        kz_result = self.kill_zones.should_trade()
+        kz_result = self.kill_zones.should_trade(as_of)
         
         # Combine signals
         signal = self._generate_signal(
@@ -77,6 +119,8 @@ class TradingEngine:
                 "details": kz.get("reasons", [])
             }
         
+        params = self.params
+        
         # Score components
         score = 0
         reasons = []
@@ -88,10 +132,10 @@ class TradingEngine:
                       if ob.type.value == "bearish" and ob.strength in ["strong", "very_strong"]]
         
         if bullish_obs:
-            score += 30
+            score += params.ob_weight
             reasons.append(f"Strong bullish OB at {bullish_obs[0].low:.2f}")
         if bearish_obs:
-            score -= 30
+            score -= params.ob_weight
             reasons.append(f"Strong bearish OB at {bearish_obs[0].high:.2f}")
         
         # Volume Profile Score
@@ -100,19 +144,19 @@ class TradingEngine:
                 self.smc.data[-1]['close'] if self.smc.data else 0
             )
             if price_position == "below_value_area":
-                score += 20
+                score += params.value_area_weight
                 reasons.append("Price below value area (potential long)")
             elif price_position == "above_value_area":
-                score -= 20
+                score -= params.value_area_weight
                 reasons.append("Price above value area (potential short)")
         
         # Price Action Score
         trend = pa.get("trend", {})
         if trend.get("direction") == "bullish":
-            score += 20
+            score += params.trend_weight
             reasons.append("Bullish trend")
         elif trend.get("direction") == "bearish":
-            score -= 20
+            score -= params.trend_weight
             reasons.append("Bearish trend")
         
         # Patterns
@@ -120,21 +164,21 @@ class TradingEngine:
         recent_patterns = patterns[-3:] if len(patterns) > 3 else patterns
         
         for pattern in recent_patterns:
-            if pattern.type.value in ["engulfing_bullish", "morning_star", "hammer"]:
-                score += 15
+            if pattern.type.value in BULLISH_PATTERNS:
+                score += params.pattern_weight
                 reasons.append(f"Bullish pattern: {pattern.type.value}")
-            elif pattern.type.value in ["engulfing_bearish", "evening_star", "shooting_star"]:
-                score -= 15
+            elif pattern.type.value in BEARISH_PATTERNS:
+                score -= params.pattern_weight
                 reasons.append(f"Bearish pattern: {pattern.type.value}")
         
         # Determine action
-        if score >= 60:
+        if score >= params.strong_threshold:
             action = "STRONG_BUY"
-        elif score >= 40:
+        elif score >= params.entry_threshold:
             action = "BUY"
-        elif score <= -60:
+        elif score <= -params.strong_threshold:
             action = "STRONG_SELL"
-        elif score <= -40:
+        elif score <= -params.entry_threshold:
             action = "SELL"
         else:
             action = "NEUTRAL"
@@ -164,16 +208,16 @@ class TradingEngine:
             bullish_obs = [ob for ob in smc.get("order_blocks", []) 
                           if ob.type.value == "bullish"]
             if bullish_obs:
-                return min(ob.low for ob in bullish_obs) - 5  # 5 pips buffer
+                return min(ob.low for ob in bullish_obs) - self.params.sl_buffer
             else:
-                return current_price * 0.995  # 0.5% stop
+                return current_price * (1 - self.params.fallback_sl_pct)
         else:
             bearish_obs = [ob for ob in smc.get("order_blocks", []) 
                           if ob.type.value == "bearish"]
             if bearish_obs:
-                return max(ob.high for ob in bearish_obs) + 5
+                return max(ob.high for ob in bearish_obs) + self.params.sl_buffer
             else:
-                return current_price * 1.005
+                return current_price * (1 + self.params.fallback_sl_pct)
         
         return None
     
@@ -188,13 +232,13 @@ class TradingEngine:
         if sl is None:
             return None
         
-        # R:R = 1:2
+        # R:R = 1:reward_risk
         risk = abs(current_price - sl)
         
         if "BUY" in action:
-            return current_price + (risk * 2)
+            return current_price + (risk * self.params.reward_risk)
         else:
-            return current_price - (risk * 2)
+            return current_price - (risk * self.params.reward_risk)
     
     async def execute_trade(
         self,
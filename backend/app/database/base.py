@@ -1,2 +0,0 @@
-from sqlalchemy.orm import declarative_base
-Base = declarative_base()
\ No newline at end of file
@@ -1,33 +1,139 @@
 # backend/app/database/connection.py
+"""
+Database engines
+One async engine (and pool) per process for the primary, plus one for the
+read replica when DATABASE_REPLICA_URL is set; every session in the app
+comes from here.
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
+- get_db / get_read_db: FastAPI dependencies
+- session_scope(read_only=...): `async with` sessions for services and tasks,
+  and the default session source of every service that takes one
+- legacy code written against a sync Session runs through
+  `await session.run_sync(fn)`, on the async pool without blocking the loop
+- sync_session(): for the few legacy objects that keep a sync Session for
+  their lifetime (the guardian's analyzer/tester/fixer in main.py); a small
+  psycopg2 pool, created on first use
+"""
 
-# ? ????? ???? settings
-from app.config import settings  # ??? ???? wrapper ??? app.core.config
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from sqlalchemy import create_engine as create_sync_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+
+from app.config import settings
+from app.core.performance import db_optimizer
 
-# Base ???? ??? ???????
 Base = declarative_base()
 
-# Async Engine
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=getattr(settings, "DEBUG", False),
-    future=True,
+# name -> engine, watched by ConnectionPoolMonitor
+engines: Dict[str, AsyncEngine] = {}
+_sync_sessions: Optional[sessionmaker] = None
+
+
+def create_engine(url: str, name: str = "primary", **overrides) -> AsyncEngine:
+    """Async engine sized from settings, instrumented and registered under name"""
+    options = dict(
+        echo=getattr(settings, "DEBUG", False),
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+    if url.startswith("postgresql+asyncpg"):
+        options["connect_args"] = {
+            "command_timeout": settings.DB_COMMAND_TIMEOUT,
+            "server_settings": {
+                "jit": "off",  # planning overhead outweighs JIT for short OLTP queries
+                "application_name": f"revolution_x:{name}",
+            },
+        }
+    options.update(overrides)
+
+    engine = create_async_engine(url, **options)
+    db_optimizer.instrument(engine)
+    engines[name] = engine
+    return engine
+
+
+engine = create_engine(settings.DATABASE_URL)
+replica_engine = (
+    create_engine(settings.DATABASE_REPLICA_URL, name="replica")
+    if settings.DATABASE_REPLICA_URL else engine
 )
 
-# Async Session factory
 AsyncSessionLocal = sessionmaker(
     bind=engine,
     class_=AsyncSession,
     expire_on_commit=False,
 )
 
-async def get_db():
+# read-only work: reports, listings, history; the primary if no replica is configured
+ReadSessionLocal = sessionmaker(
+    bind=replica_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
     async with AsyncSessionLocal() as session:
         yield session
 
+
+async def get_read_db() -> AsyncIterator[AsyncSession]:
+    async with ReadSessionLocal() as session:
+        yield session
+
+
+@asynccontextmanager
+async def session_scope(read_only: bool = False) -> AsyncIterator[AsyncSession]:
+    """Session that commits on success and rolls back on error (read-only ones never commit)"""
+    async with (ReadSessionLocal if read_only else AsyncSessionLocal)() as session:
+        if read_only:
+            yield session
+            return
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+
+
+def sync_session() -> Session:
+    """Blocking Session on the primary; only for legacy code that cannot take an AsyncSession"""
+    global _sync_sessions
+    if _sync_sessions is None:
+        legacy = create_sync_engine(
+            settings.DATABASE_URL.replace("+asyncpg", "+psycopg2"),
+            pool_size=2,
+            max_overflow=0,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+        db_optimizer.instrument(legacy)
+        engines["legacy_sync"] = legacy
+        _sync_sessions = sessionmaker(bind=legacy, expire_on_commit=False)
+    return _sync_sessions()
+
+
 async def init_db():
-    # ????? ??????? ?? ?? ??? ?????? (???? ???????)
+    # every mapped module, so create_all sees all of their tables
+    from app.guardian import models as guardian_models  # noqa: F401
+    from app.models import (  # noqa: F401
+        alert, notification, pnl_rollup, signal_subscription, telegram_user, trade, trading_stats, user
+    )
+
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def dispose_engines():
+    for pooled in engines.values():
+        if isinstance(pooled, AsyncEngine):
+            await pooled.dispose()
+        else:
+            pooled.dispose()
@@ -3,7 +3,7 @@ AI Code Guardian - الحارس الذكي
 نظام مراقبة وتحسين الكود تلقائياً
 """
 
-from .monitor import PerformanceMonitor
+from .monitor import PerformanceMonitor, performance_monitor
 from .analyzer import CodeAnalyzer
 from .fixer import AutoFixer
 from .tester import SafeTester
@@ -13,6 +13,7 @@ from .llm_interface import LLMInterface
 
 __all__ = [
     "PerformanceMonitor",
+    "performance_monitor",
     "CodeAnalyzer", 
     "AutoFixer",
     "SafeTester",
@@ -188,19 +188,18 @@ class KnowledgeBase:
     def get_performance_trends(self) -> Dict[str, Any]:
         """
         تحليل اتجاهات الأداء
+        من ملخصات pnl_daily (صف لكل يوم) دون تجميع جدول الصفقات
         """
-        # جلب آخر 30 يوم
-        month_ago = datetime.utcnow() - timedelta(days=30)
+        from app.services.pnl_rollups import pnl_rollups
         
-        metrics = self.db.query(PerformanceMetricDB).filter(
-            PerformanceMetricDB.timestamp >= month_ago
-        ).order_by(PerformanceMetricDB.timestamp).all()
+        # آخر 30 يوم
+        days = self.db.execute(pnl_rollups.trend_query(days=30)).all()
+        win_rates = [day.wins / day.trades for day in days if day.trades]
         
-        if len(metrics) < 7:
+        if len(win_rates) < 7:
             return {"trend": "insufficient_data"}
             
         # حساب الاتجاه
-        win_rates = [m.win_rate for m in metrics]
         trend = "improving" if win_rates[-1] > win_rates[0] else "declining"
         
         # التنبيه المبكر
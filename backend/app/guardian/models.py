@@ -6,10 +6,9 @@ from datetime import datetime
 from enum import Enum
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
-from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Boolean, Text, Enum as SQLEnum
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Boolean, Text, Index, Enum as SQLEnum
 
-Base = declarative_base()
+from app.database.connection import Base
 
 class AlertSeverity(str, Enum):
     LOW = "low"
@@ -70,6 +69,8 @@ class AlertDB(Base):
 
 class CodeChangeDB(Base):
     __tablename__ = "guardian_changes"
+    # صفحات السجل: keyset على (created_at, id)
+    __table_args__ = (Index("ix_guardian_changes_created", "created_at", "id"),)
     
     id = Column(Integer, primary_key=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -89,13 +90,18 @@ class CodeChangeDB(Base):
 
 class KnowledgePatternDB(Base):
     __tablename__ = "guardian_knowledge"
+    # صفحات الأنماط: keyset على (success_rate, id)، مع النوع أو بدونه
+    __table_args__ = (
+        Index("ix_guardian_knowledge_rate", "success_rate", "id"),
+        Index("ix_guardian_knowledge_type_rate", "pattern_type", "success_rate", "id"),
+    )
     
     id = Column(Integer, primary_key=True)
     pattern_type = Column(String(100))
     description = Column(Text)
     symptoms = Column(JSON)
     solution = Column(Text)
-    success_rate = Column(Float, default=0.0)
+    success_rate = Column(Float, nullable=False, default=0.0, server_default="0")  # NULL يُسقط الصف من صفحات keyset
     usage_count = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
     last_used = Column(DateTime, nullable=True)
@@ -108,7 +114,7 @@ class PerformanceMetric(BaseModel):
     sharpe_ratio: float
     max_drawdown: float = Field(..., le=0)
     expectancy: float
-    latency_ms: float = Field(..., ge=0)
+    latency_ms: Optional[float] = Field(None, ge=0)  # None: not measured
     total_trades: int = Field(..., ge=0)
     successful_trades: int = Field(..., ge=0)
     
@@ -1,16 +1,25 @@
 """
 Performance Monitor - مراقب الأداء
 مراقبة مستمرة لمؤشرات الأداء الرئيسية (KPIs)
+
+- التنبيهات المفتوحة محفوظة في الذاكرة حسب اسم المؤشر، تُحمَّل باستعلام واحد
+  (ويُعاد تحميلها كل index_refresh ثانية لالتقاط ما حُلّ من عمليات أخرى)
+- كل دورة فحص تكتب صف المقاييس وتنبيهاتها الجديدة وتحديثاتها في معاملة واحدة:
+  عدد الاستعلامات ثابت مهما كان عدد المؤشرات، والفهرس لا يتغير إلا بعد نجاح الـ commit
 """
 
 import asyncio
 import statistics
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 from typing import List, Dict, Optional, Callable
 from collections import deque
 import logging
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+
+from app.database.connection import session_scope
+
 from .models import (
     PerformanceMetric, Alert, AlertSeverity, 
     PerformanceMetricDB, AlertDB
@@ -33,14 +42,17 @@ class PerformanceMonitor:
         'latency_ms': {'max': 100, 'target': 50}
     }
     
-    def __init__(self, db_session: Session, check_interval: int = 300):
+    def __init__(self, session_scope: Callable = session_scope, check_interval: int = 300,
+                 index_refresh: int = 3600):
         """
         Args:
-            db_session: جلسة قاعدة البيانات
+            session_scope: مصدر الجلسات غير المتزامنة
             check_interval: الفاصل الزمني للفحص بالثواني (افتراضي 5 دقائق)
+            index_refresh: كل كم ثانية يُعاد تحميل فهرس التنبيهات المفتوحة
         """
-        self.db = db_session
+        self._session = session_scope
         self.check_interval = check_interval
+        self.index_refresh = index_refresh
         self.is_running = False
         self._task: Optional[asyncio.Task] = None
         
@@ -57,6 +69,14 @@ class PerformanceMonitor:
         # قائمة المستمعين للتنبيهات
         self._alert_handlers: List[Callable] = []
         
+        # آخر مقياس، والمقياس الذي لم يُكتب بعد (يُكتب مع تنبيهات الدورة)
+        self._latest_metric: Optional[PerformanceMetric] = None
+        self._unsaved_metric: Optional[PerformanceMetric] = None
+        
+        # التنبيهات غير المحلولة: metric_name -> Alert
+        self._open_alerts: Dict[str, Alert] = {}
+        self._index_loaded_at: Optional[float] = None
+        
     def register_alert_handler(self, handler: Callable):
         """تسجيل دالة معالجة للتنبيهات"""
         self._alert_handlers.append(handler)
@@ -80,6 +100,7 @@ class PerformanceMonitor:
                 await self._task
             except asyncio.CancelledError:
                 pass
+            self._task = None
         logger.info("🛑 تم إيقاف مراقب الأداء")
         
     async def _monitoring_loop(self):
@@ -93,57 +114,46 @@ class PerformanceMonitor:
                 logger.error(f"خطأ في حلقة المراقبة: {e}")
                 await asyncio.sleep(60)  # انتظر دقيقة قبل إعادة المحاولة
                 
-    async def collect_metrics(self) -> PerformanceMetric:
+    async def collect_metrics(self) -> Optional[PerformanceMetric]:
         """
         جمع المقاييس من أنظمة التداول
-        في الإنتاج، هذا يجب أن يقرأ من قاعدة بيانات التداول
+        (None قبل إغلاق أول صفقة)
         """
-        # TODO: استبدل هذا بالاستعلام الفعلي من نظام التداول
         metrics = await self._fetch_trading_metrics()
+        if metrics is None:
+            return None
         
         # حفظ في التاريخ
         for key, value in metrics.dict().items():
             if key in self._metrics_history and isinstance(value, (int, float)):
                 self._metrics_history[key].append(value)
                 
-        # حفظ في قاعدة البيانات
-        db_metric = PerformanceMetricDB(**metrics.dict())
-        self.db.add(db_metric)
-        self.db.commit()
+        # يُكتب في قاعدة البيانات ضمن معاملة detect_anomalies
+        self._latest_metric = metrics
+        self._unsaved_metric = metrics
         
         logger.debug(f"📊 تم جمع المقاييس: Win Rate={metrics.win_rate:.2%}")
         return metrics
         
-    async def _fetch_trading_metrics(self) -> PerformanceMetric:
+    async def _fetch_trading_metrics(self) -> Optional[PerformanceMetric]:
         """
-        جلب المقاييس من نظام التداول الفعلي
+        جلب المقاييس من محرك الإحصاءات التراكمي (دون مسح جدول الصفقات)
+        (بلا latency_ms: لا يوجد قياس لزمن التنفيذ، فلا يُفحص حدّه)
         """
-        # TODO: ربط هذا بنظام التداول الحقيقي
-        # مثال مؤقت:
-        return PerformanceMetric(
-            win_rate=0.58,
-            profit_factor=1.8,
-            sharpe_ratio=1.2,
-            max_drawdown=-0.12,
-            expectancy=0.015,
-            latency_ms=45,
-            total_trades=150,
-            successful_trades=87
-        )
+        from app.services.trading_stats import trading_stats
+        return await trading_stats.performance_metric()
         
     async def detect_anomalies(self) -> List[Alert]:
         """
         اكتشاف الانحرافات عن المعدلات الطبيعية
         """
-        alerts = []
+        candidates = []
         
-        # جلب آخر مقياس
-        latest = self.db.query(PerformanceMetricDB).order_by(
-            PerformanceMetricDB.timestamp.desc()
-        ).first()
+        # آخر مقياس جمعناه، أو آخر صف في قاعدة البيانات بعد إعادة التشغيل
+        latest = self._latest_metric or await self.get_current_metrics()
         
         if not latest:
-            return alerts
+            return []
             
         # فحص كل مؤشر
         for metric_name, thresholds in self.THRESHOLDS.items():
@@ -153,26 +163,25 @@ class PerformanceMonitor:
                 
             # فحص الحدود المطلقة
             if 'min' in thresholds and current_value < thresholds['min']:
-                deviation = (thresholds['min'] - current_value) / thresholds['min']
-                alert = await self._create_alert(
+                # expectancy حدها الأدنى صفر: يُقاس الانحراف نسبةً إلى الهدف
+                deviation = (thresholds['min'] - current_value) / (abs(thresholds['min']) or abs(thresholds['target']))
+                candidates.append(dict(
                     metric_name=metric_name,
                     current_value=current_value,
                     threshold_value=thresholds['min'],
                     severity=self._calculate_severity(deviation),
                     message=f"انخفاض {metric_name}: {current_value:.3f} (الحد الأدنى: {thresholds['min']})"
-                )
-                alerts.append(alert)
+                ))
                 
             if 'max' in thresholds and current_value > thresholds['max']:
                 deviation = (current_value - thresholds['max']) / abs(thresholds['max'])
-                alert = await self._create_alert(
+                candidates.append(dict(
                     metric_name=metric_name,
                     current_value=current_value,
                     threshold_value=thresholds['max'],
                     severity=self._calculate_severity(deviation),
                     message=f"ارتفاع {metric_name}: {current_value:.3f} (الحد الأقصى: {thresholds['max']})"
-                )
-                alerts.append(alert)
+                ))
                 
             # فحص الانحراف عن المتوسط المتحرك (10%)
             if len(self._metrics_history[metric_name]) >= 20:
@@ -180,15 +189,16 @@ class PerformanceMonitor:
                 if moving_avg != 0:
                     deviation_pct = abs(current_value - moving_avg) / abs(moving_avg)
                     if deviation_pct > 0.10:
-                        alert = await self._create_alert(
+                        candidates.append(dict(
                             metric_name=f"{metric_name}_deviation",
                             current_value=current_value,
                             threshold_value=moving_avg,
                             severity=AlertSeverity.MEDIUM if deviation_pct < 0.20 else AlertSeverity.HIGH,
                             message=f"انحراف كبير في {metric_name}: {deviation_pct:.1%} عن المتوسط"
-                        )
-                        alerts.append(alert)
+                        ))
                         
+        alerts = await self._apply_alerts(candidates)
+        
         # إرسال التنبيهات للمستمعين
         for alert in alerts:
             await self._notify_handlers(alert)
@@ -205,40 +215,78 @@ class PerformanceMonitor:
             return AlertSeverity.MEDIUM
         return AlertSeverity.LOW
         
-    async def _create_alert(
-        self, 
-        metric_name: str, 
-        current_value: float,
-        threshold_value: float,
-        severity: AlertSeverity,
-        message: str
-    ) -> Alert:
-        """إنشاء تنبيه جديد"""
-        # التحقق من عدم التكرار
-        existing = self.db.query(AlertDB).filter(
-            AlertDB.metric_name == metric_name,
-            AlertDB.is_resolved == False
-        ).first()
+    async def _load_open_alerts(self, session):
+        """تحميل التنبيهات غير المحلولة إلى الفهرس (استعلام واحد)"""
+        rows = (await session.execute(
+            select(AlertDB).where(AlertDB.is_resolved == False).order_by(AlertDB.timestamp)
+        )).scalars().all()
+        # الأحدث يفوز إن وُجد أكثر من تنبيه مفتوح لنفس المؤشر
+        self._open_alerts = {row.metric_name: Alert.from_orm(row) for row in rows}
+        self._index_loaded_at = time.monotonic()
+        
+    def _index_stale(self) -> bool:
+        return self._index_loaded_at is None or time.monotonic() - self._index_loaded_at > self.index_refresh
         
-        if existing:
-            # تحديث القيمة الحالية
-            existing.current_value = current_value
-            self.db.commit()
-            return Alert.from_orm(existing)
+    async def _apply_alerts(self, candidates: List[dict]) -> List[Alert]:
+        """
+        صف المقاييس غير المكتوب + التنبيهات الجديدة + تحديث القائمة منها في معاملة واحدة
+        (تنبيه واحد مفتوح لكل مؤشر، كما في السابق)؛ الفهرس يُحدَّث بعد الـ commit فقط،
+        فالتراجع يتركه مطابقاً لقاعدة البيانات
+        """
+        metric = self._unsaved_metric
+        if not candidates and metric is None:
+            return []
             
-        db_alert = AlertDB(
-            severity=severity,
-            metric_name=metric_name,
-            current_value=current_value,
-            threshold_value=threshold_value,
-            message=message
-        )
-        self.db.add(db_alert)
-        self.db.commit()
-        self.db.refresh(db_alert)
+        results: List = []   # (Alert, قيمة جديدة أو None) للموجود، AlertDB للجديد
+        changed: List[tuple] = []
+        new_rows: List = []
         
-        logger.warning(f"🚨 تنبيه جديد [{severity.value}]: {message}")
-        return Alert.from_orm(db_alert)
+        async with self._session() as session:
+            if self._index_stale():
+                await self._load_open_alerts(session)
+                
+            for candidate in candidates:
+                existing = self._open_alerts.get(candidate['metric_name'])
+                if existing:
+                    # تحديث القيمة الحالية فقط
+                    value = candidate['current_value']
+                    if existing.current_value != value:
+                        changed.append((existing, value))
+                        results.append((existing, value))
+                    else:
+                        results.append((existing, None))
+                else:
+                    row = AlertDB(**candidate)
+                    new_rows.append(row)
+                    results.append(row)
+                    
+            if changed:
+                # UPDATE واحد بمفتاح أساسي لكل الصفوف (executemany)
+                await session.execute(
+                    update(AlertDB),
+                    [{'id': alert.id, 'current_value': value} for alert, value in changed]
+                )
+            if metric is not None:
+                new_rows.insert(0, PerformanceMetricDB(**metric.dict()))
+            if new_rows:
+                session.add_all(new_rows)
+                await session.flush()
+                
+        # تم الـ commit
+        if self._unsaved_metric is metric:
+            self._unsaved_metric = None
+        alerts = []
+        for result in results:
+            if isinstance(result, AlertDB):
+                result = Alert.from_orm(result)
+                self._open_alerts[result.metric_name] = result
+                logger.warning(f"🚨 تنبيه جديد [{result.severity.value}]: {result.message}")
+            else:
+                result, value = result
+                if value is not None:
+                    result.current_value = value
+            alerts.append(result)
+        return alerts
         
     async def _notify_handlers(self, alert: Alert):
         """إشعار جميع المعالجين المسجلين"""
@@ -255,25 +303,38 @@ class PerformanceMonitor:
         """إرسال تنبيه يدوي"""
         await self._notify_handlers(alert)
         
-    def get_current_metrics(self) -> Optional[PerformanceMetric]:
+    async def get_current_metrics(self) -> Optional[PerformanceMetric]:
         """الحصول على آخر مقاييس"""
-        latest = self.db.query(PerformanceMetricDB).order_by(
-            PerformanceMetricDB.timestamp.desc()
-        ).first()
+        if self._latest_metric:
+            return self._latest_metric
+        async with self._session(read_only=True) as session:
+            latest = (await session.execute(
+                select(PerformanceMetricDB).order_by(PerformanceMetricDB.timestamp.desc()).limit(1)
+            )).scalars().first()
         return PerformanceMetric.from_orm(latest) if latest else None
         
-    def get_active_alerts(self) -> List[Alert]:
+    async def get_active_alerts(self) -> List[Alert]:
         """الحصول على التنبيهات النشطة"""
-        alerts = self.db.query(AlertDB).filter(
-            AlertDB.is_resolved == False
-        ).order_by(AlertDB.timestamp.desc()).all()
-        return [Alert.from_orm(a) for a in alerts]
+        if self._index_stale():
+            async with self._session(read_only=True) as session:
+                await self._load_open_alerts(session)
+        return sorted(self._open_alerts.values(), key=lambda a: a.timestamp, reverse=True)
         
-    def resolve_alert(self, alert_id: int):
+    async def resolve_alert(self, alert_id: int) -> bool:
         """حل تنبيه"""
-        alert = self.db.query(AlertDB).filter(AlertDB.id == alert_id).first()
-        if alert:
-            alert.is_resolved = True
-            alert.resolved_at = datetime.utcnow()
-            self.db.commit()
+        async with self._session() as session:
+            result = await session.execute(
+                update(AlertDB)
+                .where(AlertDB.id == alert_id, AlertDB.is_resolved == False)
+                .values(is_resolved=True, resolved_at=datetime.utcnow())
+            )
+        for metric_name, alert in list(self._open_alerts.items()):
+            if alert.id == alert_id:
+                del self._open_alerts[metric_name]
+        if result.rowcount:
             logger.info(f"✅ تم حل التنبيه #{alert_id}")
+        return result.rowcount > 0
+
+
+# المراقب المشترك في العملية: فهرس تنبيهات واحد لكل من الحلقة والـ API
+performance_monitor = PerformanceMonitor()
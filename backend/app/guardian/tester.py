@@ -5,15 +5,21 @@ Safe Testing - الاختبار الآمن
 
 import os
 import asyncio
+import dataclasses
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Awaitable
 from datetime import datetime, timedelta
 from enum import Enum
 import random
-import statistics
 
 from sqlalchemy.orm import Session
 from .models import CodeChange, ChangeStatus, CodeChangeDB
+from app.backtesting import BacktestConfig, BacktestEngine, BacktestResult, CandleSeries
+from app.backtesting.walk_forward import WalkForwardAnalyzer, WalkForwardConfig
+from app.backtesting.monte_carlo import MonteCarloConfig, MonteCarloEngine
+
+# (symbol, timeframe, start, end) -> candles (CandleSeries or list of OHLCV dicts)
+HistoryLoader = Callable[[str, str, datetime, datetime], Awaitable[Any]]
 
 logger = logging.getLogger(__name__)
 
@@ -35,9 +41,30 @@ class SafeTester:
         TestStage.FULL: {"duration_hours": 24, "trade_percentage": 1.00}
     }
     
-    def __init__(self, db_session: Session):
+    # نفس معايير validate_performance
+    PASS_CRITERIA = {
+        "win_rate": 0.55,
+        "profit_factor": 1.5,
+        "max_drawdown": -0.15,
+        "sharpe_ratio": 1.0
+    }
+    
+    def __init__(
+        self,
+        db_session: Session,
+        history_loader: Optional[HistoryLoader] = None,
+        backtest_config: Optional[BacktestConfig] = None,
+        walk_forward_config: Optional[WalkForwardConfig] = None,
+        monte_carlo_config: Optional[MonteCarloConfig] = None
+    ):
         self.db = db_session
         self.sandbox_active = False
+        self.history_loader = history_loader
+        self.backtest_config = backtest_config or BacktestConfig()
+        self.walk_forward_config = walk_forward_config or WalkForwardConfig()
+        self.monte_carlo_config = monte_carlo_config or MonteCarloConfig()
+        self.last_backtest: Optional[BacktestResult] = None
+        self.last_history: Optional[CandleSeries] = None
         
     async def run_backtest(
         self, 
@@ -47,36 +74,67 @@ class SafeTester:
     ) -> Dict[str, Any]:
         """
         تشغيل باك-تست على البيانات التاريخية
+        
+        المحرك يشغّل الاستراتيجية المنشورة فقط: code فارغ أو مطابق لمحتوى
+        strategy_file يُختبر، وأي كود آخر يُرفض بدلاً من نسب نتيجة المنشور إليه
         """
         logger.info(f"📊 بدء باك-تست لـ {strategy_file} ({months} أشهر)")
         
-        # TODO: ربط بمحرك الباك-تست الفعلي
-        # محاكاة النتائج للعرض
-        await asyncio.sleep(2)  # محاكاة وقت الحساب
-        
-        results = {
-            "total_return": random.uniform(0.15, 0.45),
-            "sharpe_ratio": random.uniform(1.0, 2.0),
-            "max_drawdown": random.uniform(-0.20, -0.05),
-            "win_rate": random.uniform(0.50, 0.70),
-            "total_trades": random.randint(100, 500),
-            "profit_factor": random.uniform(1.3, 2.5),
-            "duration_months": months
-        }
+        if code and not self._is_deployed(code, strategy_file):
+            logger.error(f"❌ لا يمكن اختبار كود مقترح لم يُنشر بعد: {strategy_file}")
+            return {
+                "passed": False,
+                "error": "Proposed code cannot be backtested; the engine runs the deployed strategy only",
+                "duration_months": months,
+            }
         
-        # التحقق من المعايير
-        passed = (
-            results["win_rate"] > 0.55 and
-            results["profit_factor"] > 1.5 and
-            results["max_drawdown"] > -0.15 and
-            results["sharpe_ratio"] > 1.0
-        )
+        config = self.backtest_config
+        end = datetime.utcnow()
+        start = end - timedelta(days=30 * months)
+        
+        if self.history_loader is None:
+            logger.error("❌ لا يوجد مصدر بيانات تاريخية للباك-تست")
+            return {"passed": False, "error": "No history loader configured", "duration_months": months}
         
-        results["passed"] = passed
+        candles = await self.history_loader(config.symbol, config.timeframe, start, end)
+        if candles is None or len(candles) < config.window + 2:
+            logger.error(f"❌ بيانات تاريخية غير كافية لـ {config.symbol} {config.timeframe}")
+            return {"passed": False, "error": "Insufficient history", "duration_months": months}
         
-        logger.info(f"✅ انتهى الباك-تست: {'نجح' if passed else 'فشل'}")
+        if not isinstance(candles, CandleSeries):
+            candles = CandleSeries.from_records(candles)
+        self.last_history = candles
+        
+        # المحاكاة ثقيلة على المعالج: تشغيلها خارج حلقة الأحداث
+        result = await BacktestEngine(config).run_async(candles)
+        self.last_backtest = result
+        
+        results = result.summary()
+        results["duration_months"] = months
+        results["passed"] = self._meets_criteria(results)
+        
+        logger.info(f"✅ انتهى الباك-تست: {'نجح' if results['passed'] else 'فشل'}")
         return results
         
+    @staticmethod
+    def _is_deployed(code: str, strategy_file: str) -> bool:
+        """هل الكود هو نفسه محتوى الملف المنشور (أي ما سيشغّله المحرك)"""
+        try:
+            with open(strategy_file, encoding="utf-8") as f:
+                return f.read() == code
+        except OSError:
+            return False
+        
+    def _meets_criteria(self, results: Dict[str, Any]) -> bool:
+        """التحقق من المعايير"""
+        criteria = self.PASS_CRITERIA
+        return (
+            results["win_rate"] > criteria["win_rate"] and
+            results["profit_factor"] > criteria["profit_factor"] and
+            results["max_drawdown"] > criteria["max_drawdown"] and
+            results["sharpe_ratio"] > criteria["sharpe_ratio"]
+        )
+        
     async def staged_rollout(self, change_id: int) -> bool:
         """
         نشر تدريجي للتغيير
@@ -171,23 +229,47 @@ class SafeTester:
     async def _monte_carlo_simulation(
         self, 
         code: str,
-        iterations: int = 1000
+        iterations: Optional[int] = None
     ) -> Dict[str, Any]:
-        """محاكاة مونت كارلو"""
-        returns = [random.gauss(0.001, 0.02) for _ in range(iterations)]
+        """
+        محاكاة مونت كارلو
+        إعادة أخذ عينات من عوائد صفقات آخر باك-تست
+        """
+        if self.last_backtest is None or len(self.last_backtest.trades) < 2:
+            return {"reliable": False, "error": "Not enough backtest trades"}
         
-        return {
-            "reliable": statistics.mean(returns) > 0,
-            "var_95": sorted(returns)[int(iterations * 0.05)],
-            "max_consecutive_losses": max(
-                sum(1 for _ in g) for k, g in __import__('itertools').groupby(r < 0 for r in returns) if k
-            ) if any(r < 0 for r in returns) else 0
-        }
+        config = self.monte_carlo_config
+        if iterations is not None:
+            config = dataclasses.replace(config, n_paths=iterations)
+        
+        engine = MonteCarloEngine(config)
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, engine.run, self.last_backtest.trade_returns)
+        
+        summary = result.summary()
+        logger.info(
+            f"🎲 مونت كارلو: {summary['paths']} مسار، "
+            f"احتمال الربح {summary['prob_profit']:.0%}"
+        )
+        return summary
         
     async def _walk_forward_analysis(self, code: str) -> Dict[str, Any]:
-        """تحليل المشي للأمام"""
-        # TODO: تنفيذ WFA حقيقي
-        return {"consistent": True, "robustness_score": 0.85}
+        """
+        تحليل المشي للأمام
+        إعادة تحسين المعاملات على كل نافذة داخل العينة واختبارها على النافذة التالية
+        """
+        if self.last_history is None:
+            return {"consistent": False, "robustness_score": 0.0, "error": "Run a backtest first"}
+        
+        analyzer = WalkForwardAnalyzer(self.last_history, self.backtest_config, self.walk_forward_config)
+        loop = asyncio.get_running_loop()
+        report = await loop.run_in_executor(None, analyzer.run)
+        
+        logger.info(
+            f"🚶 تحليل المشي للأمام: {report['folds']} طيات، "
+            f"المتانة {report['robustness_score']:.2f}"
+        )
+        return report
         
     async def rollback(self, change_id: int):
         """التراجع عن التغيير"""
@@ -1,22 +1,57 @@
 # backend/app/main.py
-from fastapi import FastAPI, WebSocket
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from uuid import UUID
 
 from app.config import settings  # ???? ?? ??? ?? ??? settings ??????? ???? ???????
 from app.api.v1.router import api_router
-from app.database.connection import init_db
+from app.database.connection import dispose_engines, init_db
+from app.core.cache import cache
 from app.core.logging import setup_logging
+from app.core.performance import ConnectionPoolMonitor, stop_batch_writers
+from app.core.security import security_manager
+from app.core.trading_engine import TradingEngine
+from app.marketdata.candle_store import candle_store
+from app.middleware.rate_limit import limiter
+from app.mt5.stream import MarketDataStream, StreamConsumers
+from app.services.pnl_rollups import pnl_rollups
+from app.services.signal_hub import signal_hub
+from app.services.trading_stats import trading_stats
+
+
+def signal_pipeline():
+    """MT5 stream -> closed-bar analysis; run by whichever worker owns signal_hub's lease"""
+    stream = MarketDataStream()
+    consumers = StreamConsumers(trading_engine=TradingEngine())
+    consumers.attach(stream)
+    return stream, consumers
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await init_db()
+    await candle_store.create_tables()
     setup_logging()
+    # shared by the workers: snapshot and analysis leases, signal pub/sub, L1 invalidation
+    await cache.connect()
+    pool_monitor = ConnectionPoolMonitor()
+    pool_monitor.start()
+    await trading_stats.start()
+    pnl_rollups.start()
+    # one analysis per subscribed (symbol, timeframe) and closed bar, fanned out by signal_hub
+    await signal_hub.start(signal_pipeline if settings.SIGNAL_STREAM_ENABLED else None)
     yield
     # Shutdown
-    pass
+    await signal_hub.stop()
+    await pnl_rollups.stop()
+    await trading_stats.stop()
+    await limiter.disconnect()
+    await stop_batch_writers()
+    await pool_monitor.stop()
+    await cache.disconnect()
+    await dispose_engines()
 
 
 app = FastAPI(
@@ -69,4 +104,24 @@ async def websocket_endpoint(websocket: WebSocket):
             data = await websocket.receive_text()
             await websocket.send_text(f"Echo: {data}")
         except Exception:
-            break
\ No newline at end of file
+            break
+
+
+@app.websocket("/ws/signals")
+async def signals_websocket(websocket: WebSocket, token: str):
+    """Live signals of the caller's subscriptions (see /api/v1/trading/signals/subscribe)"""
+    payload = security_manager.decode_token(token)
+    if not payload or payload.get("type") != "access":
+        await websocket.close(code=1008)
+        return
+    user_id = UUID(payload["sub"])
+    await websocket.accept()
+    signal_hub.connect(user_id, websocket)
+    try:
+        while True:
+            # nothing expected from the client; this just notices the disconnect
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        signal_hub.disconnect(user_id, websocket)
\ No newline at end of file
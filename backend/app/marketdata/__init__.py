@@ -0,0 +1,8 @@
+"""
+Market Data - بيانات السوق
+Candle formats shared by the cache, persistence and backtesting layers
+"""
+
+from .bars import CANDLE_DTYPE, TIMEFRAME_SECONDS, parse_timestamp, to_candle_array, to_candle_records
+from .candle_store import CandleStore, candle_store
+from .history_files import HistoryFiles, history_files
@@ -0,0 +1,76 @@
+"""
+Candle bar format
+One fixed-size little-endian record per bar (48 bytes), so a run of bars is
+a plain buffer that np.frombuffer can view without parsing.
+"""
+
+from datetime import datetime, timezone
+from typing import List, Sequence, Union
+
+import numpy as np
+
+CANDLE_DTYPE = np.dtype([
+    ("time", "<i8"),      # bar open time, epoch seconds UTC
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+
+TIMEFRAME_SECONDS = {
+    "M1": 60,
+    "M5": 300,
+    "M15": 900,
+    "M30": 1800,
+    "H1": 3600,
+    "H4": 14400,
+    "D1": 86400,
+}
+
+
+def parse_timestamp(value) -> int:
+    """Epoch seconds from an ISO string, datetime or number"""
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return int(value)
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def to_candle_array(bars: Union[np.ndarray, Sequence[dict]]) -> np.ndarray:
+    """CANDLE_DTYPE array from a structured array or dicts with time|timestamp keys"""
+    if isinstance(bars, np.ndarray):
+        if bars.dtype == CANDLE_DTYPE:
+            return bars
+        array = np.empty(len(bars), dtype=CANDLE_DTYPE)
+        for name in CANDLE_DTYPE.names:
+            array[name] = bars[name] if name in bars.dtype.names else 0
+        return array
+
+    array = np.empty(len(bars), dtype=CANDLE_DTYPE)
+    array["time"] = [parse_timestamp(bar.get("time", bar.get("timestamp"))) for bar in bars]
+    for name in ("open", "high", "low", "close"):
+        array[name] = [bar[name] for bar in bars]
+    array["volume"] = [bar.get("volume", 0) for bar in bars]
+    return array
+
+
+def to_candle_records(array: np.ndarray) -> List[dict]:
+    """The analyzers' list-of-dicts format"""
+    times = array["time"].astype("datetime64[s]").astype(str)
+    return [
+        {"timestamp": ts, "open": o, "high": h, "low": l, "close": c, "volume": v}
+        for ts, o, h, l, c, v in zip(
+            times,
+            array["open"].tolist(),
+            array["high"].tolist(),
+            array["low"].tolist(),
+            array["close"].tolist(),
+            array["volume"].tolist(),
+        )
+    ]
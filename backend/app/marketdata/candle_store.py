@@ -0,0 +1,214 @@
+"""
+Candle store
+M1 bars in a range-partitioned PostgreSQL table (one partition per month),
+written with COPY and read back as CANDLE_DTYPE arrays.
+
+- reads go through COPY (...) TO STDOUT in binary format; every column is
+  NOT NULL and fixed width, so the stream is decoded by a single
+  np.frombuffer call instead of building a row object per bar
+- higher timeframes are aggregated from M1 by the server, only the rolled-up
+  bars cross the wire
+- writes COPY into a staging table and upsert from there, so re-sending a
+  bar (the one still forming) overwrites it
+"""
+
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from app.database.connection import AsyncSessionLocal
+from app.marketdata.bars import CANDLE_DTYPE, TIMEFRAME_SECONDS, parse_timestamp, to_candle_array
+
+TABLE = "candles_m1"
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+
+# one binary COPY tuple: field count, then (length, value) per column, big-endian
+_COPY_ROW_DTYPE = np.dtype(
+    [("fields", ">i2")]
+    + [item for name in CANDLE_DTYPE.names for item in (
+        (f"{name}_len", ">i4"), (name, ">i8" if name == "time" else ">f8")
+    )]
+)
+
+_COLUMNS = ("symbol",) + CANDLE_DTYPE.names
+
+
+def month_start(timestamp: int) -> int:
+    """Epoch seconds of the first instant of the UTC month containing timestamp"""
+    dt = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    return int(datetime(dt.year, dt.month, 1, tzinfo=timezone.utc).timestamp())
+
+
+def partitions_for(table: str, start: int, end: int) -> List[Tuple[str, int, int]]:
+    """(name, lower, upper) of the monthly partitions covering start <= time <= end"""
+    partitions = []
+    lower = month_start(start)
+    while lower <= end:
+        dt = datetime.fromtimestamp(lower, tz=timezone.utc)
+        year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+        upper = int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp())
+        partitions.append((f"{table}_y{dt.year}m{dt.month:02d}", lower, upper))
+        lower = upper
+    return partitions
+
+
+def decode_copy_binary(data: bytes) -> np.ndarray:
+    """CANDLE_DTYPE array from a binary COPY of (time, open, high, low, close, volume)"""
+    if not data.startswith(COPY_SIGNATURE):
+        raise ValueError("Not a binary COPY stream")
+    extension = int.from_bytes(data[15:19], "big")
+    body = memoryview(data)[19 + extension:len(data) - 2]
+    if len(body) % _COPY_ROW_DTYPE.itemsize:
+        raise ValueError("Unexpected row width in COPY stream (NULL or non-float8 column?)")
+
+    rows = np.frombuffer(body, dtype=_COPY_ROW_DTYPE)
+    widths = [rows[f"{name}_len"] for name in CANDLE_DTYPE.names]
+    if (rows["fields"] != len(CANDLE_DTYPE.names)).any() or any((w != 8).any() for w in widths):
+        raise ValueError("Unexpected row layout in COPY stream")
+
+    array = np.empty(len(rows), dtype=CANDLE_DTYPE)
+    for name in CANDLE_DTYPE.names:
+        array[name] = rows[name]
+    return array
+
+
+def _select_sql(table: str, timeframe: str) -> str:
+    if timeframe == "M1":
+        return (
+            f"SELECT time, open, high, low, close, volume FROM {table} "
+            f"WHERE symbol = $1 AND time >= $2 AND time < $3 ORDER BY time"
+        )
+    step = TIMEFRAME_SECONDS[timeframe]
+    return (
+        f"SELECT bucket, (array_agg(open ORDER BY time))[1], max(high), min(low), "
+        f"(array_agg(close ORDER BY time DESC))[1], sum(volume) "
+        f"FROM (SELECT time - time % {step} AS bucket, time, open, high, low, close, volume "
+        f"FROM {table} WHERE symbol = $1 AND time >= $2 AND time < $3) AS bars "
+        f"GROUP BY bucket ORDER BY bucket"
+    )
+
+
+class CandleStore:
+    """
+    Usage:
+        await candle_store.create_tables()                  # once, at startup
+        await candle_store.write("XAUUSD", m1_bars)         # dicts or CANDLE_DTYPE array
+        stream.add_candle_handler(candle_store.on_candle)   # or persist the live feed
+        bars = await candle_store.read("XAUUSD", start, end, "H1")
+        series = await candle_store.load("XAUUSD", "H1", start, end)   # HistoryLoader
+    """
+
+    def __init__(self, session_factory: Callable = AsyncSessionLocal, table: str = TABLE):
+        self.table = table
+        self._session_factory = session_factory
+        self._partitions = set()
+
+    @asynccontextmanager
+    async def _connection(self):
+        """The pooled session's asyncpg connection"""
+        async with self._session_factory() as session:
+            connection = await session.connection()
+            raw = await connection.get_raw_connection()
+            yield raw.driver_connection
+
+    # ---------------------------------------------------------------- schema
+
+    async def create_tables(self):
+        async with self._connection() as conn:
+            await conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                f"symbol text NOT NULL, time bigint NOT NULL, "
+                f"open float8 NOT NULL, high float8 NOT NULL, low float8 NOT NULL, "
+                f"close float8 NOT NULL, volume float8 NOT NULL DEFAULT 0, "
+                f"PRIMARY KEY (symbol, time)"
+                f") PARTITION BY RANGE (time)"
+            )
+
+    async def _ensure_partitions(self, conn, start: int, end: int):
+        for name, lower, upper in partitions_for(self.table, start, end):
+            if name in self._partitions:
+                continue
+            await conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {self.table} "
+                f"FOR VALUES FROM ({lower}) TO ({upper})"
+            )
+            self._partitions.add(name)
+
+    # ---------------------------------------------------------------- writes
+
+    async def write(self, symbol: str, bars: Union[np.ndarray, Sequence[dict]]) -> int:
+        """Upsert M1 bars for a symbol, returns how many were sent"""
+        array = to_candle_array(bars)
+        if not len(array):
+            return 0
+        # one row per open time (the last one sent wins), an upsert cannot touch a row twice
+        _, last = np.unique(array["time"][::-1], return_index=True)
+        array = array[::-1][last]
+
+        records = zip(
+            [symbol] * len(array),
+            array["time"].tolist(),
+            array["open"].tolist(),
+            array["high"].tolist(),
+            array["low"].tolist(),
+            array["close"].tolist(),
+            array["volume"].tolist(),
+        )
+        updates = ", ".join(f"{name} = EXCLUDED.{name}" for name in CANDLE_DTYPE.names[1:])
+        staging = f"_{self.table}_staging"
+
+        async with self._connection() as conn:
+            await self._ensure_partitions(conn, int(array["time"].min()), int(array["time"].max()))
+            async with conn.transaction():
+                await conn.execute(
+                    f"CREATE TEMP TABLE {staging} (LIKE {self.table} INCLUDING DEFAULTS) ON COMMIT DROP"
+                )
+                await conn.copy_records_to_table(staging, records=records, columns=list(_COLUMNS))
+                await conn.execute(
+                    f"INSERT INTO {self.table} SELECT * FROM {staging} "
+                    f"ON CONFLICT (symbol, time) DO UPDATE SET {updates}"
+                )
+        return len(array)
+
+    async def on_candle(self, candle: dict):
+        """MarketDataStream candle handler, persists closed M1 bars"""
+        if candle.get("timeframe") == "M1" and candle.get("closed", True):
+            await self.write(candle["symbol"], [candle])
+
+    # ---------------------------------------------------------------- reads
+
+    async def read(self, symbol: str, start, end, timeframe: str = "M1") -> np.ndarray:
+        """Bars with start <= time < end as a CANDLE_DTYPE array, rolled up from M1"""
+        if timeframe not in TIMEFRAME_SECONDS:
+            raise ValueError(f"Unknown timeframe {timeframe}")
+        start, end = parse_timestamp(start), parse_timestamp(end)
+        # widen to a whole first bucket so it is not built from a partial set of bars
+        start -= start % TIMEFRAME_SECONDS[timeframe]
+
+        chunks = []
+
+        async def sink(chunk: bytes):
+            chunks.append(chunk)
+
+        async with self._connection() as conn:
+            await conn.copy_from_query(
+                _select_sql(self.table, timeframe), symbol, start, end,
+                output=sink, format="binary"
+            )
+        return decode_copy_binary(b"".join(chunks))
+
+    async def load(self, symbol: str, timeframe: str, start: datetime, end: datetime):
+        """HistoryLoader for SafeTester and the backtests"""
+        from app.backtesting.data import CandleSeries
+        return CandleSeries.from_structured(await self.read(symbol, start, end, timeframe))
+
+    async def latest_time(self, symbol: str) -> Optional[int]:
+        """Open time of the newest stored M1 bar, to resume ingestion from"""
+        async with self._connection() as conn:
+            return await conn.fetchval(f"SELECT max(time) FROM {self.table} WHERE symbol = $1", symbol)
+
+
+candle_store = CandleStore()
@@ -0,0 +1,189 @@
+"""
+History files
+Candles on local disk as one raw .npy file of CANDLE_DTYPE bars per symbol,
+timeframe and UTC month, for backtests and model training.
+
+    {root}/catalog.json
+    {root}/XAUUSD/M1/2024-01.npy
+
+- files are opened with mmap_mode="r": every process reading the same month
+  shares the page cache instead of holding its own copy
+- catalog.json records each month's first/last bar time and row count, so a
+  time-range read only opens the months that overlap it and binary-searches
+  the first and last one
+- append() rewrites only the months it touches (a month of M1 bars is about
+  2 MB) to a temp file and renames it over the old one; readers that still
+  have the old file mapped keep a consistent view
+"""
+
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+from app.core.config import settings
+from app.marketdata.bars import CANDLE_DTYPE, parse_timestamp, to_candle_array
+
+CATALOG = "catalog.json"
+
+
+def month_of(times: np.ndarray) -> np.ndarray:
+    """'YYYY-MM' label of each epoch-seconds timestamp"""
+    return times.astype("datetime64[s]").astype("datetime64[M]").astype(str)
+
+
+class HistoryFiles:
+    """
+    Usage:
+        history = HistoryFiles("data/history")
+        history.append("XAUUSD", "M1", bars)                  # dicts or CANDLE_DTYPE array
+        bars = history.read("XAUUSD", "M1", start, end)      # CANDLE_DTYPE array
+        df = history.frame("XAUUSD", "H1", start, end)       # LSTMModel.train / XGBoostModel.train
+        await history.update_from(candle_store, "XAUUSD", "M1")   # daily top-up
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._catalog: Dict[str, Dict[str, dict]] = {}
+        self._catalog_mtime: Optional[int] = None
+
+    # ---------------------------------------------------------------- catalog
+
+    def _path(self, symbol: str, timeframe: str, month: str) -> str:
+        return os.path.join(self.root, symbol, timeframe, f"{month}.npy")
+
+    def catalog(self) -> Dict[str, Dict[str, dict]]:
+        """{"XAUUSD/M1": {"2024-01": {"first": ..., "last": ..., "rows": ...}}}, reloaded when it changes"""
+        path = os.path.join(self.root, CATALOG)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        if mtime != self._catalog_mtime:
+            with open(path) as f:
+                self._catalog = json.load(f)
+            self._catalog_mtime = mtime
+        return self._catalog
+
+    def months(self, symbol: str, timeframe: str, start=None, end=None) -> List[str]:
+        """Months holding bars with start <= time < end, oldest first"""
+        start = parse_timestamp(start) if start is not None else None
+        end = parse_timestamp(end) if end is not None else None
+        entries = self.catalog().get(f"{symbol}/{timeframe}", {})
+        return sorted(
+            month for month, entry in entries.items()
+            if (start is None or entry["last"] >= start) and (end is None or entry["first"] < end)
+        )
+
+    def last_time(self, symbol: str, timeframe: str) -> Optional[int]:
+        entries = self.catalog().get(f"{symbol}/{timeframe}", {})
+        return max((entry["last"] for entry in entries.values()), default=None)
+
+    @contextmanager
+    def _writing(self):
+        """Serialises writers (across processes) and yields a fresh copy of the catalog"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                catalog = json.loads(json.dumps(self.catalog()))
+                yield catalog
+                self._replace(os.path.join(self.root, CATALOG), lambda f: f.write(json.dumps(catalog, indent=1).encode()))
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _replace(path: str, write):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+
+    # ---------------------------------------------------------------- reads
+
+    def open_month(self, symbol: str, timeframe: str, month: str) -> np.ndarray:
+        """Memory-mapped, read-only bars of one month"""
+        return np.load(self._path(symbol, timeframe, month), mmap_mode="r")
+
+    def scan(self, symbol: str, timeframe: str, start=None, end=None) -> Iterator[np.ndarray]:
+        """Zero-copy views of the bars with start <= time < end, one per month"""
+        lo = parse_timestamp(start) if start is not None else None
+        hi = parse_timestamp(end) if end is not None else None
+        for month in self.months(symbol, timeframe, lo, hi):
+            bars = self.open_month(symbol, timeframe, month)
+            times = bars["time"]
+            first = np.searchsorted(times, lo, side="left") if lo is not None else 0
+            last = np.searchsorted(times, hi, side="left") if hi is not None else len(bars)
+            if last > first:
+                yield bars[first:last]
+
+    def read(self, symbol: str, timeframe: str, start=None, end=None) -> np.ndarray:
+        """Bars with start <= time < end; a view of the file if they fall in one month"""
+        parts = list(self.scan(symbol, timeframe, start, end))
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=CANDLE_DTYPE)
+
+    def load(self, symbol: str, timeframe: str, start: datetime, end: datetime):
+        """HistoryLoader for SafeTester and the backtests"""
+        from app.backtesting.data import CandleSeries
+        return CandleSeries.from_structured(self.read(symbol, timeframe, start, end))
+
+    def frame(self, symbol: str, timeframe: str, start=None, end=None):
+        """pandas OHLCV DataFrame indexed by bar time, the format the AI models train on"""
+        import pandas as pd
+        bars = self.read(symbol, timeframe, start, end)
+        return pd.DataFrame(
+            {name: bars[name] for name in ("open", "high", "low", "close", "volume")},
+            index=pd.to_datetime(bars["time"], unit="s", utc=True),
+        )
+
+    # ---------------------------------------------------------------- writes
+
+    def append(self, symbol: str, timeframe: str, bars: Union[np.ndarray, Sequence[dict]]) -> int:
+        """Merge bars into the month files (a bar with a stored time replaces it), returns how many"""
+        array = to_candle_array(bars)
+        if not len(array):
+            return 0
+        # sorted, one bar per time, the last one given wins
+        _, last = np.unique(array["time"][::-1], return_index=True)
+        array = array[::-1][last]
+
+        labels = month_of(array["time"])
+        with self._writing() as catalog:
+            entries = catalog.setdefault(f"{symbol}/{timeframe}", {})
+            for month in np.unique(labels):
+                new = array[labels == month]
+                if month in entries:
+                    old = np.load(self._path(symbol, timeframe, month))
+                    new = self._merge(old, new)
+                path = self._path(symbol, timeframe, month)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._replace(path, lambda f, new=new: np.save(f, new, allow_pickle=False))
+                entries[str(month)] = {"first": int(new["time"][0]), "last": int(new["time"][-1]), "rows": len(new)}
+        return len(array)
+
+    @staticmethod
+    def _merge(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+        """old + new ordered by time, new winning on equal times"""
+        if len(old) and new["time"][0] > old["time"][-1]:
+            return np.concatenate([old, new])
+        merged = np.concatenate([new, old])
+        _, keep = np.unique(merged["time"], return_index=True)
+        return merged[keep]
+
+    async def update_from(self, store, symbol: str, timeframe: str, start=None, end=None) -> int:
+        """Append what a CandleStore has after the newest bar on disk (the last one is re-read, it may have been forming)"""
+        last = self.last_time(symbol, timeframe)
+        start = last if last is not None else parse_timestamp(start or 0)
+        end = parse_timestamp(end) if end is not None else int(time.time()) + 86400
+        bars = await store.read(symbol, start, end, timeframe)
+        return self.append(symbol, timeframe, bars)
+
+
+history_files = HistoryFiles(settings.HISTORY_DIR)
@@ -1,41 +1,215 @@
 """
 Revolution X - Rate Limiting Middleware
 Advanced rate limiting with Redis backend
+
+Limits use GCRA (generic cell rate algorithm): each client/route key holds a
+single timestamp, the theoretical arrival time (TAT) of its next request.
+Every request pushes the TAT forward by window / requests and is rejected if
+that would put it more than one window ahead of now. This behaves like a
+sliding window with a burst of `requests`, costs O(1) memory per key and is
+checked with one atomic Lua call (EVALSHA) per request.
+
+Routes with mode "hybrid" in RATE_LIMITS skip the per-request round trip:
+each worker leases a chunk of the same GCRA quota from Redis and spends it
+from memory. Unspent tokens go back to Redis when the lease expires, so the
+global limit holds; at worst quota sits idle in a worker for one lease TTL.
 """
+import asyncio
+import math
 import time
-from typing import Optional, Callable
+from collections import OrderedDict
+from typing import Optional, Callable, Union
 from functools import wraps
 from fastapi import Request, HTTPException, status
 from fastapi.responses import JSONResponse
-import redis
+import redis.asyncio as redis
 
 from app.core.config import settings
+from app.core.local_cache import DEFAULT_NAMESPACE, LocalCache
 from app.core.logging import logger
 
 
+# KEYS[1] = limit key, ARGV = interval ms, window ms, cost; times from the
+# Redis clock so every worker agrees on "now". Returns
+# {allowed, remaining, retry_after_ms, reset_after_ms}
+GCRA_SCRIPT = """
+local tat = tonumber(redis.call('GET', KEYS[1]))
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + clock[2] / 1000
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+
+if not tat or tat < now then
+    tat = now
+end
+local new_tat = tat + interval * cost
+local allow_at = new_tat - period
+if now < allow_at then
+    return {0, 0, math.ceil(allow_at - now), math.ceil(tat - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil(new_tat - now))
+return {1, math.floor((period - (new_tat - now)) / interval), 0, math.ceil(new_tat - now)}
+"""
+
+
+# KEYS[1] = limit key, ARGV = interval ms, window ms, tokens wanted, tokens
+# returned; hands back unspent tokens, then grants as many of the wanted ones
+# as the key has room for. Returns {granted, reset_after_ms}
+LEASE_SCRIPT = """
+local tat = tonumber(redis.call('GET', KEYS[1]))
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + clock[2] / 1000
+local interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local wanted = tonumber(ARGV[3])
+local returned = tonumber(ARGV[4])
+
+if not tat then
+    tat = now
+end
+tat = math.max(tat - returned * interval, now)
+local room = math.floor((period - (tat - now)) / interval)
+local granted = math.max(math.min(wanted, room), 0)
+tat = tat + granted * interval
+if tat > now then
+    redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil(tat - now))
+else
+    redis.call('DEL', KEYS[1])
+end
+return {granted, math.ceil(tat - now)}
+"""
+
+
+def gcra(tat: Optional[float], now: float, interval: float, period: float, cost: int = 1) -> tuple:
+    """
+    One GCRA decision (times in ms), the same steps as GCRA_SCRIPT.
+    Returns (allowed, new_tat, remaining, retry_after, reset_after).
+    """
+    tat = now if tat is None or tat < now else tat
+    new_tat = tat + interval * cost
+    allow_at = new_tat - period
+    if now < allow_at:
+        return False, tat, 0, math.ceil(allow_at - now), math.ceil(tat - now)
+    return True, new_tat, math.floor((period - (new_tat - now)) / interval), 0, math.ceil(new_tat - now)
+
+
+def gcra_lease(
+    tat: Optional[float],
+    now: float,
+    interval: float,
+    period: float,
+    wanted: int,
+    returned: int = 0
+) -> tuple:
+    """
+    The same steps as LEASE_SCRIPT (times in ms).
+    Returns (granted, new_tat, reset_after).
+    """
+    tat = max((now if tat is None else tat) - returned * interval, now)
+    room = math.floor((period - (tat - now)) / interval)
+    granted = max(min(wanted, room), 0)
+    tat += granted * interval
+    return granted, tat, math.ceil(tat - now)
+
+
+class _Lease:
+    """Tokens a worker took from a Redis limit and may spend locally"""
+    __slots__ = ("tokens", "expires_at", "denied_until", "reset_after", "interval", "period", "renewal")
+    
+    def __init__(self, interval: float, period: float):
+        self.tokens = 0
+        self.expires_at = 0.0
+        self.denied_until = 0.0
+        self.reset_after = 0
+        self.interval = interval
+        self.period = period
+        self.renewal: Optional[asyncio.Task] = None
+
+
 class RateLimiter:
-    """Advanced rate limiter with sliding window."""
+    """
+    Async GCRA rate limiter.
     
-    def __init__(self):
+    Usage:
+        limiter = RateLimiter()
+        await limiter.connect()
+        allowed, headers = await limiter.is_allowed(ip, "auth_login", 5, 300)
+    
+    Without Redis (or when a call fails) limits are enforced per process in
+    a bounded LRU of TATs, so an outage degrades to per-worker limits
+    instead of no limits.
+    
+    mode="hybrid" checks spend leased tokens (see LEASE_SCRIPT); concurrent
+    requests that find the lease empty share one renewal.
+    """
+    
+    def __init__(
+        self,
+        max_local_keys: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+        lease_ttl: Optional[float] = None
+    ):
+        max_local_keys = max_local_keys or settings.RATE_LIMIT_LOCAL_MAX_KEYS
         self.redis_client = None
-        self._local_cache = {}
+        self._gcra = None
+        self._lease = None
+        self._clock = clock
+        self._local = LocalCache(
+            max_entries=max_local_keys,
+            max_bytes=max_local_keys * 256,
+            quotas={DEFAULT_NAMESPACE: 1.0},
+            clock=clock
+        )
+        self.max_leases = max_local_keys
+        self.lease_ttl = lease_ttl or settings.RATE_LIMIT_LEASE_TTL
+        self._leases: "OrderedDict[str, _Lease]" = OrderedDict()
+        self._reconciler: Optional[asyncio.Task] = None
+        self._connecting: Optional[asyncio.Future] = None
     
-    def connect(self):
+    async def ensure_connected(self):
+        """connect() once, shared by concurrent first requests"""
+        if self._connecting is None:
+            self._connecting = asyncio.ensure_future(self.connect())
+        await self._connecting
+    
+    async def connect(self):
         """Initialize Redis connection."""
         try:
             self.redis_client = redis.Redis(
                 host=settings.REDIS_HOST,
                 port=settings.REDIS_PORT,
-                db=1,  # Separate DB for rate limiting
+                db=settings.RATE_LIMIT_REDIS_DB,  # Separate DB for rate limiting
                 password=settings.REDIS_PASSWORD,
-                decode_responses=True
+                socket_connect_timeout=5
             )
+            await self.redis_client.ping()
+            self._gcra = self.redis_client.register_script(GCRA_SCRIPT)
+            self._lease = self.redis_client.register_script(LEASE_SCRIPT)
+            self._reconciler = asyncio.create_task(self._reconcile_loop())
         except Exception as e:
             logger.error(f"Redis connection failed for rate limiting: {e}")
+            self.redis_client = None
+    
+    async def disconnect(self):
+        if self._reconciler:
+            self._reconciler.cancel()
+            try:
+                await self._reconciler
+            except asyncio.CancelledError:
+                pass
+            self._reconciler = None
+        # hand every unspent token back before leaving
+        await self.reconcile(expired_only=False)
+        if self.redis_client:
+            await self.redis_client.close()
+            self.redis_client = None
+            self._gcra = None
+            self._lease = None
     
     def _get_key(self, identifier: str, endpoint: str) -> str:
         """Generate rate limit key."""
-        return f"rate_limit:{identifier}:{endpoint}"
+        return f"rate_limit:{endpoint}:{identifier}"
     
     def _get_identifier(self, request: Request) -> str:
         """Get client identifier (IP or user ID)."""
@@ -52,94 +226,160 @@ class RateLimiter:
         # Fall back to direct IP
         return request.client.host
     
-    def is_allowed(
+    def _check_local(self, key: str, interval: float, period: float, cost: int) -> tuple:
+        now = self._clock() * 1000
+        allowed, new_tat, remaining, retry_after, reset_after = gcra(
+            self._local.get(key), now, interval, period, cost
+        )
+        if allowed:
+            self._local.set(key, new_tat, ttl=reset_after / 1000, size=64)
+        return allowed, remaining, retry_after, reset_after
+    
+    async def _check_hybrid(self, key: str, interval: float, period: float, lease_size: int) -> Optional[tuple]:
+        lease = self._leases.get(key)
+        if lease is None:
+            lease = self._leases[key] = _Lease(interval, period)
+            if len(self._leases) > self.max_leases:
+                # its tokens were already counted in Redis, dropping them only under-admits
+                self._leases.popitem(last=False)
+        
+        while True:
+            now = self._clock()
+            if now < lease.expires_at:
+                if lease.tokens > 0:
+                    lease.tokens -= 1
+                    return True, lease.tokens, 0, lease.reset_after
+                if now < lease.denied_until:
+                    return False, 0, math.ceil((lease.denied_until - now) * 1000), lease.reset_after
+            
+            if lease.renewal is None:
+                self._leases.move_to_end(key)
+                lease.renewal = asyncio.create_task(self._renew(key, lease, lease_size))
+            try:
+                await asyncio.shield(lease.renewal)
+            except Exception as e:
+                logger.error(f"Rate limit lease error, enforcing locally: {e}")
+                return None
+    
+    async def _renew(self, key: str, lease: _Lease, lease_size: int):
+        """Return what is left of an expired lease and take a new chunk, in one call"""
+        returned, lease.tokens = lease.tokens, 0
+        try:
+            granted, reset_after = await self._lease(
+                keys=[key], args=[lease.interval, lease.period, lease_size, returned]
+            )
+        finally:
+            lease.renewal = None
+        now = self._clock()
+        lease.tokens = int(granted)
+        lease.reset_after = int(reset_after)
+        lease.expires_at = now + self.lease_ttl
+        # nothing left: deny from memory until the next token is due
+        lease.denied_until = 0.0 if granted else now + (reset_after - lease.period + lease.interval) / 1000
+    
+    async def reconcile(self, expired_only: bool = True) -> int:
+        """Hand unspent tokens of expired leases back to Redis; returns how many"""
+        now, returned = self._clock(), 0
+        for key, lease in list(self._leases.items()):
+            if lease.renewal is not None or (expired_only and now < lease.expires_at):
+                continue
+            del self._leases[key]
+            if lease.tokens and self._lease is not None:
+                try:
+                    await self._lease(keys=[key], args=[lease.interval, lease.period, 0, lease.tokens])
+                    returned += lease.tokens
+                except Exception as e:
+                    logger.error(f"Rate limit lease release error: {e}")
+        return returned
+    
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(settings.RATE_LIMIT_RECONCILE_INTERVAL)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Rate limit reconcile error: {e}")
+    
+    async def is_allowed(
         self,
         identifier: str,
         endpoint: str,
         max_requests: int,
-        window: int
+        window: int,
+        cost: int = 1,
+        mode: str = "gcra",
+        lease: Optional[int] = None
     ) -> tuple[bool, dict]:
         """
         Check if request is allowed.
         Returns (allowed, headers).
+        
+        mode="hybrid" spends tokens leased `lease` at a time (default 5% of
+        max_requests); cost is ignored in that mode.
         """
         key = self._get_key(identifier, endpoint)
-        now = time.time()
-        window_start = now - window
+        period = window * 1000
+        interval = period / max_requests
         
-        try:
-            if self.redis_client:
-                # Use Redis sorted set for sliding window
-                pipe = self.redis_client.pipeline()
-                
-                # Remove old entries
-                pipe.zremrangebyscore(key, 0, window_start)
-                
-                # Count current entries
-                pipe.zcard(key)
-                
-                # Add current request
-                pipe.zadd(key, {str(now): now})
-                
-                # Set expiry
-                pipe.expire(key, window)
-                
-                results = pipe.execute()
-                current_count = results[1]
-                
-            else:
-                # Fallback to local cache
-                if key not in self._local_cache:
-                    self._local_cache[key] = []
-                
-                # Clean old entries
-                self._local_cache[key] = [
-                    ts for ts in self._local_cache[key]
-                    if ts > window_start
-                ]
-                
-                current_count = len(self._local_cache[key])
-                self._local_cache[key].append(now)
-            
-            allowed = current_count < max_requests
-            remaining = max(0, max_requests - current_count - 1)
-            reset_time = int(now + window)
-            
-            headers = {
-                "X-RateLimit-Limit": str(max_requests),
-                "X-RateLimit-Remaining": str(remaining),
-                "X-RateLimit-Reset": str(reset_time),
-                "X-RateLimit-Window": str(window)
-            }
-            
-            return allowed, headers
-            
-        except Exception as e:
-            logger.error(f"Rate limiting error: {e}")
-            # Fail open in case of error
-            return True, {}
+        result = None
+        if mode == "hybrid" and self._lease is not None:
+            result = await self._check_hybrid(key, interval, period, lease or max(1, max_requests // 20))
+        elif self._gcra is not None:
+            try:
+                result = await self._gcra(keys=[key], args=[interval, period, cost])
+            except Exception as e:
+                logger.error(f"Rate limiting error, enforcing locally: {e}")
+        if result is None:
+            result = self._check_local(key, interval, period, cost)
+        
+        allowed, remaining, retry_after, reset_after = result
+        headers = {
+            "X-RateLimit-Limit": str(max_requests),
+            "X-RateLimit-Remaining": str(int(remaining)),
+            "X-RateLimit-Reset": str(math.ceil(time.time() + reset_after / 1000)),
+            "X-RateLimit-Window": str(window)
+        }
+        if not allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(retry_after / 1000)))
+        
+        return bool(allowed), headers
     
     def limit(
         self,
-        requests: int = 100,
+        requests: Union[int, str] = 100,
         window: int = 60,
         key_func: Optional[Callable] = None
     ):
-        """Decorator for rate limiting."""
+        """
+        Decorator for rate limiting; the endpoint must take `request: Request`.
+        
+        requests may name a RATE_LIMITS entry instead, e.g.
+        @limiter.limit("market_data"), which brings its window, mode and lease.
+        """
         def decorator(func: Callable) -> Callable:
+            if isinstance(requests, str):
+                name, config = requests, RATE_LIMITS[requests]
+            else:
+                name, config = func.__name__, {"requests": requests, "window": window}
+            
             @wraps(func)
             async def async_wrapper(request: Request, *args, **kwargs):
+                await self.ensure_connected()
                 identifier = key_func(request) if key_func else self._get_identifier(request)
-                allowed, headers = self.is_allowed(identifier, func.__name__, requests, window)
+                allowed, headers = await self.is_allowed(
+                    identifier,
+                    name,
+                    config["requests"],
+                    config["window"],
+                    mode=config.get("mode", "gcra"),
+                    lease=config.get("lease")
+                )
                 
                 if not allowed:
                     raise HTTPException(
                         status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                         detail="Rate limit exceeded",
-                        headers={
-                            **headers,
-                            "Retry-After": str(window)
-                        }
+                        headers=headers
                     )
                 
                 response = await func(request, *args, **kwargs)
@@ -154,20 +394,24 @@ class RateLimiter:
         return decorator
 
 
-# Specific rate limit configurations
+# Specific rate limit configurations; entries with a "path" are enforced by
+# RateLimitMiddleware on requests whose path contains it (and whose method
+# matches "method", if given), the others are applied with limiter.limit(name).
+# "mode": "hybrid" (+ optional "lease" chunk size) serves the limit from
+# per-worker leases instead of one Redis call per request
 RATE_LIMITS = {
     # Authentication endpoints - strict
-    "auth_login": {"requests": 5, "window": 300},      # 5 per 5 minutes
-    "auth_register": {"requests": 3, "window": 3600},   # 3 per hour
-    "auth_refresh": {"requests": 10, "window": 60},     # 10 per minute
+    "auth_login": {"requests": 5, "window": 300, "path": "/auth/login"},        # 5 per 5 minutes
+    "auth_register": {"requests": 3, "window": 3600, "path": "/auth/register"},  # 3 per hour
+    "auth_refresh": {"requests": 10, "window": 60, "path": "/auth/refresh"},     # 10 per minute
     
     # Trading endpoints - moderate
-    "place_trade": {"requests": 30, "window": 60},      # 30 per minute
-    "modify_trade": {"requests": 60, "window": 60},     # 60 per minute
+    "place_trade": {"requests": 30, "window": 60, "path": "/trading/execute", "method": "POST"},    # 30 per minute
+    "modify_trade": {"requests": 60, "window": 60, "path": "/trading/positions/", "method": "POST"},  # 60 per minute
     
     # API endpoints - generous
-    "market_data": {"requests": 1000, "window": 60},    # 1000 per minute
-    "ai_predict": {"requests": 100, "window": 60},      # 100 per minute
+    "market_data": {"requests": 1000, "window": 60, "mode": "hybrid", "lease": 50},  # 1000 per minute, /trading/analyze
+    "ai_predict": {"requests": 100, "window": 60, "path": "/ai/predict"},       # 100 per minute
     
     # WebSocket connections
     "ws_connect": {"requests": 10, "window": 60},       # 10 per minute
@@ -177,39 +421,43 @@ RATE_LIMITS = {
 class RateLimitMiddleware:
     """FastAPI middleware for rate limiting."""
     
-    def __init__(self, app):
+    def __init__(self, app, limits: Optional[dict] = None, limiter: Optional[RateLimiter] = None):
         self.app = app
-        self.limiter = RateLimiter()
-        self.limiter.connect()
+        self.limiter = limiter or RateLimiter()
+        self.routes = [
+            (name, config)
+            for name, config in (RATE_LIMITS if limits is None else limits).items()
+            if config.get("path")
+        ]
+    
+    def _match(self, path: str, method: str) -> Optional[tuple]:
+        for name, config in self.routes:
+            if config["path"] in path and config.get("method", method) == method:
+                return name, config
+        return None
     
     async def __call__(self, scope, receive, send):
         if scope["type"] != "http":
             await self.app(scope, receive, send)
             return
         
-        request = Request(scope, receive)
-        
         # Determine rate limit based on path
-        path = request.url.path
-        
-        if "/auth/login" in path:
-            config = RATE_LIMITS["auth_login"]
-        elif "/auth/register" in path:
-            config = RATE_LIMITS["auth_register"]
-        elif "/trading/trades" in path and request.method == "POST":
-            config = RATE_LIMITS["place_trade"]
-        elif "/ai/predict" in path:
-            config = RATE_LIMITS["ai_predict"]
-        else:
+        match = self._match(scope["path"], scope["method"])
+        if match is None:
             await self.app(scope, receive, send)
             return
+        name, config = match
         
-        identifier = self.limiter._get_identifier(request)
-        allowed, headers = self.limiter.is_allowed(
+        await self.limiter.ensure_connected()
+        
+        identifier = self.limiter._get_identifier(Request(scope, receive))
+        allowed, headers = await self.limiter.is_allowed(
             identifier,
-            path,
+            name,
             config["requests"],
-            config["window"]
+            config["window"],
+            mode=config.get("mode", "gcra"),
+            lease=config.get("lease")
         )
         
         if not allowed:
@@ -222,12 +470,11 @@ class RateLimitMiddleware:
             return
         
         # Add headers to response
+        raw_headers = [(header.lower().encode(), value.encode()) for header, value in headers.items()]
+        
         async def send_with_headers(message):
             if message["type"] == "http.response.start":
-                headers = message.get("headers", [])
-                for name, value in headers.items():
-                    headers.append([name.encode(), value.encode()])
-                message["headers"] = headers
+                message["headers"] = list(message.get("headers", [])) + raw_headers
             await send(message)
         
         await self.app(scope, receive, send_with_headers)
@@ -282,4 +529,5 @@ class BruteForceProtection:
         return 0
 
 
+limiter = RateLimiter()
 brute_force_protection = BruteForceProtection()
@@ -1,6 +1,6 @@
 from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Enum, Text, JSON, Boolean
 from sqlalchemy.dialects.postgresql import UUID
-from app.database.base import Base
+from app.database.connection import Base
 import enum
 import datetime
 import uuid
@@ -1,12 +1,12 @@
 """
 Notification Model
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum as SQLEnum, Boolean, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum as SQLEnum, Boolean, JSON, Index, text
+from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime
 import enum
 
-from app.core.database import Base
+from app.database.connection import Base
 
 
 class NotificationType(str, enum.Enum):
@@ -18,6 +18,7 @@ class NotificationType(str, enum.Enum):
     RISK_MARGIN = "risk_margin"
     RISK_DAILY_LIMIT = "risk_daily_limit"
     PRICE_ALERT = "price_alert"
+    TRADE_SIGNAL = "trade_signal"
     GUARDIAN_OPTIMIZATION = "guardian_optimization"
     GUARDIAN_PARAMETER = "guardian_parameter"
     GUARDIAN_REPORT = "guardian_report"
@@ -35,9 +36,16 @@ class NotificationPriority(str, enum.Enum):
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        # inbox pages: keyset on (created_at, id) within one user
+        Index("ix_notifications_user_created", "user_id", "created_at", "id"),
+        # unread-only pages and mark-all-as-read touch just the unread rows
+        Index("ix_notifications_user_unread", "user_id", "created_at", "id",
+              postgresql_where=text("read = false")),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     
     # Notification details
     type = Column(SQLEnum(NotificationType), nullable=False)
@@ -56,9 +64,6 @@ class Notification(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     expires_at = Column(DateTime, nullable=True)  # For temporary notifications
     
-    # Relations
-    user = relationship("User", back_populates="notifications")
-    
     def __repr__(self):
         return f"<Notification(id={self.id}, type={self.type}, user_id={self.user_id})>"
     
@@ -72,3 +77,16 @@ class Notification(Base):
         if not self.delivered:
             self.delivered = {}
         self.delivered[channel] = datetime.utcnow().isoformat()
+
+
+class NotificationCounter(Base):
+    """
+    Unread notifications per user, kept in step with the notifications table:
+    incremented in the transaction that inserts a batch, decremented by the
+    rows each mark-as-read actually flipped.
+    """
+    __tablename__ = "notification_counters"
+    
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    unread = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
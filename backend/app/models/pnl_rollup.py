@@ -0,0 +1,39 @@
+from sqlalchemy import Column, String, Integer, Float, Date, DateTime
+from sqlalchemy.dialects.postgresql import UUID
+from app.database.connection import Base
+import datetime
+
+
+class PnlDaily(Base):
+    """Closed-trade PnL per user, UTC day and symbol; the key order serves per-user day ranges"""
+    __tablename__ = "pnl_daily"
+
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    day = Column(Date, primary_key=True)
+    symbol = Column(String, primary_key=True)
+    trades = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0)
+    losses = Column(Integer, nullable=False, default=0)
+    gross_profit = Column(Float, nullable=False, default=0.0)
+    gross_loss = Column(Float, nullable=False, default=0.0)
+    net_pnl = Column(Float, nullable=False, default=0.0)
+    best_trade = Column(Float, nullable=True)
+    worst_trade = Column(Float, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+
+class PnlWeekly(Base):
+    """Closed-trade PnL per user and ISO week (week = its Monday)"""
+    __tablename__ = "pnl_weekly"
+
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    week = Column(Date, primary_key=True)
+    trades = Column(Integer, nullable=False, default=0)
+    wins = Column(Integer, nullable=False, default=0)
+    losses = Column(Integer, nullable=False, default=0)
+    gross_profit = Column(Float, nullable=False, default=0.0)
+    gross_loss = Column(Float, nullable=False, default=0.0)
+    net_pnl = Column(Float, nullable=False, default=0.0)
+    best_trade = Column(Float, nullable=True)
+    worst_trade = Column(Float, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, String, DateTime, ForeignKey, JSON
+from sqlalchemy.dialects.postgresql import UUID
+from app.database.connection import Base
+import datetime
+
+
+class SignalSubscription(Base):
+    """
+    One user's subscription to the signal of a (symbol, timeframe), with the
+    channels it is delivered on. Every worker mirrors this table in memory.
+    """
+    __tablename__ = "signal_subscriptions"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    symbol = Column(String, primary_key=True)
+    timeframe = Column(String, primary_key=True)
+    channels = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
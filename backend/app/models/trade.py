@@ -3,6 +3,7 @@ from sqlalchemy.dialects.postgresql import UUID
 from app.database.connection import Base
 import enum
 import datetime
+import uuid
 
 class TradeStatus(str, enum.Enum):
     OPEN = "open"
@@ -20,6 +21,7 @@ class Trade(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     symbol = Column(String, nullable=False)
+    strategy = Column(String, nullable=True)
     type = Column(Enum(TradeType), nullable=False)
     status = Column(Enum(TradeStatus), default=TradeStatus.PENDING)
     entry_price = Column(Float, nullable=True)
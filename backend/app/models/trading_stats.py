@@ -0,0 +1,21 @@
+from sqlalchemy import Column, String, DateTime, JSON
+from app.database.connection import Base
+import datetime
+
+
+class TradingStatsSnapshot(Base):
+    """
+    Latest TradingStats state for one scope ("user|strategy|symbol", "*" = all).
+    Every snapshot written in one flush shares the same watermark: the
+    (close_time, id) of the newest trade applied when it was taken.
+    """
+    __tablename__ = "trading_stats_snapshots"
+
+    scope = Column(String, primary_key=True)
+    user_id = Column(String, nullable=True, index=True)
+    strategy = Column(String, nullable=True)
+    symbol = Column(String, nullable=True)
+    state = Column(JSON, nullable=False)
+    last_close_time = Column(DateTime, nullable=True)
+    last_trade_id = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
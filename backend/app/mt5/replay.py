@@ -0,0 +1,187 @@
+# backend/app/mt5/replay.py
+"""
+Offline stand-in for the MT5 PUB socket
+- Replays recorded ticks/candles at configurable speed
+- Records a live stream to JSONL for later replay
+Used to load-test the stream -> analyzers -> alerts pipeline without a terminal.
+
+Recording format, one message per line:
+    {"topic": "tick.XAUUSD", "ts": 1708266600.25, "data": {...}}
+"""
+
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional
+
+import zmq
+import zmq.asyncio
+
+from app.mt5.stream import HEARTBEAT_TOPIC, candle_topic, tick_topic
+
+logger = logging.getLogger(__name__)
+
+
+def _to_epoch(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+
+class StreamRecorder:
+    """Stream handler that appends every message to a JSONL file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __call__(self, message: dict):
+        if "bid" in message or "ask" in message:
+            topic = tick_topic(message["symbol"])
+            ts = _to_epoch(message.get("time", time.time()))
+        else:
+            topic = candle_topic(message["symbol"], message["timeframe"])
+            ts = _to_epoch(message["timestamp"])
+        data = {k: v for k, v in message.items() if k != "seq"}
+        self._file.write(json.dumps({"topic": topic, "ts": ts, "data": data}) + "\n")
+
+    def attach(self, stream):
+        stream.add_tick_handler(self)
+        stream.add_candle_handler(self)
+
+    def close(self):
+        self._file.close()
+
+
+class ReplayPublisher:
+    """
+    PUB socket that replays recorded messages.
+
+    speed: 1.0 = real time, 10.0 = ten times faster, 0 = as fast as possible
+    """
+
+    def __init__(
+        self,
+        endpoint: str = "tcp://127.0.0.1:9001",
+        speed: float = 1.0,
+        heartbeat_interval: float = 1.0,
+        context: Optional[zmq.asyncio.Context] = None
+    ):
+        self.endpoint = endpoint
+        self.speed = speed
+        self.heartbeat_interval = heartbeat_interval
+        self.context = context or zmq.asyncio.Context.instance()
+        self.socket: Optional[zmq.asyncio.Socket] = None
+        self.sequences: Dict[str, int] = {}
+        self.published = 0
+
+    # -----------------------------
+    # Sources
+    # -----------------------------
+    @staticmethod
+    def load_jsonl(path: str) -> Iterator[dict]:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+    @staticmethod
+    def from_candles(symbol: str, timeframe: str, candles: Iterable[dict]) -> Iterator[dict]:
+        """Turn OHLCV dicts (the analyzers' format) into replayable candle messages"""
+        for candle in candles:
+            yield {
+                "topic": candle_topic(symbol, timeframe),
+                "ts": _to_epoch(candle["timestamp"]),
+                "data": {
+                    "symbol": symbol,
+                    "timeframe": timeframe,
+                    "closed": True,
+                    **candle
+                }
+            }
+
+    # -----------------------------
+    # Publishing
+    # -----------------------------
+    def bind(self):
+        self.socket = self.context.socket(zmq.PUB)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.setsockopt(zmq.SNDHWM, 100_000)
+        self.socket.bind(self.endpoint)
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close(linger=0)
+            self.socket = None
+
+    async def publish(self, topic: str, data: dict):
+        seq = self.sequences.get(topic, 0) + 1
+        self.sequences[topic] = seq
+        payload = json.dumps({**data, "seq": seq}).encode()
+        await self.socket.send_multipart([topic.encode(), payload])
+        self.published += 1
+
+    async def heartbeat(self):
+        await self.publish(HEARTBEAT_TOPIC, {"time": time.time()})
+
+    async def replay(self, messages: Iterable[dict], warmup: float = 0.2) -> int:
+        """
+        Replay messages preserving their relative timing (scaled by speed).
+        warmup gives SUB sockets time to connect (ZMQ slow-joiner).
+        """
+        if self.socket is None:
+            self.bind()
+        await asyncio.sleep(warmup)
+
+        start_wall = time.monotonic()
+        start_ts: Optional[float] = None
+        last_hb = start_wall
+        count = 0
+
+        for message in messages:
+            if start_ts is None:
+                start_ts = message["ts"]
+
+            if self.speed > 0:
+                due = start_wall + (message["ts"] - start_ts) / self.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif count % 1000 == 0:
+                # yield to the loop so subscribers in the same process keep up
+                await asyncio.sleep(0)
+
+            await self.publish(message["topic"], message["data"])
+            count += 1
+
+            now = time.monotonic()
+            if now - last_hb >= self.heartbeat_interval:
+                await self.heartbeat()
+                last_hb = now
+
+        logger.info(f"▶️ Replayed {count} messages at {self.speed or 'max'}x")
+        return count
+
+
+async def replay_file(path: str, endpoint: str, speed: float = 1.0) -> int:
+    """Convenience entry point: replay a JSONL recording once"""
+    publisher = ReplayPublisher(endpoint=endpoint, speed=speed)
+    try:
+        return await publisher.replay(publisher.load_jsonl(path))
+    finally:
+        publisher.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay recorded MT5 market data")
+    parser.add_argument("path")
+    parser.add_argument("--endpoint", default="tcp://127.0.0.1:9001")
+    parser.add_argument("--speed", type=float, default=1.0)
+    args = parser.parse_args()
+
+    asyncio.run(replay_file(args.path, args.endpoint, args.speed))
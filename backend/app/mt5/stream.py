@@ -0,0 +1,306 @@
+# backend/app/mt5/stream.py
+"""
+MT5 Market Data Stream
+- Tick and candle subscription over ZMQ PUB/SUB
+- Per-symbol topic filtering
+- Sequence numbers for gap detection
+- Automatic resubscribe when the feed goes silent
+
+Wire format (multipart): [topic, json payload]
+    tick.XAUUSD          {"seq": 41, "symbol": "XAUUSD", "bid": 2945.1, "ask": 2945.4, "time": 1708266600.25}
+    candle.XAUUSD.M15    {"seq": 7, "symbol": "XAUUSD", "timeframe": "M15", "timestamp": "...",
+                          "open": ..., "high": ..., "low": ..., "close": ..., "volume": ..., "closed": true}
+    hb                   {"seq": 3, "time": 1708266600.0}
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import zmq
+import zmq.asyncio
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_TOPIC = "hb"
+
+
+def tick_topic(symbol: str) -> str:
+    return f"tick.{symbol}"
+
+
+def candle_topic(symbol: str, timeframe: str) -> str:
+    return f"candle.{symbol}.{timeframe}"
+
+
+@dataclass
+class StreamStats:
+    received: int = 0
+    gaps: int = 0
+    missed: int = 0
+    resubscribes: int = 0
+    last_message_at: float = 0.0
+    last_seq: Dict[str, int] = field(default_factory=dict)
+
+
+class MarketDataStream:
+    """
+    SUB-side of the MT5 bridge. Handlers are awaited in arrival order,
+    so a slow handler applies back-pressure instead of reordering bars.
+    """
+
+    def __init__(
+        self,
+        endpoint: Optional[str] = None,
+        stale_after: Optional[float] = None,
+        context: Optional[zmq.asyncio.Context] = None
+    ):
+        self.endpoint = endpoint or f"tcp://{settings.MT5_HOST}:{settings.MT5_STREAM_PORT}"
+        self.stale_after = stale_after or settings.MT5_STREAM_STALE_SECONDS
+        self.context = context or zmq.asyncio.Context.instance()
+        self.socket: Optional[zmq.asyncio.Socket] = None
+
+        self.topics: Set[str] = set()
+        self.stats = StreamStats()
+
+        self._tick_handlers: List[Callable] = []
+        self._candle_handlers: List[Callable] = []
+        self._gap_handlers: List[Callable] = []
+        self._task: Optional[asyncio.Task] = None
+        self.is_running = False
+
+    # -----------------------------
+    # Subscriptions
+    # -----------------------------
+    def subscribe(self, symbol: str, timeframes: Optional[List[str]] = None, ticks: bool = True):
+        """Subscribe to a symbol's ticks and/or candle timeframes"""
+        new_topics = []
+        if ticks:
+            new_topics.append(tick_topic(symbol))
+        for tf in timeframes or []:
+            new_topics.append(candle_topic(symbol, tf))
+
+        for topic in new_topics:
+            if topic not in self.topics:
+                self.topics.add(topic)
+                if self.socket is not None:
+                    self.socket.setsockopt_string(zmq.SUBSCRIBE, topic)
+
+    def unsubscribe(self, symbol: str):
+        """Drop every topic for a symbol"""
+        prefixes = (tick_topic(symbol), f"candle.{symbol}.")
+        for topic in [t for t in self.topics if t.startswith(prefixes)]:
+            self.topics.discard(topic)
+            self.stats.last_seq.pop(topic, None)
+            if self.socket is not None:
+                self.socket.setsockopt_string(zmq.UNSUBSCRIBE, topic)
+
+    def add_tick_handler(self, handler: Callable):
+        self._tick_handlers.append(handler)
+
+    def add_candle_handler(self, handler: Callable):
+        self._candle_handlers.append(handler)
+
+    def add_gap_handler(self, handler: Callable):
+        """handler(topic, expected_seq, received_seq)"""
+        self._gap_handlers.append(handler)
+
+    # -----------------------------
+    # Lifecycle
+    # -----------------------------
+    def _open_socket(self):
+        self.socket = self.context.socket(zmq.SUB)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.setsockopt(zmq.RCVHWM, 100_000)
+        # topic filtering is prefix based: "tick.XAU" would also match "tick.XAUEUR",
+        # so exact matching is re-checked in _dispatch
+        self.socket.setsockopt_string(zmq.SUBSCRIBE, HEARTBEAT_TOPIC)
+        for topic in self.topics:
+            self.socket.setsockopt_string(zmq.SUBSCRIBE, topic)
+        self.socket.connect(self.endpoint)
+        self.stats.last_message_at = time.monotonic()
+
+    def _close_socket(self):
+        if self.socket is not None:
+            self.socket.close(linger=0)
+            self.socket = None
+
+    async def start(self):
+        """Start the receive loop in the background"""
+        if self.is_running:
+            return
+        self._open_socket()
+        self.is_running = True
+        self._task = asyncio.create_task(self._receive_loop())
+        logger.info(f"📡 MT5 stream connected to {self.endpoint} ({len(self.topics)} topics)")
+
+    async def stop(self):
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._close_socket()
+
+    async def resubscribe(self):
+        """Tear down the socket and subscribe to everything again"""
+        self._close_socket()
+        self._open_socket()
+        # the publisher may have restarted: accept whatever sequence comes next
+        self.stats.last_seq.clear()
+        self.stats.resubscribes += 1
+        logger.warning(f"🔁 MT5 stream resubscribed ({len(self.topics)} topics)")
+
+    async def _receive_loop(self):
+        poll_ms = int(min(self.stale_after, 1.0) * 1000)
+        while self.is_running:
+            try:
+                if await self.socket.poll(poll_ms, zmq.POLLIN):
+                    topic, payload = await self.socket.recv_multipart()
+                    await self._dispatch(topic.decode(), json.loads(payload))
+                elif time.monotonic() - self.stats.last_message_at > self.stale_after:
+                    await self.resubscribe()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"MT5 stream error: {e}")
+                await asyncio.sleep(0.1)
+
+    # -----------------------------
+    # Dispatch
+    # -----------------------------
+    def _check_sequence(self, topic: str, seq: Optional[int]) -> bool:
+        """Track per-topic sequence numbers. Returns False for duplicates."""
+        if seq is None:
+            return True
+
+        last = self.stats.last_seq.get(topic)
+        self.stats.last_seq[topic] = seq
+
+        if last is None or seq == last + 1:
+            return True
+
+        if seq <= last:
+            if seq == 1 or seq < last - 1:
+                # publisher restarted and began counting again
+                logger.info(f"MT5 stream {topic} sequence reset {last} -> {seq}")
+                return True
+            self.stats.last_seq[topic] = last
+            return False
+
+        missed = seq - last - 1
+        self.stats.gaps += 1
+        self.stats.missed += missed
+        logger.warning(f"⚠️ MT5 stream gap on {topic}: expected {last + 1}, got {seq} ({missed} missed)")
+        for handler in self._gap_handlers:
+            try:
+                handler(topic, last + 1, seq)
+            except Exception as e:
+                logger.error(f"Gap handler error: {e}")
+        return True
+
+    async def _dispatch(self, topic: str, message: dict):
+        self.stats.last_message_at = time.monotonic()
+
+        if topic == HEARTBEAT_TOPIC:
+            return
+        if topic not in self.topics:
+            return
+        if not self._check_sequence(topic, message.get("seq")):
+            return
+
+        self.stats.received += 1
+        handlers = self._tick_handlers if topic.startswith("tick.") else self._candle_handlers
+
+        for handler in handlers:
+            try:
+                result = handler(message)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Stream handler error on {topic}: {e}")
+
+
+class StreamConsumers:
+    """
+    Bridges the stream into the rest of the system:
+    - every tick goes to AlertManager.check_price_alerts
+    - every closed candle is appended to a rolling window and the
+      window is run through TradingEngine.analyze_market, unless
+      analyze_filter(symbol, timeframe) says nobody needs it
+    """
+
+    def __init__(
+        self,
+        trading_engine=None,
+        alert_manager=None,
+        window_size: int = 200,
+        min_bars: int = 50,
+        on_analysis: Optional[Callable] = None,
+        analyze_filter: Optional[Callable[[str, str], bool]] = None
+    ):
+        self.trading_engine = trading_engine
+        self.alert_manager = alert_manager
+        self.window_size = window_size
+        self.min_bars = min_bars
+        self.on_analysis = on_analysis
+        self.analyze_filter = analyze_filter
+        self.windows: Dict[Tuple[str, str], Deque[dict]] = {}
+
+    def attach(self, stream: MarketDataStream):
+        stream.add_tick_handler(self.on_tick)
+        stream.add_candle_handler(self.on_candle)
+
+    def seed(self, symbol: str, timeframe: str, candles: List[dict]):
+        """Pre-fill a window with history so analysis starts on the first bar"""
+        window = self.windows.setdefault((symbol, timeframe), deque(maxlen=self.window_size))
+        window.extend(candles[-self.window_size:])
+
+    async def on_tick(self, tick: dict):
+        if self.alert_manager is None:
+            return
+        bid, ask = tick.get("bid"), tick.get("ask")
+        price = (bid + ask) / 2 if bid is not None and ask is not None else (bid or ask)
+        if price is None:
+            return
+        await self.alert_manager.check_price_alerts(tick["symbol"], price, tick)
+
+    async def on_candle(self, candle: dict):
+        # forming bars only update the last element; analysis runs on close
+        key = (candle["symbol"], candle["timeframe"])
+        window = self.windows.setdefault(key, deque(maxlen=self.window_size))
+
+        bar = {
+            "timestamp": candle["timestamp"],
+            "open": candle["open"],
+            "high": candle["high"],
+            "low": candle["low"],
+            "close": candle["close"],
+            "volume": candle.get("volume", 0)
+        }
+        if window and window[-1]["timestamp"] == bar["timestamp"]:
+            window[-1] = bar
+        else:
+            window.append(bar)
+
+        if not candle.get("closed", True) or self.trading_engine is None:
+            return
+        if len(window) < self.min_bars:
+            return
+        if self.analyze_filter is not None and not self.analyze_filter(*key):
+            return
+
+        analysis = await self.trading_engine.analyze_market(list(window), candle["symbol"])
+        if self.on_analysis:
+            result = self.on_analysis(candle["symbol"], candle["timeframe"], analysis)
+            if asyncio.iscoroutine(result):
+                await result
@@ -2,12 +2,16 @@
 Alert Manager - Smart alerts and triggers
 """
 import logging
+import uuid
 from typing import Dict, Any, List, Optional, Callable
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 from enum import Enum
 
-from app.core.database import get_db
+from sqlalchemy import select
+
+from app.core.performance import BulkInsertWriter
+from app.database.connection import session_scope
 from app.models.alert import Alert, AlertType, AlertCondition
 from app.models.user import User
 from app.services.notification_service import notification_service, NotificationPriority
@@ -29,6 +33,16 @@ class AlertTrigger(Enum):
     NEWS_KEYWORD = "news_keyword"
 
 
+# stored condition per trigger; threshold triggers fire above their value
+TRIGGER_CONDITIONS = {
+    AlertTrigger.PRICE_BELOW: AlertCondition.BELOW,
+    AlertTrigger.PRICE_CHANGE_PERCENT: AlertCondition.PERCENT_CHANGE,
+    AlertTrigger.MARGIN_LEVEL: AlertCondition.BELOW,
+}
+
+alert_writer = BulkInsertWriter(Alert.__table__, batch_size=100, flush_interval=0.2)
+
+
 @dataclass
 class AlertConfig:
     """Alert configuration"""
@@ -70,22 +84,24 @@ class AlertManager:
         if message_template is None:
             message_template = self._get_default_template(trigger)
         
-        alert = Alert(
-            user_id=user_id,
-            type=alert_type,
-            trigger=trigger.value,
-            symbol=symbol,
-            condition_value=condition_value,
-            message_template=message_template,
-            cooldown_minutes=cooldown_minutes,
-            is_active=True,
-            created_at=datetime.utcnow()
-        )
+        now = datetime.utcnow()
+        row = {
+            "id": uuid.uuid4(),
+            "user_id": user_id,
+            "name": trigger.value,
+            "type": alert_type,
+            "symbol": symbol or "",
+            "condition": TRIGGER_CONDITIONS.get(trigger, AlertCondition.ABOVE),
+            "value": condition_value,
+            "message_template": message_template,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now
+        }
         
-        async with get_db() as db:
-            db.add(alert)
-            await db.commit()
-            await db.refresh(alert)
+        # concurrent creates share one INSERT; returns once committed
+        await alert_writer.add(row, wait=True)
+        alert = Alert(**row)
         
         # Cache the alert
         if user_id not in self.active_alerts:
@@ -264,22 +280,23 @@ class AlertManager:
     
     async def load_user_alerts(self, user_id: int):
         """Load active alerts for user from database"""
-        async with get_db() as db:
-            alerts = await db.query(Alert).filter(
-                Alert.user_id == user_id,
-                Alert.is_active == True
-            ).all()
+        async with session_scope(read_only=True) as db:
+            alerts = (await db.execute(
+                select(Alert).where(Alert.user_id == user_id, Alert.is_active == True)
+            )).scalars().all()
         
         self.active_alerts[user_id] = []
         for alert in alerts:
+            # rows as create_alert() writes them: name=trigger, value=threshold, symbol "" for none;
+            # the cooldown is not stored, so reloaded alerts get the default
+            trigger = AlertTrigger(alert.name)
             config = AlertConfig(
                 user_id=alert.user_id,
                 alert_type=alert.type,
-                trigger=AlertTrigger(alert.trigger),
-                symbol=alert.symbol,
-                condition_value=alert.condition_value,
-                message_template=alert.message_template,
-                cooldown_minutes=alert.cooldown_minutes,
+                trigger=trigger,
+                symbol=alert.symbol or None,
+                condition_value=alert.value,
+                message_template=alert.message_template or self._get_default_template(trigger),
                 is_active=alert.is_active
             )
             self.active_alerts[user_id].append(config)
@@ -288,27 +305,26 @@ class AlertManager:
     
     async def deactivate_alert(self, alert_id: int) -> bool:
         """Deactivate specific alert"""
-        async with get_db() as db:
-            alert = await db.query(Alert).filter(Alert.id == alert_id).first()
+        async with session_scope() as db:
+            alert = await db.get(Alert, alert_id)
             if alert:
                 alert.is_active = False
-                await db.commit()
                 
                 # Remove from cache
                 if alert.user_id in self.active_alerts:
                     self.active_alerts[alert.user_id] = [
                         a for a in self.active_alerts[alert.user_id]
-                        if not (a.symbol == alert.symbol and 
-                               a.trigger.value == alert.trigger and
-                               a.condition_value == alert.condition_value)
+                        if not ((a.symbol or "") == alert.symbol and
+                               a.trigger.value == alert.name and
+                               a.condition_value == alert.value)
                     ]
                 return True
         return False
     
     async def get_user_alerts(self, user_id: int) -> List[Alert]:
         """Get all alerts for user"""
-        async with get_db() as db:
-            return await db.query(Alert).filter(Alert.user_id == user_id).all()
+        async with session_scope(read_only=True) as db:
+            return (await db.execute(select(Alert).where(Alert.user_id == user_id))).scalars().all()
 
 
 # Global instance
@@ -0,0 +1,141 @@
+"""
+Notification inbox
+Reads and read-state of a user's in-app notifications.
+
+- page(): keyset pagination on (user_id, created_at, id), served by
+  ix_notifications_user_created (ix_notifications_user_unread for unread
+  only), so deep pages cost what the first one does
+- unread_count(): one primary-key read of notification_counters
+- the counter is incremented by count_inserted(), which the notification
+  writer runs in each batch's transaction, and decremented by the rows each
+  mark_read()/mark_all_read() actually flipped; recount() rebuilds it
+"""
+
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.pagination import keyset, page
+from app.database.connection import session_scope
+from app.models.notification import Notification, NotificationCounter
+
+logger = logging.getLogger(__name__)
+
+PAGE_KEY = (Notification.created_at, Notification.id)
+
+
+class NotificationInbox:
+    """
+    Usage:
+        items, cursor = await notification_inbox.page(user_id, limit=50)
+        more, cursor = await notification_inbox.page(user_id, limit=50, cursor=cursor)
+        await notification_inbox.unread_count(user_id)
+    """
+
+    def __init__(self, session_scope=session_scope):
+        self._session = session_scope
+
+    async def page(
+        self,
+        user_id: UUID,
+        unread_only: bool = False,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Notification], Optional[str]]:
+        """Newest first; returns the page and the cursor of the next one (None on the last)"""
+        query = select(Notification).where(Notification.user_id == user_id)
+        if unread_only:
+            query = query.where(Notification.read == False)
+        query = keyset(query, PAGE_KEY, cursor, limit)
+
+        async with self._session(read_only=True) as db:
+            rows = (await db.execute(query)).scalars().all()
+        return page(rows, PAGE_KEY, limit)
+
+    async def unread_count(self, user_id: UUID) -> int:
+        async with self._session(read_only=True) as db:
+            unread = (await db.execute(
+                select(NotificationCounter.unread).where(NotificationCounter.user_id == user_id)
+            )).scalar_one_or_none()
+        return max(unread or 0, 0)
+
+    @staticmethod
+    def _adjust(user_id: UUID, delta: int):
+        counter = NotificationCounter.__table__.c
+        return (
+            update(NotificationCounter.__table__)
+            .where(counter.user_id == user_id)
+            .values(unread=func.greatest(counter.unread + delta, 0), updated_at=datetime.utcnow())
+        )
+
+    async def count_inserted(self, session, batch: List[dict]):
+        """BulkInsertWriter.after_insert: add the batch's unread rows onto each user's counter"""
+        unread = Counter(row["user_id"] for row in batch if not row.get("read"))
+        if not unread:
+            return
+        statement = pg_insert(NotificationCounter.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={
+                "unread": NotificationCounter.__table__.c.unread + statement.excluded.unread,
+                "updated_at": statement.excluded.updated_at,
+            },
+        )
+        now = datetime.utcnow()
+        await session.execute(statement, [
+            {"user_id": user_id, "unread": count, "updated_at": now}
+            for user_id, count in unread.items()
+        ])
+
+    async def mark_read(self, user_id: UUID, notification_id: int) -> bool:
+        """Mark one notification as read; False if it is not the user's or was already read"""
+        async with self._session() as db:
+            result = await db.execute(
+                update(Notification)
+                .where(Notification.id == notification_id, Notification.user_id == user_id,
+                       Notification.read == False)
+                .values(read=True, read_at=datetime.utcnow())
+            )
+            if result.rowcount:
+                await db.execute(self._adjust(user_id, -result.rowcount))
+            return result.rowcount > 0
+
+    async def mark_all_read(self, user_id: UUID) -> int:
+        """
+        One UPDATE over the user's unread rows (the partial index), then the
+        counter drops by what was flipped rather than to zero, so a batch
+        committed meanwhile keeps its increment.
+        """
+        async with self._session() as db:
+            result = await db.execute(
+                update(Notification)
+                .where(Notification.user_id == user_id, Notification.read == False)
+                .values(read=True, read_at=datetime.utcnow())
+            )
+            if result.rowcount:
+                await db.execute(self._adjust(user_id, -result.rowcount))
+            return result.rowcount
+
+    async def recount(self, user_id: UUID) -> int:
+        """Rebuild the user's counter from the notifications table"""
+        async with self._session() as db:
+            unread = (await db.execute(
+                select(func.count()).select_from(Notification)
+                .where(Notification.user_id == user_id, Notification.read == False)
+            )).scalar_one()
+            statement = pg_insert(NotificationCounter.__table__).values(
+                user_id=user_id, unread=unread, updated_at=datetime.utcnow()
+            )
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=["user_id"],
+                set_={"unread": statement.excluded.unread, "updated_at": statement.excluded.updated_at},
+            ))
+        return unread
+
+
+notification_inbox = NotificationInbox()
@@ -2,17 +2,21 @@
 Notification Service - Queue-based notifications with Celery
 """
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from uuid import UUID
 from datetime import datetime
 from enum import Enum
 
 from celery import Celery
 from celery.exceptions import MaxRetriesExceededError
+from sqlalchemy import select
 
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.performance import BulkInsertWriter
+from app.database.connection import dispose_engines, session_scope
 from app.models.notification import Notification, NotificationType, NotificationPriority
 from app.models.user import User
+from app.services.notification_inbox import notification_inbox
 from app.telegram.bot import telegram_bot
 
 logger = logging.getLogger(__name__)
@@ -37,6 +41,15 @@ celery_app.conf.update(
 )
 
 
+# in-app notification rows, written in batches; unread counters move in the same transaction
+notification_writer = BulkInsertWriter(
+    Notification.__table__,
+    batch_size=200,
+    flush_interval=0.5,
+    after_insert=notification_inbox.count_inserted
+)
+
+
 class NotificationChannel(Enum):
     TELEGRAM = "telegram"
     EMAIL = "email"
@@ -54,7 +67,7 @@ class NotificationService:
     
     async def send_notification(
         self,
-        user_id: int,
+        user_id: UUID,
         notification_type: NotificationType,
         title: str,
         message: str,
@@ -82,23 +95,18 @@ class NotificationService:
             logger.warning(f"Rate limit exceeded for user {user_id}")
             return False
         
-        # Create notification record
-        notification = Notification(
-            user_id=user_id,
-            type=notification_type,
-            title=title,
-            message=message,
-            data=data or {},
-            priority=priority,
-            channels=[c.value for c in channels],
-            created_at=datetime.utcnow(),
-            read=False
-        )
-        
-        # Save to database
-        async with get_db() as db:
-            db.add(notification)
-            await db.commit()
+        # Queue notification record (stored with the next batch)
+        await notification_writer.add({
+            "user_id": user_id,
+            "type": notification_type,
+            "title": title,
+            "message": message,
+            "data": data or {},
+            "priority": priority,
+            "channels": [c.value for c in channels],
+            "created_at": datetime.utcnow(),
+            "read": False
+        })
         
         # Queue notification tasks based on priority
         for channel in channels:
@@ -113,7 +121,7 @@ class NotificationService:
         logger.info(f"Notification queued for user {user_id}: {title}")
         return True
     
-    def _check_rate_limit(self, user_id: int) -> bool:
+    def _check_rate_limit(self, user_id: UUID) -> bool:
         """Check if user has exceeded rate limit"""
         now = datetime.utcnow()
         key = f"rate_limit:{user_id}"
@@ -176,13 +184,13 @@ class NotificationService:
         Args:
             user_filter: Filter criteria for users (e.g., {'is_active': True})
         """
-        async with get_db() as db:
-            query = db.query(User)
+        async with session_scope(read_only=True) as db:
+            query = select(User)
             if user_filter:
                 for key, value in user_filter.items():
-                    query = query.filter(getattr(User, key) == value)
+                    query = query.where(getattr(User, key) == value)
             
-            users = await query.all()
+            users = (await db.execute(query)).scalars().all()
         
         results = {}
         for user in users:
@@ -200,50 +208,30 @@ class NotificationService:
     
     async def get_user_notifications(
         self,
-        user_id: int,
+        user_id: UUID,
         unread_only: bool = False,
         limit: int = 50,
-        offset: int = 0
-    ) -> List[Notification]:
-        """Get notifications for user"""
-        async with get_db() as db:
-            query = db.query(Notification).filter(Notification.user_id == user_id)
-            
-            if unread_only:
-                query = query.filter(Notification.read == False)
-            
-            query = query.order_by(Notification.created_at.desc())
-            query = query.offset(offset).limit(limit)
-            
-            return await query.all()
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Notification], Optional[str]]:
+        """
+        Get notifications for user, newest first
+        
+        Returns the page and the cursor to pass for the next one (None on
+        the last page).
+        """
+        return await notification_inbox.page(user_id, unread_only, limit, cursor)
     
-    async def mark_as_read(self, notification_id: int, user_id: int) -> bool:
+    async def get_unread_count(self, user_id: UUID) -> int:
+        """Unread notifications of the user (kept as a counter)"""
+        return await notification_inbox.unread_count(user_id)
+    
+    async def mark_as_read(self, notification_id: int, user_id: UUID) -> bool:
         """Mark notification as read"""
-        async with get_db() as db:
-            notification = await db.query(Notification).filter(
-                Notification.id == notification_id,
-                Notification.user_id == user_id
-            ).first()
-            
-            if notification:
-                notification.read = True
-                notification.read_at = datetime.utcnow()
-                await db.commit()
-                return True
-            return False
+        return await notification_inbox.mark_read(user_id, notification_id)
     
-    async def mark_all_as_read(self, user_id: int) -> int:
+    async def mark_all_as_read(self, user_id: UUID) -> int:
         """Mark all notifications as read"""
-        async with get_db() as db:
-            result = await db.query(Notification).filter(
-                Notification.user_id == user_id,
-                Notification.read == False
-            ).update({
-                'read': True,
-                'read_at': datetime.utcnow()
-            })
-            await db.commit()
-            return result
+        return await notification_inbox.mark_all_read(user_id)
 
 
 # Celery Tasks
@@ -257,12 +245,14 @@ def send_telegram_notification(self, user_id: int, title: str, message: str, dat
             await telegram_bot.initialize()
             
             # Get user's Telegram chat ID
-            async with get_db() as db:
+            async with session_scope(read_only=True) as db:
                 from app.models.telegram_user import TelegramUser
-                telegram_user = await db.query(TelegramUser).filter(
-                    TelegramUser.user_id == user_id,
-                    TelegramUser.is_active == True
-                ).first()
+                telegram_user = (await db.execute(
+                    select(TelegramUser).where(
+                        TelegramUser.user_id == user_id,
+                        TelegramUser.is_active == True
+                    )
+                )).scalars().first()
                 
                 if not telegram_user:
                     logger.warning(f"No Telegram connection for user {user_id}")
@@ -280,6 +270,8 @@ def send_telegram_notification(self, user_id: int, title: str, message: str, dat
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         result = loop.run_until_complete(_send())
+        # pooled connections belong to this loop, don't hand them to the next task's
+        loop.run_until_complete(dispose_engines())
         loop.close()
         
         if not result:
@@ -0,0 +1,267 @@
+"""
+PnL rollups
+Closed-trade PnL materialized per (user, day, symbol) in pnl_daily and per
+(user, week) in pnl_weekly, so reports read a handful of rollup rows instead
+of aggregating trades.
+
+- record(): when a trade closes, one additive upsert per table, in one transaction
+- reconcile(): rebuilds the last PNL_RECONCILE_DAYS days (from their Monday)
+  from trades on the server, DELETE + INSERT ... SELECT in one transaction,
+  which repairs anything record() missed or counted twice
+- day(), period(), week(), trend(): report reads, each an index range scan on
+  (user_id, day) whose size depends on days and symbols, not on trade count
+"""
+
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import Date, and_, case, cast, delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.config import settings
+from app.database.connection import session_scope
+from app.models.pnl_rollup import PnlDaily, PnlWeekly
+from app.models.trade import Trade, TradeStatus
+
+logger = logging.getLogger(__name__)
+
+MEASURES = ("trades", "wins", "losses", "gross_profit", "gross_loss", "net_pnl", "best_trade", "worst_trade")
+
+
+def day_of(moment: Optional[datetime]) -> date:
+    """UTC day a trade closed on (naive datetimes are UTC)"""
+    if moment is None:
+        return datetime.utcnow().date()
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.date()
+
+
+def week_of(day: date) -> date:
+    """Monday of the day's ISO week, as PostgreSQL's date_trunc('week', ...)"""
+    return day - timedelta(days=day.weekday())
+
+
+def _trade_pnl(trade) -> float:
+    return (trade.profit or 0.0) - (trade.commission or 0.0) + (trade.swap or 0.0)
+
+
+def _empty() -> Dict[str, Any]:
+    return {"trades": 0, "wins": 0, "losses": 0, "gross_profit": 0.0, "gross_loss": 0.0,
+            "net_pnl": 0.0, "best_trade": None, "worst_trade": None}
+
+
+def _add(totals: Dict[str, Any], pnl: float):
+    totals["trades"] += 1
+    totals["wins"] += pnl > 0
+    totals["losses"] += pnl < 0
+    totals["gross_profit"] += max(pnl, 0.0)
+    totals["gross_loss"] += max(-pnl, 0.0)
+    totals["net_pnl"] += pnl
+    totals["best_trade"] = pnl if totals["best_trade"] is None else max(totals["best_trade"], pnl)
+    totals["worst_trade"] = pnl if totals["worst_trade"] is None else min(totals["worst_trade"], pnl)
+
+
+def _report(row) -> Dict[str, Any]:
+    """Aggregated rollup row -> report dict (win_rate in %, like the Telegram templates)"""
+    totals = _empty()
+    if row is not None and row.trades:
+        totals.update({name: getattr(row, name) for name in MEASURES})
+    totals["win_rate"] = round(totals["wins"] / totals["trades"] * 100, 1) if totals["trades"] else 0.0
+    return totals
+
+
+class PnlRollups:
+    """
+    Usage:
+        await pnl_rollups.record(trade)                       # when a trade closes
+        await pnl_rollups.day(user_id, date.today())          # /daily
+        await pnl_rollups.week(user_id, week_of(date.today()))  # /weekly
+        await pnl_rollups.trend(days=30)                      # guardian trends
+    """
+
+    def __init__(self, session_scope=session_scope, trades=None, daily=None, weekly=None):
+        self._session = session_scope
+        self.trades = trades if trades is not None else Trade.__table__
+        self.daily = daily if daily is not None else PnlDaily.__table__
+        self.weekly = weekly if weekly is not None else PnlWeekly.__table__
+        self._task: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------ writes
+
+    def _upsert(self, table, keys: List[str]):
+        """INSERT ... ON CONFLICT adding the new counts onto the stored ones"""
+        statement = pg_insert(table)
+        new, old = statement.excluded, table.c
+        additive = {name: old[name] + new[name]
+                    for name in ("trades", "wins", "losses", "gross_profit", "gross_loss", "net_pnl")}
+        return statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={
+                **additive,
+                "best_trade": func.greatest(old.best_trade, new.best_trade),
+                "worst_trade": func.least(old.worst_trade, new.worst_trade),
+                "updated_at": new.updated_at,
+            },
+        )
+
+    async def record_many(self, trades: Iterable) -> int:
+        """Add closed trades to both rollups: one upsert statement per table; returns rows touched"""
+        daily: Dict[tuple, Dict[str, Any]] = {}
+        weekly: Dict[tuple, Dict[str, Any]] = {}
+        for trade in trades:
+            pnl, day = _trade_pnl(trade), day_of(trade.close_time)
+            _add(daily.setdefault((trade.user_id, day, trade.symbol), _empty()), pnl)
+            _add(weekly.setdefault((trade.user_id, week_of(day)), _empty()), pnl)
+        if not daily:
+            return 0
+
+        now = datetime.utcnow()
+        async with self._session() as session:
+            await session.execute(self._upsert(self.daily, ["user_id", "day", "symbol"]), [
+                {"user_id": user_id, "day": day, "symbol": symbol, **totals, "updated_at": now}
+                for (user_id, day, symbol), totals in daily.items()
+            ])
+            await session.execute(self._upsert(self.weekly, ["user_id", "week"]), [
+                {"user_id": user_id, "week": week, **totals, "updated_at": now}
+                for (user_id, week), totals in weekly.items()
+            ])
+        return len(daily) + len(weekly)
+
+    async def record(self, trade) -> int:
+        return await self.record_many([trade])
+
+    def _daily_from_trades(self, since: date):
+        trades = self.trades.c
+        pnl = func.coalesce(trades.profit, 0.0) - func.coalesce(trades.commission, 0.0) + func.coalesce(trades.swap, 0.0)
+        day = cast(trades.close_time, Date)
+        return (
+            select(
+                trades.user_id, day.label("day"), trades.symbol,
+                func.count().label("trades"),
+                func.sum(case((pnl > 0, 1), else_=0)).label("wins"),
+                func.sum(case((pnl < 0, 1), else_=0)).label("losses"),
+                func.sum(case((pnl > 0, pnl), else_=0.0)).label("gross_profit"),
+                func.sum(case((pnl < 0, -pnl), else_=0.0)).label("gross_loss"),
+                func.sum(pnl).label("net_pnl"),
+                func.max(pnl).label("best_trade"),
+                func.min(pnl).label("worst_trade"),
+                func.now().label("updated_at"),
+            )
+            .where(trades.status == TradeStatus.CLOSED, trades.close_time >= since)
+            .group_by(trades.user_id, day, trades.symbol)
+        )
+
+    def _weekly_from_daily(self, since: date):
+        daily = self.daily.c
+        week = cast(func.date_trunc("week", daily.day), Date)
+        return (
+            select(
+                daily.user_id, week.label("week"),
+                *(func.sum(daily[name]).label(name)
+                  for name in ("trades", "wins", "losses", "gross_profit", "gross_loss", "net_pnl")),
+                func.max(daily.best_trade).label("best_trade"),
+                func.min(daily.worst_trade).label("worst_trade"),
+                func.now().label("updated_at"),
+            )
+            .where(daily.day >= since)
+            .group_by(daily.user_id, week)
+        )
+
+    async def reconcile(self, days: Optional[int] = None) -> None:
+        """Rebuild both rollups from trades for the last `days` days, whole weeks"""
+        days = days or settings.PNL_RECONCILE_DAYS
+        since = week_of(datetime.utcnow().date() - timedelta(days=days))
+        daily_columns = ["user_id", "day", "symbol", *MEASURES, "updated_at"]
+        weekly_columns = ["user_id", "week", *MEASURES, "updated_at"]
+        async with self._session() as session:
+            await session.execute(delete(self.daily).where(self.daily.c.day >= since))
+            await session.execute(self.daily.insert().from_select(daily_columns, self._daily_from_trades(since)))
+            await session.execute(delete(self.weekly).where(self.weekly.c.week >= since))
+            await session.execute(self.weekly.insert().from_select(weekly_columns, self._weekly_from_daily(since)))
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(settings.PNL_RECONCILE_INTERVAL)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"PnL rollup reconcile failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ------------------------------------------------------------ reads
+
+    def _totals(self, *columns):
+        daily = self.daily.c
+        return select(
+            *columns,
+            *(func.sum(daily[name]).label(name)
+              for name in ("trades", "wins", "losses", "gross_profit", "gross_loss", "net_pnl")),
+            func.max(daily.best_trade).label("best_trade"),
+            func.min(daily.worst_trade).label("worst_trade"),
+        )
+
+    async def period(self, user_id, start: date, end: date) -> Dict[str, Any]:
+        """Totals over days start <= day < end, all symbols (all users if user_id is None)"""
+        daily = self.daily.c
+        conditions = [daily.day >= start, daily.day < end]
+        if user_id is not None:
+            conditions.append(daily.user_id == user_id)
+        query = self._totals().where(and_(*conditions))
+        async with self._session(read_only=True) as session:
+            row = (await session.execute(query)).one_or_none()
+        return _report(row)
+
+    async def day(self, user_id, day: date) -> Dict[str, Any]:
+        report = await self.period(user_id, day, day + timedelta(days=1))
+        report["date"] = day.isoformat()
+        return report
+
+    async def week(self, user_id, week: date) -> Dict[str, Any]:
+        """The pnl_weekly row plus the week's best and worst day"""
+        weekly, daily = self.weekly.c, self.daily.c
+        async with self._session(read_only=True) as session:
+            row = (await session.execute(
+                select(self.weekly).where(weekly.user_id == user_id, weekly.week == week)
+            )).one_or_none()
+            days = (await session.execute(
+                select(daily.day, func.sum(daily.net_pnl).label("net_pnl"))
+                .where(daily.user_id == user_id, daily.day >= week, daily.day < week + timedelta(days=7))
+                .group_by(daily.day)
+            )).all()
+        report = _report(row)
+        report["week"] = week.isoformat()
+        days = [{"day": d.day.isoformat(), "net_pnl": d.net_pnl} for d in days]
+        report["best_day"] = max(days, key=lambda d: d["net_pnl"], default=None)
+        report["worst_day"] = min(days, key=lambda d: d["net_pnl"], default=None)
+        return report
+
+    def trend_query(self, days: int = 30, user_id=None):
+        """Per-day totals of the last `days` days, oldest first (all users if user_id is None)"""
+        daily = self.daily.c
+        conditions = [daily.day >= datetime.utcnow().date() - timedelta(days=days)]
+        if user_id is not None:
+            conditions.append(daily.user_id == user_id)
+        return self._totals(daily.day).where(and_(*conditions)).group_by(daily.day).order_by(daily.day)
+
+    async def trend(self, days: int = 30, user_id=None) -> List[Dict[str, Any]]:
+        async with self._session(read_only=True) as session:
+            rows = (await session.execute(self.trend_query(days, user_id))).all()
+        return [{"day": row.day.isoformat(), **_report(row)} for row in rows]
+
+
+pnl_rollups = PnlRollups()
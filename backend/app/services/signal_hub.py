@@ -0,0 +1,460 @@
+"""
+Signal hub
+One analysis per (symbol, timeframe) per closed bar, fanned out to every
+user subscribed to it, whichever API worker the user is connected to.
+
+- subscribe()/unsubscribe(): the registry (symbol, timeframe) -> {user: channels}
+  lives in signal_subscriptions; every worker mirrors it in memory, loaded at
+  start and kept current by the changes broadcast on the signal_hub channel
+- one worker at a time owns the analysis: it holds OWNER_KEY in Redis,
+  renewing it every owner_interval, and runs the MarketDataStream and
+  StreamConsumers built by the pipeline factory; if it dies another worker
+  takes over once the key expires (3 intervals)
+- the owner's StreamConsumers analyse a closed bar only if wants() says
+  someone is subscribed, and hand the result to publish(), which sends it
+  once over Redis pub/sub; every worker's deliver() serializes the payload
+  once and sends it to its own websockets batch_size sockets at a time (one
+  that fails or takes longer than send_timeout is dropped)
+- when the action turns BUY/SELL the owner alone sends Telegram (one
+  chat-id query, one formatted message) and in-app notifications (the
+  batched notification writer), in the background
+
+Without Redis (a single process) publish() delivers in-process. So signal
+generation costs one analysis per symbol and timeframe, whatever the number
+of users or workers; only the delivery grows with them.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.config import settings
+from app.database.connection import session_scope
+from app.marketdata.bars import TIMEFRAME_SECONDS, parse_timestamp
+from app.models.signal_subscription import SignalSubscription
+
+logger = logging.getLogger(__name__)
+
+WEBSOCKET = "websocket"
+TELEGRAM = "telegram"
+IN_APP = "in_app"
+CHANNELS = frozenset({WEBSOCKET, TELEGRAM, IN_APP})
+
+# signals worth an alert; anything else only updates the websocket feed
+ACTIONABLE = {"BUY", "STRONG_BUY", "SELL", "STRONG_SELL"}
+
+# Redis pub/sub channel of registry changes and signals, and the analysis lease
+CHANNEL = "signal_hub"
+OWNER_KEY = "signal_hub:owner"
+
+Key = Tuple[str, str]
+
+
+class SignalHub:
+    """
+    Usage:
+        await signal_hub.start(pipeline)             # every worker; pipeline() -> (stream, consumers)
+        await signal_hub.subscribe(user_id, "XAUUSD", "M15")
+        signal_hub.connect(user_id, websocket)       # live feed for that user, on this worker
+        signal_hub.latest("XAUUSD", "M15", current_bar=True)   # last analysis, no recomputation
+    """
+
+    def __init__(
+        self,
+        session_scope=session_scope,
+        cache=None,
+        telegram=None,
+        notifications=None,
+        batch_size: Optional[int] = None,
+        send_timeout: Optional[float] = None,
+        owner_interval: Optional[float] = None,
+        clock=time.time
+    ):
+        self._session = session_scope
+        self._cache = cache
+        self._telegram = telegram
+        self._notifications = notifications
+        self.batch_size = batch_size or settings.SIGNAL_FANOUT_BATCH
+        self.send_timeout = send_timeout or settings.SIGNAL_SEND_TIMEOUT
+        self.owner_interval = owner_interval or settings.SIGNAL_OWNER_INTERVAL
+        self._clock = clock
+
+        self.subscriptions: Dict[Key, Dict[Any, FrozenSet[str]]] = {}
+        self.sockets: Dict[Any, Set] = {}
+        self._latest: Dict[Key, Dict] = {}
+        self._last_action: Dict[Key, str] = {}
+        self._stream = None
+        self._consumers = None
+        self._pipeline: Optional[Callable] = None
+        self._owner_token = uuid.uuid4().hex
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Set[asyncio.Task] = set()
+        self.published = 0
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            from app.core.cache import cache
+            self._cache = cache
+        return self._cache
+
+    @property
+    def telegram(self):
+        if self._telegram is None:
+            from app.telegram.bot import telegram_bot
+            self._telegram = telegram_bot
+        return self._telegram
+
+    @property
+    def notifications(self):
+        if self._notifications is None:
+            from app.services.notification_service import notification_writer
+            self._notifications = notification_writer
+        return self._notifications
+
+    @property
+    def is_owner(self) -> bool:
+        """True while this worker runs the stream and the analysis"""
+        return self._stream is not None
+
+    # ------------------------------------------------------------ registry
+
+    def attach(self, stream=None, consumers=None):
+        """Wire into the market data stream: subscribed keys become candle topics, analyses come back here"""
+        self._stream = stream
+        self._consumers = consumers
+        if stream is not None:
+            for symbol, timeframe in self.subscriptions:
+                stream.subscribe(symbol, [timeframe], ticks=False)
+        if consumers is not None:
+            consumers.analyze_filter = self.wants
+            consumers.on_analysis = self.publish
+
+    def _detach(self):
+        if self._consumers is not None:
+            self._consumers.analyze_filter = None
+            self._consumers.on_analysis = None
+        self._stream = self._consumers = None
+
+    async def load(self) -> int:
+        """Replace the in-memory registry with signal_subscriptions; returns how many rows"""
+        async with self._session(read_only=True) as db:
+            rows = (await db.execute(select(SignalSubscription))).scalars().all()
+        subscriptions: Dict[Key, Dict[Any, FrozenSet[str]]] = {}
+        for row in rows:
+            subscriptions.setdefault((row.symbol, row.timeframe), {})[row.user_id] = frozenset(row.channels)
+        self.subscriptions = subscriptions
+        if self._stream is not None:
+            for symbol, timeframe in subscriptions:
+                self._stream.subscribe(symbol, [timeframe], ticks=False)
+        return len(rows)
+
+    async def subscribe(self, user_id, symbol: str, timeframe: str, channels: Iterable[str] = CHANNELS):
+        channels = frozenset(channels)
+        unknown = channels - CHANNELS
+        if unknown or not channels:
+            raise ValueError(f"Unknown channels {sorted(unknown)}; expected some of {sorted(CHANNELS)}")
+        statement = pg_insert(SignalSubscription.__table__).values(
+            user_id=user_id, symbol=symbol, timeframe=timeframe,
+            channels=sorted(channels), created_at=datetime.utcnow(),
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id", "symbol", "timeframe"],
+            set_={"channels": statement.excluded.channels},
+        )
+        async with self._session() as db:
+            await db.execute(statement)
+        await self._change(user_id, (symbol, timeframe), channels)
+
+    async def unsubscribe(self, user_id, symbol: Optional[str] = None, timeframe: Optional[str] = None) -> int:
+        """Drop the user's subscriptions matching symbol/timeframe (all if None); returns how many"""
+        statement = delete(SignalSubscription).where(SignalSubscription.user_id == user_id)
+        if symbol is not None:
+            statement = statement.where(SignalSubscription.symbol == symbol)
+        if timeframe is not None:
+            statement = statement.where(SignalSubscription.timeframe == timeframe)
+        statement = statement.returning(SignalSubscription.symbol, SignalSubscription.timeframe)
+        async with self._session() as db:
+            removed = (await db.execute(statement)).all()
+        for key in removed:
+            await self._change(user_id, tuple(key), None)
+        return len(removed)
+
+    async def _change(self, user_id, key: Key, channels: Optional[FrozenSet[str]]):
+        """Apply a stored registry change here, then on every other worker"""
+        self._apply(user_id, key, channels)
+        await self._broadcast({
+            "type": "subscription", "user": str(user_id), "symbol": key[0], "timeframe": key[1],
+            "channels": sorted(channels) if channels else None,
+        })
+
+    def _apply(self, user_id, key: Key, channels: Optional[FrozenSet[str]]):
+        """Mirror one registry change (channels None: removed)"""
+        if channels:
+            if key not in self.subscriptions and self._stream is not None:
+                self._stream.subscribe(key[0], [key[1]], ticks=False)
+            self.subscriptions.setdefault(key, {})[user_id] = channels
+            return
+        users = self.subscriptions.get(key)
+        if users is not None and users.pop(user_id, None) is not None and not users:
+            # the stream topic stays: candles are cheap, analysis stops via wants()
+            del self.subscriptions[key]
+            self._last_action.pop(key, None)
+
+    def subscribers(self, symbol: str, timeframe: str, channel: Optional[str] = None) -> List:
+        users = self.subscriptions.get((symbol, timeframe), {})
+        return [user for user, channels in users.items() if channel is None or channel in channels]
+
+    def wants(self, symbol: str, timeframe: str) -> bool:
+        return bool(self.subscriptions.get((symbol, timeframe)))
+
+    def connect(self, user_id, websocket):
+        self.sockets.setdefault(user_id, set()).add(websocket)
+
+    def disconnect(self, user_id, websocket):
+        sockets = self.sockets.get(user_id)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                del self.sockets[user_id]
+
+    def latest(self, symbol: str, timeframe: str, current_bar: bool = False) -> Optional[Dict]:
+        """Last delivered analysis; with current_bar, None unless it was made during the bar now open"""
+        analysis = self._latest.get((symbol, timeframe))
+        if analysis is None or not current_bar:
+            return analysis
+        seconds = TIMEFRAME_SECONDS.get(timeframe)
+        if seconds is None or analysis.get("timestamp") is None:
+            return None
+        now = self._clock()
+        return analysis if parse_timestamp(analysis["timestamp"]) >= now - now % seconds else None
+
+    # ------------------------------------------------------------ workers
+
+    async def _broadcast(self, message: Dict) -> int:
+        """Publish to every worker's listener; returns how many got it (0 without Redis)"""
+        if not self.cache.connected:
+            return 0
+        return await self.cache.redis_client.publish(CHANNEL, json.dumps(message, default=str))
+
+    async def _handle(self, data):
+        """One message from the channel, sent by any worker (this one included)"""
+        message = json.loads(data)
+        key = (message["symbol"], message["timeframe"])
+        if message["type"] == "signal":
+            await self.deliver(*key, message["analysis"])
+        elif message["type"] == "subscription":
+            channels = message["channels"]
+            self._apply(UUID(message["user"]), key, frozenset(channels) if channels else None)
+
+    async def _listen(self):
+        """Follow the signal_hub channel, resubscribing on errors"""
+        while True:
+            pubsub = self.cache.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(CHANNEL)
+                # registry changes may have been missed while unsubscribed
+                await self.load()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    try:
+                        await self._handle(message["data"])
+                    except Exception as e:
+                        logger.error(f"Signal hub message dropped: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Signal hub channel lost: {e}")
+            finally:
+                await pubsub.aclose()
+            await asyncio.sleep(1)
+
+    async def _claim(self) -> bool:
+        """True if this worker owns the analysis; the owner keeps the key by renewing it each pass"""
+        ttl = max(int(self.owner_interval * 3), 1)
+        if await self.cache.get(OWNER_KEY) == self._owner_token:
+            return await self.cache.set(OWNER_KEY, self._owner_token, ttl)
+        return await self.cache.set(OWNER_KEY, self._owner_token, ttl, nx=True)
+
+    async def check_ownership(self) -> bool:
+        """Start the pipeline on gaining the lease, stop it on losing it; returns is_owner"""
+        owner = await self._claim()
+        if owner and self._stream is None:
+            stream, consumers = self._pipeline()
+            self.attach(stream, consumers)
+            try:
+                await stream.start()
+            except Exception:
+                self._detach()
+                raise
+            logger.info("Signal hub: this worker analyses the subscribed pairs")
+        elif not owner and self._stream is not None:
+            await self._step_down()
+        return self.is_owner
+
+    async def _step_down(self):
+        stream = self._stream
+        self._detach()
+        await stream.stop()
+
+    async def _ownership_loop(self):
+        while True:
+            try:
+                await self.check_ownership()
+            except Exception as e:
+                logger.error(f"Signal hub ownership check failed: {e}")
+            await asyncio.sleep(self.owner_interval)
+
+    async def start(self, pipeline: Optional[Callable] = None):
+        """Load the registry and follow the channel; with a pipeline, also compete to run the analysis"""
+        self._pipeline = pipeline
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error(f"Signal subscriptions could not be loaded: {e}")
+        if self.cache.connected:
+            self._tasks.append(asyncio.create_task(self._listen()))
+        if pipeline is not None:
+            self._tasks.append(asyncio.create_task(self._ownership_loop()))
+
+    # ------------------------------------------------------------ fan-out
+
+    async def publish(self, symbol: str, timeframe: str, analysis: Dict) -> int:
+        """StreamConsumers.on_analysis (owner): alert if the action turned, deliver everywhere; returns workers reached"""
+        key = (symbol, timeframe)
+        self.published += 1
+        signal = analysis.get("signal") or {}
+
+        action = signal.get("action")
+        previous = self._last_action.get(key)
+        self._last_action[key] = action
+        if action in ACTIONABLE and action != previous:
+            task = asyncio.create_task(self._send_alerts(symbol, timeframe, signal))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+        if self.cache.connected:
+            # comes back to every worker's listener, this one included
+            return await self._broadcast({
+                "type": "signal", "symbol": symbol, "timeframe": timeframe, "analysis": analysis,
+            })
+        await self.deliver(symbol, timeframe, analysis)
+        return 1
+
+    async def deliver(self, symbol: str, timeframe: str, analysis: Dict) -> int:
+        """Send one analysis to the subscribed websockets of this worker; returns how many sends"""
+        key = (symbol, timeframe)
+        self._latest[key] = analysis
+        signal = analysis.get("signal") or {}
+        # kept on every worker, so one taking over alerts only on a real turn
+        self._last_action[key] = signal.get("action")
+
+        payload = json.dumps({
+            "type": "signal",
+            "symbol": symbol,
+            "timeframe": timeframe,
+            "timestamp": analysis.get("timestamp"),
+            "signal": signal,
+        }, default=str)
+        subscribed = self.subscriptions.get(key, {})
+        users = [user for user in self.sockets if WEBSOCKET in subscribed.get(user, ())]
+        return await self._send_websockets(users, payload)
+
+    async def _send_websockets(self, users: List, payload: str) -> int:
+        sockets = [(user, socket) for user in users for socket in list(self.sockets.get(user, ()))]
+        sent = 0
+        for i in range(0, len(sockets), self.batch_size):
+            batch = sockets[i:i + self.batch_size]
+            # a stalled client must not hold up the batches behind it
+            results = await asyncio.gather(
+                *(asyncio.wait_for(socket.send_text(payload), self.send_timeout) for _, socket in batch),
+                return_exceptions=True
+            )
+            for (user, socket), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    self.disconnect(user, socket)
+                else:
+                    sent += 1
+        return sent
+
+    async def _send_alerts(self, symbol: str, timeframe: str, signal: Dict):
+        # each channel on its own, one failing doesn't hold back the other
+        results = await asyncio.gather(
+            self._send_notifications(self.subscribers(symbol, timeframe, IN_APP), symbol, timeframe, signal),
+            self._send_telegram(self.subscribers(symbol, timeframe, TELEGRAM), symbol, timeframe, signal),
+            return_exceptions=True
+        )
+        for channel, result in zip((IN_APP, TELEGRAM), results):
+            if isinstance(result, Exception):
+                logger.error(f"Signal {channel} alerts for {symbol} {timeframe} failed: {result}")
+
+    async def _send_notifications(self, users: List, symbol: str, timeframe: str, signal: Dict):
+        from app.models.notification import NotificationPriority, NotificationType
+
+        now = datetime.utcnow()
+        title = f"{signal.get('action')} {symbol} {timeframe}"
+        message = "\n".join(signal.get("reasons") or []) or title
+        data = json.loads(json.dumps({"symbol": symbol, "timeframe": timeframe, **signal}, default=str))
+        for user_id in users:
+            # buffered: the writer stores them batch_size rows per INSERT
+            await self.notifications.add({
+                "user_id": user_id,
+                "type": NotificationType.TRADE_SIGNAL,
+                "title": title,
+                "message": message,
+                "data": data,
+                "priority": NotificationPriority.MEDIUM,
+                "channels": [IN_APP],
+                "created_at": now,
+                "read": False
+            })
+
+    async def _chat_ids(self, users: List) -> List:
+        from app.models.telegram_user import TelegramUser
+
+        chat_ids = []
+        async with self._session(read_only=True) as db:
+            for i in range(0, len(users), self.batch_size):
+                chat_ids.extend((await db.execute(
+                    select(TelegramUser.telegram_id).where(
+                        TelegramUser.user_id.in_(users[i:i + self.batch_size]),
+                        TelegramUser.is_active == True
+                    )
+                )).scalars().all())
+        return chat_ids
+
+    async def _send_telegram(self, users: List, symbol: str, timeframe: str, signal: Dict):
+        if not users:
+            return
+        chat_ids = await self._chat_ids(users)
+        if chat_ids:
+            await self.telegram.send_signal_alert(chat_ids, symbol, timeframe, signal)
+
+    async def stop(self):
+        """Leave the channel, hand the analysis over and wait for alerts still being delivered (shutdown)"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._stream is not None:
+            try:
+                await self._step_down()
+                # the next worker takes over without waiting for the lease to expire
+                if await self.cache.get(OWNER_KEY) == self._owner_token:
+                    await self.cache.delete(OWNER_KEY)
+            except Exception as e:
+                logger.error(f"Signal hub hand-over failed: {e}")
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+
+signal_hub = SignalHub()
@@ -0,0 +1,537 @@
+"""
+Trading stats
+Running performance statistics fed by closed trades, O(1) per trade.
+
+Each closed trade updates the stats of every scope it belongs to:
+the user, the user's strategy, the user's symbol, the user's strategy on that
+symbol, and the whole system ("*|*|*", what PerformanceMonitor reports).
+
+- win rate, profit factor, expectancy, best/worst trade: running sums
+- Sharpe/Sortino: Welford mean/variance of per-trade returns, over all trades
+  and over a rolling window of the last TRADING_STATS_WINDOW trades
+- equity peak and max drawdown from the running equity curve
+
+Every TRADING_STATS_SNAPSHOT_INTERVAL seconds each process replays the trades
+closed since its watermark (wherever they were closed), so all of them hold
+the same figures. Only backfill() moves the watermark, and it re-reads the
+last TRADING_STATS_LATE_COMMIT seconds before it, skipping trade ids already
+counted, so neither a live record() nor a late commit makes it skip a trade. Only the process holding the snapshot_owner key then
+writes the changed scopes, to trading_stats_snapshots in one transaction and
+to Redis; the others never overwrite its snapshot with their own. On start
+the snapshots are loaded and only trades closed after their watermark are
+replayed, so stats requests never scan the trades table.
+"""
+
+import asyncio
+import logging
+import math
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.backtesting.metrics import PROFIT_FACTOR_CAP
+from app.core import codecs
+from app.core.config import settings
+from app.database.connection import session_scope
+from app.models.trade import Trade, TradeStatus
+from app.models.trading_stats import TradingStatsSnapshot
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_YEAR = 365 * 86_400
+CACHE_PREFIX = "trading_stats:"
+OWNER_KEY = CACHE_PREFIX + "snapshot_owner"
+
+# (user_id, strategy, symbol); None means "all"
+StatsKey = Tuple[Optional[str], Optional[str], Optional[str]]
+ALL: StatsKey = (None, None, None)
+
+
+def scope_of(key: StatsKey) -> str:
+    return "|".join("*" if part is None else str(part) for part in key)
+
+
+def key_of(scope: str) -> StatsKey:
+    return tuple(None if part == "*" else part for part in scope.split("|", 2))
+
+
+def keys_for(user_id, strategy: Optional[str], symbol: str) -> List[StatsKey]:
+    """Every scope one trade counts towards"""
+    user = str(user_id)
+    keys = [ALL, (user, None, None), (user, None, symbol)]
+    if strategy:
+        keys += [(user, strategy, None), (user, strategy, symbol)]
+    return keys
+
+
+def net_pnl(trade) -> float:
+    """Realised PnL after costs (commission is stored as a positive cost, as in the backtester)"""
+    return (trade.profit or 0.0) - (trade.commission or 0.0) + (trade.swap or 0.0)
+
+
+def _epoch(moment: Optional[datetime]) -> float:
+    if moment is None:
+        return datetime.now(timezone.utc).timestamp()
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class Welford:
+    """Mean and variance of a stream, optionally over a sliding window of the last `window` values"""
+
+    __slots__ = ("window", "values", "n", "mean", "m2", "down_sq")
+
+    def __init__(self, window: Optional[int] = None):
+        self.window = window
+        self.values: Optional[deque] = deque() if window else None
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.down_sq = 0.0   # sum of min(x, 0)^2, for the downside deviation
+
+    def add(self, x: float):
+        if self.values is not None and self.n == self.window:
+            old = self.values.popleft()
+            # replace old with x in one step: n stays the same
+            mean = self.mean + (x - old) / self.n
+            self.m2 = max(self.m2 + (x - old) * (x - mean + old - self.mean), 0.0)
+            self.mean = mean
+            self.down_sq += min(x, 0.0) ** 2 - min(old, 0.0) ** 2
+        else:
+            self.n += 1
+            delta = x - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (x - self.mean)
+            self.down_sq += min(x, 0.0) ** 2
+        if self.values is not None:
+            self.values.append(x)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    @property
+    def downside(self) -> float:
+        return math.sqrt(max(self.down_sq, 0.0) / self.n) if self.n else 0.0
+
+    def sharpe(self, periods_per_year: float) -> float:
+        std = self.std
+        if std == 0:
+            return 0.0
+        return self.mean / std * math.sqrt(periods_per_year)
+
+    def sortino(self, periods_per_year: float) -> float:
+        downside = self.downside
+        if downside == 0:
+            return PROFIT_FACTOR_CAP if self.mean > 0 else 0.0
+        return min(self.mean / downside * math.sqrt(periods_per_year), PROFIT_FACTOR_CAP)
+
+    def to_dict(self) -> dict:
+        return {"n": self.n, "mean": self.mean, "m2": self.m2, "down_sq": self.down_sq,
+                "values": list(self.values) if self.values is not None else None}
+
+    @classmethod
+    def from_dict(cls, data: dict, window: Optional[int] = None) -> "Welford":
+        stats = cls(window)
+        if stats.values is not None:
+            # the window may have been resized: rebuild it from the stored values
+            for x in (data.get("values") or [])[-window:]:
+                stats.add(x)
+            return stats
+        stats.n, stats.mean, stats.m2, stats.down_sq = data["n"], data["mean"], data["m2"], data["down_sq"]
+        return stats
+
+
+class RunningStats:
+    """Performance of one scope, updated in O(1) per closed trade"""
+
+    def __init__(self, initial_balance: float, window: int):
+        self.trades = 0
+        self.wins = 0
+        self.losses = 0
+        self.gross_profit = 0.0
+        self.gross_loss = 0.0
+        self.best_trade = 0.0
+        self.worst_trade = 0.0
+        self.initial_balance = initial_balance
+        self.equity = initial_balance
+        self.peak = initial_balance
+        self.max_drawdown = 0.0          # negative fraction, -0.12 = 12%
+        self.max_drawdown_amount = 0.0   # negative, in account currency
+        self.first_close: Optional[float] = None
+        self.last_close: Optional[float] = None
+        # per-trade returns on the equity before the trade
+        self.returns = Welford()
+        self.recent = Welford(window)
+        self.recent_closes: deque = deque(maxlen=window)
+
+    def add(self, pnl: float, close_time: float):
+        before = self.equity
+        self.trades += 1
+        if pnl > 0:
+            self.wins += 1
+            self.gross_profit += pnl
+        elif pnl < 0:
+            self.losses += 1
+            self.gross_loss -= pnl
+        self.best_trade = pnl if self.trades == 1 else max(self.best_trade, pnl)
+        self.worst_trade = pnl if self.trades == 1 else min(self.worst_trade, pnl)
+
+        self.equity += pnl
+        self.peak = max(self.peak, self.equity)
+        if self.peak > 0:
+            self.max_drawdown = min(self.max_drawdown, self.equity / self.peak - 1.0)
+        self.max_drawdown_amount = min(self.max_drawdown_amount, self.equity - self.peak)
+
+        r = pnl / before if before > 0 else 0.0
+        self.returns.add(r)
+        self.recent.add(r)
+        self.recent_closes.append(close_time)
+        if self.first_close is None:
+            self.first_close = close_time
+        self.last_close = close_time
+
+    # ------------------------------------------------------------ figures
+
+    @property
+    def net_pnl(self) -> float:
+        return self.equity - self.initial_balance
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.trades if self.trades else 0.0
+
+    @property
+    def profit_factor(self) -> float:
+        if self.gross_loss > 0:
+            return min(self.gross_profit / self.gross_loss, PROFIT_FACTOR_CAP)
+        return PROFIT_FACTOR_CAP if self.gross_profit > 0 else 0.0
+
+    @property
+    def expectancy(self) -> float:
+        """Mean return per trade, as a fraction of equity"""
+        return self.returns.mean
+
+    @staticmethod
+    def _trades_per_year(n: int, first: Optional[float], last: Optional[float]) -> float:
+        # spans shorter than a day count as one day, so a burst of trades is not annualised to infinity
+        if not n or first is None or last is None:
+            return 0.0
+        return n / (max(last - first, 86_400) / SECONDS_PER_YEAR)
+
+    @property
+    def sharpe_ratio(self) -> float:
+        return self.returns.sharpe(self._trades_per_year(self.trades, self.first_close, self.last_close))
+
+    @property
+    def sortino_ratio(self) -> float:
+        return self.returns.sortino(self._trades_per_year(self.trades, self.first_close, self.last_close))
+
+    def _recent_per_year(self) -> float:
+        closes = self.recent_closes
+        return self._trades_per_year(len(closes), closes[0] if closes else None, closes[-1] if closes else None)
+
+    @property
+    def rolling_sharpe(self) -> float:
+        return self.recent.sharpe(self._recent_per_year())
+
+    @property
+    def rolling_sortino(self) -> float:
+        return self.recent.sortino(self._recent_per_year())
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "trades": self.trades,
+            "wins": self.wins,
+            "losses": self.losses,
+            "win_rate": self.win_rate,
+            "net_pnl": self.net_pnl,
+            "gross_profit": self.gross_profit,
+            "gross_loss": self.gross_loss,
+            "profit_factor": self.profit_factor,
+            "expectancy": self.expectancy,
+            "expectancy_amount": self.net_pnl / self.trades if self.trades else 0.0,
+            "avg_win": self.gross_profit / self.wins if self.wins else 0.0,
+            "avg_loss": self.gross_loss / self.losses if self.losses else 0.0,
+            "best_trade": self.best_trade,
+            "worst_trade": self.worst_trade,
+            "sharpe_ratio": self.sharpe_ratio,
+            "sortino_ratio": self.sortino_ratio,
+            "rolling_sharpe": self.rolling_sharpe,
+            "rolling_sortino": self.rolling_sortino,
+            "equity": self.equity,
+            "equity_peak": self.peak,
+            "max_drawdown": self.max_drawdown,
+            "max_drawdown_amount": self.max_drawdown_amount,
+            "last_close": self.last_close,
+        }
+
+    # ------------------------------------------------------------ snapshots
+
+    _FIELDS = ("trades", "wins", "losses", "gross_profit", "gross_loss", "best_trade", "worst_trade",
+               "initial_balance", "equity", "peak", "max_drawdown", "max_drawdown_amount",
+               "first_close", "last_close")
+
+    def to_dict(self) -> dict:
+        state = {name: getattr(self, name) for name in self._FIELDS}
+        state["returns"] = self.returns.to_dict()
+        state["recent"] = self.recent.to_dict()
+        state["recent_closes"] = list(self.recent_closes)
+        return state
+
+    @classmethod
+    def from_dict(cls, state: dict, window: int) -> "RunningStats":
+        stats = cls(state["initial_balance"], window)
+        for name in cls._FIELDS:
+            setattr(stats, name, state[name])
+        stats.returns = Welford.from_dict(state["returns"])
+        stats.recent = Welford.from_dict(state["recent"], window)
+        stats.recent_closes.extend(state["recent_closes"][-window:])
+        return stats
+
+
+class TradingStats:
+    """
+    Usage:
+        await trading_stats.start()                         # load snapshots, replay newer trades
+        trading_stats.record(trade)                         # when a trade closes
+        trading_stats.get(user_id)                          # this worker's live figures
+        await trading_stats.fetch(user_id, symbol="XAUUSD") # memory, then the Redis / DB snapshot
+        await trading_stats.performance_metric()            # for PerformanceMonitor
+    """
+
+    def __init__(
+        self,
+        session_scope=session_scope,
+        cache=None,
+        window: Optional[int] = None,
+        initial_balance: Optional[float] = None,
+        snapshot_interval: Optional[float] = None,
+        late_commit: Optional[float] = None,
+    ):
+        self._session = session_scope
+        self._cache = cache
+        self.window = window or settings.TRADING_STATS_WINDOW
+        self.initial_balance = initial_balance or settings.TRADING_STATS_INITIAL_BALANCE
+        self.snapshot_interval = snapshot_interval or settings.TRADING_STATS_SNAPSHOT_INTERVAL
+        self.late_commit = timedelta(seconds=late_commit or settings.TRADING_STATS_LATE_COMMIT)
+
+        self._stats: Dict[StatsKey, RunningStats] = {}
+        self._dirty: set = set()
+        # (close_time, trade id) of the newest trade backfill() has read
+        self._watermark: Optional[Tuple[datetime, str]] = None
+        # trade id -> close_time of trades counted near or after the watermark
+        self._counted: Dict[str, Optional[datetime]] = {}
+        # after load(): trades up to the watermark are in the snapshot already
+        self._priming = False
+        self._task: Optional[asyncio.Task] = None
+        self._owner_token = uuid.uuid4().hex
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            from app.core.cache import cache
+            self._cache = cache
+        return self._cache
+
+    # ------------------------------------------------------------ updates
+
+    def _apply(self, user_id, strategy, symbol, pnl: float, close_time: Optional[datetime]):
+        closed_at = _epoch(close_time)
+        for key in keys_for(user_id, strategy, symbol):
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = RunningStats(self.initial_balance, self.window)
+            stats.add(pnl, closed_at)
+            self._dirty.add(key)
+
+    def record(self, trade) -> None:
+        """Count a closed Trade now; the next backfill() knows its id and does not count it again"""
+        trade_id = str(trade.id)
+        if trade_id in self._counted:
+            return
+        self._counted[trade_id] = trade.close_time
+        self._apply(trade.user_id, getattr(trade, "strategy", None), trade.symbol,
+                    net_pnl(trade), trade.close_time)
+
+    async def backfill(self, batch_size: int = 5000) -> int:
+        """Count closed trades not counted yet, from late_commit before the watermark on; returns how many"""
+        query = (
+            select(Trade.id, Trade.user_id, Trade.strategy, Trade.symbol,
+                   Trade.profit, Trade.commission, Trade.swap, Trade.close_time)
+            .where(Trade.status == TradeStatus.CLOSED, Trade.close_time.isnot(None))
+            .order_by(Trade.close_time, Trade.id)
+            .execution_options(yield_per=batch_size)
+        )
+        start = self._watermark
+        if start is not None:
+            query = query.where(Trade.close_time >= start[0] - self.late_commit)
+
+        replayed = 0
+        newest = start
+        priming, self._priming = self._priming, False
+        try:
+            async with self._session(read_only=True) as session:
+                result = await session.stream(query)
+                async for rows in result.partitions():
+                    for row in rows:
+                        trade_id = str(row.id)
+                        mark = (row.close_time, trade_id)
+                        if newest is None or mark > newest:
+                            newest = mark
+                        if trade_id in self._counted:
+                            continue
+                        self._counted[trade_id] = row.close_time
+                        if priming and mark <= start:
+                            continue  # part of the loaded snapshot
+                        self._apply(row.user_id, row.strategy, row.symbol, net_pnl(row), row.close_time)
+                        replayed += 1
+        except Exception:
+            self._priming = priming
+            raise
+
+        self._watermark = newest
+        if newest is not None:
+            horizon = newest[0] - self.late_commit
+            self._counted = {
+                trade_id: close_time for trade_id, close_time in self._counted.items()
+                if close_time is not None and close_time >= horizon
+            }
+        if replayed:
+            logger.info(f"Trading stats: replayed {replayed} closed trades")
+        return replayed
+
+    # ------------------------------------------------------------ reads
+
+    def get(self, user_id=None, strategy: Optional[str] = None, symbol: Optional[str] = None) -> Optional[dict]:
+        """Figures this worker holds for a scope (user_id=None: the whole system)"""
+        key = (str(user_id) if user_id is not None else None, strategy, symbol)
+        stats = self._stats.get(key)
+        return stats.summary() if stats else None
+
+    async def fetch(self, user_id=None, strategy: Optional[str] = None, symbol: Optional[str] = None) -> Optional[dict]:
+        """get(), else the Redis snapshot, else the database snapshot (scopes this process has not seen)"""
+        summary = self.get(user_id, strategy, symbol)
+        if summary is not None:
+            return summary
+        scope = scope_of((str(user_id) if user_id is not None else None, strategy, symbol))
+        state = await self.cache.get(CACHE_PREFIX + scope)
+        if state is None:
+            async with self._session(read_only=True) as session:
+                state = (await session.execute(
+                    select(TradingStatsSnapshot.state).where(TradingStatsSnapshot.scope == scope)
+                )).scalar_one_or_none()
+        return RunningStats.from_dict(state, self.window).summary() if state else None
+
+    async def performance_metric(self, latency_ms: Optional[float] = None):
+        """System-wide figures as a guardian PerformanceMetric (None before the first trade)"""
+        from app.guardian.models import PerformanceMetric
+        stats = await self.fetch()
+        if not stats or not stats["trades"]:
+            return None
+        return PerformanceMetric(
+            win_rate=stats["win_rate"],
+            profit_factor=stats["profit_factor"],
+            sharpe_ratio=stats["rolling_sharpe"],
+            max_drawdown=stats["max_drawdown"],
+            expectancy=stats["expectancy"],
+            latency_ms=latency_ms,
+            total_trades=stats["trades"],
+            successful_trades=stats["wins"],
+        )
+
+    # ------------------------------------------------------------ snapshots
+
+    async def load(self) -> int:
+        """Restore every scope from trading_stats_snapshots; returns how many"""
+        async with self._session(read_only=True) as session:
+            rows = (await session.execute(select(TradingStatsSnapshot))).scalars().all()
+        for row in rows:
+            key = key_of(row.scope)
+            self._stats[key] = RunningStats.from_dict(row.state, self.window)
+            if key == ALL and row.last_close_time is not None:
+                self._watermark = (row.last_close_time, row.last_trade_id)
+                self._priming = True
+        return len(rows)
+
+    async def _claim_snapshots(self) -> bool:
+        """True if this process writes the snapshots; the owner keeps the key by renewing it each pass"""
+        ttl = max(int(self.snapshot_interval * 3), 1)
+        if await self.cache.get(OWNER_KEY) == self._owner_token:
+            return await self.cache.set(OWNER_KEY, self._owner_token, ttl)
+        return await self.cache.set(OWNER_KEY, self._owner_token, ttl, nx=True)
+
+    async def snapshot(self) -> int:
+        """Write the scopes changed since the last snapshot (owner only); returns how many"""
+        if not self._dirty or not await self._claim_snapshots():
+            # a process that is not the owner keeps its changes, in case it takes over
+            return 0
+        dirty, self._dirty = self._dirty, set()
+        states = {key: self._stats[key].to_dict() for key in dirty}
+        last_close, last_id = self._watermark or (None, None)
+        now = datetime.utcnow()
+        rows = [
+            {"scope": scope_of(key), "user_id": key[0], "strategy": key[1], "symbol": key[2],
+             "state": state, "last_close_time": last_close, "last_trade_id": last_id, "updated_at": now}
+            for key, state in states.items()
+        ]
+        try:
+            statement = pg_insert(TradingStatsSnapshot.__table__)
+            statement = statement.on_conflict_do_update(
+                index_elements=["scope"],
+                set_={name: statement.excluded[name]
+                      for name in ("state", "last_close_time", "last_trade_id", "updated_at")},
+            )
+            async with self._session() as session:
+                await session.execute(statement, rows)
+        except Exception:
+            # try again with the next snapshot
+            self._dirty |= dirty
+            raise
+        await self.cache.set_many(
+            {CACHE_PREFIX + scope_of(key): state for key, state in states.items()},
+            ttl=settings.TRADING_STATS_CACHE_TTL, codec=codecs.MSGPACK,
+        )
+        return len(rows)
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                # trades closed since the last pass, including those record() never saw
+                await self.backfill()
+                await self.snapshot()
+            except Exception as e:
+                logger.error(f"Trading stats snapshot failed: {e}")
+
+    async def start(self):
+        try:
+            await self.load()
+            await self.backfill()
+        except Exception as e:
+            logger.error(f"Trading stats restore failed: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._snapshot_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            # the snapshot's watermark then covers what record() counted
+            await self.backfill()
+            await self.snapshot()
+        except Exception as e:
+            logger.error(f"Trading stats snapshot failed: {e}")
+
+
+trading_stats = TradingStats()
@@ -76,11 +76,11 @@ class SMCAnalyzer:
         self.fvgs: List[FairValueGap] = []
         self.liquidity_sweeps: List[LiquiditySweep] = []
         
-    def analyze(self) -> dict:
+    def analyze(self, ob_lookback: int = 50, swing_lookback: int = 20) -> dict:
         """Run full SMC analysis"""
-        self.detect_order_blocks()
+        self.detect_order_blocks(lookback=ob_lookback)
         self.detect_fvg()
-        self.detect_liquidity_sweeps()
+        self.detect_liquidity_sweeps(swing_lookback=swing_lookback)
         self.analyze_market_structure()
         
         return {
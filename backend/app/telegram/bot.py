@@ -295,20 +295,35 @@ class TelegramBot:
         message = MessageTemplates.guardian_update(update_type, data)
         return await self.send_message(chat_id=chat_id, text=message)
     
+    async def send_signal_alert(
+        self,
+        chat_ids: List[int],
+        symbol: str,
+        timeframe: str,
+        signal: Dict[str, Any]
+    ) -> Dict[int, bool]:
+        """Send one trading signal to every subscribed chat (formatted once)"""
+        message = MessageTemplates.trade_signal(symbol, timeframe, signal)
+        return await self.broadcast_message(chat_ids, message)
+    
     async def broadcast_message(
         self,
         chat_ids: List[int],
         text: str,
         parse_mode: str = ParseMode.HTML
     ) -> Dict[int, bool]:
-        """Broadcast message to multiple users"""
+        """Broadcast message to multiple users, a batch per second (Telegram's rate limit)"""
         results = {}
-        for chat_id in chat_ids:
-            results[chat_id] = await self.send_message(
-                chat_id=chat_id,
-                text=text,
-                parse_mode=parse_mode
-            )
+        batch_size = settings.TELEGRAM_BROADCAST_BATCH
+        for i in range(0, len(chat_ids), batch_size):
+            if i:
+                await asyncio.sleep(1)
+            batch = chat_ids[i:i + batch_size]
+            sent = await asyncio.gather(*(
+                self.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+                for chat_id in batch
+            ))
+            results.update(zip(batch, sent))
         return results
 
 
@@ -2,7 +2,9 @@
 Telegram Bot Command & Callback Handlers
 """
 import logging
-from typing import Dict, Any
+from datetime import date, timedelta
+from typing import Dict, Any, Optional
+from sqlalchemy import select
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
@@ -10,7 +12,9 @@ from telegram.constants import ParseMode
 from app.core.database import get_db
 from app.models.user import User
 from app.models.telegram_user import TelegramUser
+from app.services.pnl_rollups import pnl_rollups, week_of
 from app.services.trading_service import TradingService
+from app.services.trading_stats import trading_stats
 from app.services.user_service import UserService
 from app.telegram.messages import MessageTemplates
 
@@ -20,6 +24,17 @@ logger = logging.getLogger(__name__)
 class CommandHandlers:
     """Telegram command handlers"""
     
+    @staticmethod
+    async def _linked_user_id(update: Update) -> Optional[Any]:
+        """ID of the app user linked to this Telegram account, if any"""
+        async with get_db(read_only=True) as db:
+            return (await db.execute(
+                select(TelegramUser.user_id).where(
+                    TelegramUser.telegram_id == str(update.effective_user.id),
+                    TelegramUser.is_active == True
+                )
+            )).scalar_one_or_none()
+    
     @staticmethod
     async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
@@ -191,14 +206,22 @@ Welcome to Revolution X!
     @staticmethod
     async def profit(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /profit command"""
-        # Mock data
+        user_id = await CommandHandlers._linked_user_id(update)
+        stats = await trading_stats.fetch(user_id) if user_id else None
+        if not stats:
+            await update.message.reply_text("📭 <b>لا توجد صفقات مغلقة بعد</b>", parse_mode=ParseMode.HTML)
+            return
+        
+        today = date.today()
         profit_data = {
-            "today": 1250.50,
-            "week": 8750.25,
-            "month": 32400.80,
-            "total": 156780.45,
-            "win_rate": 68.5,
-            "trades_count": 156
+            "today": (await pnl_rollups.day(user_id, today))["net_pnl"],
+            "week": (await pnl_rollups.period(user_id, week_of(today), today + timedelta(days=1)))["net_pnl"],
+            "month": (await pnl_rollups.period(user_id, today.replace(day=1), today + timedelta(days=1)))["net_pnl"],
+            "total": stats["net_pnl"],
+            "win_rate": round(stats["win_rate"] * 100, 1),
+            "trades_count": stats["trades"],
+            "profit_factor": stats["profit_factor"],
+            "max_drawdown": stats["max_drawdown"] * 100
         }
         
         message = f"""
@@ -211,6 +234,8 @@ Welcome to Revolution X!
 
 📈 <b>نسبة الفوز:</b> {profit_data['win_rate']}%
 🎯 <b>عدد الصفقات:</b> {profit_data['trades_count']}
+⚖️ <b>عامل الربح:</b> {profit_data['profit_factor']:.2f}
+📉 <b>أقصى تراجع:</b> {profit_data['max_drawdown']:.1f}%
         """
         
         keyboard = InlineKeyboardMarkup([
@@ -250,15 +275,17 @@ Welcome to Revolution X!
     @staticmethod
     async def daily_summary(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /daily command"""
+        user_id = await CommandHandlers._linked_user_id(update)
+        if not user_id:
+            await update.message.reply_text("⚠️ <b>غير متصل</b>\nاستخدم /connect [api_key] للربط", parse_mode=ParseMode.HTML)
+            return
+        
+        day = await pnl_rollups.day(user_id, date.today())
         summary_data = {
-            "date": "2024-01-20",
-            "trades": 12,
-            "wins": 8,
-            "losses": 4,
-            "pnl": 1250.50,
-            "win_rate": 66.7,
-            "best_trade": 450.00,
-            "worst_trade": -120.00
+            **day,
+            "pnl": day["net_pnl"],
+            "best_trade": day["best_trade"] or 0.0,
+            "worst_trade": day["worst_trade"] or 0.0
         }
         
         message = MessageTemplates.daily_summary(summary_data)
@@ -267,13 +294,23 @@ Welcome to Revolution X!
     @staticmethod
     async def weekly_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /weekly command"""
+        user_id = await CommandHandlers._linked_user_id(update)
+        if not user_id:
+            await update.message.reply_text("⚠️ <b>غير متصل</b>\nاستخدم /connect [api_key] للربط", parse_mode=ParseMode.HTML)
+            return
+        
+        week = await pnl_rollups.week(user_id, week_of(date.today()))
+        
+        def describe(day):
+            return f"{day['day']} ({day['net_pnl']:+,.2f}$)" if day else "—"
+        
         weekly_data = {
-            "week": "الأسبوع 3 - يناير 2024",
-            "total_pnl": 8750.25,
-            "trades": 45,
-            "win_rate": 68.5,
-            "best_day": "الثلاثاء (+$2,340)",
-            "worst_day": "الخميس (-$450)"
+            "week": f"أسبوع {week['week']}",
+            "total_pnl": week["net_pnl"],
+            "trades": week["trades"],
+            "win_rate": week["win_rate"],
+            "best_day": describe(week["best_day"]),
+            "worst_day": describe(week["worst_day"])
         }
         
         message = f"""
@@ -237,6 +237,31 @@ class MessageTemplates:
 🎯 <b>الهدف:</b> ${target_price:,.2f}
 📈 <b>الاتجاه:</b> {direction} من الهدف
 
+⏰ <b>الوقت:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        """
+    
+    @staticmethod
+    def trade_signal(symbol: str, timeframe: str, signal: Dict[str, Any]) -> str:
+        """Template for a new trading signal"""
+        action = signal.get('action', 'N/A')
+        emoji = "🟢" if 'BUY' in action else "🔴"
+        reasons = "\n".join(f"• {reason}" for reason in signal.get('reasons') or []) or "-"
+        entry, sl, tp = signal.get('entry_price'), signal.get('suggested_sl'), signal.get('suggested_tp')
+        
+        return f"""
+{emoji} <b>إشارة تداول - Trading Signal</b>
+
+💎 <b>الزوج:</b> {symbol} ({timeframe})
+📊 <b>الإشارة:</b> {action}
+🎯 <b>الثقة:</b> {signal.get('confidence', 0)}%
+
+💰 <b>الدخول:</b> {f"${entry:,.2f}" if entry is not None else 'N/A'}
+🔴 <b>SL:</b> {f"${sl:,.2f}" if sl is not None else 'N/A'}
+🟢 <b>TP:</b> {f"${tp:,.2f}" if tp is not None else 'N/A'}
+
+📝 <b>الأسباب:</b>
+{reasons}
+
 ⏰ <b>الوقت:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
         """
     
@@ -0,0 +1,85 @@
+"""
+Cache codec benchmark
+Payload size and encode/decode time of the cache codecs against pickle.
+
+Run from backend/:
+    python -m benchmarks.cache_codecs [--candles 500] [--repeat 200]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.core import codecs
+from app.marketdata import CANDLE_DTYPE
+
+
+def make_payloads(n_candles: int) -> dict:
+    rng = np.random.default_rng(0)
+    close = 2000 + np.cumsum(rng.normal(0, 1, n_candles))
+    start = datetime(2024, 1, 2)
+
+    # analyzer format: ISO timestamps, float prices
+    candles = [
+        {
+            "timestamp": (start + timedelta(minutes=15 * i)).isoformat(),
+            "open": float(c - 0.5), "high": float(c + 1.0),
+            "low": float(c - 1.0), "close": float(c), "volume": int(v),
+        }
+        for i, (c, v) in enumerate(zip(close, rng.integers(100, 1000, n_candles)))
+    ]
+    array = np.zeros(n_candles, dtype=CANDLE_DTYPE)
+    array["time"] = int(start.timestamp()) + np.arange(n_candles) * 900
+    array["close"] = close
+    array["open"], array["high"], array["low"] = close - 0.5, close + 1.0, close - 1.0
+    array["volume"] = rng.integers(100, 1000, n_candles)
+
+    return {
+        "tick": (
+            {"seq": 41, "symbol": "XAUUSD", "bid": 2034.15, "ask": 2034.45, "time": 1708266600.25},
+            (codecs.MSGPACK, codecs.ORJSON),
+        ),
+        "candles (dicts)": (candles, (codecs.MSGPACK, codecs.ORJSON)),
+        "candles (ndarray)": (array, (codecs.NDARRAY,)),
+        "analysis + features": (
+            {
+                "signal": "BUY", "confidence": 72.5, "score": 61,
+                "features": {"rsi": rng.random(n_candles), "atr": rng.random(n_candles)},
+            },
+            (codecs.MSGPACK,),
+        ),
+    }
+
+
+def measure(value, codec: str, repeat: int) -> tuple:
+    data = codecs.encode(value, codec)
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        codecs.encode(value, codec)
+    encode_us = (time.perf_counter() - started) / repeat * 1e6
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        codecs.decode(data, allow_pickle=codec == codecs.PICKLE)
+    decode_us = (time.perf_counter() - started) / repeat * 1e6
+    return len(data), encode_us, decode_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candles", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'payload':<22}{'codec':<10}{'bytes':>10}{'vs pickle':>11}{'encode µs':>12}{'decode µs':>12}")
+    for name, (value, candidates) in make_payloads(args.candles).items():
+        baseline, *_ = measure(value, codecs.PICKLE, args.repeat)
+        for codec in (codecs.PICKLE, *candidates):
+            size, encode_us, decode_us = measure(value, codec, args.repeat)
+            print(f"{name:<22}{codec:<10}{size:>10}{size / baseline:>10.0%}{encode_us:>12.1f}{decode_us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
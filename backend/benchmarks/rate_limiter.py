@@ -0,0 +1,124 @@
+"""
+Rate limiter benchmark
+Per-request overhead of RateLimiter and RateLimitMiddleware.
+
+Measures the in-process fallback, the Redis GCRA and hybrid (leased) paths
+(if a Redis server is reachable at --host/--port; the hybrid fast path is
+also measured against an in-process lease source) and the middleware on a
+limited and an unlimited route in front of a no-op ASGI app.
+
+Run from backend/:
+    python -m benchmarks.rate_limiter [--requests 20000] [--host localhost] [--port 6379]
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.config import settings
+from app.middleware.rate_limit import RateLimiter, RateLimitMiddleware, gcra_lease
+
+
+async def noop_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+class InProcessLeases:
+    """LEASE_SCRIPT without the network, to isolate the hybrid fast path"""
+
+    def __init__(self):
+        self.tats = {}
+
+    async def __call__(self, keys, args):
+        granted, self.tats[keys[0]], reset_after = gcra_lease(
+            self.tats.get(keys[0]), time.monotonic() * 1000, *args
+        )
+        return [granted, reset_after]
+
+
+def scope(path: str, client: int) -> dict:
+    return {
+        "type": "http", "method": "POST", "path": path, "query_string": b"",
+        "headers": [(b"x-real-ip", f"10.0.{client // 256}.{client % 256}".encode())],
+        "client": ("127.0.0.1", 5000),
+    }
+
+
+async def per_call_us(fn, n: int) -> float:
+    started = time.perf_counter()
+    for i in range(n):
+        await fn(i)
+    return (time.perf_counter() - started) / n * 1e6
+
+
+async def run(args):
+    clients = 500
+    local = RateLimiter()
+    rows = [(
+        "limiter, local fallback",
+        await per_call_us(lambda i: local.is_allowed(str(i % clients), "market_data", 1000, 60), args.requests),
+    )]
+
+    hybrid = RateLimiter()
+    hybrid._lease = InProcessLeases()
+    rows.append((
+        "limiter, hybrid in-process",
+        await per_call_us(
+            lambda i: hybrid.is_allowed("1.2.3.4", "market_data", 10 ** 9, 60, mode="hybrid", lease=1000),
+            args.requests,
+        ),
+    ))
+
+    settings.REDIS_HOST, settings.REDIS_PORT = args.host, args.port
+    remote = RateLimiter()
+    await remote.connect()
+    if remote.redis_client is not None:
+        n = min(args.requests, 5000)
+        rows.append((
+            "limiter, redis script",
+            await per_call_us(lambda i: remote.is_allowed(str(i % clients), "market_data", 1000, 60), n),
+        ))
+        rows.append((
+            "limiter, hybrid redis",
+            await per_call_us(
+                lambda i: remote.is_allowed("1.2.3.4", "market_data", 10 ** 9, 60, mode="hybrid", lease=1000), n
+            ),
+        ))
+        await remote.disconnect()
+    else:
+        print(f"(no Redis at {args.host}:{args.port}, skipping the script path)")
+
+    limits = {"market_data": {"requests": 1000, "window": 60, "path": "/market"}}
+    middleware = RateLimitMiddleware(noop_app, limits=limits, limiter=local)
+    middleware._connecting = asyncio.get_running_loop().create_future()
+    middleware._connecting.set_result(None)
+    for name, path in (("middleware, limited route", "/market"), ("middleware, other route", "/health")):
+        rows.append((
+            name,
+            await per_call_us(lambda i: middleware(scope(path, i % clients), receive, send), args.requests),
+        ))
+    rows.append(("no middleware", await per_call_us(lambda i: noop_app(scope("/health", 0), receive, send), args.requests)))
+
+    print(f"{'path':<28}{'µs/request':>12}")
+    for name, us in rows:
+        print(f"{name:<28}{us:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6379)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
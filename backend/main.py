@@ -7,13 +7,16 @@ import asyncio
 import logging
 import sys
 from contextlib import asynccontextmanager
+from datetime import date, datetime
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import func, select
 
 # Core
 from app.core.config import settings
-from app.core.database import engine, Base, SessionLocal
+from app.database.connection import dispose_engines, init_db, session_scope, sync_session
+from app.models.trade import Trade, TradeStatus
 from app.core.logging import setup_logging
 
 # API Routes
@@ -25,16 +28,19 @@ from app.api.v1.guardian import router as guardian_router
 
 # Services
 from app.services.trading_engine import TradingEngine
-from app.services.risk_manager import RiskManager
+from app.core.risk_manager import RiskManager
 
 # AI Guardian
-from app.guardian.monitor import PerformanceMonitor
+from app.guardian.monitor import PerformanceMonitor, performance_monitor
+from app.services.pnl_rollups import pnl_rollups
+from app.services.trading_stats import trading_stats
 from app.guardian.analyzer import CodeAnalyzer
 from app.guardian.fixer import AutoFixer
 from app.guardian.tester import SafeTester
 from app.guardian.deployer import SmartDeployer
 from app.guardian.knowledge_base import KnowledgeBase
 from app.guardian.llm_interface import LLMInterface
+from app.marketdata.candle_store import candle_store
 
 # Setup logging
 setup_logging()
@@ -64,9 +70,10 @@ async def init_guardian(db):
         llm = LLMInterface()
         
         # تهيئة المكونات
-        guardian_monitor = PerformanceMonitor(db)
+        guardian_monitor = performance_monitor
         guardian_analyzer = CodeAnalyzer(db, llm)
-        tester = SafeTester(db)
+        # الباك-تست يقرأ الشموع من قاعدة البيانات (CandleStore)
+        tester = SafeTester(db, history_loader=candle_store.load)
         guardian_fixer = AutoFixer(db, llm, tester)
         
         # تسجيل معالج التنبيهات
@@ -131,7 +138,7 @@ async def scheduled_analysis(db):
         except Exception as e:
             logger.error(f"خطأ في التحليل المجدول: {e}")
 
-async def init_trading_engine(db):
+async def init_trading_engine():
     """
     تهيئة محرك التداول
     """
@@ -139,8 +146,9 @@ async def init_trading_engine(db):
     
     logger.info("📈 تهيئة محرك التداول...")
     
-    risk_manager = RiskManager(db)
-    trading_engine = TradingEngine(db, risk_manager)
+    # المحرك لا يستخدم قاعدة البيانات، ومدير المخاطر جزء منه
+    trading_engine = TradingEngine()
+    risk_manager = trading_engine.risk_manager
     
     # TODO: بدء المحرك إذا كان الوضع AUTO_START مفعل
     # await trading_engine.start()
@@ -155,13 +163,17 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 بدء تشغيل Revolution X...")
     
     # إنشاء الجداول
-    Base.metadata.create_all(bind=engine)
+    await init_db()
+    await candle_store.create_tables()
     
-    db = SessionLocal()
+    # مكونات Guardian مكتوبة لجلسة متزامنة (self.db.query / commit) تحتفظ بها طوال عمرها
+    db = sync_session()
     
     try:
         # تهيئة الخدمات
-        await init_trading_engine(db)
+        await trading_stats.start()
+        pnl_rollups.start()
+        await init_trading_engine()
         await init_guardian(db)
         
         logger.info("✅ التطبيق جاهز للعمل!")
@@ -174,10 +186,14 @@ async def lifespan(app: FastAPI):
         if guardian_monitor:
             await guardian_monitor.stop()
             
+        await trading_stats.stop()
+        await pnl_rollups.stop()
+            
         if trading_engine:
-            await trading_engine.stop()
+            trading_engine.stop()
             
         db.close()
+        await dispose_engines()
         logger.info("👋 تم إيقاف التطبيق")
 
 # إنشاء تطبيق FastAPI
@@ -246,35 +262,33 @@ async def health_check():
 @app.get("/api/v1/system/status")
 async def system_status():
     """حالة النظام الكاملة"""
-    db = SessionLocal()
+    from app.guardian.knowledge_base import KnowledgeBase
     
-    try:
-        from app.guardian.knowledge_base import KnowledgeBase
-        
-        kb = KnowledgeBase(db)
-        trends = kb.get_performance_trends()
-        
-        return {
-            "trading_engine": {
-                "status": "running" if trading_engine else "stopped",
-                "active_positions": 0,  # TODO: من TradingEngine
-                "daily_pnl": 0.0
-            },
-            "guardian": {
-                "enabled": settings.GUARDIAN_ENABLED,
-                "monitoring": guardian_monitor.is_running if guardian_monitor else False,
-                "pending_changes": len(guardian_fixer.get_pending_changes()) if guardian_fixer else 0,
-                "active_alerts": len(guardian_monitor.get_active_alerts()) if guardian_monitor else 0
-            },
-            "performance": trends,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-    finally:
-        db.close()
+    async with session_scope(read_only=True) as db:
+        trends = await db.run_sync(lambda session: KnowledgeBase(session).get_performance_trends())
+        open_positions = (await db.execute(
+            select(func.count()).select_from(Trade).where(Trade.status == TradeStatus.OPEN)
+        )).scalar_one()
+    daily = await pnl_rollups.day(None, date.today())
+    
+    return {
+        "trading_engine": {
+            "status": "running" if trading_engine else "stopped",
+            "active_positions": open_positions,
+            "daily_pnl": daily["net_pnl"]
+        },
+        "guardian": {
+            "enabled": settings.GUARDIAN_ENABLED,
+            "monitoring": guardian_monitor.is_running if guardian_monitor else False,
+            "pending_changes": len(guardian_fixer.get_pending_changes()) if guardian_fixer else 0,
+            "active_alerts": len(await guardian_monitor.get_active_alerts()) if guardian_monitor else 0
+        },
+        "performance": trends,
+        "timestamp": datetime.utcnow().isoformat()
+    }
 
 if __name__ == "__main__":
     import uvicorn
-    from datetime import datetime
     
     uvicorn.run(
         "main:app",
@@ -0,0 +1,79 @@
+"""
+Unit Tests for the alert manager
+Testing that alerts written by create_alert() load and deactivate from their rows
+"""
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.models.alert import Alert, AlertType
+from app.services import alert_manager as module
+from app.services.alert_manager import AlertManager, AlertTrigger
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeDatabase:
+    """Holds the rows alert_writer would have inserted."""
+
+    def __init__(self):
+        self.alerts = []
+
+    async def add(self, row, wait=False):
+        self.alerts.append(Alert(**row))
+
+    @asynccontextmanager
+    async def session_scope(self, read_only=False):
+        yield self
+
+    async def execute(self, query):
+        return FakeResult([alert for alert in self.alerts if alert.is_active])
+
+    async def get(self, model, alert_id):
+        return next((alert for alert in self.alerts if alert.id == alert_id), None)
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(module.alert_writer, "add", database.add)
+    monkeypatch.setattr(module, "session_scope", database.session_scope)
+    return database
+
+
+@pytest.mark.unit
+class TestAlertManager:
+    """Test suite for AlertManager."""
+
+    async def test_reloads_what_create_alert_wrote(self, database):
+        created = AlertManager()
+        await created.create_alert("u1", AlertType.PRICE, AlertTrigger.PRICE_BELOW, 2900.0, symbol="XAUUSD")
+        await created.create_alert("u1", AlertType.RISK, AlertTrigger.DRAWDOWN_PERCENT, 10.0)
+
+        reloaded = AlertManager()
+        await reloaded.load_user_alerts("u1")
+        assert reloaded.active_alerts["u1"] == created.active_alerts["u1"]
+
+        price, drawdown = reloaded.active_alerts["u1"]
+        assert price.trigger is AlertTrigger.PRICE_BELOW and price.condition_value == 2900.0
+        assert drawdown.symbol is None and drawdown.cooldown_minutes == 60
+
+    async def test_deactivate_drops_the_cached_config(self, database):
+        manager = AlertManager()
+        await manager.create_alert("u1", AlertType.PRICE, AlertTrigger.PRICE_ABOVE, 3000.0, symbol="XAUUSD")
+        await manager.create_alert("u1", AlertType.PRICE, AlertTrigger.PRICE_ABOVE, 3100.0, symbol="XAUUSD")
+
+        assert await manager.deactivate_alert(database.alerts[0].id)
+        assert [a.condition_value for a in manager.active_alerts["u1"]] == [3100.0]
+
+        await manager.load_user_alerts("u1")
+        assert [a.condition_value for a in manager.active_alerts["u1"]] == [3100.0]
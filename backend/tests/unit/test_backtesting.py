@@ -0,0 +1,271 @@
+"""
+Unit Tests for the backtesting engine
+Testing exit resolution, metrics and the SafeTester wiring
+"""
+import pytest
+import numpy as np
+
+from app.backtesting import BacktestConfig, BacktestEngine, CandleSeries, resolve_exits
+from app.backtesting.execution import EXIT_STOP_LOSS, EXIT_TAKE_PROFIT, EXIT_TIMEOUT
+from app.backtesting.metrics import max_drawdown, profit_factor, PROFIT_FACTOR_CAP
+from app.backtesting.optimizer import ParameterOptimizer, ParameterSpace
+from app.backtesting.monte_carlo import MonteCarloConfig, MonteCarloEngine, longest_run
+from app.backtesting.walk_forward import WalkForwardAnalyzer, WalkForwardConfig, walk_forward_splits
+from app.core.trading_engine import SignalParams
+from app.guardian.tester import SafeTester
+
+
+def make_series(n=600, seed=1):
+    rng = np.random.default_rng(seed)
+    time = 1704182400 + np.arange(n) * 900
+    close = 2000 * np.exp(np.cumsum(rng.normal(0, 0.0012, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) + np.abs(rng.normal(0, 0.8, n))
+    low = np.minimum(open_, close) - np.abs(rng.normal(0, 0.8, n))
+    return CandleSeries(time, open_, high, low, close, rng.integers(100, 1000, n))
+
+
+def bars(rows):
+    """rows of (open, high, low, close)"""
+    o, h, l, c = map(np.array, zip(*rows))
+    return CandleSeries(np.arange(len(rows)) * 900, o, h, l, c, np.ones(len(rows)))
+
+
+@pytest.mark.unit
+class TestResolveExits:
+    """Test suite for vectorized SL/TP resolution."""
+
+    def test_stop_wins_when_both_levels_in_one_bar(self):
+        series = bars([(100, 101, 99, 100), (100, 106, 94, 100)])
+        result = resolve_exits(
+            series, np.array([1]), np.array([1]), np.array([95.0]), np.array([105.0]),
+            np.array([0.0]), max_hold=5
+        )
+        assert result.reason[0] == EXIT_STOP_LOSS
+        assert result.exit_price[0] == 95.0
+
+    def test_gap_through_target_fills_at_open(self):
+        series = bars([(100, 101, 99, 100), (100, 101, 99, 100), (110, 111, 109, 110)])
+        result = resolve_exits(
+            series, np.array([1]), np.array([1]), np.array([95.0]), np.array([105.0]),
+            np.array([0.0]), max_hold=5
+        )
+        assert result.reason[0] == EXIT_TAKE_PROFIT
+        assert result.exit_index[0] == 2
+        assert result.exit_price[0] == 110.0
+
+    def test_short_exits_on_the_ask(self):
+        # bid high 104.8 + spread 0.3 touches the 105 stop
+        series = bars([(100, 101, 99, 100), (100, 104.8, 99, 100)])
+        result = resolve_exits(
+            series, np.array([1]), np.array([-1]), np.array([105.0]), np.array([90.0]),
+            np.array([0.3]), max_hold=5
+        )
+        assert result.reason[0] == EXIT_STOP_LOSS
+
+    def test_timeout_at_end_of_data(self):
+        series = bars([(100, 101, 99, 100)] * 3)
+        result = resolve_exits(
+            series, np.array([1]), np.array([1]), np.array([90.0]), np.array([110.0]),
+            np.array([0.0]), max_hold=10
+        )
+        assert result.reason[0] == EXIT_TIMEOUT
+        assert result.exit_index[0] == 2
+
+
+@pytest.mark.unit
+class TestBacktestMetrics:
+    """Test suite for backtest metrics."""
+
+    def test_max_drawdown(self):
+        assert max_drawdown(np.array([100.0, 120.0, 90.0, 130.0])) == pytest.approx(-0.25)
+
+    def test_profit_factor_without_losses_is_capped(self):
+        assert profit_factor(np.array([10.0, 5.0])) == PROFIT_FACTOR_CAP
+        assert profit_factor(np.array([30.0, -10.0])) == pytest.approx(3.0)
+
+
+@pytest.mark.unit
+class TestBacktestEngine:
+    """Test suite for BacktestEngine."""
+
+    def test_run_produces_validation_metrics(self):
+        result = BacktestEngine(BacktestConfig()).run(make_series())
+
+        for key in ("win_rate", "profit_factor", "max_drawdown", "sharpe_ratio", "total_trades"):
+            assert key in result.metrics
+        assert len(result.equity) == 600
+        assert result.metrics["final_balance"] == pytest.approx(
+            10_000 + result.pnl.sum()
+        )
+
+    def test_positions_never_overlap(self):
+        trades = BacktestEngine(BacktestConfig()).run(make_series()).trades
+        assert np.all(trades["entry_index"][1:] > trades["exit_index"][:-1])
+
+    def test_too_few_bars(self):
+        with pytest.raises(ValueError):
+            BacktestEngine(BacktestConfig(window=100)).run(make_series(n=50))
+
+
+@pytest.mark.unit
+class TestParameterOptimizer:
+    """Test suite for the parameter sweep optimizer."""
+
+    @pytest.mark.parametrize("params", [
+        SignalParams(),
+        SignalParams(ob_lookback=30, entry_threshold=30, pattern_weight=20),
+    ])
+    def test_features_reproduce_engine_trades(self, params, tmp_path):
+        """Re-scoring cached features must match a full analyzer pass."""
+        series = make_series(1500)
+        optimizer = ParameterOptimizer(series, leaderboard_path=str(tmp_path / "lb.csv"))
+
+        full = BacktestEngine(BacktestConfig(), params).run(series)
+        fast = BacktestEngine(BacktestConfig(), params).run_signals(
+            series, optimizer.prepare().signals(params)
+        )
+
+        assert np.array_equal(full.trades, fast.trades)
+
+    def test_space_validation(self):
+        assert ParameterSpace({"ob_weight": [20, 30], "ob_lookback": [30, 50, 80]}).size() == 6
+        with pytest.raises(ValueError):
+            ParameterSpace({"not_a_param": [1]})
+        with pytest.raises(ValueError):
+            list(ParameterSpace({"ob_weight": (10, 50)}).grid())
+
+    def test_sweep_resumes_from_leaderboard(self, tmp_path):
+        path = str(tmp_path / "lb.csv")
+        series = make_series()
+        space = ParameterSpace({"entry_threshold": [30, 40]})
+
+        ParameterOptimizer(series, leaderboard_path=path).grid_search(space)
+        resumed = ParameterOptimizer(series, leaderboard_path=path)
+        resumed.grid_search(ParameterSpace({"entry_threshold": [30, 40, 50]}))
+
+        rows = resumed.leaderboard.rows()
+        assert len(rows) == 3
+        assert len({row["hash"] for row in rows}) == 3
+
+
+@pytest.mark.unit
+class TestWalkForward:
+    """Test suite for walk-forward analysis."""
+
+    def test_rolling_and_anchored_splits(self):
+        rolling = walk_forward_splits(1000, in_sample=300, out_of_sample=100)
+        anchored = walk_forward_splits(1000, in_sample=300, out_of_sample=100, anchored=True)
+
+        assert len(rolling) == len(anchored) == 7
+        assert all(f.is_end - f.is_start == 300 for f in rolling)
+        assert all(f.is_start == 0 for f in anchored)
+        # out-of-sample windows tile the data without overlap
+        assert all(a.oos_end == b.oos_start for a, b in zip(rolling, rolling[1:]))
+        assert all(f.is_end == f.oos_start for f in rolling)
+
+    def test_report(self):
+        wf_config = WalkForwardConfig(folds=3, space={"entry_threshold": [30, 40]})
+        analyzer = WalkForwardAnalyzer(make_series(1500), wf_config=wf_config)
+        report = analyzer.run()
+
+        assert report["folds"] == 3
+        assert 0.0 <= report["robustness_score"] <= 1.0
+        assert isinstance(report["consistent"], bool)
+        assert all(r.params["entry_threshold"] in (30, 40) for r in analyzer.results)
+
+    def test_pool_folds_match_in_process_folds(self):
+        """Folds run over the optimizer's shared-memory pool give the same results."""
+        series = make_series(1500)
+        space = {"entry_threshold": [30, 40]}
+        local = WalkForwardAnalyzer(series, wf_config=WalkForwardConfig(folds=2, space=space))
+        pooled = WalkForwardAnalyzer(series, wf_config=WalkForwardConfig(folds=2, space=space, workers=2))
+        local.run()
+        pooled.run()
+
+        assert [r.params for r in pooled.results] == [r.params for r in local.results]
+        def timeless(row):
+            return {k: v for k, v in row.items() if k != "elapsed"}
+
+        assert [timeless(r.out_of_sample) for r in pooled.results] == [timeless(r.out_of_sample) for r in local.results]
+
+    def test_too_little_data(self):
+        report = WalkForwardAnalyzer(make_series(100)).run()
+        assert report["consistent"] is False
+        assert report["folds"] == 0
+
+
+@pytest.mark.unit
+class TestMonteCarlo:
+    """Test suite for the Monte Carlo risk engine."""
+
+    returns = np.array([0.02, -0.01, 0.015, -0.012, -0.008, 0.03, -0.01, 0.005, 0.01, -0.02])
+
+    def test_longest_run(self):
+        mask = np.array([[1, 1, 0, 1, 1, 1, 0], [0, 0, 0, 0, 0, 0, 0], [1, 1, 1, 1, 1, 1, 1]], dtype=bool)
+        assert longest_run(mask).tolist() == [3, 0, 7]
+
+    def test_shuffle_preserves_final_return(self):
+        result = MonteCarloEngine(MonteCarloConfig(n_paths=1000, method="shuffle")).run(self.returns)
+        assert np.allclose(result.final_return, np.prod(1 + self.returns) - 1)
+        assert result.losing_streak.min() >= 1
+
+    def test_seeded_and_chunked(self):
+        config = MonteCarloConfig(n_paths=25_000, chunk_size=4_000, seed=7)
+        first = MonteCarloEngine(config).run(self.returns).summary()
+        second = MonteCarloEngine(config).run(self.returns).summary()
+
+        assert first == second
+        assert first["paths"] == 25_000
+        assert first["cvar_95"] <= first["var_95"]
+        assert first["max_drawdown_95"] <= first["max_drawdown_median"] <= 0
+
+    def test_unknown_method(self):
+        with pytest.raises(ValueError):
+            MonteCarloEngine(MonteCarloConfig(method="garch"))
+
+
+@pytest.mark.unit
+class TestSafeTesterBacktest:
+    """Test suite for SafeTester.run_backtest."""
+
+    async def test_fails_without_history(self):
+        tester = SafeTester(db_session=None)
+        results = await tester.run_backtest("", "strategy.py", months=1)
+        assert results["passed"] is False
+        assert "error" in results
+
+    async def test_runs_engine_on_loaded_history(self):
+        async def loader(symbol, timeframe, start, end):
+            return make_series()
+
+        tester = SafeTester(db_session=None, history_loader=loader)
+        results = await tester.run_backtest("", "strategy.py", months=1)
+
+        assert results["duration_months"] == 1
+        assert isinstance(results["passed"], bool)
+        assert tester.last_backtest is not None
+
+    async def test_rejects_code_it_cannot_run(self, tmp_path):
+        loaded = []
+
+        async def loader(symbol, timeframe, start, end):
+            loaded.append(symbol)
+            return make_series()
+
+        strategy = tmp_path / "strategy.py"
+        strategy.write_text("THRESHOLD = 60\n")
+        tester = SafeTester(db_session=None, history_loader=loader)
+
+        results = await tester.run_backtest("THRESHOLD = 70\n", str(strategy), months=1)
+        assert results["passed"] is False and "cannot be backtested" in results["error"]
+        assert not loaded and tester.last_backtest is None
+
+        # the deployed code itself is what the engine runs
+        await tester.run_backtest("THRESHOLD = 60\n", str(strategy), months=1)
+        assert tester.last_backtest is not None
+
+    async def test_monte_carlo_needs_a_backtest(self):
+        tester = SafeTester(db_session=None)
+        results = await tester._monte_carlo_simulation("")
+        assert results["reliable"] is False
@@ -0,0 +1,665 @@
+"""
+Unit Tests for the caching system
+Testing the bounded local tier, L1 invalidation and request coalescing
+"""
+import asyncio
+from fnmatch import fnmatchcase
+
+import numpy as np
+import pytest
+from redis.exceptions import WatchError
+
+from app.core.cache import CacheManager, KeyUsage, MarketDataCache, UserCache
+from app.core.local_cache import LocalCache
+from app.core.metrics import registry
+from app.marketdata import CANDLE_DTYPE
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.mark.unit
+class TestLocalCache:
+    """Test suite for LocalCache."""
+
+    def test_lru_eviction_keeps_recently_used(self, clock):
+        local = LocalCache(max_entries=3, quotas={"default": 1.0}, clock=clock)
+        for key in ("a", "b", "c"):
+            local.set(key, key)
+        local.get("a")
+        local.set("d", "d")
+
+        assert "b" not in local
+        assert all(key in local for key in ("a", "c", "d"))
+        assert local.stats()["evictions"] == 1
+
+    def test_byte_budget(self, clock):
+        local = LocalCache(max_bytes=1000, quotas={"default": 1.0}, clock=clock)
+        for i in range(10):
+            local.set(f"k{i}", b"x", size=300)
+
+        stats = local.stats()
+        assert stats["bytes"] <= 1000
+        assert stats["entries"] == 3
+        # larger than the whole namespace budget: rejected instead of flushing it
+        assert local.set("huge", b"x", size=5000) is False
+
+    def test_ticks_cannot_evict_sessions(self, clock):
+        local = LocalCache(max_entries=100, quotas={"tick": 0.5, "session": 0.5}, clock=clock)
+        local.set("session:1", {"user": 1}, ttl=3600)
+        for i in range(1000):
+            local.set(f"tick:{i}", i, ttl=1)
+
+        assert local.get("session:1") == {"user": 1}
+        stats = local.stats()["namespaces"]
+        assert stats["tick"]["entries"] == 50
+        assert stats["tick"]["evictions"] == 950
+        assert stats["session"]["evictions"] == 0
+
+    def test_sweeper_expires_unread_keys(self, clock):
+        removed = []
+        local = LocalCache(wheel_slots=8, listener=lambda ns, reason: removed.append((ns, reason)), clock=clock)
+        local.set("tick:XAUUSD", 1, ttl=1)
+        local.set("session:1", 2, ttl=20)  # further out than one wheel rotation
+        local.set("profile:1", 3)
+
+        clock.now += 2
+        assert local.sweep() == 1
+        assert ("tick", "expired") in removed
+
+        clock.now += 10
+        assert local.sweep() == 0
+        clock.now += 10
+        assert local.sweep() == 1
+        assert len(local) == 1
+        assert local.stats()["expirations"] == 2
+
+    def test_expired_read_is_a_miss(self, clock):
+        local = LocalCache(clock=clock)
+        local.set("tick:XAUUSD", 1, ttl=1)
+        clock.now += 1
+        assert local.get("tick:XAUUSD") is None
+        assert local.stats()["namespaces"]["tick"]["expirations"] == 1
+
+    def test_expire_and_increment(self, clock):
+        local = LocalCache(clock=clock)
+        assert local.increment("counter:a") == 1
+        assert local.increment("counter:a", 4) == 5
+        assert local.expire("counter:a", 5) is True
+
+        clock.now += 6
+        local.sweep()
+        assert "counter:a" not in local
+        assert local.expire("counter:a", 5) is False
+
+    def test_clear_pattern_uses_globs(self, clock):
+        local = LocalCache(clock=clock)
+        for key in ("tick:XAUUSD", "tick:EURUSD", "candles:XAUUSD:M15:100"):
+            local.set(key, 1)
+        assert local.clear_pattern("tick:XAU*") == 1
+        assert local.clear_pattern("*XAUUSD*") == 1
+        assert len(local) == 1
+
+
+@pytest.mark.unit
+class TestCacheManagerLocalTier:
+    """Test suite for CacheManager without Redis."""
+
+    async def test_fallback_respects_ttl_and_nx(self):
+        manager = CacheManager()
+        assert await manager.set("session:1", {"a": 1}, ttl=60) is True
+        assert await manager.set("session:1", {"a": 2}, ttl=60, nx=True) is False
+        assert await manager.get("session:1") == {"a": 1}
+
+        manager.local._clock = lambda: float("inf")
+        assert await manager.get("session:1", "gone") == "gone"
+
+    def test_sync_decorator_expires(self):
+        manager = CacheManager()
+        now = [0.0]
+        manager.local._clock = lambda: now[0]
+        calls = []
+
+        @manager.cached(ttl=10, key_prefix="square")
+        def square(x):
+            calls.append(x)
+            return x * x
+
+        assert square(3) == 9
+        assert square(3) == 9
+        now[0] += 11
+        assert square(3) == 9
+        assert calls == [3, 3]
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio for the cache paths; publish delivers synchronously."""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.subscribers = []
+        self.reads = 0
+        self.scanned = 0
+        self.writes = {}
+
+    def _touch(self, key):
+        self.writes[key] = self.writes.get(key, 0) + 1
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    async def pttl(self, key):
+        return 60_000 if key in self.data else -2
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token):
+        if self.data.get(key) == token:
+            del self.data[key]
+            return 1
+        return 0
+
+    async def delete(self, *keys):
+        for key in keys:
+            self._touch(key)
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    unlink = delete
+
+    async def keys(self, pattern):
+        raise AssertionError("KEYS blocks Redis")
+
+    async def scan_iter(self, match=None, count=None):
+        for key in list(self.data):
+            self.scanned += 1
+            if fnmatchcase(key, match):
+                yield key
+
+    async def sadd(self, key, *members):
+        self.data.setdefault(key, set()).update(members)
+
+    async def smembers(self, key):
+        return set(self.data.get(key, ()))
+
+    async def expire(self, key, seconds, nx=False, gt=False):
+        current = self.ttls.get(key)
+        if (nx and current is not None) or (gt and (current is None or seconds <= current)):
+            return 0
+        self.ttls[key] = seconds
+        return 1
+
+    async def incrby(self, key, amount):
+        self.data[key] = int(self.data.get(key, 0)) + amount
+        return self.data[key]
+
+    async def rpush(self, key, *values):
+        self._touch(key)
+        self.data.setdefault(key, []).extend(values)
+        return len(self.data[key])
+
+    async def lindex(self, key, index):
+        items = self.data.get(key, [])
+        return items[index] if -len(items) <= index < len(items) else None
+
+    async def lset(self, key, index, value):
+        self._touch(key)
+        self.data[key][index] = value
+
+    async def ltrim(self, key, start, end):
+        self._touch(key)
+        items = self.data.get(key, [])
+        self.data[key] = items[start:len(items) + end + 1 if end < 0 else end + 1]
+
+    async def lrange(self, key, start, end):
+        items = self.data.get(key, [])
+        return items[max(start, -len(items)):len(items) + end + 1 if end < 0 else end + 1]
+
+    async def publish(self, channel, message):
+        for manager in self.subscribers:
+            manager._apply_invalidation(message.encode())
+        return len(self.subscribers)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+        self.watched = {}
+        self.immediate = False
+
+    async def watch(self, *keys):
+        # commands run immediately until multi(), like redis-py
+        self.watched = {key: self.redis.writes.get(key, 0) for key in keys}
+        self.immediate = True
+
+    def multi(self):
+        self.immediate = False
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        method = getattr(self.redis, name)
+        if self.immediate:
+            return method
+
+        def queue(*args, **kwargs):
+            self.ops.append((method, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        self.redis.reads += 1
+        watched, self.watched = self.watched, {}
+        if any(self.redis.writes.get(key, 0) != seen for key, seen in watched.items()):
+            raise WatchError("Watched variable changed.")
+        return [await method(*args, **kwargs) for method, args, kwargs in self.ops]
+
+
+def bars(start, count, close=1.0):
+    return [
+        {"time": 900 * i, "open": close, "high": close, "low": close, "close": close, "volume": 1}
+        for i in range(start, start + count)
+    ]
+
+
+def node(redis):
+    manager = CacheManager()
+    manager.redis_client = redis
+    manager._connected = True
+    manager._l1_live = True
+    redis.subscribers.append(manager)
+    return manager
+
+
+@pytest.mark.unit
+class TestCacheManagerL1:
+    """Test suite for the L1 tier in front of Redis."""
+
+    async def test_reads_are_served_from_l1(self):
+        redis = FakeRedis()
+        a, b = node(redis), node(redis)
+        await a.set("tick:XAUUSD", {"bid": 1})
+
+        assert await b.get("tick:XAUUSD") == {"bid": 1}
+        assert await b.get("tick:XAUUSD") == {"bid": 1}
+        assert await a.get("tick:XAUUSD") == {"bid": 1}
+        # b went to Redis once, a wrote through its own L1
+        assert redis.reads == 1
+
+    async def test_writes_invalidate_other_nodes(self):
+        redis = FakeRedis()
+        a, b = node(redis), node(redis)
+        await a.set("session:1", {"v": 1})
+        assert await b.get("session:1") == {"v": 1}
+
+        await a.set("session:1", {"v": 2})
+        assert await b.get("session:1") == {"v": 2}
+
+        await a.clear_pattern("session:*")
+        assert await b.get("session:1") is None
+
+    async def test_l1_bypassed_without_subscription(self):
+        redis = FakeRedis()
+        a = node(redis)
+        await a.set("tick:XAUUSD", 1)
+        a._l1_live = False
+        await a.get("tick:XAUUSD")
+        await a.get("tick:XAUUSD")
+        assert redis.reads == 2
+
+    async def test_stale_read_does_not_refill_l1(self):
+        redis = FakeRedis()
+        a, b = node(redis), node(redis)
+        await a.set("profile:1", "old")
+
+        original = redis.pipeline
+
+        def racing_pipeline(transaction=True):
+            pipe = original(transaction)
+            execute = pipe.execute
+
+            async def execute_then_invalidate():
+                result = await execute()
+                # another node writes while b's read is in flight
+                await a.set("profile:1", "new")
+                return result
+
+            pipe.execute = execute_then_invalidate
+            return pipe
+
+        redis.pipeline = racing_pipeline
+        assert await b.get("profile:1") == "old"
+        redis.pipeline = original
+        assert await b.get("profile:1") == "new"
+
+
+@pytest.mark.unit
+class TestGetOrSet:
+    """Test suite for single-flight and stale-while-revalidate."""
+
+    async def test_concurrent_misses_compute_once(self):
+        manager = CacheManager()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"signal": "BUY"}
+
+        results = await asyncio.gather(*(manager.get_or_set("analysis:XAUUSD:H1", compute, ttl=60) for _ in range(20)))
+        assert len(calls) == 1
+        assert all(result == {"signal": "BUY"} for result in results)
+        assert not manager._inflight
+
+    async def test_failure_reaches_every_waiter(self):
+        manager = CacheManager()
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("analyzer down")
+
+        results = await asyncio.gather(
+            *(manager.get_or_set("analysis:XAUUSD:H1", compute) for _ in range(3)),
+            return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert not manager._inflight
+
+    async def test_stale_value_served_while_refreshing(self, monkeypatch):
+        manager = CacheManager()
+        now = [1000.0]
+        monkeypatch.setattr("app.core.cache.time.time", lambda: now[0])
+        version = iter(range(1, 10))
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            return next(version)
+
+        assert await manager.get_or_set("analysis:a", compute, ttl=60, stale_ttl=30) == 1
+        now[0] += 61
+        # expired but within stale_ttl: old value, one background refresh
+        assert await manager.get_or_set("analysis:a", compute, ttl=60, stale_ttl=30) == 1
+        assert await manager.get_or_set("analysis:a", compute, ttl=60, stale_ttl=30) == 1
+        await asyncio.gather(*manager._inflight.values())
+        assert await manager.get_or_set("analysis:a", compute, ttl=60, stale_ttl=30) == 2
+
+    async def test_redis_lock_coalesces_workers(self):
+        redis = FakeRedis()
+        a, b = node(redis), node(redis)
+        b.LOCK_POLL_INTERVAL = 0.001
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return 42
+
+        results = await asyncio.gather(
+            a.get_or_set("analysis:x", compute, lock=True),
+            b.get_or_set("analysis:x", compute, lock=True),
+        )
+        assert results == [42, 42]
+        assert len(calls) == 1
+        assert "lock:analysis:x" not in redis.data
+
+    async def test_async_decorator_coalesces(self):
+        manager = CacheManager()
+        calls = []
+
+        @manager.cached(ttl=60, key_prefix="analysis")
+        async def analyze(symbol):
+            calls.append(symbol)
+            await asyncio.sleep(0.01)
+            return symbol.lower()
+
+        assert await asyncio.gather(analyze("XAU"), analyze("XAU")) == ["xau", "xau"]
+        assert await analyze("XAU") == "xau"
+        assert calls == ["XAU"]
+
+
+@pytest.mark.unit
+class TestInvalidation:
+    """Test suite for tag- and SCAN-based invalidation."""
+
+    async def test_tags_drop_only_their_keys(self):
+        redis = FakeRedis()
+        a, b = node(redis), node(redis)
+        await a.set("candles:XAUUSD:M15:100", [1], ttl=60, tags=["symbol:XAUUSD"])
+        await a.set("analysis:XAUUSD:H1", {"s": 1}, ttl=300, tags=["symbol:XAUUSD"])
+        await a.set("candles:XAUEUR:M15:100", [2], ttl=60, tags=["symbol:XAUEUR"])
+        assert await b.get("analysis:XAUUSD:H1") == {"s": 1}
+
+        assert await a.invalidate_tags("symbol:XAUUSD") == 2
+        assert set(redis.data) == {"candles:XAUEUR:M15:100", "tag:symbol:XAUEUR"}
+        assert await b.get("analysis:XAUUSD:H1") is None
+        assert redis.scanned == 0
+
+    async def test_tag_set_outlives_its_keys(self):
+        redis = FakeRedis()
+        manager = node(redis)
+        await manager.set("analysis:XAUUSD:H1", 1, ttl=300, tags=["symbol:XAUUSD"])
+        await manager.set("candles:XAUUSD:M15:100", 2, ttl=60, tags=["symbol:XAUUSD"])
+        assert redis.ttls["tag:symbol:XAUUSD"] == 300
+
+    async def test_market_and_user_invalidation(self, monkeypatch):
+        redis = FakeRedis()
+        monkeypatch.setattr("app.core.cache.cache", node(redis))
+
+        await MarketDataCache.set_tick("XAUUSD", {"bid": 1.0})
+        await MarketDataCache.set_candles("XAUUSD", "M15", bars(0, 3))
+        await MarketDataCache.set_tick("XAUUSDm", {"bid": 1.0})
+        await MarketDataCache.invalidate_symbol("XAUUSD")
+        assert "tick:XAUUSDm" in redis.data
+        assert not any("XAUUSD:" in key or key == "tick:XAUUSD" for key in redis.data)
+
+        await UserCache.set_session(1, {"u": 1})
+        await UserCache.set_session(10, {"u": 10})
+        await UserCache.invalidate_user(1)
+        assert "session:10" in redis.data and "session:1" not in redis.data
+
+    async def test_local_fallback_tags(self):
+        manager = CacheManager()
+        await manager.set("analysis:XAUUSD:H1", 1, tags=["symbol:XAUUSD"])
+        await manager.set("analysis:EURUSD:H1", 2, tags=["symbol:EURUSD"])
+        assert await manager.invalidate_tags("symbol:XAUUSD") == 1
+        assert await manager.get("analysis:EURUSD:H1") == 2
+
+    async def test_clear_pattern_scans_in_batches(self):
+        redis = FakeRedis()
+        manager = node(redis)
+        manager.UNLINK_BATCH = 3
+        for i in range(10):
+            redis.data[f"candles:XAUUSD:M{i}"] = b"x"
+        redis.data["tick:XAUUSD"] = b"x"
+
+        assert await manager.clear_pattern("candles:*") == 10
+        assert list(redis.data) == ["tick:XAUUSD"]
+
+
+@pytest.mark.unit
+class TestBatchOperations:
+    """Test suite for get_many/set_many/delete_many."""
+
+    async def test_many_symbols_one_round_trip(self, monkeypatch):
+        redis = FakeRedis()
+        writer, reader = node(redis), node(redis)
+        monkeypatch.setattr("app.core.cache.cache", writer)
+        symbols = [f"SYM{i}" for i in range(10)]
+        await MarketDataCache.set_ticks({symbol: {"bid": i} for i, symbol in enumerate(symbols)})
+        assert redis.reads == 1
+
+        monkeypatch.setattr("app.core.cache.cache", reader)
+        ticks = await MarketDataCache.get_ticks(symbols + ["MISSING"])
+        assert redis.reads == 2
+        assert ticks["SYM3"] == {"bid": 3} and ticks["MISSING"] is None
+
+        # served from the reader's L1 now
+        await MarketDataCache.get_ticks(symbols)
+        assert redis.reads == 2
+
+    async def test_set_many_invalidates_other_nodes(self):
+        redis = FakeRedis()
+        a, b = node(redis), node(redis)
+        await a.set_many({"tick:A": 1, "tick:B": 2})
+        assert await b.get_many(["tick:A", "tick:B"]) == {"tick:A": 1, "tick:B": 2}
+
+        await a.set_many({"tick:A": 10})
+        assert await b.get_many(["tick:A", "tick:B"]) == {"tick:A": 10, "tick:B": 2}
+
+        assert await a.delete_many(["tick:A", "tick:B", "tick:C"]) == 2
+        assert await b.get_many(["tick:A", "tick:B"], default=0) == {"tick:A": 0, "tick:B": 0}
+
+    async def test_local_fallback(self):
+        manager = CacheManager()
+        await manager.set_many({"tick:A": 1, "tick:B": 2}, ttl=5)
+        assert await manager.get_many(["tick:A", "tick:C"]) == {"tick:A": 1, "tick:C": None}
+        assert await manager.delete_many(["tick:A"]) == 1
+
+
+@pytest.mark.unit
+class TestCandleSeries:
+    """Test suite for the append-only candle series."""
+
+    async def test_any_tail_from_one_series(self, monkeypatch):
+        redis = FakeRedis()
+        monkeypatch.setattr("app.core.cache.cache", node(redis))
+        await MarketDataCache.set_candles("XAUUSD", "M15", bars(0, 300))
+
+        assert list(redis.data) == ["candles:XAUUSD:M15", "tag:symbol:XAUUSD"]
+        for limit in (1, 50, 200, 500):
+            tail = await MarketDataCache.get_candles("XAUUSD", "M15", limit=limit)
+            assert tail.dtype == CANDLE_DTYPE
+            assert tail["time"].tolist() == [900 * i for i in range(max(0, 300 - limit), 300)]
+        assert await MarketDataCache.get_candles("XAUUSD", "H1") is None
+
+    async def test_append_updates_forming_bar_and_trims(self, monkeypatch):
+        redis = FakeRedis()
+        monkeypatch.setattr("app.core.cache.cache", node(redis))
+        monkeypatch.setattr(MarketDataCache, "CANDLE_MAX_BARS", 5)
+        await MarketDataCache.set_candles("XAUUSD", "M15", bars(0, 4))
+
+        # one stale bar, the forming bar updated, two new ones
+        assert await MarketDataCache.append_candles("XAUUSD", "M15", bars(2, 4, close=2.0)) == 3
+        series = await MarketDataCache.get_candles("XAUUSD", "M15", limit=10)
+        assert series["time"].tolist() == [900 * i for i in range(1, 6)]
+        assert series["close"].tolist() == [1.0, 1.0, 2.0, 2.0, 2.0]
+
+    async def test_append_retries_on_concurrent_write(self):
+        redis = FakeRedis()
+        manager = node(redis)
+        key = "candles:XAUUSD:M15"
+        await manager.append_series(key, np.zeros(1, dtype=CANDLE_DTYPE), max_len=10, ttl=60)
+        lindex = redis.lindex
+
+        async def racing_lindex(name, index):
+            redis.lindex = lindex
+            await redis.rpush(name, np.array([(900, 0, 0, 0, 0, 0)], dtype=CANDLE_DTYPE).tobytes())
+            return await lindex(name, index)
+
+        redis.lindex = racing_lindex
+        rows = np.array([(900, 1, 1, 1, 1, 1), (1800, 1, 1, 1, 1, 1)], dtype=CANDLE_DTYPE)
+        await manager.append_series(key, rows, max_len=10, ttl=60)
+
+        series = await manager.get_series_tail(key, CANDLE_DTYPE, 10)
+        assert series["time"].tolist() == [0, 900, 1800]
+        assert series["close"].tolist() == [0.0, 1.0, 1.0]
+        assert len(await manager.get_series_tail(key, CANDLE_DTYPE, 0)) == 0
+
+    async def test_local_fallback(self, monkeypatch):
+        monkeypatch.setattr("app.core.cache.cache", CacheManager())
+        await MarketDataCache.append_candles("XAUUSD", "M15", bars(0, 3))
+        await MarketDataCache.append_candles("XAUUSD", "M15", bars(2, 2, close=2.0))
+
+        series = await MarketDataCache.get_candles("XAUUSD", "M15", limit=2)
+        assert series["time"].tolist() == [1800, 2700]
+        assert series["close"].tolist() == [2.0, 2.0]
+        assert len(await MarketDataCache.get_candles("XAUUSD", "M15", limit=0)) == 0
+
+
+def sample(name, **labels):
+    return registry.get_sample_value(name, labels) or 0.0
+
+
+@pytest.mark.unit
+class TestCacheMetrics:
+    """Test suite for cache metrics and key usage tracking."""
+
+    async def test_hits_misses_and_sets_by_namespace(self):
+        redis = FakeRedis()
+        a, b = node(redis), node(redis)
+        before = {
+            "l1": sample("cache_hits_total", namespace="session", tier="l1"),
+            "redis": sample("cache_hits_total", namespace="session", tier="redis"),
+            "miss": sample("cache_misses_total", namespace="session"),
+            "set": sample("cache_sets_total", namespace="session"),
+        }
+
+        await a.set("session:1", {"u": 1})
+        await b.get("session:1")
+        await b.get("session:1")
+        await b.get("session:2")
+
+        assert sample("cache_sets_total", namespace="session") == before["set"] + 1
+        assert sample("cache_hits_total", namespace="session", tier="redis") == before["redis"] + 1
+        assert sample("cache_hits_total", namespace="session", tier="l1") == before["l1"] + 1
+        assert sample("cache_misses_total", namespace="session") == before["miss"] + 1
+        assert registry.get_sample_value("cache_redis_latency_seconds_count", {"operation": "get"}) >= 2
+
+    async def test_stale_hits(self):
+        manager = CacheManager()
+        before = sample("cache_stale_hits_total", namespace="analysis")
+        await manager.get_or_set("analysis:XAUUSD:H1", lambda: 1, ttl=60, stale_ttl=60)
+
+        manager.local.get("analysis:XAUUSD:H1")[1] = 0  # fresh_until in the past
+        assert await manager.get_or_set("analysis:XAUUSD:H1", lambda: 2, ttl=60, stale_ttl=60) == 1
+        await asyncio.sleep(0)
+        assert sample("cache_stale_hits_total", namespace="analysis") == before + 1
+
+    def test_unknown_prefixes_share_the_default_namespace(self):
+        local = LocalCache()
+        assert local.namespace("candles:XAUUSD:M15") == "candles"
+        assert local.namespace("lock:analysis:XAUUSD") == "default"
+        assert local.namespace("9f86d081884c7d65") == "default"
+
+    def test_key_usage_top_and_prune(self):
+        usage = KeyUsage(capacity=2)
+        for _ in range(5):
+            usage.record("tick:XAUUSD", 60)
+        usage.record("candles:XAUUSD:M15", 240_000, access=False)
+        usage.record("session:1", 500)
+        assert [row["key"] for row in usage.top(2)] == ["tick:XAUUSD", "session:1"]
+        assert usage.top(1, by="bytes")[0]["key"] == "candles:XAUUSD:M15"
+
+        for i in range(3):
+            usage.record(f"profile:{i}")
+        assert len(usage.accesses) <= 4
+        assert usage.top(1)[0] == {"key": "tick:XAUUSD", "accesses": 2, "bytes": 60}
@@ -0,0 +1,155 @@
+"""
+Unit Tests for the candle store
+Testing binary COPY decoding, monthly partitions, staged upserts and rollup reads
+"""
+import struct
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.marketdata import CANDLE_DTYPE
+from app.marketdata.candle_store import CandleStore, decode_copy_binary, partitions_for
+
+JAN_2024 = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+
+
+def m1_bars(n: int, start: int = JAN_2024) -> np.ndarray:
+    array = np.zeros(n, dtype=CANDLE_DTYPE)
+    array["time"] = start + np.arange(n) * 60
+    array["close"] = 2000 + np.arange(n)
+    array["open"], array["high"], array["low"] = array["close"] - 1, array["close"] + 2, array["close"] - 2
+    array["volume"] = 10
+    return array
+
+
+def copy_binary(array: np.ndarray) -> bytes:
+    """What PostgreSQL sends for COPY (SELECT time, open, ...) TO STDOUT (FORMAT binary)"""
+    out = [b"PGCOPY\n\xff\r\n\x00", struct.pack(">ii", 0, 0)]
+    for bar in array:
+        out.append(struct.pack(">h", 6))
+        out.append(struct.pack(">iq", 8, int(bar["time"])))
+        for name in ("open", "high", "low", "close", "volume"):
+            out.append(struct.pack(">id", 8, float(bar[name])))
+    out.append(struct.pack(">h", -1))
+    return b"".join(out)
+
+
+class FakeAsyncpg:
+    """Records what CandleStore sends to the asyncpg connection."""
+
+    def __init__(self, result: bytes = b""):
+        self.statements = []
+        self.copies = []
+        self.queries = []
+        self.result = result
+
+    async def execute(self, sql):
+        self.statements.append(sql)
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.statements.append("BEGIN")
+        yield
+        self.statements.append("COMMIT")
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.copies.append((table, columns, list(records)))
+
+    async def copy_from_query(self, query, *args, output, format):
+        self.queries.append((query, args, format))
+        # the server streams arbitrary-sized chunks
+        for i in range(0, len(self.result), 1000):
+            await output(self.result[i:i + 1000])
+
+
+def store_with(conn: FakeAsyncpg) -> CandleStore:
+    store = CandleStore()
+
+    @asynccontextmanager
+    async def connection():
+        yield conn
+
+    store._connection = connection
+    return store
+
+
+@pytest.mark.unit
+class TestCandleStore:
+    """Test suite for CandleStore."""
+
+    def test_decode_copy_binary(self):
+        bars = m1_bars(5000)
+        decoded = decode_copy_binary(copy_binary(bars))
+        assert decoded.dtype == CANDLE_DTYPE
+        np.testing.assert_array_equal(decoded, bars)
+        assert len(decode_copy_binary(copy_binary(bars[:0]))) == 0
+
+    def test_decode_rejects_nulls(self):
+        data = bytearray(copy_binary(m1_bars(2)))
+        # the second bar's volume becomes NULL (length -1, no value)
+        data[-2 - 12:-2] = struct.pack(">i", -1)
+        with pytest.raises(ValueError):
+            decode_copy_binary(bytes(data))
+
+    def test_monthly_partitions(self):
+        dec_15 = int(datetime(2023, 12, 15, tzinfo=timezone.utc).timestamp())
+        parts = partitions_for("candles_m1", dec_15, JAN_2024 + 40 * 86400)
+        assert [name for name, _, _ in parts] == [
+            "candles_m1_y2023m12", "candles_m1_y2024m01", "candles_m1_y2024m02"
+        ]
+        assert parts[1][1:] == (JAN_2024, int(datetime(2024, 2, 1, tzinfo=timezone.utc).timestamp()))
+        assert parts[0][2] == parts[1][1]
+
+    async def test_write_copies_into_staging_then_upserts(self):
+        conn = FakeAsyncpg()
+        store = store_with(conn)
+        bars = m1_bars(3, start=JAN_2024 - 60)
+        resent = bars[-1:].copy()
+        resent["close"] = 1.0
+
+        assert await store.write("XAUUSD", np.concatenate([bars, resent])) == 3
+
+        partitions = [sql for sql in conn.statements if "PARTITION OF" in sql]
+        assert len(partitions) == 2
+        assert conn.statements[2] == "BEGIN" and conn.statements[-1] == "COMMIT"
+        assert "ON COMMIT DROP" in conn.statements[3]
+        assert "ON CONFLICT (symbol, time) DO UPDATE" in conn.statements[4]
+
+        table, columns, records = conn.copies[0]
+        assert table == "_candles_m1_staging"
+        assert columns == ["symbol", "time", "open", "high", "low", "close", "volume"]
+        assert [r[1] for r in records] == bars["time"].tolist()
+        assert records[-1][5] == 1.0
+
+        # partitions are created once per process
+        await store.write("XAUUSD", bars)
+        assert len([sql for sql in conn.statements if "PARTITION OF" in sql]) == 2
+
+    async def test_read_decodes_the_copy_stream(self):
+        bars = m1_bars(3000)
+        conn = FakeAsyncpg(copy_binary(bars))
+        store = store_with(conn)
+
+        result = await store.read("XAUUSD", datetime(2024, 1, 1), datetime(2024, 1, 3))
+        np.testing.assert_array_equal(result, bars)
+
+        query, args, format = conn.queries[0]
+        assert format == "binary"
+        assert args == ("XAUUSD", JAN_2024, JAN_2024 + 2 * 86400)
+        assert "GROUP BY" not in query
+
+    async def test_higher_timeframes_roll_up_on_the_server(self):
+        conn = FakeAsyncpg(copy_binary(m1_bars(2, start=JAN_2024)))
+        store = store_with(conn)
+
+        series = await store.load("XAUUSD", "H1", JAN_2024 + 1800, JAN_2024 + 7200)
+        query, args, _ = conn.queries[0]
+        assert "time - time % 3600" in query and "GROUP BY bucket" in query
+        # the first bucket is widened to a whole hour
+        assert args[1] == JAN_2024
+        assert len(series) == 2
+
+        with pytest.raises(ValueError):
+            await store.read("XAUUSD", JAN_2024, JAN_2024 + 60, "M2")
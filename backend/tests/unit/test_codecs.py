@@ -0,0 +1,137 @@
+"""
+Unit Tests for the cache codecs
+Testing round trips, zero-copy array decoding and codec selection
+"""
+import pickle
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.core import codecs
+from app.core.cache import CacheManager, MarketDataCache
+
+
+@pytest.mark.unit
+class TestCodecs:
+    """Test suite for app.core.codecs."""
+
+    @pytest.mark.parametrize("codec", [codecs.PICKLE, codecs.MSGPACK, codecs.ORJSON])
+    def test_dict_round_trip(self, codec):
+        tick = {"seq": 41, "symbol": "XAUUSD", "bid": 2945.1, "ask": 2945.4, "time": 1708266600.25}
+        assert codecs.decode(codecs.encode(tick, codec), allow_pickle=codec == codecs.PICKLE) == tick
+
+    def test_msgpack_numpy_and_datetime(self):
+        value = {
+            "score": np.float64(61.5),
+            "count": np.int64(3),
+            "when": datetime(2024, 1, 2, 9, 30),
+            "features": {"rsi": np.linspace(0, 1, 50)},
+        }
+        decoded = codecs.decode(codecs.encode(value, codecs.MSGPACK))
+
+        assert decoded["score"] == 61.5 and decoded["count"] == 3
+        assert decoded["when"] == datetime(2024, 1, 2, 9, 30)
+        assert np.array_equal(decoded["features"]["rsi"], value["features"]["rsi"])
+
+    @pytest.mark.parametrize("array", [
+        np.arange(12, dtype=">f4").reshape(3, 4)[:, ::2],
+        np.zeros(4, dtype=[("time", "<i8"), ("close", "<f8")]),
+        np.zeros((0, 3)),
+        np.float64(3.5),
+    ])
+    def test_array_round_trip(self, array):
+        decoded = codecs.decode(codecs.encode(array, codecs.NDARRAY))
+        assert decoded.shape == np.shape(array)
+        assert np.array_equal(decoded, array)
+        assert decoded.dtype.isnative or decoded.dtype.byteorder in "<|"
+
+    def test_array_decode_is_zero_copy(self):
+        data = codecs.encode(np.arange(1000, dtype=np.float64), codecs.NDARRAY)
+        decoded = codecs.decode(data)
+
+        assert not decoded.flags.writeable
+        assert not decoded.flags.owndata
+
+    def test_msgpack_is_the_default(self):
+        assert codecs.encode({"a": 1})[0] == 0x01
+        with pytest.raises(TypeError):
+            codecs.encode(object())
+
+    def test_pickle_needs_an_explicit_opt_in(self):
+        payload = pickle.dumps({"a": 1}, protocol=2)
+        with pytest.raises(ValueError):
+            codecs.decode(payload)
+        with pytest.raises(ValueError):
+            codecs.decode(codecs.encode({"a": 1}, codecs.PICKLE))
+        assert codecs.decode(payload, allow_pickle=True) == {"a": 1}
+
+    def test_unknown_tags(self):
+        with pytest.raises(ValueError):
+            codecs.decode(b"\x7fgarbage")
+        with pytest.raises(ValueError):
+            codecs.encode({}, "yaml")
+        with pytest.raises(ValueError):
+            codecs.encode(np.array([object()]), codecs.NDARRAY)
+
+
+@pytest.mark.unit
+class TestMarketDataCacheCodecs:
+    """Test suite for per-namespace codec selection."""
+
+    def test_namespace_codecs(self):
+        assert MarketDataCache._codec("tick", {"bid": 1.0}) == codecs.MSGPACK
+        assert MarketDataCache._codec("candles", np.zeros(3)) == codecs.NDARRAY
+
+    async def test_manager_stores_encoded_payloads(self):
+        manager = CacheManager()
+        stored = {}
+
+        class Redis:
+            async def setex(self, key, ttl, value):
+                stored[key] = value
+
+            async def publish(self, channel, message):
+                return 0
+
+        manager.redis_client = Redis()
+        manager._connected = True
+        await manager.set("tick:XAUUSD", {"bid": 1.0}, ttl=1, codec=codecs.MSGPACK)
+
+        assert stored["tick:XAUUSD"][0] == 0x01
+        assert codecs.decode(stored["tick:XAUUSD"]) == {"bid": 1.0}
+
+    async def test_manager_reads_pickle_only_when_asked(self):
+        manager = CacheManager()
+        stored = {}
+
+        class Pipeline:
+            def __init__(self):
+                self.key = None
+
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            def get(self, key):
+                self.key = key
+                return self
+
+            def pttl(self, key):
+                return self
+
+            async def execute(self):
+                return [stored.get(self.key), -1]
+
+        class Redis:
+            def pipeline(self, transaction=True):
+                return Pipeline()
+
+        manager.redis_client = Redis()
+        manager._connected = True
+        stored["user:1"] = pickle.dumps({"id": 1}, protocol=pickle.HIGHEST_PROTOCOL)
+
+        assert await manager.get("user:1") is None
+        assert await manager.get("user:1", allow_pickle=True) == {"id": 1}
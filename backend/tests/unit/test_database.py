@@ -0,0 +1,75 @@
+"""
+Unit Tests for the database engine factory
+Testing pool sizing, instrumentation and read-replica routing
+"""
+import importlib
+
+import pytest
+
+from app.core.config import settings
+from app.core.performance import db_optimizer
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    import app.database.connection as connection
+    yield connection
+    # later tests get the module as configured by the environment again
+    monkeypatch.undo()
+    importlib.reload(connection)
+
+
+@pytest.mark.unit
+class TestDatabaseEngines:
+    """Test suite for app.database.connection."""
+
+    def test_one_pool_sized_from_settings(self, connection, monkeypatch):
+        monkeypatch.setattr(settings, "DB_POOL_SIZE", 7)
+        monkeypatch.setattr(settings, "DB_MAX_OVERFLOW", 3)
+        engine = connection.create_engine("postgresql+asyncpg://u:p@db/x", name="test")
+
+        assert connection.engines["test"] is engine
+        assert engine.pool.size() == 7 and engine.pool._max_overflow == 3
+        assert engine.sync_engine in db_optimizer._instrumented
+
+    def test_reads_use_the_primary_without_a_replica(self, connection):
+        assert connection.replica_engine is connection.engine
+        assert connection.ReadSessionLocal.kw["bind"] is connection.engine
+        assert set(connection.engines) >= {"primary"}
+
+    def test_reads_route_to_the_replica(self, connection, monkeypatch):
+        monkeypatch.setattr(settings, "DATABASE_REPLICA_URL", "postgresql+asyncpg://u:p@replica/x")
+        connection = importlib.reload(connection)
+
+        assert connection.replica_engine is not connection.engine
+        assert connection.replica_engine.url.host == "replica"
+        assert connection.ReadSessionLocal.kw["bind"] is connection.replica_engine
+        assert connection.AsyncSessionLocal.kw["bind"] is connection.engine
+
+    async def test_read_only_scope_never_commits(self, connection, monkeypatch):
+        calls = []
+
+        class Session:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                calls.append("close")
+
+            async def commit(self):
+                calls.append("commit")
+
+            async def rollback(self):
+                calls.append("rollback")
+
+        monkeypatch.setattr(connection, "ReadSessionLocal", Session)
+        monkeypatch.setattr(connection, "AsyncSessionLocal", Session)
+
+        async with connection.session_scope(read_only=True):
+            pass
+        async with connection.session_scope():
+            pass
+        with pytest.raises(ValueError):
+            async with connection.session_scope():
+                raise ValueError
+        assert calls == ["close", "commit", "close", "rollback", "close"]
@@ -0,0 +1,183 @@
+"""
+Unit Tests for the guardian performance monitor
+Testing the open-alert index and one transaction per check cycle
+"""
+from contextlib import asynccontextmanager
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.guardian.models import AlertDB, AlertSeverity, PerformanceMetric, PerformanceMetricDB
+from app.guardian.monitor import PerformanceMonitor
+
+
+class Result:
+    def __init__(self, rows=(), rowcount=0):
+        self.rows = list(rows)
+        self.rowcount = rowcount
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+
+class FakeDatabase:
+    """Counts the statements a monitor sends; each session_scope() is one transaction."""
+
+    def __init__(self, open_alerts=()):
+        self.open_alerts = list(open_alerts)
+        self.transactions = 0
+        self.statements = []
+        self.inserted = []
+
+    @asynccontextmanager
+    async def session_scope(self, read_only=False):
+        self.transactions += 1
+        yield self
+
+    async def execute(self, statement, params=None):
+        self.statements.append((statement.__visit_name__, params))
+        if statement.__visit_name__ == "select":
+            return Result(self.open_alerts)
+        return Result(rowcount=1)
+
+    def add_all(self, rows):
+        self.pending = list(rows)
+
+    async def flush(self):
+        self.statements.append(("insert", len(self.pending)))
+        for row in self.pending:
+            row.id = len(self.inserted) + 1
+            row.timestamp = datetime(2024, 1, 1)
+            row.is_resolved = False
+            self.inserted.append(row)
+
+
+def bad_metrics(**overrides) -> PerformanceMetric:
+    values = dict(
+        win_rate=0.40, profit_factor=1.0, sharpe_ratio=0.5, max_drawdown=-0.30,
+        expectancy=-0.01, latency_ms=250, total_trades=100, successful_trades=40,
+    )
+    values.update(overrides)
+    return PerformanceMetric(**values)
+
+
+@pytest.fixture
+def database():
+    return FakeDatabase()
+
+
+@pytest.fixture
+def monitor(database):
+    return PerformanceMonitor(database.session_scope)
+
+
+@pytest.mark.unit
+class TestPerformanceMonitor:
+    """Test suite for PerformanceMonitor."""
+
+    async def test_new_alerts_are_inserted_in_one_transaction(self, monitor, database):
+        monitor._latest_metric = bad_metrics()
+        alerts = await monitor.detect_anomalies()
+
+        assert [a.metric_name for a in alerts] == [
+            "win_rate", "profit_factor", "sharpe_ratio", "expectancy", "latency_ms"
+        ]
+        assert all(a.id for a in alerts)
+        assert database.transactions == 1
+        # the open-alert index is loaded once, then a single batched insert
+        assert database.statements == [("select", None), ("insert", 5)]
+        assert set(monitor._open_alerts) == {a.metric_name for a in alerts}
+
+    async def test_repeat_cycles_update_in_place(self, monitor, database):
+        monitor._latest_metric = bad_metrics()
+        await monitor.detect_anomalies()
+        database.statements.clear()
+
+        monitor._latest_metric = bad_metrics(win_rate=0.35, latency_ms=300)
+        alerts = await monitor.detect_anomalies()
+
+        assert len(alerts) == 5 and len(database.inserted) == 5
+        assert database.transactions == 2
+        ((kind, params),) = database.statements
+        assert kind == "update"
+        assert {p["current_value"] for p in params} == {0.35, 300}
+
+        # nothing changed: no writes at all
+        database.statements.clear()
+        await monitor.detect_anomalies()
+        assert database.statements == []
+
+    async def test_index_starts_from_the_database(self, database):
+        existing = AlertDB(
+            id=7, timestamp=datetime(2024, 1, 1), severity=AlertSeverity.HIGH, metric_name="win_rate",
+            current_value=0.45, threshold_value=0.55, message="low", is_resolved=False,
+        )
+        database.open_alerts = [existing]
+        monitor = PerformanceMonitor(database.session_scope)
+        monitor._latest_metric = bad_metrics(
+            profit_factor=2.0, sharpe_ratio=1.2, expectancy=0.02, latency_ms=40
+        )
+
+        (alert,) = await monitor.detect_anomalies()
+        assert alert.id == 7 and alert.current_value == 0.40
+        assert database.inserted == []
+
+    async def test_healthy_metrics_touch_nothing(self, monitor, database):
+        monitor._latest_metric = bad_metrics(
+            win_rate=0.6, profit_factor=2.0, sharpe_ratio=1.2, expectancy=0.02, latency_ms=40
+        )
+        assert await monitor.detect_anomalies() == []
+        assert database.transactions == 0
+
+    async def test_resolve_drops_the_alert_from_the_index(self, monitor, database):
+        monitor._latest_metric = bad_metrics()
+        alerts = await monitor.detect_anomalies()
+        latency = next(a for a in alerts if a.metric_name == "latency_ms")
+
+        assert await monitor.resolve_alert(latency.id)
+        assert "latency_ms" not in monitor._open_alerts
+        assert len(await monitor.get_active_alerts()) == 4
+
+        # the next breach opens a fresh alert
+        await monitor.detect_anomalies()
+        assert database.inserted[-1].metric_name == "latency_ms" and len(database.inserted) == 6
+
+    async def test_unmeasured_latency_is_not_checked(self, monitor, database):
+        monitor._latest_metric = bad_metrics(latency_ms=None)
+        alerts = await monitor.detect_anomalies()
+        assert "latency_ms" not in {a.metric_name for a in alerts} and len(alerts) == 4
+
+    async def test_metric_row_shares_the_cycle_transaction(self, monitor, database):
+        monitor._fetch_trading_metrics = AsyncMock(return_value=bad_metrics())
+        await monitor.collect_metrics()
+        await monitor.detect_anomalies()
+
+        assert database.transactions == 1
+        assert database.statements == [("select", None), ("insert", 6)]
+        assert isinstance(database.inserted[0], PerformanceMetricDB)
+
+        # written once: the next cycle without a new metric has nothing to insert
+        database.statements.clear()
+        await monitor.detect_anomalies()
+        assert database.statements == []
+
+    async def test_a_rollback_leaves_the_index_alone(self, monitor, database):
+        monitor._latest_metric = bad_metrics()
+        await monitor.detect_anomalies()
+        before = {name: alert.current_value for name, alert in monitor._open_alerts.items()}
+
+        async def fail(statement, params=None):
+            raise ConnectionError("database unavailable")
+
+        database.execute = fail
+        monitor._latest_metric = bad_metrics(win_rate=0.35)
+        with pytest.raises(ConnectionError):
+            await monitor.detect_anomalies()
+        assert {name: alert.current_value for name, alert in monitor._open_alerts.items()} == before
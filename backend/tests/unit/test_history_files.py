@@ -0,0 +1,106 @@
+"""
+Unit Tests for the history files
+Testing monthly partitioning, catalog pruning, memory-mapped reads and appends
+"""
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.marketdata import CANDLE_DTYPE, HistoryFiles
+
+JAN_30 = int(datetime(2024, 1, 30, tzinfo=timezone.utc).timestamp())
+FEB_1 = int(datetime(2024, 2, 1, tzinfo=timezone.utc).timestamp())
+
+
+def h1_bars(n: int, start: int = JAN_30) -> np.ndarray:
+    array = np.zeros(n, dtype=CANDLE_DTYPE)
+    array["time"] = start + np.arange(n) * 3600
+    array["close"] = 2000 + np.arange(n)
+    array["open"], array["high"], array["low"] = array["close"] - 1, array["close"] + 2, array["close"] - 2
+    array["volume"] = 5
+    return array
+
+
+@pytest.fixture
+def history(tmp_path):
+    return HistoryFiles(str(tmp_path))
+
+
+@pytest.mark.unit
+class TestHistoryFiles:
+    """Test suite for HistoryFiles."""
+
+    def test_append_splits_by_month(self, history, tmp_path):
+        bars = h1_bars(72)   # Jan 30 00:00 .. Feb 1 23:00
+        assert history.append("XAUUSD", "H1", bars) == 72
+
+        assert history.months("XAUUSD", "H1") == ["2024-01", "2024-02"]
+        assert (tmp_path / "XAUUSD" / "H1" / "2024-01.npy").exists()
+        entry = history.catalog()["XAUUSD/H1"]["2024-02"]
+        assert entry == {"first": FEB_1, "last": FEB_1 + 23 * 3600, "rows": 24}
+        np.testing.assert_array_equal(history.read("XAUUSD", "H1"), bars)
+
+    def test_range_reads_only_open_overlapping_months(self, history):
+        history.append("XAUUSD", "H1", h1_bars(72))
+        opened = []
+        open_month = history.open_month
+        history.open_month = lambda *args: opened.append(args[2]) or open_month(*args)
+
+        bars = history.read("XAUUSD", "H1", FEB_1 + 3600, datetime(2024, 2, 1, 5, tzinfo=timezone.utc))
+        assert opened == ["2024-02"]
+        assert bars["time"].tolist() == [FEB_1 + h * 3600 for h in range(1, 5)]
+        # a single month comes back as a view of the mapped file
+        assert isinstance(bars.base, np.memmap) or isinstance(bars, np.memmap)
+        assert not bars.flags.writeable
+
+        assert len(history.read("XAUUSD", "H1", FEB_1 + 86400 * 5, FEB_1 + 86400 * 6)) == 0
+        assert len(history.read("EURUSD", "H1")) == 0
+
+    def test_append_merges_and_replaces_the_last_bar(self, history):
+        history.append("XAUUSD", "H1", h1_bars(10, start=FEB_1))
+        update = h1_bars(5, start=FEB_1 + 9 * 3600)
+        update["close"] = 1.0
+
+        history.append("XAUUSD", "H1", update)
+        bars = history.read("XAUUSD", "H1")
+        assert len(bars) == 14
+        assert np.all(np.diff(bars["time"]) == 3600)
+        assert bars["close"][8] == 2008 and np.all(bars["close"][9:] == 1.0)
+
+        # out-of-order backfill lands in place
+        history.append("XAUUSD", "H1", h1_bars(2, start=FEB_1 - 7200))
+        assert history.read("XAUUSD", "H1")["time"][0] == FEB_1 - 7200
+        assert history.catalog()["XAUUSD/H1"]["2024-02"]["rows"] == 14
+
+    def test_readers_see_appends(self, history, tmp_path):
+        history.append("XAUUSD", "H1", h1_bars(3, start=FEB_1))
+        other_process = HistoryFiles(str(tmp_path))
+        mapped = other_process.read("XAUUSD", "H1")
+
+        history.append("XAUUSD", "H1", h1_bars(3, start=FEB_1 + 3 * 3600))
+        # the old mapping stays intact, a new read picks up the catalog change
+        assert len(mapped) == 3
+        assert len(other_process.read("XAUUSD", "H1")) == 6
+
+    async def test_update_from_candle_store(self, history):
+        history.append("XAUUSD", "H1", h1_bars(3, start=FEB_1))
+        calls = []
+
+        class Store:
+            async def read(self, symbol, start, end, timeframe):
+                calls.append((symbol, start, timeframe))
+                return h1_bars(4, start=start)
+
+        assert await history.update_from(Store(), "XAUUSD", "H1") == 4
+        assert calls == [("XAUUSD", FEB_1 + 2 * 3600, "H1")]
+        assert len(history.read("XAUUSD", "H1")) == 6
+
+    def test_frame_and_load(self, history):
+        history.append("XAUUSD", "H1", h1_bars(72))
+        df = history.frame("XAUUSD", "H1", FEB_1, FEB_1 + 86400)
+        assert list(df.columns) == ["open", "high", "low", "close", "volume"]
+        assert len(df) == 24 and str(df.index[0]) == "2024-02-01 00:00:00+00:00"
+
+        series = history.load("XAUUSD", "H1", datetime(2024, 1, 30), datetime(2024, 2, 1))
+        assert len(series) == 48 and series.time[0] == JAN_30
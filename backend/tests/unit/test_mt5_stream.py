@@ -0,0 +1,91 @@
+"""
+Unit Tests for the MT5 market data stream
+Testing sequence tracking, topic filtering and the analyzer/alert bridge
+"""
+import pytest
+from unittest.mock import AsyncMock
+
+from app.mt5.stream import MarketDataStream, StreamConsumers
+
+
+@pytest.mark.unit
+class TestMarketDataStream:
+    """Test suite for MarketDataStream dispatch."""
+
+    @pytest.fixture
+    def stream(self):
+        stream = MarketDataStream(endpoint="tcp://127.0.0.1:0", stale_after=5)
+        stream.subscribe("XAUUSD", ["M15"])
+        return stream
+
+    async def test_topic_filtering_is_exact(self, stream):
+        """Prefix matches from ZMQ must not reach handlers."""
+        received = []
+        stream.add_tick_handler(received.append)
+
+        await stream._dispatch("tick.XAUUSD", {"seq": 1, "symbol": "XAUUSD", "bid": 1, "ask": 2})
+        await stream._dispatch("tick.XAUUSDm", {"seq": 1, "symbol": "XAUUSDm", "bid": 1, "ask": 2})
+
+        assert [m["symbol"] for m in received] == ["XAUUSD"]
+
+    async def test_gap_detection(self, stream):
+        """Missing sequence numbers are counted and reported."""
+        gaps = []
+        stream.add_gap_handler(lambda topic, expected, got: gaps.append((topic, expected, got)))
+
+        for seq in (1, 2, 5):
+            await stream._dispatch("tick.XAUUSD", {"seq": seq, "symbol": "XAUUSD", "bid": 1, "ask": 1})
+
+        assert gaps == [("tick.XAUUSD", 3, 5)]
+        assert stream.stats.missed == 2
+
+    async def test_duplicates_dropped_and_restart_accepted(self, stream):
+        """A repeated seq is dropped; seq 1 after a high seq is a publisher restart."""
+        received = []
+        stream.add_tick_handler(received.append)
+
+        for seq in (1, 2, 2, 1):
+            await stream._dispatch("tick.XAUUSD", {"seq": seq, "symbol": "XAUUSD", "bid": 1, "ask": 1})
+
+        assert [m["seq"] for m in received] == [1, 2, 1]
+        assert stream.stats.gaps == 0
+
+
+@pytest.mark.unit
+class TestStreamConsumers:
+    """Test suite for the stream -> engine/alerts bridge."""
+
+    def _candle(self, i, closed=True):
+        return {
+            "symbol": "XAUUSD", "timeframe": "M15", "timestamp": f"2026-02-18T{i // 4:02d}:{(i % 4) * 15:02d}:00",
+            "open": 2900.0 + i, "high": 2901.0 + i, "low": 2899.0 + i, "close": 2900.5 + i,
+            "volume": 100, "closed": closed
+        }
+
+    async def test_ticks_feed_price_alerts(self):
+        alerts = AsyncMock()
+        consumers = StreamConsumers(alert_manager=alerts)
+
+        await consumers.on_tick({"symbol": "XAUUSD", "bid": 2945.0, "ask": 2945.4})
+
+        alerts.check_price_alerts.assert_awaited_once()
+        symbol, price, _ = alerts.check_price_alerts.await_args.args
+        assert symbol == "XAUUSD"
+        assert price == pytest.approx(2945.2)
+
+    async def test_analysis_runs_on_closed_bars_only(self):
+        engine = AsyncMock()
+        consumers = StreamConsumers(trading_engine=engine, min_bars=3)
+
+        for i in range(3):
+            await consumers.on_candle(self._candle(i))
+        await consumers.on_candle(self._candle(3, closed=False))
+
+        assert engine.analyze_market.await_count == 1
+        window = consumers.windows[("XAUUSD", "M15")]
+        assert len(window) == 4
+
+        # closing the forming bar replaces it instead of appending a duplicate
+        await consumers.on_candle(self._candle(3))
+        assert len(window) == 4
+        assert engine.analyze_market.await_count == 2
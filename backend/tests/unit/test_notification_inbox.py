@@ -0,0 +1,142 @@
+"""
+Unit Tests for keyset pagination and the notification inbox
+Testing cursors, page boundaries, the inbox indexes and unread counters
+"""
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from app.core.pagination import decode_cursor, encode_cursor, keyset, page
+from app.models.notification import Notification
+from app.services.notification_inbox import PAGE_KEY, NotificationInbox
+
+T0 = datetime(2024, 1, 2, 8)
+
+
+def sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def notification(i: int, user_id=1):
+    return SimpleNamespace(id=i, user_id=user_id, created_at=T0 + timedelta(minutes=i), read=False)
+
+
+class FakeResult:
+    def __init__(self, rows=(), rowcount=0):
+        self.rows = list(rows)
+        self.rowcount = rowcount
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+    def scalar_one_or_none(self):
+        return self.rows[0] if self.rows else None
+
+
+class FakeDatabase:
+    def __init__(self, results=()):
+        self.results = list(results)
+        self.transactions = 0
+        self.statements = []
+
+    @asynccontextmanager
+    async def session_scope(self, read_only=False):
+        self.transactions += 1
+        yield self
+
+    async def execute(self, statement, params=None):
+        self.statements.append((sql(statement), params))
+        return self.results.pop(0) if self.results else FakeResult()
+
+
+@pytest.mark.unit
+class TestKeysetPagination:
+    """Test suite for app.core.pagination."""
+
+    def test_cursor_round_trips_typed_values(self):
+        cursor = encode_cursor([T0, 42])
+        assert decode_cursor(cursor, PAGE_KEY) == [T0, 42]
+        with pytest.raises(ValueError):
+            decode_cursor("not-a-cursor", PAGE_KEY)
+        with pytest.raises(ValueError):
+            decode_cursor(encode_cursor([T0]), PAGE_KEY)
+
+    def test_pages_continue_after_the_last_row(self):
+        first = keyset(select(Notification), PAGE_KEY, None, 2)
+        statement = sql(first)
+        assert "OFFSET" not in statement and "WHERE" not in statement
+        assert "ORDER BY notifications.created_at DESC, notifications.id DESC" in statement
+
+        rows = [notification(i) for i in (9, 8, 7)]   # limit + 1 fetched
+        items, cursor = page(rows, PAGE_KEY, 2)
+        assert [n.id for n in items] == [9, 8] and cursor is not None
+
+        statement = sql(keyset(select(Notification), PAGE_KEY, cursor, 2))
+        assert "(notifications.created_at, notifications.id) < (%(param_1)s, %(param_2)s)" in statement
+        assert page(rows[:2], PAGE_KEY, 2) == (rows[:2], None)
+
+    def test_inbox_indexes_cover_the_page_key(self):
+        indexes = {index.name: str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+                   for index in Notification.__table__.indexes}
+        assert "ON notifications (user_id, created_at, id)" in indexes["ix_notifications_user_created"]
+        assert indexes["ix_notifications_user_unread"].endswith("WHERE read = false")
+
+
+@pytest.mark.unit
+class TestNotificationInbox:
+    """Test suite for NotificationInbox."""
+
+    async def test_unread_page_uses_keyset(self):
+        database = FakeDatabase([FakeResult([notification(5), notification(4)])])
+        items, cursor = await NotificationInbox(database.session_scope).page(
+            1, unread_only=True, limit=2, cursor=encode_cursor([T0 + timedelta(minutes=6), 6])
+        )
+        assert [n.id for n in items] == [5, 4] and cursor is None
+        statement, _ = database.statements[0]
+        assert "notifications.read = false" in statement
+        assert "(notifications.created_at, notifications.id) <" in statement
+        assert "LIMIT" in statement and "OFFSET" not in statement
+
+    async def test_inserted_batches_bump_counters_per_user(self):
+        database = FakeDatabase()
+        inbox = NotificationInbox(database.session_scope)
+        await inbox.count_inserted(database, [
+            {"user_id": 1, "read": False}, {"user_id": 2, "read": False},
+            {"user_id": 1, "read": False}, {"user_id": 3, "read": True},
+        ])
+
+        (statement, rows), = database.statements
+        assert "ON CONFLICT (user_id) DO UPDATE SET unread = (notification_counters.unread + excluded.unread)" in statement
+        assert {row["user_id"]: row["unread"] for row in rows} == {1: 2, 2: 1}
+
+        await inbox.count_inserted(database, [{"user_id": 3, "read": True}])
+        assert len(database.statements) == 1
+
+    async def test_mark_all_read_takes_off_what_it_flipped(self):
+        database = FakeDatabase([FakeResult(rowcount=7)])
+        assert await NotificationInbox(database.session_scope).mark_all_read(1) == 7
+
+        assert database.transactions == 1
+        (flip, _), (counter, _) = database.statements
+        assert flip.startswith("UPDATE notifications SET read=")
+        assert "notifications.read = false" in flip
+        assert "SET unread=greatest(notification_counters.unread + %(unread_1)s, %(greatest_1)s)" in counter
+
+        database = FakeDatabase([FakeResult(rowcount=0)])
+        assert await NotificationInbox(database.session_scope).mark_read(1, 99) is False
+        assert len(database.statements) == 1
+
+    async def test_unread_count_is_a_counter_read(self):
+        database = FakeDatabase([FakeResult([12]), FakeResult([])])
+        inbox = NotificationInbox(database.session_scope)
+        assert await inbox.unread_count(1) == 12
+        assert await inbox.unread_count(2) == 0
+        assert "FROM notification_counters" in database.statements[0][0]
@@ -0,0 +1,334 @@
+"""
+Unit Tests for the batch processing pipeline and query instrumentation
+Testing batching, retries, bounded buffers, shutdown flushes, bulk inserts
+and per-fingerprint query statistics
+"""
+import asyncio
+import enum
+import threading
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import JSON, Column, DateTime, Enum, Float, Integer, MetaData, String, Table, create_engine, text
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+
+from app.core.config import settings
+from app.core.performance import (
+    AsyncBatchProcessor,
+    BulkInsertWriter,
+    ConnectionPoolMonitor,
+    DatabaseOptimizer,
+    fingerprint,
+    query_type,
+)
+
+
+class Recorder(AsyncBatchProcessor):
+    def __init__(self, failures=0, **kwargs):
+        super().__init__(retry_delay=0, **kwargs)
+        self.batches = []
+        self.failures = failures
+
+    async def _process_batch(self, batch):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unavailable")
+        self.batches.append(list(batch))
+        return [f"id-{item}" for item in batch]
+
+
+class Level(enum.Enum):
+    LOW = "low"
+    HIGH = "high"
+
+
+metadata = MetaData()
+events = Table(
+    "events", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String(50)),
+    Column("level", Enum(Level)),
+    Column("value", Float),
+    Column("payload", JSON),
+    Column("status", String(10), default="new"),
+    Column("created_at", DateTime, default=lambda: datetime(2024, 1, 2)),
+)
+
+
+class FakeRawConnection:
+    def __init__(self):
+        self.copies = []
+
+    async def copy_records_to_table(self, table, records, columns, schema_name=None):
+        self.copies.append((table, columns, records))
+
+
+class FakeConnection:
+    dialect = asyncpg_dialect()
+
+    def __init__(self):
+        self.driver_connection = FakeRawConnection()
+
+    async def get_raw_connection(self):
+        return self
+
+
+class FakeSession:
+    """Stands in for AsyncSessionLocal(); records statements per transaction."""
+
+    def __init__(self, log):
+        self.log = log
+        self.raw = FakeConnection()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def begin(self):
+        return self
+
+    async def execute(self, statement, rows):
+        self.log.append((str(statement), rows))
+
+    async def connection(self):
+        return self.raw
+
+
+@pytest.mark.unit
+class TestAsyncBatchProcessor:
+    """Test suite for AsyncBatchProcessor."""
+
+    async def test_flushes_by_size_and_on_stop(self):
+        processor = Recorder(batch_size=3, flush_interval=60)
+        for i in range(7):
+            await processor.add(i)
+        assert processor.batches == [[0, 1, 2], [3, 4, 5]]
+
+        await processor.stop()
+        assert processor.batches[-1] == [6]
+
+    async def test_periodic_flush(self):
+        processor = Recorder(batch_size=100, flush_interval=0.01)
+        await processor.add("a")
+        await asyncio.sleep(0.05)
+        assert processor.batches == [["a"]]
+        await processor.stop()
+
+    async def test_wait_returns_the_items_result(self):
+        processor = Recorder(batch_size=2, flush_interval=60)
+        first = asyncio.create_task(processor.add("a", wait=True))
+        await asyncio.sleep(0)
+        assert await processor.add("b", wait=True) == "id-b"
+        assert await first == "id-a"
+        await processor.stop()
+
+    async def test_retries_with_backoff(self):
+        processor = Recorder(failures=2, batch_size=2, flush_interval=60, max_retries=3)
+        await processor.add(1)
+        await processor.add(2)
+        assert processor.batches == [[1, 2]]
+        await processor.stop()
+
+    async def test_failing_items_are_requeued_then_dropped(self):
+        processor = Recorder(failures=100, batch_size=10, flush_interval=60, max_retries=1, max_attempts=2)
+        waiter = asyncio.create_task(processor.add("x", wait=True))
+        await asyncio.sleep(0)
+
+        await processor.flush()
+        assert len(processor._buffer) == 1 and not waiter.done()
+
+        await processor.flush()
+        assert processor.dropped == 1
+        with pytest.raises(ConnectionError):
+            await waiter
+        await processor.stop()
+
+    async def test_buffer_is_bounded(self):
+        processor = Recorder(failures=100, batch_size=1000, flush_interval=60, max_buffer=5, max_retries=0)
+        for i in range(8):
+            await processor.add(i)
+        assert [entry[0] for entry in processor._buffer] == [3, 4, 5, 6, 7]
+        assert processor.dropped == 3
+        processor._flush_task.cancel()
+
+
+@pytest.mark.unit
+class TestBulkInsertWriter:
+    """Test suite for BulkInsertWriter."""
+
+    async def test_one_insert_per_batch(self):
+        log = []
+        writer = BulkInsertWriter(events, session_factory=lambda: FakeSession(log), batch_size=50, flush_interval=60)
+        for i in range(120):
+            await writer.add({"name": f"e{i}", "value": float(i)})
+        await writer.stop()
+
+        assert [len(rows) for _, rows in log] == [50, 50, 20]
+        assert log[0][0].startswith("INSERT INTO events")
+        assert writer.rows_written == 120
+
+    async def test_after_insert_runs_in_the_batch_transaction(self):
+        log = []
+
+        async def count(session, batch):
+            await session.execute("UPDATE counters", [len(batch)])
+
+        writer = BulkInsertWriter(events, session_factory=lambda: FakeSession(log), after_insert=count,
+                                  batch_size=3, flush_interval=60)
+        for i in range(4):
+            await writer.add({"name": f"e{i}", "value": float(i)})
+        await writer.stop()
+
+        assert [statement.split()[0] for statement, _ in log] == ["INSERT", "UPDATE", "INSERT", "UPDATE"]
+        assert [rows for statement, rows in log if statement == "UPDATE counters"] == [[3], [1]]
+
+    async def test_copy_fills_python_defaults(self):
+        sessions = []
+
+        def factory():
+            sessions.append(FakeSession([]))
+            return sessions[-1]
+
+        writer = BulkInsertWriter(events, session_factory=factory, copy=True, batch_size=2, flush_interval=60)
+        await writer.add({"name": "a", "level": Level.HIGH, "value": 1.5, "payload": {"k": 1}})
+        await writer.add({"name": "b", "level": Level.LOW, "value": 2.5, "payload": None})
+
+        table, columns, records = sessions[0].raw.driver_connection.copies[0]
+        assert table == "events"
+        assert columns == ["name", "level", "value", "payload", "status", "created_at"]
+        assert records[0][0] == "a" and records[0][1] == "HIGH"
+        assert records[0][3] == '{"k": 1}'
+        assert records[1][4:] == ("new", datetime(2024, 1, 2))
+        await writer.stop()
+
+
+@pytest.mark.unit
+class TestQueryInstrumentation:
+    """Test suite for DatabaseOptimizer.instrument and SQL fingerprints."""
+
+    @pytest.fixture
+    def engine(self):
+        engine = create_engine("sqlite://")
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT)"))
+        return engine
+
+    def test_fingerprint(self):
+        assert fingerprint(
+            "SELECT * FROM users  -- lookup\n WHERE id = $1 AND email IN ('a', 'it''s') LIMIT 10"
+        ) == "SELECT * FROM users WHERE id = ? AND email IN (...) LIMIT ?"
+        assert fingerprint(
+            "INSERT INTO t1 (a, b) VALUES ($1::INTEGER, $2::VARCHAR), ($3::INTEGER, $4::VARCHAR)"
+        ) == "INSERT INTO t1 (a, b) VALUES (...)"
+        assert fingerprint("SELECT x::text FROM t WHERE a = :a") == "SELECT x::text FROM t WHERE a = ?"
+        assert query_type("  WITH q AS (SELECT 1) SELECT * FROM q") == "select"
+        assert query_type("VACUUM ANALYZE users") == "other"
+
+    def test_records_per_fingerprint(self, engine):
+        optimizer = DatabaseOptimizer()
+        optimizer.instrument(engine)
+        optimizer.instrument(engine)
+
+        with engine.begin() as conn:
+            for i in range(3):
+                conn.execute(text("INSERT INTO users (id, email) VALUES (:id, :email)"), {"id": i, "email": f"u{i}"})
+            conn.execute(text("SELECT * FROM users WHERE id = 1"))
+            conn.execute(text("SELECT * FROM users WHERE id = 2"))
+            conn.execute(text("UPDATE users SET email = 'x'"))
+
+        report = optimizer.query_report(sort="count")
+        stats = {q["query"]: q for q in report["queries"]}
+        assert stats["INSERT INTO users (id, email) VALUES (...)"]["count"] == 3
+        assert stats["SELECT * FROM users WHERE id = ?"]["count"] == 2
+        assert stats["UPDATE users SET email = ?"]["rows"] == 3
+        assert report["pool_checkout"]["count"] >= 1
+
+    def test_failed_statements_do_not_leak_timers(self, engine):
+        optimizer = DatabaseOptimizer()
+        optimizer.instrument(engine)
+        with engine.connect() as conn:
+            with pytest.raises(Exception):
+                conn.execute(text("SELECT * FROM missing"))
+            conn.execute(text("SELECT 1"))
+            assert conn.info["query_started"] == []
+
+    def test_fingerprints_are_bounded(self, engine):
+        optimizer = DatabaseOptimizer(max_fingerprints=2)
+        optimizer.instrument(engine)
+        with engine.connect() as conn:
+            for column in ("id", "email", "id, email", "*"):
+                conn.execute(text(f"SELECT {column} FROM users"))
+        report = optimizer.query_report()
+        assert report["fingerprints"] == 3
+        assert {q["query"]: q["count"] for q in report["queries"]}["<other>"] == 2
+
+    async def test_slow_selects_are_explained_once(self, engine, monkeypatch):
+        monkeypatch.setattr(settings, "DB_SLOW_QUERY_SECONDS", 0.0)
+        optimizer = DatabaseOptimizer()
+        explained = []
+
+        async def explain(sync_engine, key, statement, parameters):
+            explained.append(key)
+            optimizer._query_stats[key]["plan"] = {"captured_at": time.time(), "plan": []}
+            optimizer._explaining.discard(key)
+
+        optimizer._explain = explain
+        optimizer.instrument(engine)
+        with engine.connect() as conn:
+            for i in range(3):
+                conn.execute(text(f"SELECT * FROM users WHERE id = {i}"))
+            conn.execute(text("DELETE FROM users"))
+        await asyncio.sleep(0)
+
+        assert explained == ["SELECT * FROM users WHERE id = ?"]
+        assert optimizer.get_slow_queries(threshold=-1)[0]["plan"]["plan"] == []
+
+    async def test_sync_engines_are_explained_in_a_thread(self, engine, monkeypatch):
+        optimizer = DatabaseOptimizer()
+        optimizer.instrument(engine)
+        with engine.connect() as conn:
+            conn.execute(text("SELECT * FROM users WHERE id = 1"))
+        threads = []
+
+        def explain_blocking(sync_engine, statement, parameters):
+            threads.append(threading.get_ident())
+            return [{"Plan": {"Node Type": "Seq Scan"}}]
+
+        monkeypatch.setattr(optimizer, "_explain_blocking", explain_blocking)
+        key = "SELECT * FROM users WHERE id = ?"
+        await optimizer._explain(engine, key, "SELECT * FROM users WHERE id = 1", ())
+
+        assert threads and threads[0] != threading.get_ident()
+        assert optimizer._query_stats[key]["plan"]["plan"][0]["Plan"]["Node Type"] == "Seq Scan"
+
+
+@pytest.mark.unit
+class TestConnectionPoolMonitor:
+    """Test suite for ConnectionPoolMonitor."""
+
+    async def test_reports_every_pool(self, tmp_path):
+        from sqlalchemy.pool import NullPool, QueuePool
+
+        from app.core.metrics import db_connections_active
+
+        primary = create_engine(f"sqlite:///{tmp_path}/a.db", poolclass=QueuePool, pool_size=2, max_overflow=0)
+        replica = create_engine(f"sqlite:///{tmp_path}/b.db", poolclass=QueuePool, pool_size=4)
+        unpooled = create_engine(f"sqlite:///{tmp_path}/c.db", poolclass=NullPool)
+        monitor = ConnectionPoolMonitor({"primary": primary, "replica": replica, "unpooled": unpooled})
+
+        held = [primary.connect(), primary.connect(), replica.connect()]
+        report = await monitor._check_pool_health()
+
+        assert set(report) == {"primary", "replica"}
+        assert report["primary"]["checked_out"] == 2 and report["primary"]["size"] == 2
+        assert report["replica"]["checked_out"] == 1
+        assert db_connections_active.labels(pool="primary")._value.get() == 2
+        for conn in held:
+            conn.close()
+
+    def test_wraps_a_single_engine(self):
+        engine = create_engine("sqlite://")
+        assert ConnectionPoolMonitor(engine).engines == {"primary": engine}
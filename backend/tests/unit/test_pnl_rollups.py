@@ -0,0 +1,130 @@
+"""
+Unit Tests for the PnL rollups
+Testing incremental upserts, server-side reconciliation and report reads
+"""
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.services.pnl_rollups import PnlRollups, day_of, week_of
+
+
+def trade(profit: float, close_time: datetime, user="u1", symbol="XAUUSD", commission=0.0):
+    return SimpleNamespace(user_id=user, symbol=symbol, profit=profit, commission=commission,
+                           swap=0.0, close_time=close_time)
+
+
+def sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def one_or_none(self):
+        return self.rows[0] if self.rows else None
+
+    def all(self):
+        return self.rows
+
+
+class FakeDatabase:
+    def __init__(self, results=()):
+        self.results = list(results)
+        self.transactions = 0
+        self.statements = []
+
+    @asynccontextmanager
+    async def session_scope(self, read_only=False):
+        self.transactions += 1
+        yield self
+
+    async def execute(self, statement, params=None):
+        self.statements.append((sql(statement), params))
+        return FakeResult(self.results.pop(0) if self.results else [])
+
+
+@pytest.mark.unit
+class TestPnlRollups:
+    """Test suite for PnlRollups."""
+
+    def test_days_and_weeks(self):
+        assert day_of(datetime(2024, 1, 16, 23, 30)) == date(2024, 1, 16)
+        # 01:30 in UTC+3 is still the previous day in UTC
+        assert day_of(datetime(2024, 1, 17, 1, 30, tzinfo=timezone(timedelta(hours=3)))) == date(2024, 1, 16)
+        assert week_of(date(2024, 1, 21)) == date(2024, 1, 15)
+        assert week_of(date(2024, 1, 15)) == date(2024, 1, 15)
+
+    async def test_record_adds_onto_both_rollups_in_one_transaction(self):
+        database = FakeDatabase()
+        rollups = PnlRollups(database.session_scope)
+        monday = datetime(2024, 1, 15, 10)
+
+        touched = await rollups.record_many([
+            trade(100.0, monday),
+            trade(-30.0, monday + timedelta(hours=2), commission=5.0),
+            trade(40.0, monday + timedelta(days=1), symbol="EURUSD"),
+        ])
+        assert touched == 3   # two daily rows, one weekly row
+        assert database.transactions == 1
+
+        (daily_sql, daily), (weekly_sql, weekly) = database.statements
+        assert "ON CONFLICT (user_id, day, symbol) DO UPDATE" in daily_sql
+        assert "trades = (pnl_daily.trades + excluded.trades)" in daily_sql
+        assert "greatest(pnl_daily.best_trade, excluded.best_trade)" in daily_sql
+        assert "ON CONFLICT (user_id, week) DO UPDATE" in weekly_sql
+
+        gold = next(row for row in daily if row["symbol"] == "XAUUSD")
+        assert gold["day"] == date(2024, 1, 15)
+        assert (gold["trades"], gold["wins"], gold["losses"]) == (2, 1, 1)
+        assert gold["net_pnl"] == 65.0 and gold["gross_loss"] == 35.0
+        assert (gold["best_trade"], gold["worst_trade"]) == (100.0, -35.0)
+        (week,) = weekly
+        assert week["week"] == date(2024, 1, 15) and week["trades"] == 3 and week["net_pnl"] == 105.0
+
+        assert await rollups.record_many([]) == 0
+        assert database.transactions == 1
+
+    async def test_reconcile_rebuilds_whole_weeks_on_the_server(self):
+        database = FakeDatabase()
+        await PnlRollups(database.session_scope).reconcile(days=7)
+
+        assert database.transactions == 1
+        statements = [statement for statement, _ in database.statements]
+        assert statements[0].startswith("DELETE FROM pnl_daily WHERE pnl_daily.day >=")
+        assert statements[1].startswith("INSERT INTO pnl_daily (user_id, day, symbol, trades")
+        assert "FROM trades" in statements[1] and "GROUP BY trades.user_id" in statements[1]
+        assert statements[2].startswith("DELETE FROM pnl_weekly")
+        assert "date_trunc" in statements[3] and "FROM pnl_daily" in statements[3]
+
+    async def test_reports_read_rollup_rows(self):
+        row = SimpleNamespace(trades=4, wins=3, losses=1, gross_profit=90.0, gross_loss=10.0,
+                              net_pnl=80.0, best_trade=50.0, worst_trade=-10.0)
+        database = FakeDatabase(results=[[row]])
+        rollups = PnlRollups(database.session_scope)
+
+        report = await rollups.day("u1", date(2024, 1, 16))
+        assert report["net_pnl"] == 80.0 and report["win_rate"] == 75.0 and report["date"] == "2024-01-16"
+        statement, _ = database.statements[0]
+        assert "FROM pnl_daily" in statement and "trades" not in statement.split("FROM")[1].split("WHERE")[0]
+
+        # no rows: an empty report rather than None
+        empty = await rollups.period("u1", date(2024, 1, 1), date(2024, 2, 1))
+        assert empty["trades"] == 0 and empty["win_rate"] == 0.0
+
+    async def test_week_report_names_best_and_worst_day(self):
+        week_row = SimpleNamespace(trades=5, wins=3, losses=2, gross_profit=300.0, gross_loss=120.0,
+                                   net_pnl=180.0, best_trade=150.0, worst_trade=-80.0)
+        days = [SimpleNamespace(day=date(2024, 1, 15), net_pnl=200.0),
+                SimpleNamespace(day=date(2024, 1, 16), net_pnl=-20.0)]
+        database = FakeDatabase(results=[[week_row], days])
+
+        report = await PnlRollups(database.session_scope).week("u1", date(2024, 1, 15))
+        assert report["trades"] == 5 and report["week"] == "2024-01-15"
+        assert report["best_day"] == {"day": "2024-01-15", "net_pnl": 200.0}
+        assert report["worst_day"] == {"day": "2024-01-16", "net_pnl": -20.0}
+        assert "FROM pnl_weekly" in database.statements[0][0]
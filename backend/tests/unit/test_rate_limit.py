@@ -0,0 +1,290 @@
+"""
+Unit Tests for the rate limiter
+Testing GCRA decisions, the Redis script path, the local fallback and the middleware
+"""
+import asyncio
+import random
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.middleware import rate_limit
+from app.middleware.rate_limit import RateLimiter, RateLimitMiddleware, gcra, gcra_lease
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeScript:
+    """Runs gcra() against a dict, the way GCRA_SCRIPT runs against Redis."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.tats = {}
+        self.calls = 0
+
+    async def __call__(self, keys, args):
+        self.calls += 1
+        interval, period, cost = args
+        allowed, new_tat, remaining, retry_after, reset_after = gcra(
+            self.tats.get(keys[0]), self.clock() * 1000, interval, period, cost
+        )
+        if allowed:
+            self.tats[keys[0]] = new_tat
+        return [int(allowed), remaining, retry_after, reset_after]
+
+
+class FakeLeaseRedis:
+    """Shared Redis stand-in for LEASE_SCRIPT; every call yields to other workers."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.tats = {}
+        self.calls = 0
+
+    async def __call__(self, keys, args):
+        self.calls += 1
+        await asyncio.sleep(0)
+        granted, new_tat, reset_after = gcra_lease(self.tats.get(keys[0]), self.clock() * 1000, *args)
+        self.tats[keys[0]] = new_tat
+        return [granted, reset_after]
+
+
+def worker(clock, redis, lease_ttl=1.0):
+    limiter = RateLimiter(clock=clock, lease_ttl=lease_ttl)
+    limiter._lease = redis
+    return limiter
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.mark.unit
+class TestGCRA:
+    """Test suite for the GCRA decision."""
+
+    def test_burst_then_one_per_interval(self):
+        tat, decisions = None, []
+        for _ in range(6):
+            allowed, new_tat, remaining, retry_after, _ = gcra(tat, 0, 60_000, 300_000)
+            decisions.append((allowed, remaining, retry_after))
+            tat = new_tat if allowed else tat
+
+        assert [d[0] for d in decisions] == [True] * 5 + [False]
+        assert [d[1] for d in decisions[:5]] == [4, 3, 2, 1, 0]
+        assert decisions[5][2] == 60_000
+
+        # one interval later exactly one more request fits
+        assert gcra(tat, 60_000, 60_000, 300_000)[0]
+        assert not gcra(gcra(tat, 60_000, 60_000, 300_000)[1], 60_000, 60_000, 300_000)[0]
+
+    def test_idle_key_starts_full(self):
+        allowed, _, remaining, _, reset_after = gcra(1_000, 10_000_000, 60, 60_000)
+        assert allowed and remaining == 999 and reset_after == 60
+
+
+@pytest.mark.unit
+class TestRateLimiter:
+    """Test suite for RateLimiter."""
+
+    async def test_local_fallback(self, clock):
+        limiter = RateLimiter(clock=clock)
+        results = [await limiter.is_allowed("1.2.3.4", "auth_login", 5, 300) for _ in range(6)]
+
+        assert [allowed for allowed, _ in results] == [True] * 5 + [False]
+        assert results[0][1]["X-RateLimit-Remaining"] == "4"
+        assert results[5][1]["Retry-After"] == "60"
+        # other clients and routes are independent
+        assert (await limiter.is_allowed("5.6.7.8", "auth_login", 5, 300))[0]
+        assert (await limiter.is_allowed("1.2.3.4", "ai_predict", 100, 60))[0]
+
+        clock.now += 60
+        assert (await limiter.is_allowed("1.2.3.4", "auth_login", 5, 300))[0]
+
+    async def test_local_fallback_is_bounded(self, clock):
+        limiter = RateLimiter(max_local_keys=50, clock=clock)
+        for i in range(1000):
+            await limiter.is_allowed(f"10.0.{i // 256}.{i % 256}", "market_data", 1000, 60)
+        assert len(limiter._local) <= 50
+
+    async def test_redis_script_path(self, clock):
+        limiter = RateLimiter(clock=clock)
+        limiter._gcra = script = FakeScript(clock)
+
+        results = [(await limiter.is_allowed("1.2.3.4", "ai_predict", 3, 60))[0] for _ in range(4)]
+
+        assert results == [True, True, True, False]
+        assert script.calls == 4
+        assert list(script.tats) == ["rate_limit:ai_predict:1.2.3.4"]
+        assert len(limiter._local) == 0
+
+    async def test_redis_errors_enforce_locally(self, clock):
+        limiter = RateLimiter(clock=clock)
+
+        async def broken(keys, args):
+            raise ConnectionError("redis down")
+
+        limiter._gcra = broken
+        results = [(await limiter.is_allowed("1.2.3.4", "auth_login", 2, 60))[0] for _ in range(3)]
+        assert results == [True, True, False]
+
+
+@pytest.mark.unit
+class TestRateLimitMiddleware:
+    """Test suite for RateLimitMiddleware."""
+
+    @pytest.fixture
+    def middleware(self, clock):
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+            await send({"type": "http.response.body", "body": b"ok"})
+
+        async def connect():
+            pass
+
+        limiter = RateLimiter(clock=clock)
+        limiter.connect = connect
+        limits = {
+            "auth_login": {"requests": 2, "window": 60, "path": "/auth/login"},
+            "place_trade": {"requests": 1, "window": 60, "path": "/trading/execute", "method": "POST"},
+            "market_data": {"requests": 1000, "window": 60},
+        }
+        return RateLimitMiddleware(app, limits=limits, limiter=limiter)
+
+    @staticmethod
+    async def call(middleware, path, method="POST"):
+        scope = {
+            "type": "http", "method": method, "path": path, "query_string": b"",
+            "headers": [(b"x-real-ip", b"1.2.3.4")], "client": ("127.0.0.1", 5000),
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            messages.append(message)
+
+        await middleware(scope, receive, send)
+        start = messages[0]
+        return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}
+
+    async def test_limits_matching_routes(self, middleware):
+        responses = [await self.call(middleware, "/api/v1/auth/login") for _ in range(3)]
+
+        assert [status for status, _ in responses] == [200, 200, 429]
+        assert responses[0][1]["x-ratelimit-remaining"] == "1"
+        assert responses[0][1]["content-type"] == "text/plain"
+        assert responses[2][1]["retry-after"] == "30"
+
+    async def test_method_and_unmatched_routes(self, middleware):
+        for _ in range(3):
+            status, headers = await self.call(middleware, "/api/v1/trading/execute", method="GET")
+            assert status == 200 and "x-ratelimit-limit" not in headers
+        assert (await self.call(middleware, "/api/v1/trading/execute"))[0] == 200
+        assert (await self.call(middleware, "/api/v1/trading/execute"))[0] == 429
+
+
+@pytest.mark.unit
+class TestHybridRateLimiter:
+    """Test suite for leased (hybrid) limits."""
+
+    def test_lease_math(self):
+        assert gcra_lease(None, 0, 60, 60_000, 50)[0] == 50
+        granted, tat, _ = gcra_lease(59_000, 0, 60, 60_000, 50)
+        assert granted == 16 and tat == 59_000 + 16 * 60
+        # returned tokens make room again
+        assert gcra_lease(tat, 0, 60, 60_000, 50, returned=20)[0] == 20
+
+    async def test_most_checks_stay_in_memory(self, clock):
+        redis = FakeLeaseRedis(clock)
+        limiter = worker(clock, redis)
+        results = [
+            (await limiter.is_allowed("1.2.3.4", "market_data", 1000, 60, mode="hybrid", lease=50))[0]
+            for _ in range(200)
+        ]
+        assert all(results)
+        assert redis.calls == 4
+
+    async def test_global_limit_across_concurrent_workers(self, clock):
+        redis = FakeLeaseRedis(clock)
+        workers = [worker(clock, redis) for _ in range(8)]
+        rng = random.Random(7)
+
+        async def request():
+            allowed, _ = await rng.choice(workers).is_allowed(
+                "1.2.3.4", "market_data", 1000, 60, mode="hybrid", lease=50
+            )
+            return allowed
+
+        allowed = sum(await asyncio.gather(*(request() for _ in range(3000))))
+        assert 1000 - 8 * 50 <= allowed <= 1000
+        assert redis.calls < 3000 / 10
+
+        # leases expire, unspent tokens go back and whoever is busy can use them
+        clock.now += 1.5
+        for limiter in workers[1:]:
+            await limiter.reconcile()
+        allowed_after = sum([
+            (await workers[0].is_allowed("1.2.3.4", "market_data", 1000, 60, mode="hybrid", lease=50))[0]
+            for _ in range(1000)
+        ])
+        assert allowed + allowed_after <= 1000 + 1.5 * 1000 / 60 + 1
+        assert allowed + allowed_after >= 1000
+
+    async def test_denials_are_served_from_memory(self, clock):
+        redis = FakeLeaseRedis(clock)
+        limiter = worker(clock, redis, lease_ttl=10)
+        results = [
+            (await limiter.is_allowed("1.2.3.4", "ai_predict", 10, 60, mode="hybrid", lease=5))
+            for _ in range(50)
+        ]
+        assert sum(allowed for allowed, _ in results) == 10
+        assert redis.calls == 3
+        assert results[-1][1]["Retry-After"] == "6"
+
+        clock.now += 6
+        assert (await limiter.is_allowed("1.2.3.4", "ai_predict", 10, 60, mode="hybrid", lease=5))[0]
+
+    async def test_lease_errors_enforce_locally(self, clock):
+        async def broken(keys, args):
+            raise ConnectionError("redis down")
+
+        limiter = worker(clock, broken)
+        results = [
+            (await limiter.is_allowed("1.2.3.4", "ai_predict", 3, 60, mode="hybrid"))[0]
+            for _ in range(4)
+        ]
+        assert results == [True, True, True, False]
+
+    async def test_named_limit_takes_the_lease_path(self, clock, monkeypatch):
+        monkeypatch.setitem(rate_limit.RATE_LIMITS, "market_data",
+                            {"requests": 100, "window": 60, "mode": "hybrid", "lease": 25})
+        redis = FakeLeaseRedis(clock)
+        limiter = worker(clock, redis, lease_ttl=10)
+
+        async def connect():
+            pass
+
+        limiter.connect = connect
+
+        @limiter.limit("market_data")
+        async def analyze(request):
+            return "ok"
+
+        request = SimpleNamespace(headers={"X-Real-IP": "1.2.3.4"}, client=None)
+        assert [await analyze(request) for _ in range(100)] == ["ok"] * 100
+        with pytest.raises(HTTPException) as denied:
+            await analyze(request)
+        assert denied.value.status_code == 429
+        # 100 requests on 25-token leases, not one Redis call each
+        assert redis.calls <= 6
+        assert list(redis.tats) == ["rate_limit:market_data:1.2.3.4"]
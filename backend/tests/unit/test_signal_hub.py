@@ -0,0 +1,337 @@
+"""
+Unit Tests for the signal hub
+Testing the stored subscription registry, one analysis per bar, batched
+fan-out and delivery across workers
+"""
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.mt5.stream import StreamConsumers
+from app.models.signal_subscription import SignalSubscription
+from app.services.signal_hub import IN_APP, OWNER_KEY, TELEGRAM, WEBSOCKET, SignalHub
+
+
+def analysis(action: str, symbol="XAUUSD"):
+    return {"symbol": symbol, "timestamp": "2026-02-18T10:15:00",
+            "signal": {"action": action, "confidence": 70, "reasons": ["Bullish trend"]}}
+
+
+def candle(i: int, symbol="XAUUSD", timeframe="M15"):
+    return {"symbol": symbol, "timeframe": timeframe, "timestamp": f"2026-02-18T{i:02d}:00:00",
+            "open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0, "closed": True}
+
+
+class FakeSocket:
+    def __init__(self, fail=False, stall=False):
+        self.sent = []
+        self.fail = fail
+        self.stall = stall
+
+    async def send_text(self, text):
+        if self.fail:
+            raise ConnectionError("socket closed")
+        if self.stall:
+            await asyncio.sleep(60)
+        self.sent.append(text)
+
+
+class FakeStream:
+    def __init__(self):
+        self.topics = []
+        self.running = False
+
+    def subscribe(self, symbol, timeframes=None, ticks=True):
+        self.topics.append((symbol, tuple(timeframes), ticks))
+
+    async def start(self):
+        self.running = True
+
+    async def stop(self):
+        self.running = False
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeDatabase:
+    """signal_subscriptions rows, plus the chat ids any Telegram lookup returns."""
+
+    def __init__(self, chat_ids=()):
+        self.chat_ids = list(chat_ids)
+        self.rows = {}
+        self.queries = 0
+
+    @asynccontextmanager
+    async def session_scope(self, read_only=False):
+        yield self
+
+    async def execute(self, statement):
+        params = statement.compile().params
+        if statement.is_insert:
+            key = (params["user_id"], params["symbol"], params["timeframe"])
+            self.rows[key] = SignalSubscription(
+                user_id=key[0], symbol=key[1], timeframe=key[2], channels=params["channels"])
+            return FakeResult([])
+        if statement.is_delete:
+            removed = [
+                key for key in self.rows
+                if key[0] == params["user_id_1"]
+                and params.get("symbol_1", key[1]) == key[1]
+                and params.get("timeframe_1", key[2]) == key[2]
+            ]
+            for key in removed:
+                del self.rows[key]
+            return FakeResult([key[1:] for key in removed])
+        if statement.get_final_froms()[0].name == "signal_subscriptions":
+            return FakeResult(list(self.rows.values()))
+        self.queries += 1
+        return FakeResult(self.chat_ids)
+
+
+class FakePubSub:
+    """FakeCache.publish() hands messages to the hubs directly; this only idles."""
+
+    async def subscribe(self, channel):
+        pass
+
+    async def listen(self):
+        await asyncio.Event().wait()
+        yield
+
+    async def aclose(self):
+        pass
+
+
+class FakeCache:
+    """Shared Redis of several workers: keys for the lease, pub/sub to every started hub."""
+
+    def __init__(self, connected=False):
+        self.connected = connected
+        self.redis_client = self
+        self.store = {}
+        self.hubs = []
+
+    async def get(self, key, default=None):
+        return self.store.get(key, default)
+
+    async def set(self, key, value, ttl=None, nx=False):
+        if nx and key in self.store:
+            return False
+        self.store[key] = value
+        return True
+
+    async def delete(self, key):
+        self.store.pop(key, None)
+        return True
+
+    def pubsub(self):
+        return FakePubSub()
+
+    async def publish(self, channel, data):
+        for worker in self.hubs:
+            await worker._handle(data)
+        return len(self.hubs)
+
+
+def hub(database=None, cache=None, **options):
+    worker = SignalHub((database or FakeDatabase()).session_scope, cache=cache or FakeCache(),
+                       telegram=AsyncMock(), notifications=AsyncMock(), **options)
+    worker.cache.hubs.append(worker)
+    return worker
+
+
+@pytest.mark.unit
+class TestSignalHub:
+    """Test suite for SignalHub."""
+
+    async def test_registry_maps_pairs_to_users(self):
+        signals, stream = hub(), FakeStream()
+        signals.attach(stream)
+        await signals.subscribe("u1", "XAUUSD", "M15")
+        await signals.subscribe("u2", "XAUUSD", "M15", [WEBSOCKET])
+        await signals.subscribe("u1", "EURUSD", "H1")
+
+        # one candle topic per pair, however many users share it
+        assert stream.topics == [("XAUUSD", ("M15",), False), ("EURUSD", ("H1",), False)]
+        assert signals.subscribers("XAUUSD", "M15") == ["u1", "u2"]
+        assert signals.subscribers("XAUUSD", "M15", TELEGRAM) == ["u1"]
+        with pytest.raises(ValueError):
+            await signals.subscribe("u1", "XAUUSD", "M15", ["sms"])
+
+        assert await signals.unsubscribe("u1") == 2
+        assert not signals.wants("EURUSD", "H1")
+        assert signals.wants("XAUUSD", "M15")
+
+    async def test_registry_survives_a_restart(self):
+        database = FakeDatabase()
+        before = hub(database)
+        await before.subscribe("u1", "XAUUSD", "M15", [TELEGRAM])
+        await before.subscribe("u2", "XAUUSD", "M15")
+        await before.unsubscribe("u2", "XAUUSD", "M15")
+
+        after = hub(database)
+        assert await after.load() == 1
+        assert after.subscribers("XAUUSD", "M15") == ["u1"]
+        assert after.subscribers("XAUUSD", "M15", WEBSOCKET) == []
+
+    async def test_one_analysis_per_bar_whatever_the_users(self):
+        signals, engine = hub(), AsyncMock()
+        engine.analyze_market.return_value = analysis("NEUTRAL")
+        consumers = StreamConsumers(trading_engine=engine, min_bars=1)
+        signals.attach(consumers=consumers)
+
+        await consumers.on_candle(candle(1))
+        assert engine.analyze_market.await_count == 0   # nobody subscribed
+
+        for user in range(500):
+            await signals.subscribe(user, "XAUUSD", "M15")
+        await consumers.on_candle(candle(2))
+        await consumers.on_candle(candle(2, symbol="EURUSD"))
+        assert engine.analyze_market.await_count == 1
+        assert signals.published == 1
+        assert signals.latest("XAUUSD", "M15")["signal"]["action"] == "NEUTRAL"
+
+    async def test_websockets_get_one_payload_in_batches(self):
+        signals = hub(batch_size=2)
+        sockets = [FakeSocket() for _ in range(4)]
+        dead = FakeSocket(fail=True)
+        for i, socket in enumerate(sockets):
+            await signals.subscribe(f"u{i}", "XAUUSD", "M15", [WEBSOCKET])
+            signals.connect(f"u{i}", socket)
+        signals.connect("u0", dead)
+        signals.connect("stranger", FakeSocket())
+
+        assert await signals.deliver("XAUUSD", "M15", analysis("NEUTRAL")) == 4
+        payloads = {socket.sent[0] for socket in sockets}
+        assert len(payloads) == 1 and '"action": "NEUTRAL"' in payloads.pop()
+        # a failed send drops the socket, the user's other socket stays
+        assert signals.sockets["u0"] == {sockets[0]}
+
+    async def test_a_stalled_socket_times_out_and_is_dropped(self):
+        signals = hub(send_timeout=0.01)
+        fast, stalled = FakeSocket(), FakeSocket(stall=True)
+        await signals.subscribe("u1", "XAUUSD", "M15", [WEBSOCKET])
+        await signals.subscribe("u2", "XAUUSD", "M15", [WEBSOCKET])
+        signals.connect("u1", fast)
+        signals.connect("u2", stalled)
+
+        assert await asyncio.wait_for(signals.deliver("XAUUSD", "M15", analysis("NEUTRAL")), 1) == 1
+        assert len(fast.sent) == 1 and "u2" not in signals.sockets
+
+    async def test_latest_for_the_current_bar_only(self):
+        now = datetime(2026, 2, 18, 10, 20, tzinfo=timezone.utc).timestamp()
+        signals = hub(clock=lambda: now)
+        await signals.publish("XAUUSD", "M15", analysis("NEUTRAL"))   # made at 10:15, bar 10:15-10:30
+        await signals.publish("XAUUSD", "H4", analysis("NEUTRAL"))    # bar 08:00-12:00
+        await signals.publish("XAUUSD", "M5", analysis("NEUTRAL"))    # bar 10:20-10:25
+
+        assert signals.latest("XAUUSD", "M15", current_bar=True)["signal"]["action"] == "NEUTRAL"
+        assert signals.latest("XAUUSD", "H4", current_bar=True) is not None
+        assert signals.latest("XAUUSD", "M5", current_bar=True) is None
+        assert signals.latest("XAUUSD", "M5") is not None
+        assert signals.latest("EURUSD", "M15", current_bar=True) is None
+
+    async def test_alerts_go_out_when_the_action_turns(self):
+        database = FakeDatabase([1001, 1002])
+        signals = hub(database)
+        await signals.subscribe("u1", "XAUUSD", "M15")
+        await signals.subscribe("u2", "XAUUSD", "M15", [TELEGRAM])
+        await signals.subscribe("u3", "XAUUSD", "M15", [IN_APP, WEBSOCKET])
+
+        for action in ("NEUTRAL", "BUY", "BUY", "SELL"):
+            await signals.publish("XAUUSD", "M15", analysis(action))
+        await signals.stop()
+
+        telegram = signals.telegram.send_signal_alert
+        assert telegram.await_count == 2
+        chat_ids, symbol, timeframe, signal = telegram.await_args_list[0].args
+        assert chat_ids == [1001, 1002] and signal["action"] == "BUY"
+        assert database.queries == 2   # one chat-id lookup per alert, not per user
+
+        rows = [call.args[0] for call in signals.notifications.add.await_args_list]
+        assert [row["user_id"] for row in rows] == ["u1", "u3", "u1", "u3"]
+        assert rows[0]["title"] == "BUY XAUUSD M15" and rows[0]["read"] is False
+
+    async def test_a_failing_channel_does_not_hold_back_the_others(self):
+        signals = hub(FakeDatabase([1001]))
+        await signals.subscribe("u1", "XAUUSD", "M15")
+        signals.notifications.add.side_effect = ConnectionError("database unavailable")
+
+        await signals.publish("XAUUSD", "M15", analysis("BUY"))
+        await signals.stop()
+        assert signals.telegram.send_signal_alert.await_count == 1
+        assert not signals._pending
+
+
+@pytest.mark.unit
+class TestSignalHubWorkers:
+    """Test suite for SignalHub across several API workers."""
+
+    async def test_one_owner_analyses_and_every_worker_delivers(self):
+        database, redis = FakeDatabase([1001]), FakeCache(connected=True)
+        owner, other = hub(database, redis), hub(database, redis)
+        pipelines = []
+
+        def pipeline():
+            pipelines.append((FakeStream(), StreamConsumers(trading_engine=AsyncMock(), min_bars=1)))
+            return pipelines[-1]
+
+        for worker in (owner, other):
+            await worker.start(pipeline)
+            await worker.check_ownership()
+        assert owner.is_owner and not other.is_owner and len(pipelines) == 1
+        stream, consumers = pipelines[0]
+
+        # subscribed and connected on the worker that does not analyse
+        user, socket = uuid.uuid4(), FakeSocket()
+        await other.subscribe(user, "XAUUSD", "M15")
+        other.connect(user, socket)
+        assert consumers.analyze_filter("XAUUSD", "M15")
+        assert stream.topics == [("XAUUSD", ("M15",), False)]
+
+        assert await consumers.on_analysis("XAUUSD", "M15", analysis("BUY")) == 2
+        assert '"action": "BUY"' in socket.sent[0]
+        assert other.latest("XAUUSD", "M15")["signal"]["action"] == "BUY"
+        await owner.stop()
+        await other.stop()
+        # alerts go out once, from the owner
+        assert owner.telegram.send_signal_alert.await_count == 1
+        assert other.telegram.send_signal_alert.await_count == 0
+
+    async def test_another_worker_takes_over_the_analysis(self):
+        database, redis = FakeDatabase(), FakeCache(connected=True)
+        first, second = hub(database, redis), hub(database, redis)
+        streams = []
+
+        def pipeline():
+            streams.append(FakeStream())
+            return streams[-1], StreamConsumers(trading_engine=AsyncMock(), min_bars=1)
+
+        await first.start(pipeline)
+        await second.start(pipeline)
+        await first.subscribe(uuid.uuid4(), "XAUUSD", "H1")
+        assert await first.check_ownership() and not await second.check_ownership()
+
+        # the last analysed action travels with the signal, so a new owner alerts on turns only
+        await first.publish("XAUUSD", "H1", analysis("BUY"))
+        await first.stop()
+        assert not streams[0].running and OWNER_KEY not in redis.store
+
+        assert await second.check_ownership()
+        assert streams[1].running and streams[1].topics == [("XAUUSD", ("H1",), False)]
+        await second.publish("XAUUSD", "H1", analysis("BUY"))
+        await second.stop()
+        assert second.telegram.send_signal_alert.await_count == 0
@@ -0,0 +1,303 @@
+"""
+Unit Tests for the trading stats engine
+Testing Welford updates, per-scope stats, snapshots and backfill
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.backtesting.metrics import max_drawdown
+from app.services.trading_stats import ALL, OWNER_KEY, RunningStats, TradingStats, Welford, key_of, scope_of
+
+T0 = datetime(2024, 1, 2, 8)
+
+
+def trade(i: int, profit: float, user="u1", strategy="smc", symbol="XAUUSD", **extra):
+    values = dict(id=f"00000000-0000-0000-0000-{i:012d}", user_id=user, strategy=strategy, symbol=symbol,
+                  profit=profit, commission=0.0, swap=0.0, close_time=T0 + timedelta(hours=i))
+    values.update(extra)
+    return SimpleNamespace(**values)
+
+
+class FakeStream:
+    def __init__(self, rows, size=2):
+        self.rows, self.size = rows, size
+
+    async def partitions(self):
+        for i in range(0, len(self.rows), self.size):
+            yield self.rows[i:i + self.size]
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+    def scalar_one_or_none(self):
+        return self.rows[0] if self.rows else None
+
+
+class FakeDatabase:
+    def __init__(self, trades=(), snapshots=()):
+        self.trades = list(trades)
+        self.snapshots = list(snapshots)
+        self.queries = []
+        self.writes = []
+        self.fail = False
+
+    @asynccontextmanager
+    async def session_scope(self, read_only=False):
+        yield self
+
+    async def stream(self, query):
+        self.queries.append(str(query))
+        since = query.compile().params.get("close_time_1")
+        return FakeStream([t for t in self.trades if since is None or t.close_time >= since])
+
+    async def execute(self, statement, params=None):
+        if params is not None:
+            if self.fail:
+                raise ConnectionError("database unavailable")
+            self.writes.append((str(statement), params))
+            return FakeResult([])
+        return FakeResult(self.snapshots)
+
+
+class FakeCache:
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    async def set(self, key, value, ttl=None, nx=False):
+        if nx and key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+    async def set_many(self, mapping, ttl=None, codec=None):
+        self.values.update(mapping)
+        return True
+
+
+def engine(database=None, cache=None, **options):
+    options.setdefault("window", 5)
+    options.setdefault("initial_balance", 1000.0)
+    return TradingStats((database or FakeDatabase()).session_scope, cache or FakeCache(), **options)
+
+
+@pytest.mark.unit
+class TestWelford:
+    """Test suite for Welford."""
+
+    def test_matches_numpy_over_the_window(self):
+        rng = np.random.default_rng(1)
+        values = rng.normal(0.001, 0.01, 500)
+        overall, window = Welford(), Welford(50)
+        for x in values:
+            overall.add(x)
+            window.add(x)
+
+        assert overall.mean == pytest.approx(values.mean())
+        assert overall.std == pytest.approx(values.std(ddof=1))
+        tail = values[-50:]
+        assert window.n == 50
+        assert window.mean == pytest.approx(tail.mean())
+        assert window.std == pytest.approx(tail.std(ddof=1))
+        assert window.downside == pytest.approx(np.sqrt((np.minimum(tail, 0) ** 2).mean()))
+
+    def test_round_trips_through_a_snapshot(self):
+        window = Welford(3)
+        for x in (1.0, -2.0, 3.0, 4.0):
+            window.add(x)
+        restored = Welford.from_dict(window.to_dict(), 3)
+        assert list(restored.values) == [-2.0, 3.0, 4.0]
+        assert restored.mean == pytest.approx(window.mean) and restored.m2 == pytest.approx(window.m2)
+
+
+@pytest.mark.unit
+class TestRunningStats:
+    """Test suite for RunningStats."""
+
+    def test_figures_match_a_full_recomputation(self):
+        pnl = np.array([50.0, -20.0, -40.0, 80.0, -10.0, 30.0, -60.0])
+        stats = RunningStats(1000.0, window=4)
+        for i, value in enumerate(pnl):
+            stats.add(value, 86_400.0 * i)
+
+        equity = 1000.0 + np.cumsum(pnl)
+        returns = pnl / np.concatenate([[1000.0], equity[:-1]])
+        assert stats.trades == 7 and stats.wins == 3
+        assert stats.win_rate == pytest.approx(3 / 7)
+        assert stats.profit_factor == pytest.approx(160 / 130)
+        assert stats.net_pnl == pytest.approx(pnl.sum())
+        assert stats.max_drawdown == pytest.approx(max_drawdown(np.concatenate([[1000.0], equity])))
+        assert stats.expectancy == pytest.approx(returns.mean())
+        # 7 trades over 6 days
+        per_year = 7 / (6 * 86_400 / (365 * 86_400))
+        assert stats.sharpe_ratio == pytest.approx(returns.mean() / returns.std(ddof=1) * np.sqrt(per_year))
+        assert stats.recent.mean == pytest.approx(returns[-4:].mean())
+
+    def test_restored_stats_continue_identically(self):
+        straight, resumed = RunningStats(1000.0, 3), RunningStats(1000.0, 3)
+        for i, value in enumerate((10.0, -5.0, 7.0, -3.0)):
+            straight.add(value, i * 3600.0)
+            resumed.add(value, i * 3600.0)
+        resumed = RunningStats.from_dict(resumed.to_dict(), 3)
+        for stats in (straight, resumed):
+            stats.add(12.0, 5 * 3600.0)
+        assert resumed.summary() == pytest.approx(straight.summary())
+
+
+@pytest.mark.unit
+class TestTradingStats:
+    """Test suite for TradingStats."""
+
+    def test_a_trade_counts_towards_each_scope(self):
+        stats = engine()
+        stats.record(trade(1, 100.0))
+        stats.record(trade(2, -40.0, symbol="EURUSD", strategy=None))
+        stats.record(trade(3, 25.0, user="u2"))
+
+        assert stats.get()["trades"] == 3
+        assert stats.get("u1")["trades"] == 2
+        assert stats.get("u1", symbol="XAUUSD")["net_pnl"] == 100.0
+        assert stats.get("u1", strategy="smc")["trades"] == 1
+        assert stats.get("u1", "smc", "XAUUSD")["trades"] == 1
+        assert stats.get("u2", symbol="EURUSD") is None
+        # costs come off the realised profit
+        stats.record(trade(4, 10.0, user="u3", commission=3.0, swap=-1.0))
+        assert stats.get("u3")["net_pnl"] == pytest.approx(6.0)
+
+    def test_scope_names(self):
+        assert scope_of(ALL) == "*|*|*"
+        assert scope_of(("u1", None, "XAUUSD")) == "u1|*|XAUUSD"
+        assert key_of("u1|*|XAUUSD") == ("u1", None, "XAUUSD")
+
+    async def test_snapshot_writes_only_changed_scopes(self):
+        database, cache = FakeDatabase(trades=[trade(1, 100.0, strategy=None)]), FakeCache()
+        stats = engine(database, cache)
+        await stats.backfill()
+
+        assert await stats.snapshot() == 3
+        statement, rows = database.writes[0]
+        assert "ON CONFLICT (scope) DO UPDATE" in statement
+        assert {row["scope"] for row in rows} == {"*|*|*", "u1|*|*", "u1|*|XAUUSD"}
+        assert all(row["last_trade_id"] == trade(1, 0).id for row in rows)
+        assert set(cache.values) - {OWNER_KEY} == {"trading_stats:" + row["scope"] for row in rows}
+        assert await stats.snapshot() == 0
+
+        stats.record(trade(2, 5.0, user="u2", strategy=None))
+        database.fail = True
+        with pytest.raises(ConnectionError):
+            await stats.snapshot()
+        database.fail = False
+        # kept for the next attempt, together with anything newer
+        stats.record(trade(3, 5.0, strategy=None))
+        assert await stats.snapshot() == 5
+
+    async def test_restart_replays_only_newer_trades(self):
+        old = [trade(i, value) for i, value in enumerate((20.0, -10.0, 15.0))]
+        database = FakeDatabase(trades=old)
+        first = engine(database)
+        await first.backfill()
+        await first.snapshot()
+
+        _, rows = database.writes[0]
+        database.snapshots = [SimpleNamespace(**row) for row in rows]
+        # trades the snapshot holds already, as if they fell in the re-read before the watermark
+        database.trades = old + [trade(3, -5.0), trade(4, 30.0)]
+        restarted = engine(database)
+        await restarted.start()
+        await restarted.stop()
+
+        assert "trades.close_time >=" in database.queries[1]
+        for i, value in enumerate((-5.0, 30.0), start=3):
+            first.record(trade(i, value))
+        assert restarted.get("u1", "smc", "XAUUSD") == pytest.approx(first.get("u1", "smc", "XAUUSD"))
+
+    async def test_backfill_skips_trades_recorded_meanwhile(self):
+        database = FakeDatabase(trades=[trade(1, 10.0), trade(2, 20.0)])
+        stats = engine(database)
+        stream = database.stream
+
+        async def stream_after_a_live_close(query):
+            stats.record(trade(2, 20.0))
+            return await stream(query)
+
+        database.stream = stream_after_a_live_close
+        assert await stats.backfill() == 1
+        assert stats.get("u1")["trades"] == 2
+        assert "(trades.close_time, trades.id) >" not in database.queries[0]
+
+    async def test_live_records_do_not_hide_earlier_closes(self):
+        database = FakeDatabase()
+        stats = engine(database)
+        stats.record(trade(2, 20.0))
+        # closed earlier on another worker, committed after trade 2 was recorded here
+        database.trades = [trade(1, 10.0), trade(2, 20.0)]
+
+        assert await stats.backfill() == 1
+        assert stats.get("u1")["trades"] == 2
+        assert stats.get("u1")["net_pnl"] == 30.0
+
+        database.trades = [trade(2, 20.0), trade(3, 5.0)]
+        assert await stats.backfill() == 1
+        assert "trades.close_time >=" in database.queries[-1]
+
+    async def test_reads_fall_back_to_snapshots(self):
+        database, cache = FakeDatabase(), FakeCache()
+        writer = engine(database, cache)
+        writer.record(trade(1, 50.0))
+        await writer.snapshot()
+
+        reader = engine(database, cache)
+        assert (await reader.fetch("u1"))["net_pnl"] == 50.0
+
+        metric = await reader.performance_metric()
+        assert metric.total_trades == 1 and metric.win_rate == 1.0
+        assert await engine().performance_metric() is None
+
+    async def test_one_process_owns_the_snapshots(self):
+        database, cache = FakeDatabase(), FakeCache()
+        owner, other = engine(database, cache), engine(database, cache)
+        for stats in (owner, other):
+            stats.record(trade(1, 50.0))
+
+        assert await owner.snapshot() == 5
+        assert await other.snapshot() == 0
+        assert len(database.writes) == 1
+        # the owner renews its claim, the other keeps its changes for a takeover
+        owner.record(trade(2, 10.0))
+        assert await owner.snapshot() == 5
+        del cache.values[OWNER_KEY]
+        assert await other.snapshot() == 5
+
+    async def test_each_pass_replays_trades_closed_elsewhere(self):
+        database = FakeDatabase(trades=[trade(1, 10.0)])
+        stats = engine(database, snapshot_interval=0.01)
+        stream = database.stream
+
+        async def closed_since_the_last_pass(query):
+            result = await stream(query)
+            database.trades = []
+            return result
+
+        database.stream = closed_since_the_last_pass
+        await stats.start()
+        database.trades = [trade(2, 20.0)]   # closed by another process
+        await asyncio.sleep(0.05)
+        await stats.stop()
+
+        assert stats.get("u1")["trades"] == 2
+        assert database.writes